@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+🎯 MAXXPHARM CRM - Бенчмарк автоматического назначения сотрудников
+
+Симуляция рабочего дня (2000 заказов) поверх WorkerLoadBalancer:
+пропускная способность назначений и равномерность нагрузки.
+
+Запуск: python benchmarks/bench_assignment.py [--orders 2000] [--seed 42]
+"""
+
+import argparse
+import heapq
+import os
+import random
+import statistics
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.services.assignment_service import WorkerLoad, WorkerLoadBalancer
+
+ZONES = ["центр", "север", "юг", "восток", "запад"]
+
+# Роль -> (сотрудников в зоне, средняя длительность этапа в минутах)
+STAGES = [
+    ("collector", 3, 15.0),
+    ("checker", 2, 5.0),
+    ("courier", 4, 40.0),
+]
+
+WORKDAY_MINUTES = 12 * 60
+
+
+def build_balancer(rng: random.Random) -> WorkerLoadBalancer:
+    """Создание сотрудников по зонам"""
+    balancer = WorkerLoadBalancer()
+    workers = []
+    user_id = 1
+    for role, per_zone, _ in STAGES:
+        for zone in ZONES:
+            for _ in range(per_zone):
+                workers.append(WorkerLoad(
+                    user_id=user_id,
+                    role=role,
+                    zone=zone,
+                    max_orders=5,
+                    performance_score=round(rng.uniform(3.5, 5.0), 2)
+                ))
+                user_id += 1
+    balancer.load(workers)
+    return balancer
+
+
+def simulate_day(orders: int, seed: int) -> dict:
+    """Дискретно-событийная симуляция дня"""
+    rng = random.Random(seed)
+    balancer = build_balancer(rng)
+    
+    events = []  # (минута, seq, тип, заказ, этап)
+    seq = 0
+    for order_id in range(orders):
+        minute = rng.uniform(0, WORKDAY_MINUTES)
+        heapq.heappush(events, (minute, seq, "stage", order_id, 0))
+        seq += 1
+    
+    order_zone = {order_id: rng.choice(ZONES) for order_id in range(orders)}
+    waiting = defaultdict(list)  # роль -> очередь (минута, заказ, этап)
+    assigned_count = defaultdict(int)
+    wait_times = []
+    assign_ns = 0
+    assign_ops = 0
+    peak_load = 0
+    
+    def try_assign(now, order_id, stage):
+        nonlocal seq, assign_ns, assign_ops, peak_load
+        role, _, duration = STAGES[stage]
+        started = time.perf_counter_ns()
+        worker = balancer.best(role, order_zone[order_id])
+        if worker is not None:
+            balancer.adjust(worker.user_id, +1)
+        assign_ns += time.perf_counter_ns() - started
+        assign_ops += 1
+        
+        if worker is None:
+            return False
+        
+        assigned_count[worker.user_id] += 1
+        peak_load = max(peak_load, worker.active_orders)
+        finish = now + rng.expovariate(1.0 / duration)
+        heapq.heappush(events, (finish, seq, "done", order_id, (stage, worker.user_id)))
+        seq += 1
+        return True
+    
+    while events:
+        now, _, kind, order_id, payload = heapq.heappop(events)
+        
+        if kind == "stage":
+            if not try_assign(now, order_id, payload):
+                waiting[STAGES[payload][0]].append((now, order_id, payload))
+            continue
+        
+        stage, user_id = payload
+        started = time.perf_counter_ns()
+        balancer.adjust(user_id, -1)
+        assign_ns += time.perf_counter_ns() - started
+        assign_ops += 1
+        
+        # Освободившийся сотрудник забирает ожидающий заказ своей роли
+        role = STAGES[stage][0]
+        if waiting[role]:
+            queued_at, queued_order, queued_stage = waiting[role].pop(0)
+            if try_assign(now, queued_order, queued_stage):
+                wait_times.append(now - queued_at)
+            else:
+                waiting[role].insert(0, (queued_at, queued_order, queued_stage))
+        
+        if stage + 1 < len(STAGES):
+            heapq.heappush(events, (now, seq, "stage", order_id, stage + 1))
+            seq += 1
+    
+    balance = {}
+    for role, _, _ in STAGES:
+        counts = [
+            assigned_count[worker["user_id"]]
+            for worker in balancer.snapshot(role)
+        ]
+        balance[role] = {
+            "workers": len(counts),
+            "min": min(counts),
+            "max": max(counts),
+            "mean": round(statistics.mean(counts), 1),
+            "cv": round(statistics.pstdev(counts) / statistics.mean(counts), 3) if sum(counts) else 0.0,
+        }
+    
+    return {
+        "orders": orders,
+        "assign_ops": assign_ops,
+        "ns_per_op": assign_ns / assign_ops if assign_ops else 0.0,
+        "ops_per_second": assign_ops / (assign_ns / 1e9) if assign_ns else 0.0,
+        "peak_load": peak_load,
+        "queued": len(wait_times),
+        "avg_wait_minutes": statistics.mean(wait_times) if wait_times else 0.0,
+        "balance": balance,
+    }
+
+
+def scaling(worker_counts, operations: int, seed: int) -> list:
+    """Стоимость операции в зависимости от количества сотрудников"""
+    rng = random.Random(seed)
+    results = []
+    for count in worker_counts:
+        balancer = WorkerLoadBalancer()
+        balancer.load(
+            WorkerLoad(user_id=i, role="courier", zone=rng.choice(ZONES), max_orders=10 ** 6)
+            for i in range(count)
+        )
+        started = time.perf_counter()
+        for _ in range(operations):
+            worker = balancer.best("courier", rng.choice(ZONES))
+            balancer.adjust(worker.user_id, +1)
+            balancer.adjust(worker.user_id, -1)
+        elapsed = time.perf_counter() - started
+        results.append((count, elapsed / operations * 1e6))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    
+    print("🎯 MAXXPHARM CRM - Assignment benchmark")
+    print("=" * 50)
+    
+    result = simulate_day(args.orders, args.seed)
+    print(f"📦 Orders simulated: {result['orders']}")
+    print(f"⚡ Balancer ops: {result['assign_ops']} "
+          f"({result['ns_per_op'] / 1000:.2f} µs/op, {result['ops_per_second']:,.0f} ops/s)")
+    print(f"📈 Peak worker load: {result['peak_load']}")
+    print(f"⏳ Queued assignments: {result['queued']} "
+          f"(avg wait {result['avg_wait_minutes']:.1f} min)")
+    print("\n👥 Load balance (assignments per worker):")
+    for role, stats in result["balance"].items():
+        print(f"• {role}: workers={stats['workers']} min={stats['min']} "
+              f"max={stats['max']} mean={stats['mean']} cv={stats['cv']}")
+    
+    print("\n📊 Scaling (assign + release, µs/cycle):")
+    for count, micros in scaling([100, 1000, 10000], 20000, args.seed):
+        print(f"• {count:>6} workers: {micros:.2f} µs")
+
+
+if __name__ == "__main__":
+    main()
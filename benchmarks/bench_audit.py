@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+📝 MAXXPHARM CRM - Бенчмарк записи журнала действий
+
+Поток событий журнала записывается двумя способами: как раньше, отдельным
+INSERT и commit на каждое действие, и через очередь AuditLog с пакетными
+многострочными INSERT. Замеряется время, которое действие тратит на
+журнал, общее время до записи всех событий и задержка сброса пакетов.
+
+Запуск: python benchmarks/bench_audit.py [--events 5000] [--batch 500]
+        [--database-url sqlite+aiosqlite:////tmp/bench_audit.db]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import insert, delete, select, func
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+
+from src.models.database import Base, User, ActivityLog
+from src.services.audit_service import AuditLog
+
+
+def event(n: int):
+    return {
+        "user_id": 1,
+        "action": "order_status_changed",
+        "entity_type": "order",
+        "entity_id": n,
+        "details": {"old_status": "confirmed", "new_status": "collecting", "operator": "Оператор", "n": n},
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=5000)
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--database-url", default="sqlite+aiosqlite:////tmp/bench_audit.db")
+    args = parser.parse_args()
+    
+    engine = create_async_engine(args.database_url)
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.drop_all)
+        await connection.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with session_factory() as session:
+        await session.execute(insert(User), [{"id": 1, "telegram_id": 1, "full_name": "Operator", "role": "operator"}])
+        await session.commit()
+    
+    print("📝 MAXXPHARM CRM - Audit log benchmark")
+    print("=" * 50)
+    
+    # Как раньше: INSERT и commit в каждом действии
+    async with session_factory() as session:
+        started = time.perf_counter()
+        for n in range(args.events):
+            session.add(ActivityLog(**event(n)))
+            await session.commit()
+        legacy = time.perf_counter() - started
+        await session.execute(delete(ActivityLog))
+        await session.commit()
+    print(f"🐢 Commit per event: {args.events} events in {legacy:.2f} s "
+          f"({legacy / args.events * 1000:.2f} ms per action)")
+    
+    audit = AuditLog(batch_size=args.batch, flush_interval=0.05, session_factory=session_factory)
+    started = time.perf_counter()
+    for n in range(args.events):
+        await audit.record(**event(n))
+    enqueued = time.perf_counter() - started
+    await audit.flush()
+    total = time.perf_counter() - started
+    stats = audit.get_stats()
+    await audit.stop()
+    
+    async with session_factory() as session:
+        written = (await session.execute(select(func.count()).select_from(ActivityLog))).scalar()
+    print(f"🚀 Batched queue: {enqueued / args.events * 1000:.3f} ms per action, all {written} written in "
+          f"{total:.2f} s ({legacy / total:.0f}× faster), {stats['batches']} batches")
+    print(f"⏱️ Flush latency: p50={stats['flush']['p50_ms']} ms p95={stats['flush']['p95_ms']} ms "
+          f"max={stats['flush']['max_ms']} ms")
+    
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
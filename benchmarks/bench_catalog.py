@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+📚 MAXXPHARM CRM - Бенчмарк сопоставления строк заказа с каталогом
+
+Каталог из 20000 SKU (реальные МНН и синтетические названия, кириллица и
+латиница, дозировки и формы) и 10000 строк свободного текста с опечатками,
+сокращениями и латинским написанием.
+
+Запуск: python benchmarks/bench_catalog.py [--skus 20000] [--lines 10000] [--seed 42]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.services.catalog_service import CatalogIndex, normalize_tokens
+
+REAL_NAMES = [
+    "Парацетамол", "Ибупрофен", "Аспирин", "Анальгин", "Арбидол", "Кагоцел",
+    "Ремантадин", "Осельтамивир", "Лозартан", "Эналаприл", "Амлодипин", "Цефтриаксон",
+    "Новокаин", "Амоксициллин", "Азитромицин", "Кларитромицин", "Ципрофлоксацин",
+    "Метформин", "Омепразол", "Пантопразол", "Дротаверин", "Лоратадин", "Цетиризин",
+    "Диклофенак", "Кеторолак", "Нимесулид", "Метронидазол", "Флуконазол", "Аторвастатин",
+    "Симвастатин", "Бисопролол", "Метопролол", "Каптоприл", "Фуросемид", "Гидрохлортиазид",
+    "Дексаметазон", "Преднизолон", "Амброксол", "Ацетилцистеин", "Бромгексин",
+    "Nurofen", "Panadol", "Aspirin Cardio", "Coldrex", "Theraflu", "Strepsils",
+]
+SYLLABLES = ["ба", "ве", "до", "ла", "ми", "ни", "ро", "са", "те", "фа", "ци", "кса",
+             "зол", "трин", "фен", "мак", "лин", "пра", "кор", "вит"]
+SUFFIXES = ["ин", "ол", "ид", "ат", "ен", "он", "ил", "ам"]
+FORMS = ["таблетки", "капсулы", "ампулы", "раствор", "сироп", "мазь", "флакон", "порошок"]
+DOSES = ["5мг", "10мг", "20мг", "50мг", "100мг", "250мг", "500мг", "1г", "2мл", "5мл"]
+PACKS = ["№10", "№20", "№30", "№50"]
+LATIN = {"а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ж": "zh", "з": "z",
+         "и": "i", "й": "y", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o", "п": "p",
+         "р": "r", "с": "s", "т": "t", "у": "u", "ф": "f", "х": "kh", "ц": "c", "ч": "ch",
+         "ш": "sh", "щ": "sch", "ы": "y", "э": "e", "ю": "yu", "я": "ya", "ь": "", "ъ": ""}
+
+
+def synthetic_name(rng: random.Random) -> str:
+    """Синтетическое название препарата"""
+    body = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3)))
+    return (body + rng.choice(SUFFIXES)).capitalize()
+
+
+def build_catalog(count: int, rng: random.Random):
+    """SKU: название + дозировка + фасовка, по ~10 вариантов на название"""
+    bases = list(REAL_NAMES)
+    seen = set(name.lower() for name in bases)
+    while len(bases) * 10 < count:
+        name = synthetic_name(rng)
+        if name.lower() not in seen:
+            seen.add(name.lower())
+            bases.append(name)
+    
+    products = []
+    keys = set()
+    while len(products) < count:
+        base = rng.choice(bases)
+        dose = rng.choice(DOSES)
+        pack = rng.choice(PACKS)
+        name = f"{base} {dose} {pack}"
+        if name in keys:
+            continue
+        keys.add(name)
+        products.append({
+            "id": len(products) + 1,
+            "name": name,
+            "form": rng.choice(FORMS),
+            "price": round(rng.uniform(10, 500), 2),
+            "stock": rng.randint(0, 1000),
+            "base": base,
+            "dose": dose,
+        })
+    return products
+
+
+def typo(word: str, rng: random.Random) -> str:
+    """Одна опечатка: замена, пропуск или перестановка букв"""
+    if len(word) < 5:
+        return word
+    i = rng.randrange(1, len(word) - 1)
+    kind = rng.random()
+    if kind < 0.4:
+        return word[:i] + rng.choice("аеиоуклмнрст") + word[i + 1:]
+    if kind < 0.7:
+        return word[:i] + word[i + 1:]
+    return word[:i - 1] + word[i] + word[i - 1] + word[i + 1:]
+
+
+def to_latin(word: str) -> str:
+    return "".join(LATIN.get(char, char) for char in word.lower())
+
+
+def build_lines(products, count: int, rng: random.Random):
+    """Строки заказа: (текст, ожидаемое название, дозировка или None, если не указана)"""
+    lines = []
+    for _ in range(count):
+        product = rng.choice(products)
+        base = product["base"]
+        mode = rng.random()
+        if mode < 0.3:
+            name = typo(base, rng)
+        elif mode < 0.4:
+            name = to_latin(base)
+        elif mode < 0.5:
+            name = base.lower()[:max(5, len(base) - 3)]
+        else:
+            name = base
+        text = name
+        dose = None
+        if rng.random() < 0.7:
+            dose = product["dose"]
+            text += f" {dose}"
+        if rng.random() < 0.3:
+            text += f" {rng.choice(['таб', 'капс', 'амп', 'фл'])}"
+        lines.append((text, base, dose))
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--skus", type=int, default=20000)
+    parser.add_argument("--lines", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    
+    rng = random.Random(args.seed)
+    products = build_catalog(args.skus, rng)
+    lines = build_lines(products, args.lines, rng)
+    
+    print("📚 MAXXPHARM CRM - Catalog matching benchmark")
+    print("=" * 50)
+    
+    started = time.perf_counter()
+    index = CatalogIndex.from_products(products)
+    print(f"🏗 Index build: {len(index)} SKUs in {(time.perf_counter() - started) * 1000:.0f} ms")
+    
+    # Без кэша запросов: каждая строка проходит полный поиск
+    index.cache_size = 0
+    latencies = []
+    hits = 0
+    base_correct = 0
+    dose_correct = 0
+    with_dose = sum(1 for _, _, dose in lines if dose)
+    for text, base, dose in lines:
+        started = time.perf_counter()
+        match = index.match(text)
+        latencies.append((time.perf_counter() - started) * 1e6)
+        if match is None:
+            continue
+        hits += 1
+        matched_base = normalize_tokens(match["name"])
+        if normalize_tokens(base)[0] == matched_base[0]:
+            base_correct += 1
+            if dose and normalize_tokens(dose)[0] in matched_base:
+                dose_correct += 1
+    
+    latencies.sort()
+    print(f"⚡ Match (no cache): mean={statistics.mean(latencies):.1f} µs "
+          f"p50={latencies[len(latencies) // 2]:.1f} µs "
+          f"p99={latencies[int(len(latencies) * 0.99)]:.1f} µs")
+    print(f"🎯 Matched: {hits}/{len(lines)}, correct drug: {base_correct / len(lines) * 100:.1f}%, "
+          f"correct dose (lines with dose): {dose_correct / with_dose * 100:.1f}%")
+    
+    index.cache_size = len(lines)
+    started = time.perf_counter()
+    for _ in range(3):
+        for text, _, _ in lines:
+            index.match(text)
+    cached = (time.perf_counter() - started) / (3 * len(lines)) * 1e6
+    print(f"💾 Match with query cache (repeated lines): {cached:.1f} µs")
+
+
+if __name__ == "__main__":
+    main()
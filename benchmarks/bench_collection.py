@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+💼 MAXXPHARM CRM - Бенчмарк списка должников торговых представителей
+
+Клиенты, аптеки по зонам и активные долги создаются напрямую в базе.
+Сравнивается экран "💰 Долги", собранный агрегатом по долгам, клиентам
+и аптекам с сортировкой по приоритету, и чтение готовых строк
+debt_worklist по индексу (sales_rep_id, priority); отдельно замеряется
+пересчет строки клиента после оплаты и полный ночной пересчет.
+
+Запуск: python benchmarks/bench_collection.py [--clients 5000] [--debts 30000] [--zones 10]
+        [--database-url sqlite+aiosqlite:///:memory:]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import insert, select, func
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+
+from src.models.database import Base, User, Pharmacy, Debt, ClientBalance
+from src.services.collection_service import CollectionService, client_risk, debt_priority, _age_days
+
+
+async def seed(session_factory, clients: int, debts: int, zones: int, rng: random.Random):
+    now = datetime.utcnow()
+    reps = list(range(clients + 1, clients + zones + 1))
+    async with session_factory() as session:
+        await session.execute(insert(User), [
+            {"id": n, "telegram_id": n, "full_name": f"Client {n}", "role": "client"} for n in range(1, clients + 1)
+        ] + [
+            {"id": rep_id, "telegram_id": rep_id, "full_name": f"Rep {rep_id}", "role": "sales_rep",
+             "zone": f"zone-{index}"} for index, rep_id in enumerate(reps)
+        ])
+        await session.execute(insert(Pharmacy), [
+            {"id": n, "user_id": n, "name": f"Pharmacy {n}", "address": "Душанбе", "zone": f"zone-{n % zones}",
+             "latitude": 38.5 + rng.random() * 0.1, "longitude": 68.7 + rng.random() * 0.1}
+            for n in range(1, clients + 1)
+        ])
+        totals = {}
+        rows = []
+        for debt_id in range(1, debts + 1):
+            client_id = rng.randint(1, clients)
+            amount = Decimal(rng.randint(50, 5000))
+            totals[client_id] = totals.get(client_id, Decimal("0")) + amount
+            rows.append({"id": debt_id, "order_id": debt_id, "client_id": client_id, "total_amount": amount,
+                         "paid_amount": 0, "remaining_amount": amount, "is_active": True,
+                         "created_at": now - timedelta(days=rng.randint(0, 120))})
+        for start in range(0, len(rows), 5000):
+            await session.execute(insert(Debt), rows[start:start + 5000])
+        await session.execute(insert(ClientBalance), [
+            {"client_id": client_id, "charged_total": total * 2, "paid_total": total, "outstanding": total,
+             "active_debt": total} for client_id, total in totals.items()
+        ])
+        await session.commit()
+    return reps
+
+
+async def legacy_worklist(session, zone: str, limit: int, now: datetime):
+    """Как строился бы экран без debt_worklist: агрегат по всем долгам зоны и сортировка в Python"""
+    result = await session.execute(
+        select(
+            Debt.client_id, func.sum(Debt.remaining_amount), func.count(Debt.id), func.min(Debt.created_at),
+            ClientBalance.charged_total, ClientBalance.paid_total, User.full_name, Pharmacy.name
+        )
+        .join(User, User.id == Debt.client_id)
+        .join(Pharmacy, Pharmacy.user_id == Debt.client_id)
+        .outerjoin(ClientBalance, ClientBalance.client_id == Debt.client_id)
+        .where(Debt.is_active == True, Pharmacy.zone == zone)
+        .group_by(Debt.client_id, ClientBalance.charged_total, ClientBalance.paid_total, User.full_name, Pharmacy.name)
+    )
+    rows = []
+    for client_id, outstanding, count, oldest, charged, paid, name, pharmacy in result.all():
+        age = _age_days(oldest, now)
+        risk = client_risk(count, age, float(charged or 0), float(paid or 0))
+        rows.append((debt_priority(float(outstanding), age, risk), client_id, name, pharmacy))
+    rows.sort(reverse=True)
+    return rows[:limit]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=5000)
+    parser.add_argument("--debts", type=int, default=30000)
+    parser.add_argument("--zones", type=int, default=10)
+    parser.add_argument("--lookups", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--database-url", default="sqlite+aiosqlite:///:memory:")
+    args = parser.parse_args()
+    
+    engine = create_async_engine(args.database_url)
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    
+    rng = random.Random(args.seed)
+    reps = await seed(session_factory, args.clients, args.debts, args.zones, rng)
+    
+    print("💼 MAXXPHARM CRM - Debt collection benchmark")
+    print("=" * 50)
+    print(f"📦 {args.debts} active debts, {args.clients} clients, {args.zones} zones")
+    
+    async with session_factory() as session:
+        started = time.perf_counter()
+        stats = await CollectionService(session).rebuild()
+        elapsed = time.perf_counter() - started
+    print(f"🌙 Full rebuild: {stats['clients']} clients in {elapsed * 1000:.0f} ms")
+    
+    now = datetime.utcnow()
+    picks = [rng.randrange(args.zones) for _ in range(args.lookups)]
+    async with session_factory() as session:
+        started = time.perf_counter()
+        for index in picks:
+            await legacy_worklist(session, f"zone-{index}", 20, now)
+        legacy = time.perf_counter() - started
+        
+        service = CollectionService(session)
+        started = time.perf_counter()
+        for index in picks:
+            await service.get_worklist(reps[index])
+            session.expunge_all()
+        indexed = time.perf_counter() - started
+    print(f"🔎 Worklist x{args.lookups}: aggregate + sort {legacy / args.lookups * 1000:.2f} ms, "
+          f"debt_worklist {indexed / args.lookups * 1000:.2f} ms ({legacy / indexed:.0f}× faster)")
+    
+    async with session_factory() as session:
+        service = CollectionService(session)
+        client_ids = [rng.randint(1, args.clients) for _ in range(args.lookups)]
+        started = time.perf_counter()
+        for client_id in client_ids:
+            await service.refresh_client(client_id)
+        await session.commit()
+        elapsed = time.perf_counter() - started
+        
+        started = time.perf_counter()
+        plan = await service.plan_day(reps[0])
+        plan_elapsed = time.perf_counter() - started
+    print(f"💸 Refresh after payment: {elapsed / args.lookups * 1000:.2f} ms per client")
+    print(f"🗺️ Day plan: {len(plan['visits'])} visits, {plan['distance_km']} km in {plan_elapsed * 1000:.0f} ms")
+    
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+🚚 MAXXPHARM CRM - Бенчмарк поиска ближайших курьеров
+
+1000 курьеров × 10000 запросов k ближайших по сетке CourierGridIndex
+в сравнении с полным перебором.
+
+Запуск: python benchmarks/bench_dispatch.py [--couriers 1000] [--queries 10000] [--k 5]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.services.dispatch_service import CourierGridIndex
+from src.services.location_service import haversine_km
+
+# Центр Душанбе и разброс точек (~15 км)
+CENTER = (38.5598, 68.7870)
+SPREAD_DEGREES = 0.14
+
+
+def random_point(rng: random.Random):
+    """Случайная точка в городе"""
+    return (
+        CENTER[0] + rng.uniform(-SPREAD_DEGREES, SPREAD_DEGREES),
+        CENTER[1] + rng.uniform(-SPREAD_DEGREES, SPREAD_DEGREES)
+    )
+
+
+def brute_force(positions, latitude, longitude, k, max_km):
+    """Полный перебор для проверки"""
+    distances = []
+    for courier_id, (lat, lon) in positions.items():
+        distance = haversine_km(latitude, longitude, lat, lon)
+        if distance <= max_km:
+            distances.append((distance, courier_id))
+    distances.sort()
+    return distances[:k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--couriers", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=10000)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--radius", type=float, default=50.0)
+    parser.add_argument("--cell-km", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    
+    rng = random.Random(args.seed)
+    index = CourierGridIndex(cell_km=args.cell_km)
+    positions = {}
+    for courier_id in range(args.couriers):
+        positions[courier_id] = random_point(rng)
+        index.update(courier_id, *positions[courier_id])
+    
+    queries = [random_point(rng) for _ in range(args.queries)]
+    
+    print("🚚 MAXXPHARM CRM - Dispatch benchmark")
+    print("=" * 50)
+    print(f"👥 Couriers: {args.couriers}, queries: {args.queries}, k={args.k}")
+    
+    latencies = []
+    for latitude, longitude in queries:
+        started = time.perf_counter()
+        index.nearest(latitude, longitude, args.k, args.radius)
+        latencies.append((time.perf_counter() - started) * 1e6)
+    
+    latencies.sort()
+    print(f"⚡ Grid: mean={statistics.mean(latencies):.1f} µs "
+          f"p50={latencies[len(latencies) // 2]:.1f} µs "
+          f"p99={latencies[int(len(latencies) * 0.99)]:.1f} µs")
+    
+    sample = queries[:500]
+    started = time.perf_counter()
+    mismatches = 0
+    for latitude, longitude in sample:
+        expected = brute_force(positions, latitude, longitude, args.k, args.radius)
+        actual = index.nearest(latitude, longitude, args.k, args.radius)
+        if [courier_id for _, courier_id in expected] != [courier_id for _, courier_id in actual]:
+            mismatches += 1
+    brute_micros = (time.perf_counter() - started) / len(sample) * 1e6
+    
+    print(f"🐢 Brute force + grid check: {brute_micros:.1f} µs/query")
+    print(f"✅ Mismatches vs brute force: {mismatches}/{len(sample)}")
+    
+    # Поток обновлений позиций (курьеры двигаются)
+    started = time.perf_counter()
+    for _ in range(args.queries):
+        courier_id = rng.randrange(args.couriers)
+        index.update(courier_id, *random_point(rng))
+    update_micros = (time.perf_counter() - started) / args.queries * 1e6
+    print(f"📍 Position update: {update_micros:.2f} µs")
+
+
+if __name__ == "__main__":
+    main()
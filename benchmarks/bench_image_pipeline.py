@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+📷 MAXXPHARM CRM - Бенчмарк обработки фото рецептов
+
+Всплеск фото высокого разрешения (12 Мп) обрабатывается двумя способами:
+прямо в цикле событий и через пул процессов ImageProcessor. Замеряются
+пропускная способность, максимальная задержка цикла событий (насколько
+бот "замирает" для остальных пользователей) и пиковая память воркера.
+
+Запуск: python benchmarks/bench_image_pipeline.py [--photos 16] [--workers 2] [--in-flight 4]
+"""
+
+import argparse
+import asyncio
+import os
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.services.media_service import ImageProcessor, normalize_image
+from src.config import settings
+
+
+def make_photos(directory: str, count: int):
+    """Фото 4032x3024 с шумом (размер файла как у снимка телефона)"""
+    from PIL import Image
+    
+    paths = []
+    noise = Image.effect_noise((4032, 3024), 64).convert("RGB")
+    for n in range(count):
+        path = os.path.join(directory, f"photo_{n}.jpg")
+        # Разный сдвиг - разное содержимое, без совпадений по хэшу
+        Image.merge("RGB", [channel.point(lambda v, n=n: (v + n * 7) % 256) for channel in noise.split()]).save(
+            path, quality=92
+        )
+        paths.append(path)
+    return paths
+
+
+async def measure(label: str, run):
+    lag = 0.0
+    stop = asyncio.Event()
+    
+    async def ticker():
+        nonlocal lag
+        while not stop.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(0.005)
+            lag = max(lag, time.perf_counter() - started - 0.005)
+    
+    task = asyncio.create_task(ticker())
+    await asyncio.sleep(0.01)
+    started = time.perf_counter()
+    count = await run()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await task
+    
+    print(f"{label}: {count} photos in {elapsed:.2f} s ({count / elapsed:.1f}/s), "
+          f"max loop lag {lag * 1000:.0f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--photos", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--in-flight", type=int, default=4)
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as directory:
+        settings.media_storage_path = os.path.join(directory, "store")
+        print("📷 MAXXPHARM CRM - Image pipeline benchmark")
+        print("=" * 50)
+        paths = make_photos(directory, args.photos)
+        size = sum(os.path.getsize(path) for path in paths) / len(paths) / 1024 / 1024
+        print(f"🖼 {args.photos} photos 4032x3024, avg {size:.1f} MiB")
+        
+        processor = ImageProcessor(workers=args.workers, max_in_flight=args.in_flight)
+        
+        async def pooled():
+            async def one(path):
+                async with processor.slots:
+                    return await processor.normalize(path)
+            results = await asyncio.gather(*[one(path) for path in paths])
+            return len(results)
+        
+        async def inline():
+            for path in paths:
+                normalize_image(path, settings.media_storage_path + "_inline",
+                                settings.image_max_side, settings.image_jpeg_quality)
+            return len(paths)
+        
+        # Прогрев пула (запуск процессов) в замер не входит
+        await processor.normalize(paths[0])
+        
+        await measure(f"⚙️ Process pool ({args.workers} workers, {args.in_flight} in flight)", pooled)
+        await measure("🐌 Inline on event loop", inline)
+        
+        stats = processor.get_stats()
+        processor.executor.shutdown(wait=True)
+        worker_peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+        print(f"📊 Worker avg {stats['avg_ms']} ms/photo (incl. queueing), failed {stats['failed']}, "
+              f"worker peak RSS {worker_peak:.0f} MiB")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+📥 MAXXPHARM CRM - Бенчмарк импорта заказа из CSV/XLSX
+
+Документ на 5000 строк (артикулы, названия с опечатками, повторы и
+ошибочные строки) импортируется целиком: потоковое чтение, проверка,
+сопоставление с каталогом и создание заказа. Отдельно сравнивается
+вставка позиций по одной и одним multi-row INSERT.
+
+Запуск: python benchmarks/bench_order_import.py [--rows 5000] [--products 3000]
+        [--database-url sqlite+aiosqlite:///:memory:]
+"""
+
+import argparse
+import asyncio
+import io
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+
+from src.models.database import Base, User, Pharmacy, Order, OrderItem, Product
+from src.services.catalog_service import product_catalog
+from src.services.order_import_service import OrderImportService
+
+NAMES = ["Парацетамол", "Ибупрофен", "Аспирин", "Анальгин", "Арбидол", "Кагоцел", "Ремантадин",
+         "Лозартан", "Эналаприл", "Амлодипин", "Цефтриаксон", "Новокаин", "Амоксициллин",
+         "Азитромицин", "Метформин", "Омепразол", "Дротаверин", "Лоратадин", "Цетиризин",
+         "Диклофенак", "Кеторолак", "Нимесулид", "Метронидазол", "Флуконазол", "Аторвастатин"]
+DOSES = ["5мг", "10мг", "20мг", "50мг", "100мг", "250мг", "500мг", "1г"]
+PACKS = ["№10", "№20", "№30", "№50", "№100"]
+FORMS = ["таблетки", "капсулы", "раствор", "сироп"]
+HEADER = ["Артикул", "Наименование", "Кол-во", "Ед. изм."]
+
+
+def build_products(count: int, rng: random.Random):
+    count = min(count, len(NAMES) * len(DOSES) * len(PACKS) * len(FORMS))
+    products = []
+    seen = set()
+    while len(products) < count:
+        name = f"{rng.choice(NAMES)} {rng.choice(FORMS)} {rng.choice(DOSES)} {rng.choice(PACKS)}"
+        if name in seen:
+            continue
+        seen.add(name)
+        products.append({
+            "sku": f"MX-{len(products) + 1:05d}",
+            "name": name,
+            "price": round(rng.uniform(5, 300), 2),
+            "stock": rng.randint(0, 1000),
+        })
+    return products
+
+
+def build_rows(products, count: int, rng: random.Random):
+    """Строки документа: 40% по артикулу, остальные по названию, ~1% с ошибками"""
+    rows = []
+    for _ in range(count):
+        product = rng.choice(products)
+        kind = rng.random()
+        if kind < 0.01:
+            rows.append(["", product["name"], "много", "шт"])
+        elif kind < 0.4:
+            rows.append([product["sku"], product["name"], rng.randint(1, 200), "уп"])
+        else:
+            name = product["name"].lower() if kind < 0.7 else product["name"]
+            rows.append(["", name, f"{rng.randint(1, 200)} шт", ""])
+    return rows
+
+
+def to_csv(rows) -> bytes:
+    lines = [";".join(HEADER)] + [";".join(str(cell) for cell in row) for row in rows]
+    return ("\r\n".join(lines) + "\r\n").encode("cp1251")
+
+
+def to_xlsx(rows) -> bytes:
+    from openpyxl import Workbook
+    
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(HEADER)
+    for row in rows:
+        sheet.append(row)
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+async def seed(session_factory, products):
+    async with session_factory() as session:
+        await session.execute(insert(Product), products)
+        client = User(telegram_id=1, full_name="Bench Client", role="client")
+        session.add(client)
+        await session.flush()
+        pharmacy = Pharmacy(user_id=client.id, name="Bench Pharmacy", address="Душанбе, Рудаки 1")
+        session.add(pharmacy)
+        await session.commit()
+        return client.id, pharmacy.id
+
+
+async def run_import(session_factory, label, payload, file_name, client_id, pharmacy_id):
+    stage_started = {}
+    
+    async def progress(stage, done, total):
+        stage_started.setdefault(stage, time.perf_counter())
+    
+    tracemalloc.start()
+    started = time.perf_counter()
+    async with session_factory() as session:
+        report = await OrderImportService(session).import_order(
+            stream=io.BytesIO(payload),
+            file_name=file_name,
+            client_id=client_id,
+            pharmacy_id=pharmacy_id,
+            progress=progress
+        )
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    phases = " ".join(
+        f"{stage}@{(moment - started) * 1000:.0f}ms" for stage, moment in stage_started.items()
+    )
+    print(f"📄 {label}: {len(payload) / 1024:.0f} KiB, {report['rows']} rows in {elapsed * 1000:.0f} ms "
+          f"({report['rows'] / elapsed:,.0f} rows/s), peak {peak / 1024 / 1024:.1f} MiB")
+    print(f"   items={len(report['items'])} unmatched={report['unmatched']} "
+          f"errors={report['error_count']} order={report['order'].order_number} [{phases}]")
+
+
+async def compare_inserts(session_factory, client_id, pharmacy_id, count: int):
+    """Позиции по одной (как раньше) против одного multi-row INSERT"""
+    items = [
+        {"product_name": f"Товар {n}", "quantity": n % 50 + 1, "unit_price": 10.0}
+        for n in range(count)
+    ]
+    
+    async def make_order(session, number):
+        order = Order(order_number=number, client_id=client_id, pharmacy_id=pharmacy_id,
+                      status="created", total_amount=0)
+        session.add(order)
+        await session.flush()
+        return order.id
+    
+    async with session_factory() as session:
+        order_id = await make_order(session, "BENCH-ROW")
+        started = time.perf_counter()
+        for item in items:
+            session.add(OrderItem(order_id=order_id, product_name=item["product_name"],
+                                  quantity=item["quantity"], unit_price=item["unit_price"],
+                                  total_price=item["quantity"] * item["unit_price"]))
+        await session.commit()
+        per_row = time.perf_counter() - started
+    
+    async with session_factory() as session:
+        order_id = await make_order(session, "BENCH-BULK")
+        started = time.perf_counter()
+        await session.execute(insert(OrderItem), [
+            {"order_id": order_id, "product_name": item["product_name"], "quantity": item["quantity"],
+             "unit_price": item["unit_price"], "total_price": item["quantity"] * item["unit_price"]}
+            for item in items
+        ])
+        await session.commit()
+        bulk = time.perf_counter() - started
+    
+    print(f"💾 Insert {count} items: per-object {per_row * 1000:.0f} ms, "
+          f"multi-row {bulk * 1000:.0f} ms ({per_row / bulk:.1f}× faster)")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--products", type=int, default=3000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--database-url", default="sqlite+aiosqlite:///:memory:")
+    args = parser.parse_args()
+    
+    engine = create_async_engine(args.database_url)
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    
+    rng = random.Random(args.seed)
+    products = build_products(args.products, rng)
+    rows = build_rows(products, args.rows, rng)
+    client_id, pharmacy_id = await seed(session_factory, products)
+    
+    print("📥 MAXXPHARM CRM - Order import benchmark")
+    print("=" * 50)
+    
+    # Первое обращение строит индекс каталога, в замер импорта оно не входит
+    started = time.perf_counter()
+    async with session_factory() as session:
+        await product_catalog.refresh(session, force=True)
+    print(f"📚 Catalog index: {args.products} products in {(time.perf_counter() - started) * 1000:.0f} ms")
+    
+    await run_import(session_factory, "CSV (cp1251, ';')", to_csv(rows), "order.csv", client_id, pharmacy_id)
+    await run_import(session_factory, "XLSX", to_xlsx(rows), "order.xlsx", client_id, pharmacy_id)
+    await compare_inserts(session_factory, client_id, pharmacy_id, args.rows)
+    
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
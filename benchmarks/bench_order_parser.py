@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+🧾 MAXXPHARM CRM - Бенчмарк парсера текстовых заказов
+
+Точность на корпусе типичных форматов (маркеры, табуляция, x50, 50шт,
+перечисления через запятую) и пропускная способность на больших
+вставках (выгрузка остатков аптеки) в сравнении со старым парсером.
+
+Запуск: python benchmarks/bench_order_parser.py [--lines 50000] [--seed 42]
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.services.order_parser import parse_order_text, iter_order_items
+
+# Строка -> ожидаемые позиции [(название, количество, единица)]
+CORPUS = [
+    ("Парацетамол - 50 шт", [("Парацетамол", 50, "шт")]),
+    ("Цефтриаксон - 20 ампул", [("Цефтриаксон", 20, "ампула")]),
+    ("• Парацетамол - 50 шт", [("Парацетамол", 50, "шт")]),
+    ("• Ибупрофен 400мг - 30", [("Ибупрофен 400мг", 30, "шт")]),
+    ("- Аспирин 100мг x20", [("Аспирин 100мг", 20, "шт")]),
+    ("* Анальгин х 15", [("Анальгин", 15, "шт")]),
+    ("1. Арбидол 50шт", [("Арбидол", 50, "шт")]),
+    ("2) Кагоцел 10 уп", [("Кагоцел", 10, "упаковка")]),
+    ("3. Лозартан 50мг 5 упаковок", [("Лозартан 50мг", 5, "упаковка")]),
+    ("Физраствор 200мл 12 флаконов", [("Физраствор 200мл", 12, "флакон")]),
+    ("Физраствор 0,9% - 10 фл.", [("Физраствор 0,9%", 10, "флакон")]),
+    ("Новокаин 0.5% 10 амп", [("Новокаин 0.5%", 10, "ампула")]),
+    ("Эналаприл 10мг: 40", [("Эналаприл 10мг", 40, "шт")]),
+    ("Амлодипин 5мг — 25 шт.", [("Амлодипин 5мг", 25, "шт")]),
+    ("Парацетамол\t50", [("Парацетамол", 50, "шт")]),
+    ("Ромашка\t20\tуп", [("Ромашка", 20, "упаковка")]),
+    ("АП-0012\tШалфей фильтр-пакеты\t15\t25.00", [("Шалфей фильтр-пакеты", 15, "шт")]),
+    ("Парацетамол 50шт, Аспирин 20 уп, Цефтриаксон x10",
+     [("Парацетамол", 50, "шт"), ("Аспирин", 20, "упаковка"), ("Цефтриаксон", 10, "шт")]),
+    ("Анальгин - 10; Ибупрофен - 5",
+     [("Анальгин", 10, "шт"), ("Ибупрофен", 5, "шт")]),
+    ("Парацетамол, таблетки 500мг - 20", [("Парацетамол, таблетки 500мг", 20, "шт")]),
+    ("50 шт Парацетамол", [("Парацетамол", 50, "шт")]),
+    ("10 Омепразол 20мг", [("Омепразол 20мг", 10, "шт")]),
+    ("Витамин D3 - 6 фл", [("Витамин D3", 6, "флакон")]),
+    ("Омега-3 x 4", [("Омега-3", 4, "шт")]),
+    ("Кальций D3 Никомед 30", [("Кальций D3 Никомед", 30, "шт")]),
+    ("Эхинацея", [("Эхинацея", 1, "шт")]),
+    ("Ремантадин 50мг №20 - 3 уп", [("Ремантадин 50мг №20", 3, "упаковка")]),
+    ("Осельтамивир 75мг №10 2уп", [("Осельтамивир 75мг №10", 2, "упаковка")]),
+    ("Nurofen 200mg x12", [("Nurofen 200mg", 12, "шт")]),
+    ("Заказ на завтра:", []),
+    ("", []),
+    ("12345", []),
+    ("— Цетиризин — 7 шт —", [("Цетиризин", 7, "шт")]),
+    ("Дротаверин 40мг 100 штук", [("Дротаверин 40мг", 100, "шт")]),
+    ("Амоксициллин 500 мг - 2 пачки", [("Амоксициллин 500 мг", 2, "упаковка")]),
+]
+
+NAMES = ["Парацетамол", "Ибупрофен", "Аспирин", "Анальгин", "Цефтриаксон", "Лозартан",
+         "Эналаприл", "Амлодипин", "Физраствор", "Новокаин", "Омепразол", "Метформин"]
+DOSES = ["5мг", "10мг", "100мг", "500мг", "1г", "0,9%", "200мл"]
+TEMPLATES = [
+    "• {name} {dose} - {qty} шт",
+    "{name} {dose} x{qty}",
+    "{n}. {name} {dose} {qty} уп",
+    "{code}\t{name} {dose}\t{qty}\t{price}",
+    "{name} {dose}: {qty}",
+    "{name} {qty}шт, {name2} {qty2} амп",
+]
+
+
+def legacy_parse(text):
+    """Старый парсер ClientHandlers._parse_order_text (для сравнения)"""
+    items = []
+    for line in text.strip().split('\n'):
+        line = line.strip()
+        if not line or line.startswith('•'):
+            line = line.replace('•', '').strip()
+        if ' - ' in line:
+            parts = line.split(' - ')
+            if len(parts) >= 2:
+                quantity = 1
+                numbers = re.findall(r'\d+', parts[1].strip())
+                if numbers:
+                    quantity = int(numbers[0])
+                items.append({'product_name': parts[0].strip(), 'quantity': quantity})
+    return items
+
+
+def accuracy(parser) -> float:
+    """Доля строк корпуса, разобранных полностью верно"""
+    correct = 0
+    for line, expected in CORPUS:
+        got = [
+            (item["product_name"], item["quantity"], item.get("unit", "шт"))
+            for item in parser(line)
+        ]
+        if got == expected:
+            correct += 1
+        elif parser is parse_order_text:
+            print(f"   ✗ {line!r}: {got} != {expected}")
+    return correct / len(CORPUS)
+
+
+def build_export(lines: int, rng: random.Random) -> str:
+    """Большая вставка в смешанных форматах"""
+    out = []
+    for n in range(1, lines + 1):
+        out.append(rng.choice(TEMPLATES).format(
+            n=n,
+            code=f"АП-{n:05d}",
+            name=rng.choice(NAMES),
+            name2=rng.choice(NAMES),
+            dose=rng.choice(DOSES),
+            qty=rng.randint(1, 500),
+            qty2=rng.randint(1, 50),
+            price=f"{rng.uniform(5, 500):.2f}",
+        ))
+    return "\n".join(out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--lines", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    
+    print("🧾 MAXXPHARM CRM - Order parser benchmark")
+    print("=" * 50)
+    print(f"🎯 Corpus accuracy: {accuracy(parse_order_text) * 100:.1f}% "
+          f"(legacy: {accuracy(legacy_parse) * 100:.1f}%) on {len(CORPUS)} lines")
+    
+    text = build_export(args.lines, random.Random(args.seed))
+    print(f"📄 Export: {args.lines} lines, {len(text) / 1024:.0f} KiB")
+    
+    for label, run in (
+        ("parse_order_text", lambda: parse_order_text(text)),
+        ("iter_order_items (stream)", lambda: sum(1 for _ in iter_order_items(text))),
+        ("legacy", lambda: legacy_parse(text)),
+    ):
+        started = time.perf_counter()
+        result = run()
+        elapsed = time.perf_counter() - started
+        count = result if isinstance(result, int) else len(result)
+        print(f"⚡ {label}: {elapsed * 1000:.0f} ms, {args.lines / elapsed:,.0f} lines/s, {count} items")
+    
+    # Линейность: вдвое больше строк - вдвое дольше
+    double = text + "\n" + text
+    started = time.perf_counter()
+    parse_order_text(text)
+    single_time = time.perf_counter() - started
+    started = time.perf_counter()
+    parse_order_text(double)
+    print(f"📈 2× input time ratio: {(time.perf_counter() - started) / single_time:.2f}")
+
+
+if __name__ == "__main__":
+    main()
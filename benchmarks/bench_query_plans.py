@@ -0,0 +1,536 @@
+#!/usr/bin/env python3
+"""
+🔬 MAXXPHARM CRM - Регрессионный бенчмарк запросов и планов выполнения
+
+База заполняется синтетическими данными: по умолчанию 100 тыс. заказов,
+1 млн позиций и 5 млн точек геолокации курьеров (--scale уменьшает все
+объемы пропорционально). Схема создается миграциями, поэтому планы
+используют те же индексы, что и рабочая база. Заполненная база
+используется повторно при следующих запусках.
+
+Каждый метод OrderService, UserService, LocationService и AnalyticsService,
+обращающийся к базе, выполняется несколько раз (медиана и p95). Для каждого
+SELECT, отправленного методом, сохраняется план: EXPLAIN ANALYZE в
+PostgreSQL, EXPLAIN QUERY PLAN в SQLite. Результат пишется в JSON. С
+--baseline запуск завершается с кодом 1, если метод стал медленнее порога,
+начал падать или в его планах появилось последовательное чтение большой
+таблицы.
+
+Не замеряются внешние API (geocode_address, reverse_geocode,
+generate_ai_report), методы без запросов (calculate_distance,
+get_delivery_time_estimate) и cleanup_old_locations (удаляет данные набора).
+
+Запуск: python benchmarks/bench_query_plans.py [--scale 1.0] [--repeat 5]
+        [--database-url sqlite+aiosqlite:////tmp/maxxpharm_query_plans.db]
+        [--baseline benchmarks/results/baseline.json] [--output results.json]
+        [--threshold 1.5] [--min-delta-ms 5]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import event, insert, select, func, text
+
+# Таблицы, последовательное чтение которых на рабочих объемах - регрессия
+BIG_TABLES = {"orders", "order_items", "payments", "debts", "locations", "activity_logs", "balance_entries"}
+
+ZONES = ["center", "north", "south", "east", "west", "airport", "industrial", "suburb"]
+
+# Распределение статусов: закрытые заказы за полгода и свежие открытые
+CLOSED_WEIGHTS = {
+    "delivered": 35, "paid": 32, "debt": 8, "partially_paid": 5, "rejected": 5,
+}
+OPEN_WEIGHTS = {
+    "created": 3, "confirmed": 3, "collected": 3, "ready_for_delivery": 3, "in_delivery": 3,
+}
+
+PARTITION_SUFFIX = re.compile(r"_(p\d{6,8}|default|legacy)$")
+SQLITE_SCAN = re.compile(r"^SCAN (\w+)(?: AS \w+)?$")
+
+
+class QueryRecorder:
+    """SQL, отправленный драйверу во время вызова метода"""
+    
+    def __init__(self):
+        self.active = None
+    
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if self.active is not None:
+            self.active.append((statement, parameters, executemany))
+    
+    @contextmanager
+    def capture(self):
+        self.active = []
+        try:
+            yield self.active
+        finally:
+            self.active = None
+
+
+class Dataset:
+    """Идентификаторы заполненной базы, из которых сценарии берут аргументы"""
+    
+    def __init__(self):
+        self.clients = []
+        self.pharmacies = {}
+        self.client_names = []
+        self.couriers = []
+        self.operators = []
+        self.collectors = []
+        self.order_ids = []
+        self.order_numbers = []
+        self.created_orders = []
+        self.confirmed_orders = []
+        self.next_telegram_id = 0
+        self.new_users = []
+        self.counts = {}
+    
+    async def load(self, session_factory):
+        from src.models.database import User, Pharmacy, Order, OrderItem, Location, ActivityLog
+        
+        async with session_factory() as session:
+            users = (await session.execute(select(User.id, User.role, User.full_name))).all()
+            for user_id, role, full_name in users:
+                if role == "client":
+                    self.clients.append(user_id)
+                    self.client_names.append(full_name)
+                elif role == "courier":
+                    self.couriers.append(user_id)
+                elif role == "operator":
+                    self.operators.append(user_id)
+                elif role == "collector":
+                    self.collectors.append(user_id)
+            self.pharmacies = dict((await session.execute(select(Pharmacy.user_id, Pharmacy.id))).all())
+            
+            sample = (await session.execute(
+                select(Order.id, Order.order_number).order_by(func.random()).limit(1000)
+            )).all()
+            self.order_ids = [row.id for row in sample]
+            self.order_numbers = [row.order_number for row in sample]
+            self.created_orders = (await session.execute(
+                select(Order.id).where(Order.status == "created").order_by(Order.id.desc()).limit(500)
+            )).scalars().all()
+            self.confirmed_orders = (await session.execute(
+                select(Order.id).where(Order.status == "confirmed").order_by(Order.id.desc()).limit(500)
+            )).scalars().all()
+            self.next_telegram_id = ((await session.execute(select(func.max(User.telegram_id)))).scalar() or 0) + 1
+            
+            for name, model in (("users", User), ("orders", Order), ("order_items", OrderItem),
+                                ("locations", Location), ("activity_logs", ActivityLog)):
+                self.counts[name] = (await session.execute(select(func.count()).select_from(model))).scalar()
+
+
+def weighted(rng: random.Random, weights: dict) -> str:
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+async def seed(session_factory, scale: float, rng: random.Random) -> None:
+    """Синтетическая история: сотрудники, клиенты с аптеками, заказы, позиции, оплаты, долги, трек курьеров"""
+    from src.models.database import User, Pharmacy, Order, OrderItem, Payment, Debt, Location, ActivityLog
+    
+    now = datetime.utcnow()
+    clients = max(50, int(5000 * scale))
+    orders = max(1000, int(100_000 * scale))
+    pings = max(10_000, int(5_000_000 * scale))
+    logs = max(5000, int(200_000 * scale))
+    chunk = 10_000
+    
+    staff = {"operator": 20, "collector": 20, "checker": 10, "courier": 60, "sales_rep": 10, "admin": 2}
+    users, user_id = [], 0
+    for role, count in staff.items():
+        for n in range(count):
+            user_id += 1
+            users.append({"id": user_id, "telegram_id": user_id, "full_name": f"{role.title()} {n}", "role": role,
+                          "zone": ZONES[n % len(ZONES)], "is_online": role == "courier" and n % 2 == 0})
+    staff_ids = {role: [u["id"] for u in users if u["role"] == role] for role in staff}
+    client_ids = list(range(user_id + 1, user_id + clients + 1))
+    users += [{"id": n, "telegram_id": n, "full_name": f"Аптека клиент {n}", "role": "client",
+               "phone": f"+99290{n:07d}"} for n in client_ids]
+    
+    t0 = time.perf_counter()
+    async with session_factory() as session:
+        for start in range(0, len(users), chunk):
+            await session.execute(insert(User), users[start:start + chunk])
+        await session.execute(insert(Pharmacy), [
+            {"id": n, "user_id": client_id, "name": f"Pharmacy {n}", "address": f"ул. Рудаки, {n}",
+             "zone": ZONES[n % len(ZONES)], "latitude": 38.50 + rng.random() * 0.1,
+             "longitude": 68.70 + rng.random() * 0.1}
+            for n, client_id in enumerate(client_ids, 1)
+        ])
+        await session.commit()
+        
+        item_id = payment_id = debt_id = 0
+        for first in range(1, orders + 1, chunk):
+            order_rows, item_rows, payment_rows, debt_rows = [], [], [], []
+            for order_id in range(first, min(first + chunk, orders + 1)):
+                client_index = rng.randrange(clients)
+                is_open = rng.random() < 0.15
+                status = weighted(rng, OPEN_WEIGHTS if is_open else CLOSED_WEIGHTS)
+                created_at = now - (timedelta(hours=rng.uniform(0, 48)) if is_open
+                                    else timedelta(days=rng.uniform(2, 180)))
+                lines = max(1, int(rng.gauss(10, 3)))
+                total = Decimal("0")
+                for _ in range(lines):
+                    item_id += 1
+                    quantity, price = rng.randint(1, 20), Decimal(rng.randint(5, 500))
+                    total += quantity * price
+                    item_rows.append({"id": item_id, "order_id": order_id, "product_name": f"Препарат {rng.randint(1, 3000)}",
+                                      "quantity": quantity, "unit_price": price, "total_price": quantity * price})
+                
+                progressed = status not in ("created", "rejected")
+                delivered = status in ("delivered", "paid", "debt", "partially_paid")
+                paid = total if status == "paid" else (total / 2 if status == "partially_paid" else Decimal("0"))
+                order_rows.append({
+                    "id": order_id, "order_number": f"SEED-{order_id:07d}", "client_id": client_ids[client_index],
+                    "pharmacy_id": client_index + 1, "status": status, "total_amount": total, "paid_amount": paid,
+                    "debt_amount": total - paid if delivered else 0, "zone": ZONES[(client_index + 1) % len(ZONES)],
+                    "created_at": created_at, "updated_at": created_at + timedelta(hours=2),
+                    "operator_id": rng.choice(staff_ids["operator"]) if progressed or status == "rejected" else None,
+                    "confirmed_at": created_at + timedelta(minutes=20) if progressed else None,
+                    "courier_id": rng.choice(staff_ids["courier"]) if status == "in_delivery" or delivered else None,
+                    "delivered_at": created_at + timedelta(hours=rng.uniform(3, 30)) if delivered else None,
+                    "charged_at": created_at + timedelta(hours=30) if delivered else None,
+                })
+                if paid:
+                    payment_id += 1
+                    payment_rows.append({"id": payment_id, "order_id": order_id, "client_id": client_ids[client_index],
+                                         "payment_type": rng.choice(["cash", "online"]), "amount": paid,
+                                         "created_at": created_at + timedelta(days=1),
+                                         "confirmed_at": created_at + timedelta(days=1)})
+                if status in ("debt", "partially_paid"):
+                    debt_id += 1
+                    debt_rows.append({"id": debt_id, "order_id": order_id, "client_id": client_ids[client_index],
+                                      "total_amount": total - paid, "paid_amount": 0, "remaining_amount": total - paid,
+                                      "is_active": True, "created_at": created_at + timedelta(days=1)})
+            
+            await session.execute(insert(Order), order_rows)
+            for start in range(0, len(item_rows), chunk):
+                await session.execute(insert(OrderItem), item_rows[start:start + chunk])
+            if payment_rows:
+                await session.execute(insert(Payment), payment_rows)
+            if debt_rows:
+                await session.execute(insert(Debt), debt_rows)
+            await session.commit()
+        print(f"  orders: {orders:,}, items: {item_id:,} ({time.perf_counter() - t0:.0f} s)")
+        
+        couriers = staff_ids["courier"]
+        for first in range(0, pings, chunk):
+            rows = []
+            for n in range(first, min(first + chunk, pings)):
+                rows.append({"user_id": couriers[n % len(couriers)],
+                             "latitude": 38.50 + rng.random() * 0.1, "longitude": 68.70 + rng.random() * 0.1,
+                             "accuracy": rng.uniform(3, 30), "speed": rng.uniform(0, 15),
+                             "created_at": now - timedelta(seconds=(pings - n) * 30 * 86400 / pings)})
+            await session.execute(insert(Location), rows)
+            await session.commit()
+        print(f"  locations: {pings:,} ({time.perf_counter() - t0:.0f} s)")
+        
+        actions = ["order_status_changed", "payment_recorded", "user_login", "order_created"]
+        for first in range(0, logs, chunk):
+            await session.execute(insert(ActivityLog), [
+                {"user_id": rng.randint(1, user_id + clients), "action": rng.choice(actions), "entity_type": "order",
+                 "entity_id": rng.randint(1, orders), "details": {}, "created_at": now - timedelta(days=rng.uniform(0, 365))}
+                for _ in range(first, min(first + chunk, logs))
+            ])
+            await session.commit()
+    
+    print(f"  seeded in {time.perf_counter() - t0:.0f} s")
+
+
+def build_cases(data: Dataset):
+    """Сценарии: имя метода -> вызов (session, номер повтора)"""
+    from src.models.database import OrderStatus, UserRole
+    from src.services.order_service import OrderService
+    from src.services.user_service import UserService
+    from src.services.location_service import LocationService
+    from src.services.analytics_service import AnalyticsService
+    
+    now = datetime.utcnow()
+    zone = ZONES[1]
+    pick = lambda items, i: items[(i * 7919) % len(items)]
+    
+    def items(i):
+        return [{"product_name": f"Препарат {i}-{n}", "quantity": 2, "unit_price": Decimal("35.50")} for n in range(10)]
+    
+    async def create_user(session, i):
+        user = await UserService(session).create_user(data.next_telegram_id + i, f"Bench user {i}")
+        data.new_users.append(user.id)
+        return user
+    
+    return [
+        ("OrderService.get_order_by_id", lambda s, i: OrderService(s).get_order_by_id(pick(data.order_ids, i))),
+        ("OrderService.get_order_by_number", lambda s, i: OrderService(s).get_order_by_number(pick(data.order_numbers, i))),
+        ("OrderService.get_orders_by_status", lambda s, i: OrderService(s).get_orders_by_status(OrderStatus.IN_DELIVERY)),
+        ("OrderService.get_orders_by_status[zone]",
+         lambda s, i: OrderService(s).get_orders_by_status(OrderStatus.CONFIRMED, zone)),
+        ("OrderService.get_orders_by_client", lambda s, i: OrderService(s).get_orders_by_client(pick(data.clients, i))),
+        ("OrderService.get_pending_orders_for_operator", lambda s, i: OrderService(s).get_pending_orders_for_operator()),
+        ("OrderService.get_orders_for_collector", lambda s, i: OrderService(s).get_orders_for_collector(zone)),
+        ("OrderService.get_orders_for_checker", lambda s, i: OrderService(s).get_orders_for_checker(zone)),
+        ("OrderService.get_orders_for_courier", lambda s, i: OrderService(s).get_orders_for_courier(zone)),
+        ("OrderService.get_order_statistics", lambda s, i: OrderService(s).get_order_statistics()),
+        ("OrderService.search_orders", lambda s, i: OrderService(s).search_orders(pick(data.order_numbers, i)[-5:])),
+        ("OrderService.create_order", lambda s, i: OrderService(s).create_order(
+            pick(data.clients, i), data.pharmacies[pick(data.clients, i)], items(i))),
+        ("OrderService.update_order_status", lambda s, i: OrderService(s).update_order_status(
+            data.created_orders.pop(), OrderStatus.CONFIRMED, pick(data.operators, i))),
+        ("OrderService.assign_order_to_employee", lambda s, i: OrderService(s).assign_order_to_employee(
+            pick(data.confirmed_orders, i), pick(data.collectors, i), UserRole.COLLECTOR.value)),
+        ("OrderService.reject_order", lambda s, i: OrderService(s).reject_order(
+            data.created_orders.pop(), pick(data.operators, i), "benchmark")),
+        
+        ("UserService.get_user_by_telegram_id", lambda s, i: UserService(s).get_user_by_telegram_id(pick(data.clients, i))),
+        ("UserService.get_user_by_id", lambda s, i: UserService(s).get_user_by_id(pick(data.clients, i))),
+        ("UserService.get_users_by_role", lambda s, i: UserService(s).get_users_by_role(UserRole.COURIER)),
+        ("UserService.get_active_users", lambda s, i: UserService(s).get_active_users()),
+        ("UserService.search_users", lambda s, i: UserService(s).search_users(pick(data.client_names, i)[-4:])),
+        ("UserService.get_user_stats", lambda s, i: UserService(s).get_user_stats()),
+        ("UserService.get_user_activity_history",
+         lambda s, i: UserService(s).get_user_activity_history(pick(data.clients, i))),
+        ("UserService.create_user", create_user),
+        ("UserService.create_pharmacy_for_user", lambda s, i: UserService(s).create_pharmacy_for_user(
+            pick(data.new_users, i), f"Bench pharmacy {i}", "ул. Сомони, 1")),
+        ("UserService.update_user_role", lambda s, i: UserService(s).update_user_role(
+            pick(data.new_users, i), UserRole.CLIENT)),
+        ("UserService.block_user", lambda s, i: UserService(s).block_user(pick(data.new_users, i))),
+        ("UserService.log_activity", lambda s, i: UserService(s).log_activity(
+            pick(data.clients, i), "benchmark", "order", i, {"n": i})),
+        
+        ("LocationService.get_user_locations", lambda s, i: LocationService(s).get_user_locations(pick(data.couriers, i))),
+        ("LocationService.get_last_location", lambda s, i: LocationService(s).get_last_location(pick(data.couriers, i))),
+        ("LocationService.get_courier_locations", lambda s, i: LocationService(s).get_courier_locations()),
+        ("LocationService.get_route_history", lambda s, i: LocationService(s).get_route_history(
+            pick(data.couriers, i), now - timedelta(days=2), now - timedelta(days=1))),
+        ("LocationService.get_daily_distance", lambda s, i: LocationService(s).get_daily_distance(
+            pick(data.couriers, i), now - timedelta(days=3))),
+        ("LocationService.get_location_statistics", lambda s, i: LocationService(s).get_location_statistics()),
+        ("LocationService.save_location", lambda s, i: LocationService(s).save_location(
+            pick(data.couriers, i), 38.55, 68.77, accuracy=5.0)),
+        
+        ("AnalyticsService.get_daily_report", lambda s, i: AnalyticsService(s).get_daily_report(now - timedelta(days=i))),
+        ("AnalyticsService.get_weekly_report", lambda s, i: AnalyticsService(s).get_weekly_report()),
+        ("AnalyticsService.get_monthly_report", lambda s, i: AnalyticsService(s).get_monthly_report()),
+        ("AnalyticsService.get_zone_stats", lambda s, i: AnalyticsService(s).get_zone_stats(now - timedelta(days=30), now)),
+    ]
+
+
+def parent_table(name: str) -> str:
+    """Секция -> родительская таблица (locations_p20261019 -> locations)"""
+    return PARTITION_SUFFIX.sub("", name)
+
+
+def seq_scans(plan, dialect: str) -> list:
+    """Таблицы, прочитанные целиком"""
+    tables = set()
+    if dialect == "postgresql":
+        stack = [plan["Plan"]]
+        while stack:
+            node = stack.pop()
+            if node.get("Node Type") == "Seq Scan":
+                tables.add(parent_table(node["Relation Name"]))
+            stack.extend(node.get("Plans", []))
+    else:
+        for detail in plan:
+            match = SQLITE_SCAN.match(detail)
+            if match:
+                tables.add(re.sub(r"_\d+$", "", match.group(1)))
+    return sorted(tables)
+
+
+async def explain(conn, statement: str, parameters, dialect: str):
+    """План SELECT с теми же параметрами, что отправил метод"""
+    if not statement.lstrip().upper().startswith(("SELECT", "WITH")):
+        return None
+    parameters = tuple(parameters) if isinstance(parameters, list) else parameters
+    if dialect == "postgresql":
+        result = await conn.exec_driver_sql("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + statement, parameters)
+        plan = result.scalar()
+        return (json.loads(plan) if isinstance(plan, str) else plan)[0]
+    result = await conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)
+    return [row[3] for row in result.all()]
+
+
+async def run_case(name, call, repeat, session_factory, engine, recorder, dialect):
+    timings, captured = [], []
+    for i in range(repeat):
+        async with session_factory() as session:
+            with recorder.capture() as statements:
+                started = time.perf_counter()
+                await call(session, i)
+                # Сервисы не фиксируют сами (в боте это делает SessionMiddleware)
+                await session.commit()
+                timings.append((time.perf_counter() - started) * 1000)
+            if i == 0:
+                captured = statements
+    
+    plans, scans, seen = [], set(), set()
+    async with engine.connect() as conn:
+        for statement, parameters, executemany in captured:
+            if executemany or statement in seen:
+                continue
+            seen.add(statement)
+            plan = await explain(conn, statement, parameters, dialect)
+            if plan is None:
+                continue
+            tables = seq_scans(plan, dialect)
+            scans.update(table for table in tables if table in BIG_TABLES)
+            plans.append({"sql": statement, "seq_scans": tables, "plan": plan})
+        await conn.rollback()
+    
+    timings.sort()
+    return {
+        "median_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+        "min_ms": round(timings[0], 3),
+        "queries": len(captured),
+        "seq_scans": sorted(scans),
+        "plans": plans,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float, min_delta_ms: float) -> list:
+    """Регрессии относительно сохраненного запуска"""
+    regressions = []
+    if baseline["meta"]["dialect"] != results["meta"]["dialect"]:
+        print(f"⚠️ Baseline dialect {baseline['meta']['dialect']} differs, comparison skipped")
+        return regressions
+    # Сценарии записи добавляют несколько строк за запуск - сравнивается только порядок объемов
+    counts = results["meta"]["counts"]
+    if any(abs(counts.get(name, 0) - count) > count * 0.1 for name, count in baseline["meta"]["counts"].items()):
+        print("⚠️ Baseline dataset differs in size, timings may not be comparable")
+    
+    for name, case in results["cases"].items():
+        before = baseline["cases"].get(name)
+        if before is None:
+            continue
+        if "error" in case:
+            if "error" not in before:
+                regressions.append(f"{name}: fails ({case['error']})")
+            continue
+        if "error" in before:
+            continue
+        if case["median_ms"] > before["median_ms"] * threshold and case["median_ms"] - before["median_ms"] > min_delta_ms:
+            regressions.append(
+                f"{name}: {before['median_ms']:.1f} -> {case['median_ms']:.1f} ms "
+                f"(x{case['median_ms'] / max(before['median_ms'], 0.001):.1f})"
+            )
+        new_scans = sorted(set(case["seq_scans"]) - set(before["seq_scans"]))
+        if new_scans:
+            regressions.append(f"{name}: new sequential scan of {', '.join(new_scans)}")
+        if case["queries"] > before["queries"] * 2 and case["queries"] - before["queries"] > 5:
+            regressions.append(f"{name}: {before['queries']} -> {case['queries']} queries")
+    return regressions
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ""
+
+
+async def main(args) -> int:
+    # Сервисы и миграции работают через src.database.engine: адрес базы задается до импорта
+    os.environ["DATABASE_URL"] = args.database_url
+    from src.database import engine, AsyncSessionLocal
+    from src.migrations import upgrade
+    from src.models.database import Order
+    from src.services.audit_service import audit_log
+    
+    dialect = engine.dialect.name
+    print(f"🔬 Query plan benchmark ({dialect})")
+    await upgrade()
+    
+    async with AsyncSessionLocal() as session:
+        seeded = (await session.execute(select(func.count(Order.id)))).scalar()
+    if not seeded:
+        print(f"🌱 Seeding (scale {args.scale})...")
+        await seed(AsyncSessionLocal, args.scale, random.Random(42))
+        async with engine.begin() as conn:
+            await conn.execute(text("ANALYZE"))
+    
+    data = Dataset()
+    await data.load(AsyncSessionLocal)
+    print("📦 Dataset: " + ", ".join(f"{name} {count:,}" for name, count in data.counts.items()))
+    
+    recorder = QueryRecorder()
+    event.listen(engine.sync_engine, "before_cursor_execute", recorder)
+    
+    results = {
+        "meta": {
+            "at": datetime.utcnow().isoformat(),
+            "git": git_revision(),
+            "dialect": dialect,
+            "repeat": args.repeat,
+            "counts": data.counts,
+        },
+        "cases": {},
+    }
+    print(f"\n{'method':<48} {'median':>9} {'p95':>9} {'queries':>8}  seq scans")
+    for name, call in build_cases(data):
+        if args.only and args.only not in name:
+            continue
+        try:
+            case = await run_case(name, call, args.repeat, AsyncSessionLocal, engine, recorder, dialect)
+        except Exception as e:
+            results["cases"][name] = {"error": f"{type(e).__name__}: {e}"}
+            print(f"{name:<48} ❌ {type(e).__name__}: {e}")
+            continue
+        results["cases"][name] = case
+        print(f"{name:<48} {case['median_ms']:>7.1f}ms {case['p95_ms']:>7.1f}ms {case['queries']:>8}  "
+              f"{', '.join(case['seq_scans']) or '-'}")
+    
+    await audit_log.stop()
+    await engine.dispose()
+    
+    output = args.output or os.path.join(
+        os.path.dirname(__file__), "results", f"query_plans_{dialect}_{datetime.utcnow():%Y%m%d_%H%M%S}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as file:
+        json.dump(results, file, ensure_ascii=False, indent=1, default=str)
+    print(f"\n💾 Results: {output}")
+    
+    if not args.baseline:
+        return 0
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    regressions = compare(results, baseline, args.threshold, args.min_delta_ms)
+    if regressions:
+        print(f"\n❌ {len(regressions)} regressions against {args.baseline}:")
+        for line in regressions:
+            print(f"  • {line}")
+        return 1
+    print(f"\n✅ No regressions against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=float, default=1.0, help="доля объема данных (1.0 = 100 тыс. заказов)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--database-url", default=os.environ.get(
+        "BENCH_DATABASE_URL",
+        f"sqlite+aiosqlite:///{os.path.join(tempfile.gettempdir(), 'maxxpharm_query_plans.db')}"
+    ))
+    parser.add_argument("--baseline", help="JSON предыдущего запуска для сравнения")
+    parser.add_argument("--output", help="куда сохранить JSON (по умолчанию benchmarks/results/)")
+    parser.add_argument("--threshold", type=float, default=1.5, help="допустимое замедление медианы, раз")
+    parser.add_argument("--min-delta-ms", type=float, default=5.0, help="замедления меньше этого не считаются")
+    parser.add_argument("--only", help="только методы, содержащие подстроку")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+💰 MAXXPHARM CRM - Бенчмарк сверки оплат и балансов клиентов
+
+История заказов, платежей, долгов и журнала балансов за несколько месяцев
+создается напрямую в базе. Сравнивается чтение задолженности клиента
+агрегатом по заказам, платежам и долгам и чтением строки client_balances;
+затем ночная сверка проходит один день и весь период порциями с замером
+времени и пиковой памяти.
+
+Запуск: python benchmarks/bench_reconciliation.py [--clients 2000] [--orders 40000] [--days 90]
+        [--database-url sqlite+aiosqlite:///:memory:]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import insert, select, func
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+
+from src.models.database import Base, User, Pharmacy, Order, Payment, Debt, ClientBalance, BalanceEntry
+from src.services.reconciliation_service import ReconciliationService
+
+
+def build_history(clients: int, orders: int, days: int, rng: random.Random):
+    """Заказы, платежи, долги и журнал, согласованные между собой"""
+    start = datetime(2026, 1, 1)
+    order_rows, payment_rows, debt_rows, entry_rows = [], [], [], []
+    balances = {client_id: {"charged": Decimal("0"), "paid": Decimal("0"), "debt": Decimal("0")}
+                for client_id in range(1, clients + 1)}
+    running = {client_id: Decimal("0") for client_id in balances}
+    
+    events = []
+    for order_id in range(1, orders + 1):
+        client_id = rng.randint(1, clients)
+        created = start + timedelta(minutes=rng.randint(0, days * 24 * 60 - 1))
+        total = Decimal(rng.randint(50, 5000))
+        paid = min(total, Decimal(rng.choice([0, rng.randint(10, 5000), int(total)])))
+        order_rows.append({
+            "id": order_id, "order_number": f"ORD-B-{order_id:06d}", "client_id": client_id,
+            "pharmacy_id": client_id, "status": "paid" if paid == total else "partially_paid",
+            "total_amount": total, "paid_amount": paid, "debt_amount": total - paid,
+            "created_at": created, "charged_at": created,
+        })
+        events.append((created, "charge", client_id, order_id, total))
+        if paid:
+            events.append((created + timedelta(hours=rng.randint(1, 48)), "payment", client_id, order_id, paid))
+        if total - paid:
+            debt_rows.append({"order_id": order_id, "client_id": client_id, "total_amount": total,
+                              "paid_amount": paid, "remaining_amount": total - paid, "is_active": True})
+            balances[client_id]["debt"] += total - paid
+    
+    for moment, kind, client_id, order_id, amount in sorted(events):
+        signed = amount if kind == "charge" else -amount
+        running[client_id] += signed
+        payment_id = None
+        if kind == "payment":
+            payment_id = len(payment_rows) + 1
+            payment_rows.append({"id": payment_id, "order_id": order_id, "client_id": client_id,
+                                 "payment_type": "online", "amount": amount, "created_at": moment})
+            balances[client_id]["paid"] += amount
+        else:
+            balances[client_id]["charged"] += amount
+        entry_rows.append({"client_id": client_id, "order_id": order_id, "payment_id": payment_id, "kind": kind,
+                           "amount": signed, "balance_after": running[client_id], "created_at": moment})
+    
+    balance_rows = [
+        {"client_id": client_id, "charged_total": value["charged"], "paid_total": value["paid"],
+         "outstanding": value["charged"] - value["paid"], "active_debt": value["debt"]}
+        for client_id, value in balances.items()
+    ]
+    return order_rows, payment_rows, debt_rows, entry_rows, balance_rows
+
+
+async def seed(session_factory, clients: int, history):
+    order_rows, payment_rows, debt_rows, entry_rows, balance_rows = history
+    async with session_factory() as session:
+        await session.execute(insert(User), [
+            {"id": n, "telegram_id": n, "full_name": f"Client {n}", "role": "client"} for n in range(1, clients + 1)
+        ])
+        await session.execute(insert(Pharmacy), [
+            {"id": n, "user_id": n, "name": f"Pharmacy {n}", "address": "Душанбе"} for n in range(1, clients + 1)
+        ])
+        for table, rows in ((Order, order_rows), (Payment, payment_rows), (Debt, debt_rows),
+                            (BalanceEntry, entry_rows), (ClientBalance, balance_rows)):
+            for start in range(0, len(rows), 5000):
+                await session.execute(insert(table), rows[start:start + 5000])
+        await session.commit()
+
+
+async def legacy_outstanding(session, client_id: int):
+    """Как считалось бы без таблицы балансов: заказы минус платежи плюс долги"""
+    charged = await session.execute(select(func.sum(Order.total_amount)).where(Order.client_id == client_id))
+    paid = await session.execute(select(func.sum(Payment.amount)).join(Order).where(Order.client_id == client_id))
+    debt = await session.execute(
+        select(func.sum(Debt.remaining_amount)).where(Debt.client_id == client_id, Debt.is_active == True)
+    )
+    return (charged.scalar() or 0) - (paid.scalar() or 0), debt.scalar() or 0
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=2000)
+    parser.add_argument("--orders", type=int, default=40000)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--lookups", type=int, default=500)
+    parser.add_argument("--chunk", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--database-url", default="sqlite+aiosqlite:///:memory:")
+    args = parser.parse_args()
+    
+    engine = create_async_engine(args.database_url)
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    
+    rng = random.Random(args.seed)
+    history = build_history(args.clients, args.orders, args.days, rng)
+    await seed(session_factory, args.clients, history)
+    
+    print("💰 MAXXPHARM CRM - Reconciliation benchmark")
+    print("=" * 50)
+    print(f"📦 {args.orders} orders, {len(history[1])} payments, {len(history[3])} ledger entries, "
+          f"{args.clients} clients, {args.days} days")
+    
+    client_ids = [rng.randint(1, args.clients) for _ in range(args.lookups)]
+    async with session_factory() as session:
+        started = time.perf_counter()
+        for client_id in client_ids:
+            await legacy_outstanding(session, client_id)
+        legacy = time.perf_counter() - started
+        
+        service = ReconciliationService(session)
+        started = time.perf_counter()
+        for client_id in client_ids:
+            await service.get_outstanding(client_id)
+            session.expunge_all()
+        indexed = time.perf_counter() - started
+    print(f"🔎 Outstanding x{args.lookups}: multi-table aggregate {legacy / args.lookups * 1000:.2f} ms, "
+          f"client_balances {indexed / args.lookups * 1000:.2f} ms ({legacy / indexed:.0f}× faster)")
+    
+    day = datetime(2026, 1, 1).date() + timedelta(days=args.days // 2)
+    tracemalloc.start()
+    async with session_factory() as session:
+        started = time.perf_counter()
+        report = await ReconciliationService(session).reconcile_day(day, chunk_size=args.chunk, fix=False)
+        elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    print(f"🌙 Day {day}: {report['payments']} payments, {report['orders_checked']} orders, "
+          f"{report['clients_checked']} clients in {elapsed * 1000:.0f} ms, "
+          f"mismatches {report['mismatch_count']}, peak {peak / 1024 / 1024:.1f} MiB")
+    
+    async with session_factory() as session:
+        started = time.perf_counter()
+        summary = await ReconciliationService(session).reconcile_range(
+            datetime(2026, 1, 1).date(), datetime(2026, 1, 1).date() + timedelta(days=args.days - 1), fix=False
+        )
+        elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"📅 {summary['days']} days: {summary['payments']} payments in {elapsed:.2f} s "
+          f"({summary['payments'] / elapsed:,.0f} payments/s), mismatches {summary['mismatch_count']}, "
+          f"peak {peak / 1024 / 1024:.1f} MiB")
+    
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+🗺 MAXXPHARM CRM - Бенчмарк планирования маршрутов
+
+Разбиение готовых к доставке точек на рейсы (sweep) и порядок объезда
+(ближайший сосед + 2-opt) в сравнении с объездом в порядке поступления.
+
+Запуск: python benchmarks/bench_routes.py [--stops 120] [--max-stops 8] [--rounds 50]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.services.route_service import (
+    distance_matrix, nearest_neighbour_tour, two_opt, tour_length, sweep_batches, plan_trip
+)
+
+# Склад в центре Душанбе и разброс аптек (~15 км)
+DEPOT = (38.5598, 68.7870)
+SPREAD_DEGREES = 0.14
+
+
+def random_points(rng: random.Random, count: int):
+    """Случайные точки доставки"""
+    return [
+        (
+            DEPOT[0] + rng.uniform(-SPREAD_DEGREES, SPREAD_DEGREES),
+            DEPOT[1] + rng.uniform(-SPREAD_DEGREES, SPREAD_DEGREES)
+        )
+        for _ in range(count)
+    ]
+
+
+def plan_round(points, max_stops: int) -> dict:
+    """Один пересчет: рейсы и длины маршрутов по трем стратегиям"""
+    arrival = sum(
+        tour_length(range(len(batch) + 1), distance_matrix([DEPOT] + batch))
+        for batch in (points[k:k + max_stops] for k in range(0, len(points), max_stops))
+    )
+    
+    nn_only = 0.0
+    optimized = 0.0
+    minutes = []
+    for batch in sweep_batches(DEPOT, points, max_stops):
+        trip_points = [DEPOT] + [points[i] for i in batch]
+        matrix = distance_matrix(trip_points)
+        tour = nearest_neighbour_tour(matrix, range(len(trip_points)))
+        nn_only += tour_length(tour, matrix)
+        optimized += tour_length(two_opt(tour, matrix), matrix)
+        minutes.append(plan_trip(DEPOT, trip_points[1:])['total_minutes'])
+    
+    return {
+        "arrival_km": arrival,
+        "nn_km": nn_only,
+        "optimized_km": optimized,
+        "trips": len(minutes),
+        "avg_trip_minutes": statistics.mean(minutes) if minutes else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--stops", type=int, default=120)
+    parser.add_argument("--max-stops", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    
+    rng = random.Random(args.seed)
+    
+    print("🗺 MAXXPHARM CRM - Route planning benchmark")
+    print("=" * 50)
+    print(f"📦 Stops: {args.stops}, max stops per trip: {args.max_stops}, rounds: {args.rounds}")
+    
+    latencies = []
+    totals = {"arrival_km": 0.0, "nn_km": 0.0, "optimized_km": 0.0, "trips": 0, "avg_trip_minutes": 0.0}
+    for _ in range(args.rounds):
+        points = random_points(rng, args.stops)
+        started = time.perf_counter()
+        result = plan_round(points, args.max_stops)
+        latencies.append((time.perf_counter() - started) * 1000)
+        for key in totals:
+            totals[key] += result[key]
+    
+    for key in totals:
+        totals[key] /= args.rounds
+    
+    latencies.sort()
+    print(f"⚡ Re-plan: mean={statistics.mean(latencies):.1f} ms "
+          f"p95={latencies[int(len(latencies) * 0.95)]:.1f} ms")
+    print(f"🚚 Trips: {totals['trips']:.1f}, avg trip {totals['avg_trip_minutes']:.0f} min")
+    print(f"📏 Arrival order: {totals['arrival_km']:.1f} km")
+    print(f"📏 Sweep + nearest neighbour: {totals['nn_km']:.1f} km")
+    print(f"📏 Sweep + nearest neighbour + 2-opt: {totals['optimized_km']:.1f} km "
+          f"({(1 - totals['optimized_km'] / totals['arrival_km']) * 100:.1f}% shorter)")
+    
+    # Стоимость матрицы расстояний на одной крупной выборке
+    points = random_points(rng, 500)
+    started = time.perf_counter()
+    distance_matrix([DEPOT] + points)
+    print(f"🧮 Distance matrix 501×501: {(time.perf_counter() - started) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
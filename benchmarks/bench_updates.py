@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+"""
+📨 MAXXPHARM CRM - Нагрузочный тест обработчиков Telegram
+
+Обновления подаются напрямую в Dispatcher.feed_update со всеми роутерами
+приложения. Bot API заменен сессией без сети: запросы только считаются, а
+ответ собирается из самого запроса. Сценарии: клиент (/start, "📦 Создать
+заявку", выбор текста, список лекарств), оператор (новые заявки, принять
+или отклонить) и курьер (серия геолокаций). Вместо сценариев можно
+воспроизвести записанные обновления (JSONL, одно Update на строку):
+обновления одного пользователя идут по порядку, разные пользователи -
+параллельно.
+
+Конкурентность наращивается ступенями; для каждой ступени выводятся
+пропускная способность, p50/p95/p99 задержки обработчика и число SQL-
+запросов на обновление. База по умолчанию - временный SQLite, схема
+создается миграциями.
+
+Запуск: python benchmarks/bench_updates.py [--concurrency 1,4,16,64] [--scripts 200]
+        [--replay updates.jsonl] [--save-updates updates.jsonl] [--api-latency-ms 0]
+        [--database-url postgresql+asyncpg://...] [--output results.json]
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict, deque
+from contextvars import ContextVar
+from typing import get_origin
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.base import BaseSession
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.exceptions import ClientDecodeError
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import Update
+from sqlalchemy import event, insert, select, func
+
+# Доли сценариев в нагрузке
+MIX = {"client": 5, "operator": 3, "courier": 2}
+
+# Диапазоны telegram_id тестовых пользователей (не пересекаются с реальными)
+CLIENT_BASE, OPERATOR_BASE, COURIER_BASE = 7_100_000_000, 7_200_000_000, 7_300_000_000
+
+PRODUCTS = [
+    "Парацетамол 500мг", "Цефтриаксон 1г", "Сироп Нурофен", "Амоксициллин 250мг", "Аспирин 100мг",
+    "Омепразол 20мг", "Лоратадин 10мг", "Ибупрофен 400мг", "Метформин 850мг", "Но-шпа 40мг",
+]
+
+# Счетчик SQL текущего обновления (у каждой задачи-исполнителя свой)
+current_queries: ContextVar = ContextVar("current_queries", default=None)
+
+
+def count_query(conn, cursor, statement, parameters, context, executemany):
+    counter = current_queries.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+class RecordingSession(BaseSession):
+    """Bot API без сети: вызовы считаются, ответ строится из запроса"""
+    
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls = Counter()
+        self._message_ids = itertools.count(1)
+    
+    async def make_request(self, bot, method, timeout=None):
+        self.calls[type(method).__name__] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        
+        returning = method.__returning__
+        if returning is bool:
+            return True
+        chat_id = getattr(method, "chat_id", None) or 0
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "text": getattr(method, "text", None) or getattr(method, "caption", None),
+        }
+        result = [message] if get_origin(returning) is list else message
+        try:
+            return self.check_response(bot, method, 200, json.dumps({"ok": True, "result": result})).result
+        except ClientDecodeError:
+            # Ответы не-сообщения (файлы, участники чата) обработчикам сценариев не нужны
+            return True
+    
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+    
+    async def close(self):
+        pass
+
+
+class UpdateFactory:
+    """JSON обновлений в формате Bot API"""
+    
+    def __init__(self):
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+    
+    @staticmethod
+    def _user(telegram_id: int) -> dict:
+        return {"id": telegram_id, "is_bot": False, "first_name": f"Load {telegram_id}"}
+    
+    def _message(self, telegram_id: int, **content) -> dict:
+        return {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": telegram_id, "type": "private"},
+            "from": self._user(telegram_id),
+            **content,
+        }
+    
+    def message(self, telegram_id: int, **content) -> dict:
+        return {"update_id": next(self._update_ids), "message": self._message(telegram_id, **content)}
+    
+    def command(self, telegram_id: int, command: str) -> dict:
+        return self.message(telegram_id, text=command, entities=[{"type": "bot_command", "offset": 0, "length": len(command)}])
+    
+    def callback(self, telegram_id: int, data: str) -> dict:
+        message = self._message(telegram_id, text="...")
+        message["from"] = {"id": 1, "is_bot": True, "first_name": "MAXXPHARM"}
+        return {
+            "update_id": next(self._update_ids),
+            "callback_query": {
+                "id": str(next(self._update_ids)),
+                "from": self._user(telegram_id),
+                "chat_instance": str(telegram_id),
+                "data": data,
+                "message": message,
+            },
+        }
+
+
+def client_script(factory: UpdateFactory, telegram_id: int, rng: random.Random) -> list:
+    lines = [f"{name} - {rng.randint(1, 50)} шт" for name in rng.sample(PRODUCTS, rng.randint(2, 6))]
+    return [
+        factory.command(telegram_id, "/start"),
+        factory.message(telegram_id, text="📦 Создать заявку"),
+        factory.callback(telegram_id, "order_text"),
+        factory.message(telegram_id, text="\n".join(lines)),
+    ]
+
+
+def operator_script(factory: UpdateFactory, telegram_id: int, order_id: int, rng: random.Random) -> list:
+    action = "accept" if rng.random() < 0.8 else "reject"
+    return [
+        factory.message(telegram_id, text="📥 Новые заявки"),
+        factory.callback(telegram_id, f"{action}_order_{order_id}"),
+    ]
+
+
+def courier_script(factory: UpdateFactory, telegram_id: int, rng: random.Random, pings: int = 5) -> list:
+    latitude, longitude = 38.55 + rng.uniform(-0.05, 0.05), 68.78 + rng.uniform(-0.05, 0.05)
+    updates = []
+    for _ in range(pings):
+        latitude += rng.uniform(-0.002, 0.002)
+        longitude += rng.uniform(-0.002, 0.002)
+        updates.append(factory.message(telegram_id, location={
+            "latitude": latitude, "longitude": longitude, "horizontal_accuracy": rng.uniform(3, 30)
+        }))
+    return updates
+
+
+def load_replay(path: str) -> list:
+    """Записанные обновления, сгруппированные по отправителю"""
+    scripts = {}
+    with open(path) as file:
+        for line in file:
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            event_data = data.get("message") or data.get("callback_query") or data.get("edited_message") or {}
+            sender = event_data.get("from", {}).get("id", 0)
+            scripts.setdefault(sender, []).append(data)
+    return [("replay", updates) for updates in scripts.values()]
+
+
+async def seed_users(session_factory, clients: int, operators: int, couriers: int) -> None:
+    from src.models.database import User, Pharmacy
+    
+    async with session_factory() as session:
+        existing = (await session.execute(
+            select(func.count(User.id)).where(User.telegram_id >= CLIENT_BASE)
+        )).scalar()
+        if existing:
+            return
+        
+        rows = [{"telegram_id": CLIENT_BASE + n, "full_name": f"Load client {n}", "role": "client"} for n in range(clients)]
+        rows += [{"telegram_id": OPERATOR_BASE + n, "full_name": f"Load operator {n}", "role": "operator"} for n in range(operators)]
+        rows += [{"telegram_id": COURIER_BASE + n, "full_name": f"Load courier {n}", "role": "courier", "zone": "center"}
+                 for n in range(couriers)]
+        await session.execute(insert(User), rows)
+        client_ids = (await session.execute(
+            select(User.id).where(User.telegram_id.between(CLIENT_BASE, OPERATOR_BASE - 1)).order_by(User.id)
+        )).scalars().all()
+        await session.execute(insert(Pharmacy), [
+            {"user_id": user_id, "name": f"Load pharmacy {n}", "address": f"ул. Рудаки, {n}", "zone": "center"}
+            for n, user_id in enumerate(client_ids)
+        ])
+        await session.commit()
+
+
+async def seed_orders(session_factory, count: int) -> list:
+    """Новые заказы для сценариев оператора"""
+    from src.models.database import User, Pharmacy, Order
+    
+    async with session_factory() as session:
+        clients = (await session.execute(
+            select(User.id, Pharmacy.id).join(Pharmacy, Pharmacy.user_id == User.id)
+            .where(User.telegram_id.between(CLIENT_BASE, OPERATOR_BASE - 1))
+        )).all()
+        prefix = f"LOAD-{time.time_ns()}"
+        await session.execute(insert(Order), [
+            {"order_number": f"{prefix}-{n}", "client_id": clients[n % len(clients)][0],
+             "pharmacy_id": clients[n % len(clients)][1], "status": "created", "total_amount": 100, "zone": "center"}
+            for n in range(count)
+        ])
+        order_ids = (await session.execute(
+            select(Order.id).where(Order.order_number.like(f"{prefix}-%")).order_by(Order.id)
+        )).scalars().all()
+        await session.commit()
+    return order_ids
+
+
+def build_scripts(factory: UpdateFactory, count: int, order_ids: list, args, rng: random.Random) -> list:
+    kinds = rng.choices(list(MIX), weights=list(MIX.values()), k=count)
+    orders = deque(order_ids)
+    scripts = []
+    for n, kind in enumerate(kinds):
+        if kind == "client":
+            scripts.append((kind, client_script(factory, CLIENT_BASE + n % args.clients, rng)))
+        elif kind == "operator":
+            scripts.append((kind, operator_script(factory, OPERATOR_BASE + n % args.operators, orders.popleft(), rng)))
+        else:
+            scripts.append((kind, courier_script(factory, COURIER_BASE + n % args.couriers, rng)))
+    return scripts
+
+
+def percentile(values: list, fraction: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+async def run_level(dp: Dispatcher, bot: Bot, scripts: list, concurrency: int) -> dict:
+    """Скрипты разбираются исполнителями; обновления одного скрипта - строго по порядку"""
+    queue = deque(scripts)
+    latencies, queries = [], []
+    by_kind = defaultdict(list)
+    errors, unhandled = Counter(), 0
+    
+    async def worker():
+        nonlocal unhandled
+        while queue:
+            kind, updates = queue.popleft()
+            for data in updates:
+                update = Update.model_validate(data, context={"bot": bot})
+                counter = [0]
+                token = current_queries.set(counter)
+                started = time.perf_counter()
+                try:
+                    if await dp.feed_update(bot, update) is UNHANDLED:
+                        unhandled += 1
+                except Exception as e:
+                    errors[f"{kind}: {type(e).__name__}: {str(e)[:80]}"] += 1
+                finally:
+                    elapsed = (time.perf_counter() - started) * 1000
+                    current_queries.reset(token)
+                latencies.append(elapsed)
+                queries.append(counter[0])
+                by_kind[kind].append(elapsed)
+    
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+    
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "updates": len(latencies),
+        "seconds": round(wall, 3),
+        "throughput": round(len(latencies) / wall, 1) if wall else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50), 2),
+        "p95_ms": round(percentile(latencies, 0.95), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+        "queries_per_update": round(statistics.mean(queries), 2) if queries else 0.0,
+        "max_queries": max(queries, default=0),
+        "kinds": {
+            kind: {"updates": len(values), "p50_ms": round(statistics.median(values), 2),
+                   "p95_ms": round(percentile(sorted(values), 0.95), 2)}
+            for kind, values in by_kind.items()
+        },
+        "unhandled": unhandled,
+        "errors": dict(errors),
+    }
+
+
+async def main(args) -> int:
+    # Приложение берет адрес базы из окружения при импорте
+    os.environ["DATABASE_URL"] = args.database_url
+    from src.main import register_handlers
+    # src.main включает INFO для всего приложения - в тесте нужны только ошибки
+    logging.getLogger().setLevel(logging.ERROR)
+    from src.database import engine, AsyncSessionLocal
+    from src.migrations import upgrade
+    from src.services.audit_service import audit_log
+    
+    await upgrade()
+    await seed_users(AsyncSessionLocal, args.clients, args.operators, args.couriers)
+    
+    session = RecordingSession(latency=args.api_latency_ms / 1000)
+    bot = Bot(token="42:LOADTEST", session=session)
+    dp = Dispatcher(storage=MemoryStorage())
+    await register_handlers(dp)
+    event.listen(engine.sync_engine, "before_cursor_execute", count_query)
+    
+    levels = [int(value) for value in args.concurrency.split(",")]
+    replay = load_replay(args.replay) if args.replay else None
+    rng = random.Random(args.seed)
+    factory = UpdateFactory()
+    
+    print(f"📨 Update replay load test ({engine.dialect.name}, Bot API latency {args.api_latency_ms} ms)")
+    print(f"\n{'conc':>5} {'updates':>8} {'upd/s':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'sql/upd':>8} {'errors':>7}")
+    results = []
+    for concurrency in levels:
+        if replay is not None:
+            scripts = replay
+        else:
+            order_ids = await seed_orders(AsyncSessionLocal, args.scripts)
+            scripts = build_scripts(factory, args.scripts, order_ids, args, rng)
+            if args.save_updates and concurrency == levels[0]:
+                with open(args.save_updates, "w") as file:
+                    for _, updates in scripts:
+                        for data in updates:
+                            file.write(json.dumps(data, ensure_ascii=False) + "\n")
+        
+        level = await run_level(dp, bot, scripts, concurrency)
+        results.append(level)
+        print(f"{concurrency:>5} {level['updates']:>8} {level['throughput']:>8.1f} {level['p50_ms']:>7.1f}ms "
+              f"{level['p95_ms']:>7.1f}ms {level['p99_ms']:>7.1f}ms {level['queries_per_update']:>8.1f} "
+              f"{sum(level['errors'].values()):>7}")
+    
+    last = results[-1]
+    print(f"\n📊 By scenario at concurrency {last['concurrency']}:")
+    for kind, stats in sorted(last["kinds"].items()):
+        print(f"  {kind:<10} {stats['updates']:>6} updates  p50 {stats['p50_ms']:.1f} ms  p95 {stats['p95_ms']:.1f} ms")
+    print("📤 Bot API calls: " + ", ".join(f"{name} {count}" for name, count in session.calls.most_common()))
+    
+    failed = Counter()
+    for level in results:
+        failed.update(level["errors"])
+    if failed:
+        print("\n❌ Handler errors:")
+        for message, count in failed.most_common(10):
+            print(f"  {count:>5} × {message}")
+    if any(level["unhandled"] for level in results):
+        print(f"⚠️ Unhandled updates: {sum(level['unhandled'] for level in results)}")
+    
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"dialect": engine.dialect.name, "api_latency_ms": args.api_latency_ms,
+                       "bot_api_calls": dict(session.calls), "levels": results}, file, ensure_ascii=False, indent=1)
+        print(f"💾 Results: {args.output}")
+    
+    await audit_log.stop()
+    await engine.dispose()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,4,16,64", help="ступени одновременно обслуживаемых пользователей")
+    parser.add_argument("--scripts", type=int, default=200, help="сценариев на ступень")
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--operators", type=int, default=20)
+    parser.add_argument("--couriers", type=int, default=50)
+    parser.add_argument("--replay", help="JSONL с записанными обновлениями вместо сценариев")
+    parser.add_argument("--save-updates", help="сохранить обновления первой ступени в JSONL")
+    parser.add_argument("--api-latency-ms", type=float, default=0.0, help="имитация задержки Bot API")
+    parser.add_argument("--database-url", default=os.environ.get(
+        "BENCH_DATABASE_URL",
+        f"sqlite+aiosqlite:///{os.path.join(tempfile.gettempdir(), 'maxxpharm_updates.db')}"
+    ))
+    parser.add_argument("--output", help="сохранить результаты в JSON")
+    parser.add_argument("--seed", type=int, default=42)
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+🎤 MAXXPHARM CRM - Бенчмарк очереди распознавания голосовых заказов
+
+Всплеск голосовых сообщений подается в VoiceQueue с подключаемым
+бэкендом, который имитирует CPU-нагрузку локальной модели. Замеряются
+отклоненные запросы при переполнении очереди, время ожидания в очереди,
+длительность распознавания и задержка цикла событий бота.
+
+Запуск: python benchmarks/bench_voice_queue.py [--messages 40] [--workers 2] [--queue 20] [--cpu-ms 300]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.services.voice_service import VoiceQueue, TranscriptionBackend, transcript_to_text
+from src.services.order_parser import parse_order_text
+
+PHRASES = [
+    "Парацетамол пятьдесят штук, цефтриаксон двадцать ампул",
+    "Ибупрофен 400 мг 30 штук и новокаин 10 ампул",
+    "Физраствор 12 флаконов плюс омепразол 20 мг 5 упаковок",
+]
+
+
+class CpuBoundBackend(TranscriptionBackend):
+    """Имитация локальной модели: держит CPU cpu_ms миллисекунд"""
+    
+    name = "bench"
+    
+    def __init__(self, options):
+        self.cpu_seconds = float(os.environ.get("BENCH_VOICE_CPU_MS", "300")) / 1000
+    
+    def transcribe(self, path: str) -> str:
+        deadline = time.perf_counter() + self.cpu_seconds
+        counter = 0
+        while time.perf_counter() < deadline:
+            counter += 1
+        return PHRASES[hash(path) % len(PHRASES)]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=40)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--queue", type=int, default=20)
+    parser.add_argument("--cpu-ms", type=int, default=300)
+    args = parser.parse_args()
+    os.environ["BENCH_VOICE_CPU_MS"] = str(args.cpu_ms)
+    
+    print("🎤 MAXXPHARM CRM - Voice queue benchmark")
+    print("=" * 50)
+    
+    queue = VoiceQueue(workers=args.workers, max_size=args.queue, backend="bench_voice_queue:CpuBoundBackend")
+    
+    # Прогрев: запуск процессов и инициализация бэкенда
+    await queue.submit("warmup.ogg", timeout=30)
+    
+    lag = 0.0
+    stop = asyncio.Event()
+    
+    async def ticker():
+        nonlocal lag
+        while not stop.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(0.005)
+            lag = max(lag, time.perf_counter() - started - 0.005)
+    
+    async def one(n):
+        try:
+            text = await queue.submit(f"voice_{n}.ogg", timeout=60)
+        except asyncio.QueueFull:
+            return None
+        return parse_order_text(transcript_to_text(text))
+    
+    tick = asyncio.create_task(ticker())
+    started = time.perf_counter()
+    results = await asyncio.gather(*[one(n) for n in range(args.messages)])
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await tick
+    
+    accepted = [result for result in results if result is not None]
+    stats = queue.get_stats()
+    print(f"📨 Burst of {args.messages} messages, {args.workers} workers, queue {args.queue}, "
+          f"{args.cpu_ms} ms CPU per message")
+    print(f"✅ Accepted {len(accepted)}, rejected {args.messages - len(accepted)} "
+          f"in {elapsed:.2f} s ({len(accepted) / elapsed:.1f} msg/s)")
+    print(f"⏳ Queue wait: p50={stats['wait']['p50_ms']} ms p95={stats['wait']['p95_ms']} ms "
+          f"max={stats['wait']['max_ms']} ms")
+    print(f"🧠 Transcription: p50={stats['transcription']['p50_ms']} ms "
+          f"p95={stats['transcription']['p95_ms']} ms")
+    print(f"🔁 Max event loop lag during burst: {lag * 1000:.0f} ms")
+    print(f"💊 Items per accepted message: {sum(len(items) for items in accepted) / max(len(accepted), 1):.1f}")
+    
+    await queue.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
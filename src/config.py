@@ -18,6 +18,28 @@ class Settings(BaseSettings):
     # 🗄️ Database Settings
     database_url: str = Field(..., env="DATABASE_URL")
     redis_url: str = Field("redis://localhost:6379", env="REDIS_URL")
+    # Применять миграции при запуске, если схема отстает (иначе - ошибка запуска)
+    db_auto_migrate: bool = Field(True, env="DB_AUTO_MIGRATE")
+    # Пул соединений PostgreSQL: поллинг бота и API работают в одном процессе
+    db_pool_size: int = Field(10, env="DB_POOL_SIZE")
+    db_max_overflow: int = Field(10, env="DB_MAX_OVERFLOW")
+    db_pool_timeout: float = Field(10.0, env="DB_POOL_TIMEOUT")  # секунд ожидания свободного соединения
+    db_pool_recycle: int = Field(1800, env="DB_POOL_RECYCLE")
+    db_pool_pre_ping: bool = Field(True, env="DB_POOL_PRE_PING")
+    db_connect_timeout: float = Field(10.0, env="DB_CONNECT_TIMEOUT")
+    db_statement_cache_size: int = Field(100, env="DB_STATEMENT_CACHE_SIZE")  # подготовленных запросов на соединение
+    db_statement_timeout_ms: int = Field(30000, env="DB_STATEMENT_TIMEOUT_MS")  # 0 - без ограничения
+    db_application_name: str = Field("maxxpharm-crm", env="DB_APPLICATION_NAME")
+    # PgBouncer в режиме transaction: без кеша подготовленных запросов и лишних параметров запуска
+    db_pgbouncer: bool = Field(False, env="DB_PGBOUNCER")
+    # Сессия дольше этого держит соединение - предупреждение в журнале
+    db_session_warn_seconds: float = Field(5.0, env="DB_SESSION_WARN_SECONDS")
+    db_session_check_seconds: int = 30
+    # Реплики для отчетов (через запятую); пусто - все читается из основной базы
+    database_replica_urls: str = Field("", env="DATABASE_REPLICA_URLS")
+    replica_max_lag_seconds: float = Field(5.0, env="REPLICA_MAX_LAG_SECONDS")
+    replica_sticky_seconds: float = Field(5.0, env="REPLICA_STICKY_SECONDS")  # после записи пользователь читает основную базу
+    replica_lag_check_seconds: float = 5.0
     
     # 🤖 AI Settings
     openai_api_key: str = Field(..., env="OPENAI_API_KEY")
@@ -40,6 +62,124 @@ class Settings(BaseSettings):
     order_timeout_minutes: int = 60
     delivery_radius_km: int = 50
     
+    # 🎯 Auto Assignment Settings
+    auto_assignment_enabled: bool = Field(True, env="AUTO_ASSIGNMENT_ENABLED")
+    max_orders_per_worker: int = 5
+    worker_sync_interval_seconds: int = 300
+    
+    # 🚚 Courier Dispatch Settings
+    geo_dispatch_enabled: bool = Field(True, env="GEO_DISPATCH_ENABLED")
+    dispatch_candidates: int = 5
+    dispatch_grid_cell_km: float = 1.0
+    dispatch_load_penalty_minutes: int = 10
+    courier_position_ttl_minutes: int = 30
+    
+    # 🗺 Route Planning Settings
+    depot_latitude: float = 38.5598
+    depot_longitude: float = 68.7870
+    route_max_stops: int = 8
+    route_max_trip_minutes: int = 180
+    
+    # 🧭 Geocoding Settings
+    geocoding_provider: str = Field("auto", env="GEOCODING_PROVIDER")  # auto, google, gazetteer
+    geocode_memory_cache_size: int = 2048
+    geocode_cache_ttl_days: int = 90
+    geocode_negative_ttl_hours: int = 6
+    geocode_concurrency: int = 4
+    geocode_timeout_seconds: float = 10.0
+    geocode_coordinate_precision: int = 4
+    
+    # 📚 Product Catalog
+    catalog_reload_seconds: int = 60
+    catalog_match_threshold: float = 0.5
+    default_unit_price: float = 100.0
+    
+    # 🗺 Delivery Zones
+    zone_polygons_path: Optional[str] = Field(None, env="ZONE_POLYGONS_PATH")
+    
+    # 📥 Order Import (CSV/XLSX)
+    import_max_file_mb: int = 10
+    import_max_rows: int = 10000
+    import_max_quantity: int = 100000
+    import_chunk_rows: int = 500
+    import_spool_mb: int = 2
+    
+    # 📷 Media (фото рецептов)
+    media_storage_path: str = Field("media", env="MEDIA_STORAGE_PATH")
+    image_max_side: int = 1600
+    image_jpeg_quality: int = 80
+    image_workers: int = 2
+    image_max_in_flight: int = 4
+    image_max_download_mb: int = 20
+    
+    # 🧾 Payment Receipts (чеки оплаты)
+    receipt_storage_backend: str = Field("local", env="RECEIPT_STORAGE_BACKEND")  # local, s3
+    receipt_storage_path: str = Field("media/receipts", env="RECEIPT_STORAGE_PATH")
+    receipt_s3_bucket: Optional[str] = Field(None, env="RECEIPT_S3_BUCKET")
+    receipt_s3_endpoint_url: Optional[str] = Field(None, env="RECEIPT_S3_ENDPOINT_URL")
+    receipt_thumbnail_side: int = 320
+    receipt_max_download_mb: int = 10
+    receipt_link_ttl_minutes: int = 60
+    public_base_url: Optional[str] = Field(None, env="PUBLIC_BASE_URL")
+    
+    # 💰 Payment Reconciliation
+    reconcile_enabled: bool = Field(True, env="RECONCILE_ENABLED")
+    reconcile_hour_utc: int = 22  # 03:00 по Душанбе
+    reconcile_chunk_size: int = 1000
+    reconcile_auto_fix: bool = Field(False, env="RECONCILE_AUTO_FIX")
+    
+    # 💼 Debt Collection (торговые представители)
+    collection_age_weight_days: int = 30  # долг возрастом 30 дней весит вдвое больше нового
+    collection_worklist_size: int = 20
+    collection_max_visits: int = 12
+    collection_day_minutes: int = 480
+    collection_rebuild_chunk: int = 500
+    
+    # 📋 Client Summary
+    client_recent_orders: int = 10  # заказов в сводке клиента
+    client_history_page_size: int = 10
+    
+    # 🎤 Voice Orders
+    transcription_backend: str = Field("auto", env="TRANSCRIPTION_BACKEND")  # auto, openai, local
+    transcription_model: str = Field("whisper-1", env="TRANSCRIPTION_MODEL")
+    local_whisper_model: str = Field("small", env="LOCAL_WHISPER_MODEL")
+    voice_workers: int = 2
+    voice_queue_size: int = 20
+    voice_max_duration_seconds: int = 180
+    voice_timeout_seconds: float = 120.0
+    
+    # 📝 Audit Log
+    audit_batch_size: int = 500
+    audit_flush_interval: float = 1.0  # секунд ожидания неполного пакета
+    audit_queue_size: int = 10000
+    audit_shutdown_timeout: float = 10.0
+    
+    # 🗂️ Partitioning (activity_logs, locations)
+    partition_interval_locations: str = Field("day", env="PARTITION_INTERVAL_LOCATIONS")  # day или month
+    partition_interval_activity_logs: str = Field("month", env="PARTITION_INTERVAL_ACTIVITY_LOGS")
+    partition_premake: int = 3  # секций наперед
+    partition_maintenance_hours: int = 6
+    partition_retention_action: str = Field("drop", env="PARTITION_RETENTION_ACTION")  # drop или detach (архив)
+    location_retention_days: int = 30
+    activity_log_retention_days: int = 365
+    retention_delete_chunk: int = 5000  # без секций (SQLite): строк за один DELETE
+    
+    # 🗄 Order Archive
+    archive_enabled: bool = Field(True, env="ARCHIVE_ENABLED")
+    archive_after_days: int = 180  # закрытые заказы старше - в архив
+    archive_chunk_size: int = 500  # заказов в одном файле
+    archive_path: str = Field("media/archive", env="ARCHIVE_PATH")
+    archive_compression: str = Field("auto", env="ARCHIVE_COMPRESSION")  # auto, zstd, gzip
+    
+    # 🩺 Health Checks
+    health_check_timeout: float = 2.0  # секунд на SELECT 1 и getMe
+    health_bot_cache_seconds: int = 300  # успешный getMe
+    health_bot_retry_seconds: int = 30  # после ошибки getMe
+    stats_refresh_seconds: int = Field(300, env="STATS_REFRESH_SECONDS")
+    
+    # 📈 Metrics
+    slow_handler_ms: int = Field(1000, env="SLOW_HANDLER_MS")  # дольше - предупреждение с самыми долгими SQL
+    
     # 🏥 1C Integration
     onec_api_url: Optional[str] = Field(None, env="ONEC_API_URL")
     onec_api_key: Optional[str] = Field(None, env="ONEC_API_KEY")
@@ -3,22 +3,98 @@
 """
 
 import asyncio
-from typing import AsyncGenerator
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+import logging
+import time
+from contextvars import ContextVar
+from typing import AsyncGenerator, Optional
+from uuid import uuid4
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import declarative_base
-from sqlalchemy import text
+from sqlalchemy import text, make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 
 from .config import settings
-from .models.database import Base
+from .metrics import metrics, instrument_engine
+
+logger = logging.getLogger(__name__)
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Пул с учетом запросов, ждущих свободного соединения, и времени ожидания"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.waiting = 0
+    
+    def _do_get(self):
+        started = time.perf_counter()
+        self.waiting += 1
+        try:
+            return super()._do_get()
+        finally:
+            self.waiting -= 1
+            metrics.observe("db_pool_wait_seconds", time.perf_counter() - started, "Ожидание соединения из пула")
+
+
+def engine_options(database_url: str) -> dict:
+    """Параметры движка из настроек: пул, таймауты и кеш подготовленных запросов asyncpg"""
+    options = {"echo": settings.debug, "future": True}
+    if make_url(database_url).get_backend_name() != "postgresql":
+        # SQLite: пул по умолчанию, параметры PostgreSQL неприменимы
+        return options
+    
+    server_settings = {"application_name": settings.db_application_name}
+    connect_args = {"timeout": settings.db_connect_timeout, "server_settings": server_settings}
+    if settings.db_pgbouncer:
+        # Подготовленные запросы живут в серверном соединении, а PgBouncer меняет его между
+        # транзакциями; параметры запуска, кроме application_name, PgBouncer отклоняет
+        connect_args.update(
+            statement_cache_size=0,
+            prepared_statement_cache_size=0,
+            prepared_statement_name_func=lambda: f"__asyncpg_{uuid4()}__",
+        )
+        if settings.db_statement_timeout_ms:
+            logger.info("ℹ️ DB_PGBOUNCER: statement_timeout is not sent, set it on the database role")
+    else:
+        connect_args.update(
+            statement_cache_size=settings.db_statement_cache_size,
+            prepared_statement_cache_size=settings.db_statement_cache_size,
+        )
+        if settings.db_statement_timeout_ms:
+            server_settings["statement_timeout"] = str(settings.db_statement_timeout_ms)
+    
+    options.update(
+        poolclass=InstrumentedQueuePool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_pre_ping=settings.db_pool_pre_ping,
+        connect_args=connect_args,
+    )
+    return options
+
 
 # Создание двигателя базы данных
-engine = create_async_engine(
-    settings.database_url,
-    echo=settings.debug,
-    future=True,
-    pool_pre_ping=True,
-    pool_recycle=300,
-)
+engine = create_async_engine(settings.database_url, **engine_options(settings.database_url))
+
+# Число запросов и время в базе для метрик обработчиков
+instrument_engine(engine)
+
+
+def pool_gauges() -> dict:
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return {}
+    return {
+        (("state", "checked_out"),): pool.checkedout(),
+        (("state", "idle"),): pool.checkedin(),
+        (("state", "overflow"),): max(pool.overflow(), 0),
+        (("state", "waiting"),): getattr(pool, "waiting", 0),
+    }
+
+
+metrics.gauge("db_pool_connections", pool_gauges, "Соединения пула по состоянию")
 
 # Создание фабрики сессий
 AsyncSessionLocal = async_sessionmaker(
@@ -30,41 +106,62 @@ AsyncSessionLocal = async_sessionmaker(
 )
 
 
-async def get_db() -> AsyncGenerator[AsyncSession, None]:
-    """Получение сессии базы данных"""
-    async with AsyncSessionLocal() as session:
+class UpdateSession:
+    """Сессия обновления Telegram: открывается при первом обращении, закрывается SessionMiddleware"""
+    
+    def __init__(self):
+        self.session: Optional[AsyncSession] = None
+    
+    def get(self) -> AsyncSession:
+        if self.session is None:
+            self.session = AsyncSessionLocal()
+        return self.session
+    
+    async def close(self, commit: bool) -> None:
+        """Одна фиксация (или откат при ошибке) в конце обновления; соединение всегда возвращается в пул"""
+        if self.session is None:
+            return
         try:
-            yield session
+            if commit and self.session.in_transaction() and self.session.is_active:
+                await self.session.commit()
         finally:
-            await session.close()
+            # close() откатывает незафиксированное
+            await self.session.close()
+            self.session = None
+
+
+# Сессия текущего обновления (None - фоновые задачи и API)
+current_update_session: ContextVar[Optional[UpdateSession]] = ContextVar("current_update_session", default=None)
+
+
+def update_session() -> AsyncSession:
+    """Общая сессия текущего обновления Telegram"""
+    update = current_update_session.get()
+    if update is None:
+        raise RuntimeError("No update session: use 'async with AsyncSessionLocal()' outside Telegram handlers")
+    return update.get()
+
+
+async def get_db() -> AsyncGenerator[AsyncSession, None]:
+    """Получение сессии базы данных: в обработчике - общая сессия обновления, иначе новая"""
+    update = current_update_session.get()
+    if update is not None:
+        session = update.get()
+        # После перехваченной ошибки базы сессия ждет отката
+        if not session.is_active:
+            await session.rollback()
+        yield session
+        return
+    
+    async with AsyncSessionLocal() as session:
+        yield session
 
 
 async def init_db() -> None:
-    """Инициализация базы данных"""
-    async with engine.begin() as conn:
-        # Создание всех таблиц
-        await conn.run_sync(Base.metadata.create_all)
-        
-        # Создание индексов
-        await create_indexes(conn)
-
-
-async def create_indexes(conn) -> None:
-    """Создание дополнительных индексов"""
-    indexes = [
-        "CREATE INDEX IF NOT EXISTS idx_users_telegram_id ON users(telegram_id)",
-        "CREATE INDEX IF NOT EXISTS idx_users_role ON users(role)",
-        "CREATE INDEX IF NOT EXISTS idx_orders_status ON orders(status)",
-        "CREATE INDEX IF NOT EXISTS idx_orders_client_id ON orders(client_id)",
-        "CREATE INDEX IF NOT EXISTS idx_orders_created_at ON orders(created_at)",
-        "CREATE INDEX IF NOT EXISTS idx_payments_order_id ON payments(order_id)",
-        "CREATE INDEX IF NOT EXISTS idx_locations_user_id ON locations(user_id)",
-        "CREATE INDEX IF NOT EXISTS idx_activity_logs_user_id ON activity_logs(user_id)",
-        "CREATE INDEX IF NOT EXISTS idx_activity_logs_created_at ON activity_logs(created_at)",
-    ]
+    """Инициализация базы данных: проверка версии схемы (миграции - src/migrations)"""
+    from .migrations import check_schema
     
-    for index_sql in indexes:
-        await conn.execute(text(index_sql))
+    await check_schema()
 
 
 async def close_db() -> None:
@@ -83,37 +180,52 @@ class DatabaseManager:
         """Создание новой сессии"""
         return self.session_factory()
     
-    async def health_check(self) -> bool:
-        """Проверка здоровья базы данных"""
+    async def health_check(self, timeout: Optional[float] = None) -> bool:
+        """Проверка здоровья базы данных (соединение из пула и SELECT 1)"""
+        async def ping() -> None:
+            async with self.engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+        
         try:
-            async with self.create_session() as session:
-                await session.execute(text("SELECT 1"))
-                return True
+            await asyncio.wait_for(ping(), timeout)
+            return True
         except Exception:
             return False
     
-    async def get_stats(self) -> dict:
-        """Получение статистики базы данных"""
+    def pool_status(self) -> dict:
+        """Состояние пула соединений без обращения к базе"""
+        pool = self.engine.pool
+        status = {"class": type(pool).__name__}
+        for name in ("size", "checkedin", "checkedout", "overflow"):
+            if hasattr(pool, name):
+                status[name] = getattr(pool, name)()
+        if isinstance(pool, InstrumentedQueuePool):
+            status["waiting"] = pool.waiting
+            wait = metrics.histogram("db_pool_wait_seconds")
+            if wait is not None:
+                status["wait_p99_ms"] = round(wait.quantile(0.99) * 1000, 1)
+        return status
+    
+    async def get_stats(self, engine: Optional[AsyncEngine] = None) -> dict:
+        """Число пользователей, заказов и платежей (в PostgreSQL - оценка планировщика без COUNT(*))"""
+        tables = ("users", "orders", "payments")
         try:
-            async with self.create_session() as session:
-                # Статистика пользователей
-                users_result = await session.execute(text("SELECT COUNT(*) FROM users"))
-                users_count = users_result.scalar()
-                
-                # Статистика заказов
-                orders_result = await session.execute(text("SELECT COUNT(*) FROM orders"))
-                orders_count = orders_result.scalar()
+            async with (engine or self.engine).connect() as conn:
+                counts = {}
+                if conn.dialect.name == "postgresql":
+                    result = await conn.execute(
+                        text("SELECT relname, reltuples FROM pg_class WHERE relname = ANY(:tables) AND relkind IN ('r', 'p')"),
+                        {"tables": list(tables)}
+                    )
+                    # reltuples = -1: таблица еще не анализировалась
+                    counts = {name: int(value) for name, value in result.all() if value >= 0}
+                estimated = bool(counts)
                 
-                # Статистика платежей
-                payments_result = await session.execute(text("SELECT COUNT(*) FROM payments"))
-                payments_count = payments_result.scalar()
+                for table in tables:
+                    if table not in counts:
+                        counts[table] = (await conn.execute(text(f"SELECT COUNT(*) FROM {table}"))).scalar()
                 
-                return {
-                    "users": users_count,
-                    "orders": orders_count,
-                    "payments": payments_count,
-                    "database_healthy": await self.health_check()
-                }
+                return {**counts, "estimated": estimated, "database_healthy": True}
         except Exception as e:
             return {
                 "error": str(e),
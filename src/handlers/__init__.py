@@ -6,6 +6,8 @@ from .client import ClientHandlers
 from .operator import OperatorHandlers
 from .admin import AdminHandlers
 from .courier import CourierHandlers
+from .warehouse import WarehouseHandlers
+from .sales_rep import SalesRepHandlers
 from .common import CommonHandlers
 
 __all__ = [
@@ -13,5 +15,7 @@ __all__ = [
     "OperatorHandlers",
     "AdminHandlers", 
     "CourierHandlers",
+    "WarehouseHandlers",
+    "SalesRepHandlers",
     "CommonHandlers"
 ]
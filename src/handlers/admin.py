@@ -3,6 +3,7 @@
 """
 
 from typing import List, Dict, Any
+from datetime import datetime
 from aiogram import Router, F, types
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
@@ -11,6 +12,10 @@ from aiogram.types import Message, ReplyKeyboardMarkup, KeyboardButton, InlineKe
 from ..models.database import UserRole, OrderStatus
 from ..services.user_service import UserService
 from ..services.order_service import OrderService
+from ..services.analytics_service import AnalyticsService
+from ..services.archive_service import ArchiveService
+from ..services.zone_service import ZoneService
+from ..config import settings
 from ..database import get_db
 
 
@@ -21,6 +26,16 @@ class UserManagementStates(StatesGroup):
     role_selection = State()
 
 
+class ArchiveStates(StatesGroup):
+    """Состояния поиска в архиве"""
+    order_number = State()
+
+
+class ZoneStates(StatesGroup):
+    """Состояния назначения зоны сотруднику"""
+    staff_zone = State()
+
+
 class AdminHandlers:
     """Обработчики для администраторов"""
     
@@ -115,11 +130,22 @@ class AdminHandlers:
 • 🔒 Заблокировано: {user_stats['blocked_users']}
 
 👥 <b>По ролям:</b>"""
-                
+
                 for role, count in user_stats['role_distribution'].items():
                     role_display = self._get_role_display(role)
                     text += f"\n• {role_display}: {count}"
                 
+                # Заказы за сегодня по зонам
+                today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+                zone_stats = await AnalyticsService(session).get_zone_stats(today, datetime.utcnow())
+                if zone_stats:
+                    text += "\n\n🗺 <b>Сегодня по зонам:</b>"
+                    for zone in zone_stats:
+                        text += (
+                            f"\n• {zone['zone']}: {zone['orders']} заказов, "
+                            f"🚚 {zone['delivered']}, 💰 {zone['total_amount']:.2f} сомони"
+                        )
+                
                 text += f"""
 
 💰 <b>Финансы:</b>
@@ -344,23 +370,174 @@ class AdminHandlers:
         @self.router.message(F.text == "🗄 Архив")
         async def handle_archive(message: Message):
             """Работа с архивом"""
-            await message.answer(
-                "🗄 <b>Архив системы</b>\n\n"
-                "📊 <b>Статистика архива:</b>\n\n"
-                "📦 Заказов в архиве: 0\n"
-                "👥 Пользователей в архиве: 0\n"
-                "💰 Финансовых операций: 0\n\n"
-                "🔍 <b>Поиск в архиве:</b>\n\n"
-                "📦 По номеру заказа\n"
-                "👤 По пользователю\n"
-                "📅 По дате\n"
-                "💰 По сумме\n\n"
-                "⚙️ <b>Настройки архивации:</b>\n\n"
-                "📅 Период автоархивации: 90 дней\n"
-                "📦 Заказы старше 6 месяцев\n"
-                "👥 Неактивные пользователи\n\n"
-                "🏥 MAXXPHARM CRM - Хранение данных"
+            async for session in get_db():
+                user = await UserService(session).get_user_by_telegram_id(message.from_user.id)
+                if not user or user.role != UserRole.ADMIN:
+                    await message.answer("❌ Доступ запрещен")
+                    return
+                
+                stats = await ArchiveService(session).get_stats()
+                
+                text = "🗄 <b>Архив заказов</b>\n\n"
+                text += "📊 <b>Статистика архива:</b>\n\n"
+                text += f"📦 Заказов в архиве: {stats['orders']}\n"
+                text += f"💰 На сумму: {stats['amount']:,.0f} сомони\n"
+                text += f"🗂 Файлов: {stats['files']}\n"
+                if stats['oldest'] and stats['newest']:
+                    text += f"📅 Закрыты: {stats['oldest'].strftime('%d.%m.%Y')} - {stats['newest'].strftime('%d.%m.%Y')}\n"
+                if stats['last_archived_at']:
+                    text += f"🕐 Последняя архивация: {stats['last_archived_at'].strftime('%d.%m.%Y %H:%M')}\n"
+                text += "\n⚙️ <b>Настройки архивации:</b>\n\n"
+                text += f"🔄 Автоархивация: {'включена' if settings.archive_enabled else 'выключена'}\n"
+                text += f"📅 Закрытые заказы старше {settings.archive_after_days} дней\n"
+                
+                keyboard = InlineKeyboardMarkup(inline_keyboard=[
+                    [InlineKeyboardButton(text="🔍 Найти по номеру", callback_data="archive_search")],
+                    [InlineKeyboardButton(text="🗄 Архивировать сейчас", callback_data="archive_run")]
+                ])
+                await message.answer(text, reply_markup=keyboard)
+        
+        @self.router.callback_query(F.data == "archive_run")
+        async def handle_archive_run(callback: types.CallbackQuery):
+            """Архивация закрытых заказов вручную"""
+            async for session in get_db():
+                user = await UserService(session).get_user_by_telegram_id(callback.from_user.id)
+                if not user or user.role != UserRole.ADMIN:
+                    await callback.answer("❌ Доступ запрещен")
+                    return
+                
+                await callback.answer("⏳ Архивация...")
+                result = await ArchiveService(session).archive_closed()
+                await callback.message.answer(
+                    "✅ <b>Архивация завершена</b>\n\n"
+                    f"📦 Заказов перенесено: {result['orders']}\n"
+                    f"🗂 Файлов: {result['files']}"
+                )
+        
+        @self.router.callback_query(F.data == "archive_search")
+        async def handle_archive_search(callback: types.CallbackQuery, state: FSMContext):
+            """Поиск заказа по номеру"""
+            await state.set_state(ArchiveStates.order_number)
+            await callback.message.answer("🔍 Введите номер заказа:")
+            await callback.answer()
+        
+        @self.router.message(ArchiveStates.order_number)
+        async def handle_archive_order_number(message: Message, state: FSMContext):
+            """Заказ по номеру - из рабочей базы или из архива"""
+            await state.clear()
+            async for session in get_db():
+                user = await UserService(session).get_user_by_telegram_id(message.from_user.id)
+                if not user or user.role != UserRole.ADMIN:
+                    await message.answer("❌ Доступ запрещен")
+                    return
+                
+                order = await OrderService(session).get_order_by_number((message.text or "").strip())
+                if not order:
+                    await message.answer("📭 Заказ не найден")
+                    return
+                
+                text = f"📦 <b>Заказ #{order.order_number}</b>"
+                text += " 🗄 (архив)\n\n" if getattr(order, "is_archived", False) else "\n\n"
+                text += f"📊 Статус: {order.status}\n"
+                text += f"💰 Сумма: {float(order.total_amount or 0):,.0f} сомони\n"
+                text += f"💸 Оплачено: {float(order.paid_amount or 0):,.0f} сомони\n"
+                if order.created_at:
+                    text += f"📅 Создан: {order.created_at.strftime('%d.%m.%Y %H:%M')}\n"
+                if order.delivered_at:
+                    text += f"🚚 Доставлен: {order.delivered_at.strftime('%d.%m.%Y %H:%M')}\n"
+                if order.items:
+                    text += "\n💊 <b>Позиции:</b>\n"
+                    for item in order.items[:20]:
+                        text += f"• {item.product_name} × {item.quantity}\n"
+                if order.payments:
+                    text += "\n💸 <b>Оплаты:</b>\n"
+                    for payment in order.payments:
+                        text += f"• {float(payment.amount):,.0f} сомони ({payment.payment_type})\n"
+                
+                await message.answer(text)
+        
+        @self.router.message(F.text == "🗺 Зоны")
+        async def handle_zones(message: Message):
+            """Зоны доставки: покрытие и сотрудники по зонам"""
+            async for session in get_db():
+                user = await UserService(session).get_user_by_telegram_id(message.from_user.id)
+                if not user or user.role != UserRole.ADMIN:
+                    await message.answer("❌ Доступ запрещен")
+                    return
+                
+                zone_service = ZoneService(session)
+                coverage = await zone_service.get_coverage()
+                staff = await zone_service.get_staff()
+                
+                text = "🗺 <b>Зоны доставки</b>\n\n"
+                text += f"📍 Зоны: {', '.join(zone_service.index.zones)}\n"
+                text += f"🏥 Аптек без зоны: {coverage['pharmacies']}\n"
+                text += f"📦 Открытых заказов без зоны: {coverage['orders']}\n"
+                text += "ℹ️ Заказы без зоны видны в очередях всех зон\n\n"
+                text += "👥 <b>Сотрудники:</b>\n"
+                for member in staff[:30]:
+                    text += f"• {member.full_name} ({self._get_role_display(member.role)}, 🆔 {member.telegram_id}): {member.zone or 'все зоны'}\n"
+                
+                keyboard = InlineKeyboardMarkup(inline_keyboard=[
+                    [InlineKeyboardButton(text="🔄 Заполнить зоны", callback_data="zones_backfill")],
+                    [InlineKeyboardButton(text="📍 Зона сотрудника", callback_data="zones_staff")]
+                ])
+                await message.answer(text, reply_markup=keyboard)
+        
+        @self.router.callback_query(F.data == "zones_backfill")
+        async def handle_zones_backfill(callback: types.CallbackQuery):
+            """Зоны аптек (с геокодированием адресов) и открытых заказов без зоны"""
+            async for session in get_db():
+                user = await UserService(session).get_user_by_telegram_id(callback.from_user.id)
+                if not user or user.role != UserRole.ADMIN:
+                    await callback.answer("❌ Доступ запрещен")
+                    return
+                
+                await callback.answer("⏳ Определяю зоны...")
+                result = await ZoneService(session).backfill_zones()
+                await callback.message.answer(
+                    "✅ <b>Зоны заполнены</b>\n\n"
+                    f"🏥 Аптек получили зону: {result['pharmacies']}\n"
+                    f"📦 Заказов получили зону: {result['orders']}"
+                )
+        
+        @self.router.callback_query(F.data == "zones_staff")
+        async def handle_zones_staff(callback: types.CallbackQuery, state: FSMContext):
+            """Назначение зоны сотруднику"""
+            await state.set_state(ZoneStates.staff_zone)
+            await callback.message.answer(
+                "📍 Введите Telegram ID сотрудника и зону через пробел\n"
+                "Например: <code>123456789 центр</code>\n"
+                "Вместо зоны <code>-</code> - все зоны"
             )
+            await callback.answer()
+        
+        @self.router.message(ZoneStates.staff_zone)
+        async def handle_zones_staff_input(message: Message, state: FSMContext):
+            """Telegram ID и зона сотрудника"""
+            await state.clear()
+            async for session in get_db():
+                user = await UserService(session).get_user_by_telegram_id(message.from_user.id)
+                if not user or user.role != UserRole.ADMIN:
+                    await message.answer("❌ Доступ запрещен")
+                    return
+                
+                parts = (message.text or "").split(maxsplit=1)
+                if len(parts) != 2 or not parts[0].isdigit():
+                    await message.answer("❌ Формат: <code>Telegram ID зона</code>")
+                    return
+                zone = None if parts[1].strip() == "-" else parts[1].strip().lower()
+                
+                try:
+                    member = await ZoneService(session).set_staff_zone(int(parts[0]), zone)
+                except ValueError as e:
+                    await message.answer(f"❌ {e}")
+                    return
+                if member is None:
+                    await message.answer("❌ Сотрудник с очередью (оператор, сборщик, проверщик, курьер) не найден")
+                    return
+                
+                await message.answer(f"✅ {member.full_name}: {member.zone or 'все зоны'}")
         
         @self.router.message(F.text == "🔐 Управление админами")
         async def handle_admin_management(message: Message):
@@ -2,7 +2,11 @@
 🔹 Обработчики клиентов MAXXPHARM CRM
 """
 
-from typing import List, Dict, Any
+import asyncio
+import time
+import weakref
+from datetime import datetime
+from typing import Optional, Dict, Any
 from aiogram import Router, F, types
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
@@ -11,7 +15,16 @@ from aiogram.types import Message, ReplyKeyboardMarkup, KeyboardButton, InlineKe
 from ..models.database import UserRole, OrderStatus
 from ..services.user_service import UserService
 from ..services.order_service import OrderService
+from ..services.catalog_service import CatalogService
+from ..services.order_parser import parse_order_text
+from ..services.order_import_service import OrderImportService, detect_format, open_spool
+from ..services.media_service import MediaService
+from ..services.voice_service import VoiceService, voice_queue
+from ..services.receipt_service import ReceiptService
+from ..services.reconciliation_service import ReconciliationService
+from ..services.client_summary_service import ClientSummaryService
 from ..database import get_db
+from ..config import settings
 
 
 class OrderCreationStates(StatesGroup):
@@ -22,11 +35,18 @@ class OrderCreationStates(StatesGroup):
     order_voice = State()
 
 
+class PaymentStates(StatesGroup):
+    """Состояния отправки чека оплаты"""
+    receipt = State()
+
+
 class ClientHandlers:
     """Обработчики для клиентов"""
     
     def __init__(self):
         self.router = Router()
+        # Блокировка живет, пока ее держат или ждут сообщения альбома, затем запись удаляется сама
+        self._photo_locks: "weakref.WeakValueDictionary[int, asyncio.Lock]" = weakref.WeakValueDictionary()
         self._register_handlers()
     
     def _register_handlers(self):
@@ -67,9 +87,10 @@ class ClientHandlers:
                     "• Парацетамол - 50 шт\n"
                     "• Цефтриаксон - 20 ампул\n"
                     "• Сироп Нурофен - 10 флаконов\n\n"
-                    "💊 Укажите название, количество и форму выпуска"
+                    "💊 Укажите название, количество и форму выпуска\n"
+                    "📎 Большой заказ можно отправить файлом CSV или XLSX"
                 )
-                
+            
             elif order_type == "photo":
                 await state.set_state(OrderCreationStates.order_photo)
                 await callback.message.answer(
@@ -80,7 +101,7 @@ class ClientHandlers:
                     "• 🏥 Адрес доставки\n\n"
                     "📷 Фото должно быть четким и читаемым"
                 )
-                
+            
             elif order_type == "voice":
                 await state.set_state(OrderCreationStates.order_voice)
                 await callback.message.answer(
@@ -95,22 +116,290 @@ class ClientHandlers:
             
             await callback.answer()
         
+        @self.router.message(OrderCreationStates.order_photo, F.photo | F.document)
+        async def handle_order_photo(message: Message, state: FSMContext):
+            """Прием фото рецепта: сжатая копия прикрепляется к заявке"""
+            if message.photo:
+                file = message.photo[-1]  # наибольшее разрешение
+            elif (message.document.mime_type or "").startswith("image/"):
+                file = message.document
+            else:
+                await message.answer("❌ Отправьте фото или изображение рецепта")
+                return
+            
+            async for session in get_db():
+                user = await UserService(session).get_user_by_telegram_id(message.from_user.id, with_pharmacy=True)
+                if not user or not user.pharmacy:
+                    await message.answer("❌ Ошибка: профиль не найден")
+                    await state.clear()
+                    return
+                
+                media_service = MediaService(session)
+                try:
+                    stored = await media_service.store_photo(message.bot, file)
+                except Exception as e:
+                    await message.answer(f"❌ Не удалось обработать фото: {str(e)}")
+                    return
+                
+                # Альбом приходит несколькими сообщениями одновременно - заявка создается один раз
+                lock = self._photo_locks.get(user.id)
+                if lock is None:
+                    lock = self._photo_locks[user.id] = asyncio.Lock()
+                async with lock:
+                    data = await state.get_data()
+                    order_id = data.get("photo_order_id")
+                    order_number = data.get("photo_order_number")
+                    if order_id is None:
+                        order = await OrderService(session).create_order(
+                            client_id=user.id,
+                            pharmacy_id=user.pharmacy.id,
+                            items=[],
+                            notes="Заказ по фото рецепта"
+                        )
+                        order_id, order_number = order.id, order.order_number
+                        await state.update_data(photo_order_id=order_id, photo_order_number=order_number)
+                
+                await media_service.attach(order_id, stored, uploaded_by=user.id)
+                
+                await message.answer(
+                    f"✅ <b>Фото добавлено к заявке {order_number}</b>\n\n"
+                    f"📷 Можно отправить еще фото\n"
+                    f"📝 Для завершения напишите:\n"
+                    f"• 📞 Контактный телефон\n"
+                    f"• 🏥 Адрес доставки"
+                )
+        
+        @self.router.message(OrderCreationStates.order_photo, F.text)
+        async def handle_order_photo_details(message: Message, state: FSMContext):
+            """Контакты и адрес к заявке по фото"""
+            data = await state.get_data()
+            order_id = data.get("photo_order_id")
+            if order_id is None:
+                await message.answer("📸 Сначала отправьте фото рецепта")
+                return
+            
+            async for session in get_db():
+                order_service = OrderService(session)
+                order = await order_service.get_order_by_id(order_id)
+                if order:
+                    order.delivery_address = message.text[:500]
+                    order.notes = f"Заказ по фото рецепта. Контакты: {message.text[:200]}"
+                
+                await message.answer(
+                    f"✅ <b>Заявка {data.get('photo_order_number')} отправлена!</b>\n\n"
+                    f"🔄 Оператор проверит рецепт и подтвердит заказ\n"
+                    f"⏱️ Ожидайте подтверждения\n\n"
+                    f"🏥 MAXXPHARM - Ваша надежная аптека!"
+                )
+                await state.clear()
+        
+        @self.router.message(OrderCreationStates.order_voice, F.voice | F.audio)
+        async def handle_order_voice(message: Message, state: FSMContext):
+            """Голосовой заказ: распознавание в очереди и черновик на подтверждение"""
+            voice = message.voice or message.audio
+            status = await message.answer(
+                f"🎤 <b>Распознаю сообщение...</b>\n"
+                f"⏳ В очереди: {voice_queue.depth}"
+            )
+            
+            async for session in get_db():
+                voice_service = VoiceService(session)
+                try:
+                    transcript = await voice_service.transcribe(message.bot, voice)
+                except asyncio.QueueFull:
+                    await status.edit_text(
+                        "⏳ <b>Сейчас много голосовых заявок</b>\n\n"
+                        "🔄 Отправьте сообщение через минуту или напишите заявку текстом"
+                    )
+                    return
+                except asyncio.TimeoutError:
+                    await status.edit_text("❌ Распознавание заняло слишком много времени, попробуйте еще раз")
+                    return
+                except Exception as e:
+                    await status.edit_text(f"❌ Не удалось распознать сообщение: {str(e)}")
+                    return
+                
+                items = await voice_service.draft_order(transcript)
+                if not items:
+                    await status.edit_text(
+                        f"🤔 <b>Не удалось найти лекарства в сообщении</b>\n\n"
+                        f"📝 Распознано: <i>{transcript[:500] or '—'}</i>\n\n"
+                        f"🎤 Повторите название и количество, например:\n"
+                        f"«Парацетамол пятьдесят штук, цефтриаксон двадцать ампул»"
+                    )
+                    return
+                
+                await state.update_data(voice_items=items, voice_transcript=transcript)
+                
+                total = sum(item['quantity'] * item['unit_price'] for item in items)
+                lines = "\n".join(
+                    f"• {item['product_name']} - {item['quantity']} {item.get('unit', 'шт')}"
+                    for item in items[:30]
+                )
+                if len(items) > 30:
+                    lines += f"\n… и еще {len(items) - 30}"
+                
+                keyboard = InlineKeyboardMarkup(
+                    inline_keyboard=[[
+                        InlineKeyboardButton(text="✅ Подтвердить", callback_data="voice_confirm"),
+                        InlineKeyboardButton(text="🔄 Заново", callback_data="voice_retry")
+                    ]]
+                )
+                await status.edit_text(
+                    f"🎤 <b>Черновик заявки</b>\n\n"
+                    f"📝 Распознано: <i>{transcript[:300]}</i>\n\n"
+                    f"{lines}\n\n"
+                    f"💰 Примерная сумма: {total:.2f} сомони\n\n"
+                    f"✅ Подтвердите заявку или запишите сообщение заново",
+                    reply_markup=keyboard
+                )
+        
+        @self.router.callback_query(OrderCreationStates.order_voice, F.data.in_({"voice_confirm", "voice_retry"}))
+        async def handle_voice_draft(callback: types.CallbackQuery, state: FSMContext):
+            """Подтверждение черновика голосовой заявки"""
+            data = await state.get_data()
+            items = data.get("voice_items")
+            
+            if callback.data == "voice_retry" or not items:
+                await state.update_data(voice_items=None, voice_transcript=None)
+                await callback.message.edit_text("🎤 Запишите голосовое сообщение со списком лекарств еще раз")
+                await callback.answer()
+                return
+            
+            async for session in get_db():
+                user = await UserService(session).get_user_by_telegram_id(callback.from_user.id, with_pharmacy=True)
+                if not user or not user.pharmacy:
+                    await callback.answer("❌ Профиль не найден", show_alert=True)
+                    await state.clear()
+                    return
+                
+                order = await OrderService(session).create_order(
+                    client_id=user.id,
+                    pharmacy_id=user.pharmacy.id,
+                    items=items,
+                    notes=f"Голосовой заказ: {data.get('voice_transcript', '')[:100]}"
+                )
+                
+                await callback.message.edit_text(
+                    f"✅ <b>Заявка создана!</b>\n\n"
+                    f"📝 Номер: {order.order_number}\n"
+                    f"💊 Позиций: {len(items)}\n"
+                    f"💰 Сумма: {order.total_amount} сомони\n"
+                    f"📊 Статус: {self._get_status_display(order.status)}\n\n"
+                    f"🔄 Заявка передана оператору"
+                )
+                await state.clear()
+                await callback.answer("✅ Заявка создана")
+        
+        @self.router.message(OrderCreationStates.order_text, F.document)
+        async def handle_order_document(message: Message, state: FSMContext):
+            """Импорт заказа из CSV/XLSX документа"""
+            document = message.document
+            
+            if detect_format(document.file_name, document.mime_type) is None:
+                await message.answer(
+                    "❌ <b>Неподдерживаемый файл</b>\n\n"
+                    "📎 Отправьте таблицу в формате CSV или XLSX\n"
+                    "📋 Колонки: Наименование, Количество (Артикул - по желанию)"
+                )
+                return
+            
+            if document.file_size and document.file_size > settings.import_max_file_mb * 1024 * 1024:
+                await message.answer(f"❌ Файл больше {settings.import_max_file_mb} МБ")
+                return
+            
+            status = await message.answer("📥 <b>Загрузка файла...</b>")
+            stage_titles = {
+                "read": "📄 Чтение файла",
+                "match": "🔎 Сопоставление с каталогом",
+                "save": "💾 Сохранение заявки",
+            }
+            last_update = 0.0
+            
+            async def report_progress(stage: str, done: int, total: Optional[int]):
+                nonlocal last_update
+                # Telegram ограничивает частоту редактирования сообщений
+                now = time.monotonic()
+                if now - last_update < 2 and stage != "save":
+                    return
+                last_update = now
+                counter = f"{done}/{total}" if total else f"{done} строк"
+                try:
+                    await status.edit_text(f"⏳ <b>{stage_titles[stage]}</b>: {counter}")
+                except Exception:
+                    pass
+            
+            async for session in get_db():
+                user = await UserService(session).get_user_by_telegram_id(message.from_user.id, with_pharmacy=True)
+                if not user or not user.pharmacy:
+                    await message.answer("❌ Ошибка: профиль не найден")
+                    await state.clear()
+                    return
+                
+                try:
+                    with open_spool() as buffer:
+                        await message.bot.download(document, destination=buffer)
+                        buffer.seek(0)
+                        report = await OrderImportService(session).import_order(
+                            stream=buffer,
+                            file_name=document.file_name,
+                            client_id=user.id,
+                            pharmacy_id=user.pharmacy.id,
+                            mime_type=document.mime_type,
+                            progress=report_progress
+                        )
+                except Exception as e:
+                    await status.edit_text(f"❌ Ошибка импорта: {str(e)}")
+                    return
+                
+                errors_text = ""
+                if report["error_count"]:
+                    errors_text = f"\n⚠️ <b>Пропущено строк: {report['error_count']}</b>\n" + "\n".join(
+                        f"• строка {row}: {error}" for row, error in report["errors"][:5]
+                    ) + "\n"
+                if report["truncated"]:
+                    errors_text += f"\n✂️ Обработаны первые {settings.import_max_rows} строк\n"
+                
+                order = report["order"]
+                if order is None:
+                    await status.edit_text(
+                        "❌ <b>В файле не найдено ни одной позиции</b>\n"
+                        f"{errors_text}\n"
+                        "🔄 Исправьте файл и отправьте еще раз"
+                    )
+                    return
+                
+                await status.edit_text(
+                    f"✅ <b>Заявка создана из файла!</b>\n\n"
+                    f"📝 Номер: {order.order_number}\n"
+                    f"📄 Строк в файле: {report['rows']}\n"
+                    f"💊 Позиций: {len(report['items'])}\n"
+                    f"🔎 Не найдено в каталоге: {report['unmatched']}\n"
+                    f"💰 Сумма: {order.total_amount} сомони\n"
+                    f"📊 Статус: {self._get_status_display(order.status)}\n"
+                    f"{errors_text}\n"
+                    f"🔄 Заявка передана оператору"
+                )
+                await state.clear()
+        
         @self.router.message(OrderCreationStates.order_text)
         async def handle_order_text(message: Message, state: FSMContext):
             """Обработка текстового заказа"""
             order_text = message.text
             
             # Парсинг заказа
-            items = self._parse_order_text(order_text)
+            items = parse_order_text(order_text)
             
             if not items:
                 await message.answer(
                     "❌ <b>Ошибка в формате заказа</b>\n\n"
                     "📝 <b>Правильный формат:</b>\n"
-                    "• Название лекарства - количество\n\n"
+                    "• Название лекарства - количество\n"
+                    "• Одна позиция на строку или через запятую\n\n"
                     "📝 <b>Пример:</b>\n"
                     "• Парацетамол - 50 шт\n"
-                    "• Цефтриаксон - 20 ампул\n\n"
+                    "• Цефтриаксон 20 ампул\n"
+                    "• Аспирин 100мг x30\n\n"
                     "🔄 Попробуйте еще раз"
                 )
                 return
@@ -120,12 +409,15 @@ class ClientHandlers:
                 user_service = UserService(session)
                 order_service = OrderService(session)
                 
-                user = await user_service.get_user_by_telegram_id(message.from_user.id)
+                user = await user_service.get_user_by_telegram_id(message.from_user.id, with_pharmacy=True)
                 if not user or not user.pharmacy:
                     await message.answer("❌ Ошибка: профиль не найден")
                     await state.clear()
                     return
                 
+                # Сопоставление с каталогом и цены
+                items = await CatalogService(session).price_items(items)
+                
                 try:
                     order = await order_service.create_order(
                         client_id=user.id,
@@ -148,7 +440,7 @@ class ClientHandlers:
                     )
                     
                     await state.clear()
-                    
+                
                 except Exception as e:
                     await message.answer(f"❌ Ошибка создания заказа: {str(e)}")
                     await state.clear()
@@ -158,16 +450,17 @@ class ClientHandlers:
             """Просмотр заявок клиента"""
             async for session in get_db():
                 user_service = UserService(session)
-                order_service = OrderService(session)
+                summary_service = ClientSummaryService(session)
                 
                 user = await user_service.get_user_by_telegram_id(message.from_user.id)
                 if not user:
                     await message.answer("❌ Пользователь не найден")
                     return
                 
-                orders = await order_service.get_orders_by_client(user.id)
+                # Одна строка сводки вместо загрузки всех заказов клиента
+                summary = await summary_service.get_summary(user.id)
                 
-                if not orders:
+                if not summary.order_count:
                     await message.answer(
                         "📭 <b>У вас пока нет заявок</b>\n\n"
                         "📦 Хотите создать заявку?\n"
@@ -176,21 +469,60 @@ class ClientHandlers:
                     return
                 
                 text = "📋 <b>Ваши заявки</b>\n\n"
+                text += f"📦 Всего: {summary.order_count} • 🔄 В работе: {summary.open_order_count}\n"
+                text += f"💰 На сумму: {float(summary.orders_amount):,.2f} сомони\n"
+                if summary.outstanding > 0:
+                    text += f"💸 Задолженность: {float(summary.outstanding):,.2f} сомони\n"
+                elif summary.outstanding < 0:
+                    text += f"💰 Переплата: {float(-summary.outstanding):,.2f} сомони\n"
+                if summary.last_payment_at:
+                    text += (
+                        f"💳 Последняя оплата: {float(summary.last_payment_amount or 0):,.2f} сомони, "
+                        f"{summary.last_payment_at.strftime('%d.%m.%Y')}\n"
+                    )
+                text += "\n"
                 
-                for order in orders[:10]:  # Последние 10
-                    status_display = self._get_status_display(order.status)
-                    
-                    text += f"📝 <b>{order.order_number}</b>\n"
-                    text += f"📊 Статус: {status_display}\n"
-                    text += f"💰 Сумма: {order.total_amount} сомони\n"
-                    text += f"📅 Создан: {order.created_at.strftime('%d.%m.%Y %H:%M')}\n"
-                    
-                    if order.delivered_at:
-                        text += f"✅ Доставлен: {order.delivered_at.strftime('%d.%m.%Y %H:%M')}\n"
-                    
-                    text += "\n"
+                for entry in summary.recent_orders:
+                    text += self._format_order_entry(entry)
                 
-                await message.answer(text)
+                keyboard = None
+                if summary.order_count > len(summary.recent_orders):
+                    keyboard = InlineKeyboardMarkup(inline_keyboard=[[
+                        InlineKeyboardButton(
+                            text="📜 Вся история",
+                            callback_data=f"my_orders_page_{summary.recent_orders[-1]['id']}"
+                        )
+                    ]])
+                
+                await message.answer(text, reply_markup=keyboard)
+        
+        @self.router.callback_query(F.data.startswith("my_orders_page_"))
+        async def handle_my_orders_page(callback: types.CallbackQuery):
+            """Следующая страница истории заявок"""
+            before_id = int(callback.data.split("_")[-1])
+            async for session in get_db():
+                user = await UserService(session).get_user_by_telegram_id(callback.from_user.id)
+                if not user:
+                    await callback.answer("❌ Пользователь не найден")
+                    return
+                
+                entries, has_more = await ClientSummaryService(session).get_history_page(user.id, before_id)
+                if not entries:
+                    await callback.answer("📭 Больше заявок нет")
+                    return
+                
+                text = "📜 <b>История заявок</b>\n\n"
+                for entry in entries:
+                    text += self._format_order_entry(entry)
+                
+                keyboard = None
+                if has_more:
+                    keyboard = InlineKeyboardMarkup(inline_keyboard=[[
+                        InlineKeyboardButton(text="➡️ Далее", callback_data=f"my_orders_page_{entries[-1]['id']}")
+                    ]])
+                
+                await callback.message.answer(text, reply_markup=keyboard)
+                await callback.answer()
         
         @self.router.message(F.text == "📊 Статус заявки")
         async def handle_order_status(message: Message):
@@ -205,8 +537,28 @@ class ClientHandlers:
         @self.router.message(F.text == "💳 Оплатить заказ")
         async def handle_payment(message: Message):
             """Оплата заказа"""
+            keyboard = None
+            balance_text = ""
+            async for session in get_db():
+                user = await UserService(session).get_user_by_telegram_id(message.from_user.id)
+                if user:
+                    outstanding = await ReconciliationService(session).get_outstanding(user.id)
+                    if outstanding > 0:
+                        balance_text = f"💸 <b>Ваша задолженность:</b> {outstanding} сомони\n\n"
+                    elif outstanding < 0:
+                        balance_text = f"💰 <b>Переплата:</b> {-outstanding} сомони\n\n"
+                    
+                    orders = await ReceiptService(session).get_payable_orders(user.id)
+                    if orders:
+                        keyboard = InlineKeyboardMarkup(inline_keyboard=[
+                            [InlineKeyboardButton(text=f"🧾 Чек к {order.order_number}",
+                                                  callback_data=f"pay_receipt_{order.id}")]
+                            for order in orders
+                        ])
+            
             await message.answer(
                 "💳 <b>Оплата заказа</b>\n\n"
+                f"{balance_text}"
                 "💰 <b>Реквизиты для оплаты:</b>\n\n"
                 "🏦 <b>Банк:</b> Эсхата Банк\n"
                 "📱 <b>Карта:</b> 4242 4242 4242 4242\n"
@@ -216,11 +568,79 @@ class ClientHandlers:
                 "• 💰 Наличными курьеру\n"
                 "• 📱 Банковское приложение\n\n"
                 "📸 <b>После оплаты:</b>\n"
-                "• Отправьте фото чека\n"
+                "• Выберите заявку и отправьте фото чека\n"
                 "• Или номер операции\n\n"
-                "🏥 MAXXPHARM - Спасибо за доверие!"
+                "🏥 MAXXPHARM - Спасибо за доверие!",
+                reply_markup=keyboard
             )
         
+        @self.router.callback_query(F.data.startswith("pay_receipt_"))
+        async def handle_payment_receipt_order(callback: types.CallbackQuery, state: FSMContext):
+            """Выбор заявки для чека"""
+            order_id = int(callback.data.split("_")[2])
+            
+            async for session in get_db():
+                user = await UserService(session).get_user_by_telegram_id(callback.from_user.id)
+                order = await OrderService(session).get_order_by_id(order_id)
+                if not user or not order or order.client_id != user.id:
+                    await callback.answer("❌ Заявка не найдена", show_alert=True)
+                    return
+                
+                await state.set_state(PaymentStates.receipt)
+                await state.update_data(receipt_order_id=order.id, receipt_order_number=order.order_number)
+                await callback.message.answer(
+                    f"🧾 <b>Чек к заявке {order.order_number}</b>\n\n"
+                    f"📸 Отправьте фото или скриншот чека"
+                )
+                await callback.answer()
+        
+        @self.router.message(PaymentStates.receipt, F.photo | F.document)
+        async def handle_payment_receipt(message: Message, state: FSMContext):
+            """Прием чека: оригинал и миниатюра сохраняются, повторный чек отмечается для оператора"""
+            if message.photo:
+                file = message.photo[-1]
+            elif (message.document.mime_type or "").startswith("image/"):
+                file = message.document
+            else:
+                await message.answer("❌ Отправьте фото или скриншот чека")
+                return
+            
+            data = await state.get_data()
+            async for session in get_db():
+                user = await UserService(session).get_user_by_telegram_id(message.from_user.id)
+                if not user:
+                    await message.answer("❌ Ошибка: профиль не найден")
+                    await state.clear()
+                    return
+                
+                receipt_service = ReceiptService(session)
+                try:
+                    stored = await receipt_service.store_receipt(message.bot, file)
+                except Exception as e:
+                    await message.answer(f"❌ Не удалось обработать чек: {str(e)}")
+                    return
+                
+                receipt, created, duplicates = await receipt_service.register(
+                    data["receipt_order_id"], stored, client_id=user.id
+                )
+                await state.clear()
+                
+                if not created:
+                    await message.answer(f"ℹ️ Этот чек уже получен для заявки {data['receipt_order_number']}")
+                    return
+                
+                text = (
+                    f"✅ <b>Чек получен</b>\n\n"
+                    f"📝 Заявка: {data['receipt_order_number']}\n"
+                    f"🔄 Оператор проверит оплату и подтвердит"
+                )
+                if duplicates:
+                    text += (
+                        f"\n\n⚠️ Этот же чек уже отправляли к заявке {duplicates[0].order.order_number}. "
+                        f"Если это ошибка, отправьте чек именно этой оплаты"
+                    )
+                await message.answer(text)
+        
         @self.router.message(F.text == "💬 Связаться с оператором")
         async def handle_contact_operator(message: Message):
             """Связь с оператором"""
@@ -297,77 +717,17 @@ class ClientHandlers:
             
             await message.answer(catalog_text)
     
-    def _parse_order_text(self, text: str) -> List[Dict[str, Any]]:
-        """Парсинг текстового заказа"""
-        items = []
-        lines = text.strip().split('\n')
-        
-        for line in lines:
-            line = line.strip()
-            if not line or line.startswith('•'):
-                line = line.replace('•', '').strip()
-            
-            # Парсинг формата: "Название - количество"
-            if ' - ' in line:
-                parts = line.split(' - ')
-                if len(parts) >= 2:
-                    product_name = parts[0].strip()
-                    quantity_info = parts[1].strip()
-                    
-                    # Извлечение количества
-                    quantity = 1
-                    try:
-                        # Ищем цифры в строке количества
-                        import re
-                        numbers = re.findall(r'\d+', quantity_info)
-                        if numbers:
-                            quantity = int(numbers[0])
-                    except:
-                        pass
-                    
-                    # Расчет примерной цены
-                    unit_price = self._estimate_price(product_name)
-                    
-                    items.append({
-                        'product_name': product_name,
-                        'quantity': quantity,
-                        'unit_price': unit_price
-                    })
-        
-        return items
-    
-    def _estimate_price(self, product_name: str) -> float:
-        """Оценка цены товара"""
-        product_name_lower = product_name.lower()
-        
-        # Базовые цены для популярных товаров
-        price_map = {
-            'парацетамол': 45.0,
-            'ибупрофен': 80.0,
-            'аспирин': 35.0,
-            'анальгин': 25.0,
-            'арбидол': 250.0,
-            'кагоцел': 200.0,
-            'ремантадин': 150.0,
-            'осельтамивир': 300.0,
-            'лозартан': 120.0,
-            'эналаприл': 90.0,
-            'амлодипин': 85.0,
-            'витамин': 50.0,
-            'ромашка': 30.0,
-            'шалфей': 25.0,
-            'эхинацея': 45.0,
-            'цефтриаксон': 150.0,
-            'новокаин': 45.0,
-            'физраствор': 35.0
-        }
+    def _format_order_entry(self, entry: Dict[str, Any]) -> str:
+        """Строки заявки из записи сводки"""
+        text = f"📝 <b>{entry['order_number']}</b>\n"
+        text += f"📊 Статус: {self._get_status_display(entry['status'])}\n"
+        text += f"💰 Сумма: {entry['total_amount']} сомони\n"
+        text += f"📅 Создан: {datetime.fromisoformat(entry['created_at']).strftime('%d.%m.%Y %H:%M')}\n"
         
-        for key, price in price_map.items():
-            if key in product_name_lower:
-                return price
+        if entry['delivered_at']:
+            text += f"✅ Доставлен: {datetime.fromisoformat(entry['delivered_at']).strftime('%d.%m.%Y %H:%M')}\n"
         
-        # Стандартная цена для неизвестных товаров
-        return 100.0
+        return text + "\n"
     
     def _get_status_display(self, status: str) -> str:
         """Получение отображения статуса"""
@@ -159,6 +159,7 @@ class CommonHandlers:
                     KeyboardButton(text="🔐 Управление админами")
                 ],
                 [
+                    KeyboardButton(text="🗺 Зоны"),
                     KeyboardButton(text="🚪 Выход")
                 ]
             ],
@@ -382,7 +383,10 @@ class CommonHandlers:
                     KeyboardButton(text="📊 Статистика")
                 ],
                 [
-                    KeyboardButton(text="🗺️ Карта"),
+                    KeyboardButton(text="📦 Готовые к доставке"),
+                    KeyboardButton(text="🗺️ Карта")
+                ],
+                [
                     KeyboardButton(text="🚪 Выход")
                 ]
             ],
@@ -6,12 +6,13 @@ from typing import List, Dict, Any
 from aiogram import Router, F, types
 from aiogram.fsm.context import FSMContext
 from aiogram.types import Message, ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
-from aiogram.types import Location as TelegramLocation
 
 from ..models.database import UserRole, OrderStatus
 from ..services.user_service import UserService
 from ..services.order_service import OrderService
 from ..services.location_service import LocationService
+from ..services.dispatch_service import DispatchService
+from ..services.route_service import RouteService
 from ..database import get_db
 
 
@@ -38,8 +39,7 @@ class CourierHandlers:
                     return
                 
                 # Получаем заказы курьера в пути
-                transit_orders = await order_service.get_orders_by_status(OrderStatus.IN_DELIVERY)
-                transit_orders = [order for order in transit_orders if order.courier_id == user.id]
+                transit_orders = await order_service.get_orders_by_status(OrderStatus.IN_DELIVERY, courier_id=user.id)
                 
                 if not transit_orders:
                     await message.answer(
@@ -62,31 +62,93 @@ class CourierHandlers:
                 
                 await message.answer(text)
         
+        @self.router.message(F.text == "📦 Готовые к доставке")
+        async def handle_ready_for_delivery(message: Message):
+            """Готовые к доставке заказы зоны курьера, сгруппированные в рейсы"""
+            async for session in get_db():
+                user_service = UserService(session)
+                route_service = RouteService(session)
+                
+                user = await user_service.get_user_by_telegram_id(message.from_user.id)
+                if not user or user.role != UserRole.COURIER:
+                    await message.answer("❌ Доступ запрещен")
+                    return
+                
+                plan = await route_service.plan_ready_orders(user.zone)
+                
+                if not plan['orders']:
+                    await message.answer(
+                        "📭 <b>Готовых к доставке заказов нет</b>\n\n"
+                        f"📍 Зона: {user.zone or 'все зоны'}"
+                    )
+                    return
+                
+                text = f"📦 <b>Готовые к доставке ({plan['orders']})</b>\n"
+                text += f"📍 Зона: {user.zone or 'все зоны'} • 🚚 Рейсов: {len(plan['trips'])}\n\n"
+                
+                for number, trip in enumerate(plan['trips'][:10], 1):
+                    couriers = {courier_id for stop in trip['stops'] for courier_id in stop['courier_ids']}
+                    if couriers == {user.id}:
+                        owner = "ваш"
+                    elif couriers == {None}:
+                        owner = "свободен"
+                    else:
+                        owner = "назначен" if None not in couriers else "частично назначен"
+                    
+                    text += f"🚚 <b>Рейс {number}</b> ({owner}): {len(trip['stops'])} точек, "
+                    text += f"{trip['distance_km']} км, ~{trip['total_minutes']} мин\n"
+                    for stop in trip['stops']:
+                        text += f"   📍 {stop['address']} - {', '.join(stop['order_numbers'])}\n"
+                    text += "\n"
+                
+                if plan['unrouted']:
+                    text += f"⚠️ <b>Без координат:</b> {', '.join(plan['unrouted'])}\n"
+                
+                await message.answer(text)
+        
         @self.router.message(F.text == "📍 Маршрут")
         async def handle_route(message: Message):
             """Просмотр маршрута"""
-            await message.answer(
-                "📍 <b>Маршрут доставки</b>\n\n"
-                "🗺️ <b>Ваш маршрут на сегодня:</b>\n\n"
-                "🚚 <b>Активные доставки:</b>\n"
-                "• 📍 Ул. Рудаки 15 - 2 заказа\n"
-                "• 📍 Ул. Сомони 42 - 1 заказ\n"
-                "• 📍 Ул. Исмоили Сомони 88 - 1 заказ\n\n"
-                "📊 <b>Статистика маршрута:</b>\n"
-                "• 📦 Всего заказов: 4\n"
-                "• 🚚 Общее расстояние: 12.5 км\n"
-                "• ⏱️ Примерное время: 2.5 часа\n"
-                "• 💰 Общая сумма: 2,450 сомони\n\n"
-                "🎯 <b>Оптимальный порядок:</b>\n"
-                "1. 📍 Ул. Рудаки 15 (ближайшая)\n"
-                "2. 📍 Ул. Сомони 42\n"
-                "3. 📍 Ул. Исмоили Сомони 88\n\n"
-                "🗺️ <b>Для навигации:</b>\n"
-                "• 📍 Отправьте геолокацию\n"
-                "• 🗺️ Используйте Google Maps\n"
-                "• 📞 Свяжитесь с клиентами\n\n"
-                "🏥 MAXXPHARM CRM - Умная логистика"
-            )
+            async for session in get_db():
+                user_service = UserService(session)
+                route_service = RouteService(session)
+                
+                user = await user_service.get_user_by_telegram_id(message.from_user.id)
+                if not user or user.role != UserRole.COURIER:
+                    await message.answer("❌ Доступ запрещен")
+                    return
+                
+                route = await route_service.plan_courier_route(user.id)
+                
+                if not route['orders']:
+                    await message.answer(
+                        "📍 <b>Маршрут доставки</b>\n\n"
+                        "📭 Нет активных доставок"
+                    )
+                    return
+                
+                text = "📍 <b>Маршрут доставки</b>\n\n"
+                text += "🎯 <b>Оптимальный порядок:</b>\n"
+                
+                total_amount = 0.0
+                for number, stop in enumerate(route['stops'], 1):
+                    total_amount += stop['total_amount']
+                    text += f"{number}. 📍 {stop['address']}\n"
+                    text += f"   📦 {', '.join(stop['order_numbers'])}\n"
+                    text += f"   🚚 {stop['leg_km']} км • ⏱️ ~{stop['arrival_minutes']} мин\n"
+                
+                if route['unrouted']:
+                    text += "\n⚠️ <b>Без координат:</b>\n"
+                    text += f"• {', '.join(route['unrouted'])}\n"
+                
+                text += "\n📊 <b>Статистика маршрута:</b>\n"
+                text += f"• 📦 Всего заказов: {route['orders']}\n"
+                text += f"• 🚚 Общее расстояние: {route['distance_km']} км\n"
+                text += f"• ⏱️ Примерное время: {route['total_minutes']} мин\n"
+                text += f"• 💰 Общая сумма: {total_amount:,.0f} сомони\n\n"
+                text += "📍 Отправьте геолокацию для пересчета маршрута"
+                
+                await message.answer(text)
         
         @self.router.message(F.text == "✅ Доставлено")
         async def handle_delivered(message: Message):
@@ -101,8 +163,7 @@ class CourierHandlers:
                     return
                 
                 # Получаем заказы курьера в пути
-                transit_orders = await order_service.get_orders_by_status(OrderStatus.IN_DELIVERY)
-                transit_orders = [order for order in transit_orders if order.courier_id == user.id]
+                transit_orders = await order_service.get_orders_by_status(OrderStatus.IN_DELIVERY, courier_id=user.id)
                 
                 if not transit_orders:
                     await message.answer(
@@ -206,8 +267,9 @@ class CourierHandlers:
             )
         
         @self.router.message(F.location)
-        async def handle_location(message: Message, location: TelegramLocation):
+        async def handle_location(message: Message):
             """Обработка геолокации"""
+            location = message.location
             async for session in get_db():
                 user_service = UserService(session)
                 location_service = LocationService(session)
@@ -226,6 +288,11 @@ class CourierHandlers:
                         accuracy=location.horizontal_accuracy
                     )
                     
+                    # Обновляем позицию в индексе диспетчеризации
+                    DispatchService(session).update_position(
+                        courier.id, location.latitude, location.longitude
+                    )
+                    
                     await message.answer(
                         f"📍 <b>Геолокация получена!</b>\n\n"
                         f"🗺️ <b>Координаты:</b>\n"
@@ -237,7 +304,7 @@ class CourierHandlers:
                         f"🚚 Маршрут отслеживается в реальном времени\n\n"
                         f"🏥 MAXXPHARM CRM - Безопасная доставка!"
                     )
-                    
+                
                 except Exception as e:
                     await message.answer(
                         f"❌ <b>Ошибка сохранения геолокации</b>\n\n"
@@ -261,8 +328,7 @@ class CourierHandlers:
                     return
                 
                 # Получаем заказы курьера
-                transit_orders = await order_service.get_orders_by_status(OrderStatus.IN_DELIVERY)
-                transit_orders = [order for order in transit_orders if order.courier_id == user.id]
+                transit_orders = await order_service.get_orders_by_status(OrderStatus.IN_DELIVERY, courier_id=user.id)
                 
                 if not transit_orders:
                     await message.answer(
@@ -299,12 +365,10 @@ class CourierHandlers:
                     return
                 
                 # Получаем статистику заказов курьера
-                all_orders = await order_service.get_orders_by_status(OrderStatus.DELIVERED)
-                courier_orders = [order for order in all_orders if order.courier_id == user.id]
+                courier_orders = await order_service.get_orders_by_status(OrderStatus.DELIVERED, courier_id=user.id)
                 
                 # Заказы в пути
-                transit_orders = await order_service.get_orders_by_status(OrderStatus.IN_DELIVERY)
-                courier_transit = [order for order in transit_orders if order.courier_id == user.id]
+                courier_transit = await order_service.get_orders_by_status(OrderStatus.IN_DELIVERY, courier_id=user.id)
                 
                 # Рассчитываем статистику
                 total_delivered = len(courier_orders)
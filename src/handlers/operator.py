@@ -6,10 +6,13 @@ from typing import List, Dict, Any
 from aiogram import Router, F, types
 from aiogram.fsm.context import FSMContext
 from aiogram.types import Message, ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.types import FSInputFile, InputMediaPhoto, URLInputFile
 
 from ..models.database import UserRole, OrderStatus
 from ..services.user_service import UserService
 from ..services.order_service import OrderService
+from ..services.media_service import MediaService
+from ..services.receipt_service import ReceiptService, receipt_link
 from ..database import get_db
 
 
@@ -49,6 +52,9 @@ class OperatorHandlers:
                 text = f"📥 <b>Новые заявки ({len(new_orders)})</b>\n\n"
                 
                 keyboard_buttons = []
+                photo_counts = await MediaService(session).count_attachments(
+                    [order.id for order in new_orders[:10]]
+                )
                 
                 for i, order in enumerate(new_orders[:10], 1):  # Показываем первые 10
                     status_display = self._get_status_display(order.status)
@@ -63,6 +69,15 @@ class OperatorHandlers:
                     if order.notes:
                         text += f"📝 Примечание: {order.notes[:50]}...\n"
                     
+                    if photo_counts.get(order.id):
+                        text += f"📷 Фото рецепта: {photo_counts[order.id]}\n"
+                        keyboard_buttons.append([
+                            InlineKeyboardButton(
+                                text=f"📷 Фото {order.order_number}",
+                                callback_data=f"prescription_{order.id}"
+                            )
+                        ])
+                    
                     text += "\n"
                     
                     # Кнопки действий
@@ -81,6 +96,31 @@ class OperatorHandlers:
                 
                 await message.answer(text, reply_markup=keyboard)
         
+        @self.router.callback_query(F.data.startswith("prescription_"))
+        async def handle_prescription_photos(callback: types.CallbackQuery):
+            """Просмотр фото рецепта заявки"""
+            order_id = int(callback.data.split("_")[1])
+            
+            async for session in get_db():
+                operator = await UserService(session).get_user_by_telegram_id(callback.from_user.id)
+                if not operator or operator.role != UserRole.OPERATOR:
+                    await callback.answer("❌ Доступ запрещен", show_alert=True)
+                    return
+                
+                media_service = MediaService(session)
+                attachments = await media_service.get_attachments(order_id)
+                if not attachments:
+                    await callback.answer("📭 Фото не найдены", show_alert=True)
+                    return
+                
+                # Альбом Telegram - не больше 10 фото
+                for start in range(0, len(attachments), 10):
+                    await callback.message.answer_media_group([
+                        InputMediaPhoto(media=FSInputFile(media_service.file_path(attachment)))
+                        for attachment in attachments[start:start + 10]
+                    ])
+                await callback.answer()
+        
         @self.router.callback_query(F.data.startswith("accept_order_"))
         async def handle_accept_order(callback: types.CallbackQuery):
             """Подтверждение заказа"""
@@ -147,8 +187,8 @@ class OperatorHandlers:
                     await message.answer("❌ Доступ запрещен")
                     return
                 
-                # Получаем заказы в работе
-                work_orders = await order_service.get_orders_by_status(OrderStatus.CONFIRMED)
+                # Получаем заказы в работе (только зона оператора, если она задана)
+                work_orders = await order_service.get_orders_by_status(OrderStatus.CONFIRMED, zone=user.zone)
                 
                 if not work_orders:
                     await message.answer(
@@ -171,25 +211,121 @@ class OperatorHandlers:
         
         @self.router.message(F.text == "💳 Оплата")
         async def handle_payment_check(message: Message):
-            """Проверка оплаты"""
-            await message.answer(
-                "💳 <b>Проверка оплаты</b>\n\n"
-                "📋 <b>Как проверить оплату:</b>\n\n"
-                "1. 📸 Фото чека\n"
-                "   • Клиент отправляет фото\n"
-                "   • Проверяйте реквизиты\n"
-                "   • Сумма и получатель\n\n"
-                "2. 📱 Номер операции\n"
-                "   • Запросите у клиента\n"
-                "   • Проверьте в системе\n\n"
-                "3. 💰 Наличные\n"
-                "   • Курьер подтверждает\n"
-                "   • Торговый представитель\n\n"
-                "📊 <b>После проверки:</b>\n"
-                "• ✅ Подтвердите оплату\n"
-                "• ❌ Укажите проблему\n\n"
-                "🏥 MAXXPHARM - Контроль платежей"
-            )
+            """Проверка оплаты: чеки клиентов, ожидающие решения"""
+            async for session in get_db():
+                operator = await UserService(session).get_user_by_telegram_id(message.from_user.id)
+                if not operator or operator.role != UserRole.OPERATOR:
+                    await message.answer("❌ Доступ запрещен")
+                    return
+                
+                receipt_service = ReceiptService(session)
+                receipts = await receipt_service.get_pending_receipts()
+                
+                if not receipts:
+                    await message.answer(
+                        "💳 <b>Проверка оплаты</b>\n\n"
+                        "📭 Новых чеков нет\n\n"
+                        "📋 <b>Как проверить оплату:</b>\n\n"
+                        "1. 📸 Фото чека\n"
+                        "   • Клиент отправляет фото\n"
+                        "   • Проверяйте реквизиты\n"
+                        "   • Сумма и получатель\n\n"
+                        "2. 📱 Номер операции\n"
+                        "   • Запросите у клиента\n"
+                        "   • Проверьте в системе\n\n"
+                        "3. 💰 Наличные\n"
+                        "   • Курьер подтверждает\n"
+                        "   • Торговый представитель\n\n"
+                        "🏥 MAXXPHARM - Контроль платежей"
+                    )
+                    return
+                
+                await message.answer(f"💳 <b>Чеки на проверке ({len(receipts)})</b>")
+                
+                for receipt in receipts:
+                    caption = (
+                        f"🧾 <b>{receipt.order.order_number}</b>\n"
+                        f"👤 Клиент: {receipt.client.full_name if receipt.client else '-'}\n"
+                        f"💰 Сумма заказа: {receipt.order.total_amount} сомони\n"
+                        f"📅 Получен: {receipt.created_at.strftime('%d.%m.%Y %H:%M')}"
+                    )
+                    if receipt.duplicate_of:
+                        caption += (
+                            f"\n\n⚠️ <b>Этот же чек уже присылали к заявке "
+                            f"{receipt.duplicate_of.order.order_number}</b>"
+                        )
+                    
+                    link = receipt_link(receipt.storage_path)
+                    original_button = (
+                        InlineKeyboardButton(text="🧾 Оригинал", url=link) if link
+                        else InlineKeyboardButton(text="🧾 Оригинал", callback_data=f"receipt_view_{receipt.id}")
+                    )
+                    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+                        [original_button],
+                        [
+                            InlineKeyboardButton(text="✅ Оплата верна", callback_data=f"receipt_accept_{receipt.id}"),
+                            InlineKeyboardButton(text="❌ Проблема", callback_data=f"receipt_reject_{receipt.id}")
+                        ]
+                    ])
+                    
+                    thumbnail = receipt_service.media_source(receipt.thumbnail_path or receipt.storage_path)
+                    await message.answer_photo(
+                        self._input_file(thumbnail),
+                        caption=caption,
+                        reply_markup=keyboard
+                    )
+        
+        @self.router.callback_query(F.data.startswith("receipt_view_"))
+        async def handle_receipt_original(callback: types.CallbackQuery):
+            """Оригинал чека файлом (без пережатия Telegram)"""
+            receipt_id = int(callback.data.split("_")[2])
+            
+            async for session in get_db():
+                operator = await UserService(session).get_user_by_telegram_id(callback.from_user.id)
+                if not operator or operator.role != UserRole.OPERATOR:
+                    await callback.answer("❌ Доступ запрещен", show_alert=True)
+                    return
+                
+                receipt_service = ReceiptService(session)
+                receipt = await receipt_service.get_receipt(receipt_id)
+                if not receipt:
+                    await callback.answer("📭 Чек не найден", show_alert=True)
+                    return
+                
+                await callback.message.answer_document(
+                    self._input_file(receipt_service.media_source(receipt.storage_path)),
+                    caption=f"🧾 Чек к заявке {receipt.order.order_number}"
+                )
+                await callback.answer()
+        
+        @self.router.callback_query(F.data.startswith("receipt_accept_") | F.data.startswith("receipt_reject_"))
+        async def handle_receipt_review(callback: types.CallbackQuery):
+            """Решение оператора по чеку"""
+            _, action, receipt_id = callback.data.split("_")
+            
+            async for session in get_db():
+                operator = await UserService(session).get_user_by_telegram_id(callback.from_user.id)
+                if not operator or operator.role != UserRole.OPERATOR:
+                    await callback.answer("❌ Доступ запрещен", show_alert=True)
+                    return
+                
+                try:
+                    receipt, payment = await ReceiptService(session).review(int(receipt_id), operator.id, action == "accept")
+                except ValueError as e:
+                    await callback.answer(f"⚠️ {e}", show_alert=True)
+                    return
+                if not receipt:
+                    await callback.answer("📭 Чек не найден", show_alert=True)
+                    return
+                
+                verdict = "✅ Оплата подтверждена" if action == "accept" else "❌ Оплата не подтверждена"
+                if payment is not None:
+                    verdict += f" ({payment.amount} сомони)"
+                
+                await callback.message.edit_caption(
+                    caption=f"{callback.message.caption}\n\n{verdict}: {operator.full_name}"
+                )
+                await callback.answer(verdict)
         
         @self.router.message(F.text == "✅ Принять")
         async def handle_quick_accept(message: Message):
@@ -274,6 +410,12 @@ class OperatorHandlers:
                 
                 await message.answer(text)
     
+    def _input_file(self, source: str):
+        """Файл для отправки в Telegram: локальный путь или ссылка объектного хранилища"""
+        if source.startswith(("http://", "https://")):
+            return URLInputFile(source)
+        return FSInputFile(source)
+    
     def _get_status_display(self, status: str) -> str:
         """Получение отображения статуса"""
         status_map = {
@@ -0,0 +1,192 @@
+"""
+💼 Обработчики торговых представителей MAXXPHARM CRM
+"""
+
+from decimal import Decimal, InvalidOperation
+from aiogram import Router, F, types
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
+
+from ..models.database import UserRole
+from ..services.user_service import UserService
+from ..services.collection_service import CollectionService
+from ..services.reconciliation_service import ReconciliationService
+from ..database import get_db
+
+
+class CollectionStates(StatesGroup):
+    """Состояния фиксации оплаты долга"""
+    amount = State()
+
+
+class SalesRepHandlers:
+    """Обработчики для торговых представителей"""
+    
+    def __init__(self):
+        self.router = Router()
+        self._register_handlers()
+    
+    def _register_handlers(self):
+        """Регистрация обработчиков"""
+        
+        @self.router.message(F.text == "💰 Долги")
+        async def handle_debts(message: Message):
+            """Должники представителя по приоритету"""
+            async for session in get_db():
+                user = await UserService(session).get_user_by_telegram_id(message.from_user.id)
+                if not user or user.role != UserRole.SALES_REP:
+                    await message.answer("❌ Доступ запрещен")
+                    return
+                
+                collection_service = CollectionService(session)
+                worklist = await collection_service.get_worklist(user.id)
+                if not worklist:
+                    await message.answer(
+                        "💰 <b>Долги клиентов</b>\n\n"
+                        "✅ Должников в вашей зоне нет"
+                    )
+                    return
+                
+                text = f"💰 <b>Должники по приоритету ({len(worklist)})</b>\n\n"
+                for number, item in enumerate(worklist, 1):
+                    data = collection_service.to_dict(item)
+                    text += f"{number}. 🏥 <b>{data['pharmacy_name'] or data['client_name']}</b>\n"
+                    text += f"   💰 {data['outstanding']:,.0f} сомони • 📄 {data['debt_count']} • ⏳ {data['age_days']} дн.\n"
+                    text += f"   📞 {data['phone'] or 'Не указан'}\n"
+                
+                await message.answer(text)
+        
+        @self.router.message(F.text == "🗺️ Маршрут")
+        async def handle_collection_route(message: Message):
+            """План визитов на день"""
+            async for session in get_db():
+                user = await UserService(session).get_user_by_telegram_id(message.from_user.id)
+                if not user or user.role != UserRole.SALES_REP:
+                    await message.answer("❌ Доступ запрещен")
+                    return
+                
+                plan = await CollectionService(session).plan_day(user.id)
+                if not plan['visits'] and not plan['without_location']:
+                    await message.answer(
+                        "🗺️ <b>План визитов</b>\n\n"
+                        "📭 Нет должников для посещения"
+                    )
+                    return
+                
+                text = "🗺️ <b>План визитов на сегодня</b>\n\n"
+                for number, visit in enumerate(plan['visits'], 1):
+                    text += f"{number}. 🏥 {visit['pharmacy_name'] or visit['client_name']}\n"
+                    text += f"   📍 {visit['address'] or 'Адрес не указан'}\n"
+                    text += f"   💰 {visit['outstanding']:,.0f} сомони • 🚗 {visit['leg_km']} км • ⏱️ ~{visit['arrival_minutes']} мин\n"
+                
+                if plan['without_location']:
+                    text += "\n⚠️ <b>Без координат:</b>\n"
+                    for visit in plan['without_location']:
+                        text += f"• {visit['pharmacy_name'] or visit['client_name']} - {visit['outstanding']:,.0f} сомони\n"
+                
+                text += "\n📊 <b>Итого:</b>\n"
+                text += f"• 🚗 Расстояние: {plan['distance_km']} км\n"
+                text += f"• ⏱️ Время: {plan['total_minutes']} мин\n"
+                text += f"• 💰 К сбору: {plan['expected_amount']:,.0f} сомони"
+                
+                await message.answer(text)
+        
+        @self.router.message(F.text == "💸 Фиксировать оплату")
+        async def handle_record_payment(message: Message):
+            """Выбор клиента для фиксации оплаты"""
+            async for session in get_db():
+                user = await UserService(session).get_user_by_telegram_id(message.from_user.id)
+                if not user or user.role != UserRole.SALES_REP:
+                    await message.answer("❌ Доступ запрещен")
+                    return
+                
+                worklist = await CollectionService(session).get_worklist(user.id)
+                if not worklist:
+                    await message.answer("✅ Должников для оплаты нет")
+                    return
+                
+                keyboard = InlineKeyboardMarkup(inline_keyboard=[
+                    [InlineKeyboardButton(
+                        text=f"💸 {item.pharmacy_name or item.client_name} - {float(item.outstanding):,.0f}",
+                        callback_data=f"collect_{item.client_id}"
+                    )]
+                    for item in worklist
+                ])
+                await message.answer("💸 <b>Выберите клиента:</b>", reply_markup=keyboard)
+        
+        @self.router.callback_query(F.data.startswith("collect_"))
+        async def handle_collect_client(callback: types.CallbackQuery, state: FSMContext):
+            """Клиент выбран - ожидание суммы"""
+            client_id = int(callback.data.split("_")[1])
+            async for session in get_db():
+                user = await UserService(session).get_user_by_telegram_id(callback.from_user.id)
+                if not user or user.role != UserRole.SALES_REP:
+                    await callback.answer("❌ Доступ запрещен")
+                    return
+                
+                outstanding = await ReconciliationService(session).get_outstanding(client_id)
+                await state.set_state(CollectionStates.amount)
+                await state.update_data(collect_client_id=client_id)
+                await callback.message.answer(
+                    f"💰 Задолженность клиента: <b>{outstanding:,.2f} сомони</b>\n\n"
+                    "✍️ Введите полученную сумму:"
+                )
+                await callback.answer()
+        
+        @self.router.message(CollectionStates.amount)
+        async def handle_collect_amount(message: Message, state: FSMContext):
+            """Фиксация полученной суммы"""
+            try:
+                amount = Decimal((message.text or "").replace(",", ".").replace(" ", ""))
+            except InvalidOperation:
+                await message.answer("❌ Введите сумму числом, например: 1500")
+                return
+            
+            data = await state.get_data()
+            client_id = data.get("collect_client_id")
+            async for session in get_db():
+                user = await UserService(session).get_user_by_telegram_id(message.from_user.id)
+                if not user or user.role != UserRole.SALES_REP or client_id is None:
+                    await state.clear()
+                    await message.answer("❌ Доступ запрещен")
+                    return
+                
+                reconciliation_service = ReconciliationService(session)
+                try:
+                    payments = await reconciliation_service.apply_client_payment(
+                        client_id, amount, recorded_by=user.id
+                    )
+                except ValueError as e:
+                    await message.answer(f"❌ {e}")
+                    return
+                
+                await state.clear()
+                outstanding = await reconciliation_service.get_outstanding(client_id)
+                await message.answer(
+                    f"✅ <b>Оплата зафиксирована: {amount:,.2f} сомони</b>\n\n"
+                    f"📦 Заказов погашено: {len(payments)}\n"
+                    f"💰 Остаток долга: {max(outstanding, Decimal('0')):,.2f} сомони"
+                )
+        
+        @self.router.message(F.text == "📋 История")
+        async def handle_collection_history(message: Message):
+            """Последние собранные оплаты"""
+            async for session in get_db():
+                user = await UserService(session).get_user_by_telegram_id(message.from_user.id)
+                if not user or user.role != UserRole.SALES_REP:
+                    await message.answer("❌ Доступ запрещен")
+                    return
+                
+                payments = await CollectionService(session).get_collection_history(user.id)
+                if not payments:
+                    await message.answer("📋 <b>История сборов пуста</b>")
+                    return
+                
+                text = f"📋 <b>Последние сборы ({len(payments)})</b>\n\n"
+                for payment in payments:
+                    text += f"💸 {float(payment.amount):,.0f} сомони • 📦 {payment.order.order_number if payment.order else '-'}\n"
+                    if payment.created_at:
+                        text += f"   🕐 {payment.created_at.strftime('%d.%m.%Y %H:%M')}\n"
+                
+                await message.answer(text)
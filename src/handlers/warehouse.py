@@ -0,0 +1,65 @@
+"""
+📦 Обработчики склада (сборщики и проверщики) MAXXPHARM CRM
+"""
+
+from typing import List, Optional
+
+from aiogram import Router, F
+from aiogram.types import Message
+
+from ..models.database import UserRole, Order
+from ..services.user_service import UserService
+from ..services.order_service import OrderService
+from ..database import get_db
+
+
+class WarehouseHandlers:
+    """Обработчики для сборщиков и проверщиков: очереди своей зоны"""
+    
+    def __init__(self):
+        self.router = Router()
+        self._register_handlers()
+    
+    def _register_handlers(self):
+        """Регистрация обработчиков"""
+        
+        @self.router.message(F.text == "📋 Список")
+        async def handle_collector_queue(message: Message):
+            """Очередь подтвержденных заказов зоны сборщика"""
+            async for session in get_db():
+                user = await UserService(session).get_user_by_telegram_id(message.from_user.id)
+                if not user or user.role != UserRole.COLLECTOR:
+                    await message.answer("❌ Доступ запрещен")
+                    return
+                
+                orders = await OrderService(session).get_orders_for_collector(user.zone)
+                await message.answer(self._format_queue("📋 Заказы на сборку", orders, user.zone))
+        
+        @self.router.message(F.text == "🔍 На проверке")
+        async def handle_checker_queue(message: Message):
+            """Очередь собранных заказов зоны проверщика"""
+            async for session in get_db():
+                user = await UserService(session).get_user_by_telegram_id(message.from_user.id)
+                if not user or user.role != UserRole.CHECKER:
+                    await message.answer("❌ Доступ запрещен")
+                    return
+                
+                orders = await OrderService(session).get_orders_for_checker(user.zone)
+                await message.answer(self._format_queue("🔍 Заказы на проверку", orders, user.zone))
+    
+    def _format_queue(self, title: str, orders: List[Order], zone: Optional[str]) -> str:
+        """Текст очереди: старые заказы первыми"""
+        zone_text = zone or "все зоны"
+        if not orders:
+            return f"📭 <b>{title}: очередь пуста</b>\n\n📍 Зона: {zone_text}"
+        
+        text = f"<b>{title} ({len(orders)})</b>\n"
+        text += f"📍 Зона: {zone_text}\n\n"
+        
+        for order in orders[:10]:
+            text += f"📝 <b>{order.order_number}</b>\n"
+            text += f"🏥 Аптека: {order.pharmacy.name}\n"
+            text += f"📦 Позиций: {len(order.items)}\n"
+            text += f"📅 Создан: {order.created_at.strftime('%d.%m.%Y %H:%M')}\n\n"
+        
+        return text
@@ -4,10 +4,13 @@
 
 import asyncio
 import logging
+import mimetypes
+import os
 from contextlib import asynccontextmanager
+from typing import Optional
 
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, FileResponse, RedirectResponse, Response
 
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
@@ -15,12 +18,24 @@ from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.types import Update
 
 from .config import settings
-from .database import init_db, close_db, db_manager
+from .database import init_db, close_db
+from .metrics import metrics, instrument_dispatcher
 from .handlers.common import CommonHandlers
 from .handlers.client import ClientHandlers
 from .handlers.operator import OperatorHandlers
 from .handlers.admin import AdminHandlers
 from .handlers.courier import CourierHandlers
+from .handlers.warehouse import WarehouseHandlers
+from .handlers.sales_rep import SalesRepHandlers
+from .services.media_service import image_processor
+from .services.voice_service import voice_queue
+from .services.reconciliation_service import nightly_reconciler
+from .services.audit_service import audit_log
+from .services.partition_service import partition_manager
+from .services.health_service import health_monitor
+from .replicas import replica_router, ActorMiddleware
+from .sessions import session_tracker, SessionMiddleware
+from .services.receipt_service import get_receipt_storage, receipt_relative_path, verify_receipt_link
 
 
 # Настройка логирования
@@ -35,6 +50,9 @@ logger = logging.getLogger(__name__)
 bot = None
 dp = None
 
+# Файлы чеков адресуются по sha256 и не меняются
+RECEIPT_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -61,6 +79,24 @@ async def lifespan(app: FastAPI):
     await register_handlers()
     logger.info("✅ Handlers registered")
     
+    # Ночная сверка оплат
+    nightly_reconciler.start()
+    
+    # Секции журналов наперед и срок хранения
+    partition_manager.start()
+    
+    # Снимок статистики для /health и /stats
+    health_monitor.start()
+    
+    # Проверка отставания реплик для отчетов
+    replica_router.start()
+    
+    # Потерянные и долгие сессии базы
+    session_tracker.start()
+    
+    # Пакетная запись журнала действий
+    audit_log.start()
+    
     # Запуск бота в фоновом режиме
     asyncio.create_task(start_bot_polling())
     
@@ -70,6 +106,14 @@ async def lifespan(app: FastAPI):
     
     # Остановка
     logger.info("🛑 Shutting down MAXXPHARM CRM...")
+    image_processor.shutdown()
+    await voice_queue.shutdown()
+    await nightly_reconciler.stop()
+    await partition_manager.stop()
+    await health_monitor.stop()
+    await replica_router.stop()
+    await session_tracker.stop()
+    await audit_log.stop()
     await close_db()
     logger.info("✅ Database closed")
 
@@ -83,27 +127,46 @@ app = FastAPI(
 )
 
 
-async def register_handlers():
-    """Регистрация всех обработчиков"""
+async def register_handlers(dispatcher: Optional[Dispatcher] = None):
+    """Регистрация всех обработчиков (по умолчанию - в диспетчер приложения)"""
+    dispatcher = dispatcher or dp
+    
     # Общие обработчики
     common_handlers = CommonHandlers()
-    dp.include_router(common_handlers.router)
+    dispatcher.include_router(common_handlers.router)
     
     # Обработчики клиентов
     client_handlers = ClientHandlers()
-    dp.include_router(client_handlers.router)
+    dispatcher.include_router(client_handlers.router)
     
     # Обработчики операторов
     operator_handlers = OperatorHandlers()
-    dp.include_router(operator_handlers.router)
+    dispatcher.include_router(operator_handlers.router)
     
     # Обработчики администраторов
     admin_handlers = AdminHandlers()
-    dp.include_router(admin_handlers.router)
+    dispatcher.include_router(admin_handlers.router)
     
     # Обработчики курьеров
     courier_handlers = CourierHandlers()
-    dp.include_router(courier_handlers.router)
+    dispatcher.include_router(courier_handlers.router)
+    
+    # Обработчики склада (сборщики и проверщики)
+    warehouse_handlers = WarehouseHandlers()
+    dispatcher.include_router(warehouse_handlers.router)
+    
+    # Обработчики торговых представителей
+    sales_rep_handlers = SalesRepHandlers()
+    dispatcher.include_router(sales_rep_handlers.router)
+    
+    # Время и запросы к базе по каждому обработчику (/metrics)
+    instrument_dispatcher(dispatcher)
+    
+    # Пользователь обновления: после его записи отчеты читаются из основной базы
+    dispatcher.update.outer_middleware(ActorMiddleware())
+    
+    # Одна сессия базы на обновление: открывается по требованию, фиксируется в конце
+    dispatcher.update.outer_middleware(SessionMiddleware())
     
     logger.info("✅ All handlers registered")
 
@@ -133,33 +196,30 @@ async def webhook(request: Request):
         return JSONResponse({"status": "error", "message": str(e)}, status_code=500)
 
 
+@app.get("/health/live")
+async def liveness_check():
+    """Liveness: процесс отвечает (без обращения к базе и Telegram)"""
+    return JSONResponse(health_monitor.liveness())
+
+
+@app.get("/health/ready")
+async def readiness_check():
+    """Readiness: соединение из пула и кешированная проверка бота"""
+    readiness = await health_monitor.readiness(bot)
+    return JSONResponse(readiness, status_code=503 if readiness["status"] == "unhealthy" else 200)
+
+
 @app.get("/health")
 async def health_check():
-    """Проверка здоровья приложения"""
+    """Проверка здоровья приложения: readiness и снимок статистики"""
     try:
-        # Проверка базы данных
-        db_healthy = await db_manager.health_check()
-        
-        # Проверка бота
-        bot_healthy = False
-        if bot:
-            try:
-                await bot.get_me()
-                bot_healthy = True
-            except:
-                pass
-        
-        # Статистика
-        stats = await db_manager.get_stats()
-        
+        readiness = await health_monitor.readiness(bot)
         return JSONResponse({
-            "status": "healthy" if db_healthy and bot_healthy else "unhealthy",
-            "database": db_healthy,
-            "bot": bot_healthy,
-            "stats": stats,
+            **readiness,
+            "stats": await health_monitor.get_stats(),
             "timestamp": asyncio.get_event_loop().time()
-        })
-        
+        }, status_code=503 if readiness["status"] == "unhealthy" else 200)
+    
     except Exception as e:
         logger.error(f"❌ Health check error: {e}")
         return JSONResponse({
@@ -177,7 +237,10 @@ async def root():
         "status": "running",
         "endpoints": {
             "health": "/health",
+            "liveness": "/health/live",
+            "readiness": "/health/ready",
             "webhook": "/webhook",
+            "metrics": "/metrics",
             "docs": "/docs"
         }
     })
@@ -185,15 +248,79 @@ async def root():
 
 @app.get("/stats")
 async def get_stats():
-    """Получение статистики системы"""
+    """Получение статистики системы (фоновый снимок, см. STATS_REFRESH_SECONDS)"""
     try:
-        stats = await db_manager.get_stats()
+        stats = await health_monitor.get_stats()
         return JSONResponse(stats)
     except Exception as e:
         logger.error(f"❌ Stats error: {e}")
         return JSONResponse({"error": str(e)}, status_code=500)
 
 
+@app.get("/metrics")
+async def get_metrics():
+    """Метрики в формате Prometheus"""
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/stats/queues")
+async def get_queue_stats():
+    """Очереди фоновой обработки: глубина, ожидание и длительность задач"""
+    return JSONResponse({
+        "voice": voice_queue.get_stats(),
+        "images": image_processor.get_stats(),
+        "audit": audit_log.get_stats(),
+    })
+
+
+@app.get("/stats/partitions")
+async def get_partition_stats():
+    """Результат последнего обслуживания секций журналов"""
+    return JSONResponse({"last_run": partition_manager.last_run})
+
+
+@app.get("/stats/reconciliation")
+async def get_reconciliation_stats():
+    """Результат последней ночной сверки оплат"""
+    return JSONResponse({"last_report": nightly_reconciler.last_report})
+
+
+@app.get("/receipts/{name}")
+async def get_receipt_file(name: str, request: Request, expires: int = 0, signature: str = ""):
+    """Файл чека или миниатюры по подписанной ссылке (ETag, If-None-Match, Range)"""
+    relative_path = receipt_relative_path(name)
+    if relative_path is None:
+        return JSONResponse({"error": "not found"}, status_code=404)
+    if not verify_receipt_link(name, expires, signature):
+        return JSONResponse({"error": "invalid or expired link"}, status_code=403)
+    
+    etag = f'"{name}"'
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match.strip() == "*" or etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": RECEIPT_CACHE_CONTROL})
+    
+    storage = get_receipt_storage()
+    local_path = storage.local_path(relative_path)
+    if local_path is None:
+        # Объектное хранилище отдает файл само по временной ссылке
+        return RedirectResponse(storage.remote_url(relative_path), status_code=307)
+    if not os.path.exists(local_path):
+        return JSONResponse({"error": "not found"}, status_code=404)
+    
+    # If-Range сверяется с ETag по хэшу: при совпадении отдается диапазон, иначе - файл целиком.
+    # FileResponse дальше видит только Range
+    if_range = request.headers.get("if-range")
+    if if_range is not None:
+        dropped = {b"if-range"} if if_range.strip() == etag else {b"if-range", b"range"}
+        request.scope["headers"] = [(key, value) for key, value in request.scope["headers"] if key not in dropped]
+    
+    return FileResponse(
+        local_path,
+        media_type=mimetypes.guess_type(name)[0] or "application/octet-stream",
+        headers={"ETag": etag, "Cache-Control": RECEIPT_CACHE_CONTROL}
+    )
+
+
 if __name__ == "__main__":
     import uvicorn
     
@@ -0,0 +1,315 @@
+"""
+📈 Метрики MAXXPHARM CRM: задержка обработчиков Telegram и запросы к базе
+
+Обработка каждого обновления измеряется целиком (фильтры, обработчик,
+ответы Bot API) с метками роутера и обработчика; SQL-хуки движка
+(src/database.py) добавляют к обновлению число запросов и время в базе.
+Значения копятся в логарифмических гистограммах с постоянной
+относительной точностью (как HdrHistogram) и отдаются в формате
+Prometheus на /metrics.
+"""
+
+import logging
+import math
+import time
+from collections import deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.dispatcher.event.bases import UNHANDLED
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Границы ведер при выдаче в Prometheus (внутри точность выше)
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class LatencyWindow:
+    """Скользящее окно последних замеров (секунды)"""
+    
+    def __init__(self, size: int = 500):
+        self.samples: deque = deque(maxlen=size)
+        self.count = 0
+    
+    def add(self, value: float) -> None:
+        self.samples.append(value)
+        self.count += 1
+    
+    def summary(self) -> Dict[str, float]:
+        if not self.samples:
+            return {"count": self.count, "p50_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0}
+        ordered = sorted(self.samples)
+        return {
+            "count": self.count,
+            "p50_ms": round(ordered[len(ordered) // 2] * 1000, 1),
+            "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 1),
+            "max_ms": round(ordered[-1] * 1000, 1),
+        }
+
+
+class HdrHistogram:
+    """Ведра по степеням 2**(1/precision): относительная ошибка ~2% при любом порядке величин"""
+    
+    def __init__(self, lowest: float, precision: int = 32):
+        self.lowest = lowest
+        self.precision = precision
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+    
+    def _index(self, value: float) -> int:
+        if value <= 0:
+            return -1
+        if value <= self.lowest:
+            return 0
+        return math.ceil(math.log2(value / self.lowest) * self.precision)
+    
+    def _upper(self, index: int) -> float:
+        return 0.0 if index < 0 else self.lowest * 2 ** (index / self.precision)
+    
+    def record(self, value: float) -> None:
+        index = self._index(value)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+    
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                value = min(self._upper(index), self.max)
+                # Целые величины (число запросов) - без дробной границы ведра
+                return float(math.floor(value)) if self.lowest >= 1 else value
+        return self.max
+    
+    def cumulative(self, bounds) -> List[int]:
+        """Число значений <= каждой границы (для ведер Prometheus)"""
+        result, seen, indices = [], 0, sorted(self.buckets)
+        position = 0
+        for bound in bounds:
+            while position < len(indices) and self._upper(indices[position]) <= bound * (1 + 1e-9):
+                seen += self.buckets[indices[position]]
+                position += 1
+            result.append(seen)
+        return result
+
+
+def _labels(labels: Tuple[Tuple[str, str], ...], **extra) -> str:
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ""
+    escaped = (
+        f'{key}="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for key, value in pairs
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class MetricsRegistry:
+    """Гистограммы, счетчики и вычисляемые показатели в формате Prometheus"""
+    
+    def __init__(self, prefix: str = "maxxpharm"):
+        self.prefix = prefix
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._histograms: Dict[str, Dict[tuple, HdrHistogram]] = {}
+        self._bounds: Dict[str, tuple] = {}
+        self._counters: Dict[str, Dict[tuple, float]] = {}
+        self._gauges: Dict[str, Callable[[], Dict[tuple, float]]] = {}
+    
+    def _declare(self, name: str, kind: str, description: str) -> str:
+        name = f"{self.prefix}_{name}"
+        self._help.setdefault(name, (kind, description))
+        return name
+    
+    def observe(self, name: str, value: float, description: str = "", bounds=SECONDS_BUCKETS,
+                lowest: float = 1e-5, **labels) -> None:
+        name = self._declare(name, "histogram", description)
+        self._bounds.setdefault(name, bounds)
+        series = self._histograms.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+        if key not in series:
+            series[key] = HdrHistogram(lowest)
+        series[key].record(value)
+    
+    def inc(self, name: str, value: float = 1, description: str = "", **labels) -> None:
+        name = self._declare(name, "counter", description)
+        series = self._counters.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+        series[key] = series.get(key, 0) + value
+    
+    def gauge(self, name: str, collect: Callable[[], Dict[tuple, float]], description: str = "") -> None:
+        """Показатель, вычисляемый при чтении: collect() -> {метки: значение}"""
+        name = self._declare(name, "gauge", description)
+        self._gauges[name] = collect
+    
+    def histogram(self, name: str, **labels) -> Optional[HdrHistogram]:
+        return self._histograms.get(f"{self.prefix}_{name}", {}).get(tuple(sorted(labels.items())))
+    
+    def render(self) -> str:
+        lines = []
+        for name, (kind, description) in sorted(self._help.items()):
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "histogram":
+                bounds = self._bounds[name]
+                for labels, histogram in sorted(self._histograms.get(name, {}).items()):
+                    for bound, count in zip(bounds, histogram.cumulative(bounds)):
+                        lines.append(f"{name}_bucket{_labels(labels, le=_number(bound))} {count}")
+                    lines.append(f"{name}_bucket{_labels(labels, le='+Inf')} {histogram.count}")
+                    lines.append(f"{name}_sum{_labels(labels)} {_number(histogram.sum)}")
+                    lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+            elif kind == "counter":
+                for labels, value in sorted(self._counters.get(name, {}).items()):
+                    lines.append(f"{name}{_labels(labels)} {_number(value)}")
+            else:
+                try:
+                    values = self._gauges[name]()
+                except Exception as e:
+                    logger.warning(f"⚠️ Metric {name} failed: {e}")
+                    values = {}
+                for labels, value in sorted(values.items()):
+                    lines.append(f"{name}{_labels(labels)} {_number(value)}")
+        
+        # Квантили по полной точности гистограмм - отдельным семейством (Prometheus не смешивает типы)
+        for name, series in sorted(self._histograms.items()):
+            lines.append(f"# TYPE {name}_quantile gauge")
+            for labels, histogram in sorted(series.items()):
+                for q in QUANTILES:
+                    lines.append(f"{name}_quantile{_labels(labels, quantile=_number(q))} {_number(histogram.quantile(q))}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+@dataclass
+class UpdateTrace:
+    """Запросы к базе в рамках одного обновления"""
+    started: float = field(default_factory=time.perf_counter)
+    router: str = "-"
+    handler: str = "unhandled"
+    queries: int = 0
+    db_seconds: float = 0.0
+    slowest: List[Tuple[float, str]] = field(default_factory=list)
+    
+    def add_query(self, statement: str, seconds: float) -> None:
+        self.queries += 1
+        self.db_seconds += seconds
+        # Для журнала медленных обработчиков хранятся только самые долгие запросы
+        self.slowest.append((seconds, statement))
+        if len(self.slowest) > 3:
+            self.slowest.sort(reverse=True)
+            self.slowest.pop()
+
+
+current_trace: ContextVar[Optional[UpdateTrace]] = ContextVar("current_trace", default=None)
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - conn.info["query_started"].pop()
+    metrics.observe("db_query_duration_seconds", seconds, "Время выполнения SQL-запроса")
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add_query(statement, seconds)
+
+
+def handle_error(context) -> None:
+    # Упавший запрос не доходит до after_cursor_execute
+    started = context.connection.info.get("query_started") if context.connection is not None else None
+    if started:
+        started.pop()
+
+
+def instrument_engine(engine) -> None:
+    """SQL-хуки на синхронном движке под AsyncEngine"""
+    from sqlalchemy import event
+    
+    event.listen(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(engine.sync_engine, "handle_error", handle_error)
+
+
+def handler_labels(handler) -> Tuple[str, str]:
+    """ClientHandlers._register_handlers.<locals>.handle_order_text -> (ClientHandlers, handle_order_text)"""
+    qualname = getattr(handler.callback, "__qualname__", repr(handler.callback))
+    parts = qualname.split(".")
+    return (parts[0] if len(parts) > 1 else handler.callback.__module__), parts[-1]
+
+
+class HandlerLabelMiddleware(BaseMiddleware):
+    """Внутренний middleware роутера: отмечает, какой обработчик принял обновление"""
+    
+    async def __call__(self, handler: Callable[..., Awaitable[Any]], event: Any, data: Dict[str, Any]) -> Any:
+        trace = current_trace.get()
+        if trace is not None:
+            trace.router, trace.handler = handler_labels(data["handler"])
+        return await handler(event, data)
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Внешний middleware диспетчера: время обработки, запросы и время в базе на обновление"""
+    
+    async def __call__(self, handler: Callable[..., Awaitable[Any]], event: Any, data: Dict[str, Any]) -> Any:
+        trace = UpdateTrace()
+        token = current_trace.set(trace)
+        status = "ok"
+        try:
+            result = await handler(event, data)
+            if result is UNHANDLED:
+                status = "unhandled"
+            return result
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            current_trace.reset(token)
+            self._record(trace, status, event)
+    
+    def _record(self, trace: UpdateTrace, status: str, event: Any) -> None:
+        seconds = time.perf_counter() - trace.started
+        labels = {"router": trace.router, "handler": trace.handler}
+        metrics.observe("update_duration_seconds", seconds, "Время обработки обновления Telegram", **labels)
+        metrics.observe("update_db_seconds", trace.db_seconds, "Время в базе за обновление", **labels)
+        metrics.observe("update_db_queries", trace.queries, "SQL-запросов за обновление",
+                        bounds=COUNT_BUCKETS, lowest=1, **labels)
+        metrics.inc("updates_total", description="Обработанные обновления Telegram", status=status, **labels)
+        
+        if seconds * 1000 >= settings.slow_handler_ms:
+            slowest = "\n".join(
+                f"    {query_seconds * 1000:.0f} ms: {' '.join(statement.split())[:300]}"
+                for query_seconds, statement in sorted(trace.slowest, reverse=True)
+            )
+            logger.warning(
+                f"🐢 Slow handler {trace.router}.{trace.handler} (update {getattr(event, 'update_id', '?')}): "
+                f"{seconds * 1000:.0f} ms, {trace.queries} queries, {trace.db_seconds * 1000:.0f} ms in DB"
+                + (f"\n{slowest}" if slowest else "")
+            )
+
+
+def instrument_dispatcher(dispatcher: Dispatcher) -> None:
+    """Метрики на все роутеры диспетчера (вызывается после include_router)"""
+    dispatcher.update.outer_middleware(UpdateMetricsMiddleware())
+    label = HandlerLabelMiddleware()
+    for router in dispatcher.chain_tail:
+        for name, observer in router.observers.items():
+            if name not in ("update", "error"):
+                observer.middleware(label)
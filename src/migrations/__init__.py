@@ -0,0 +1,141 @@
+"""
+🧬 Миграции схемы MAXXPHARM CRM (Alembic)
+
+Схема меняется только ревизиями в versions/. При запуске приложение
+лишь сверяет версию базы с последней ревизией. Индексы на живых таблицах
+PostgreSQL строятся без блокировки записи (CREATE INDEX CONCURRENTLY).
+
+Применение: python -m src.migrations upgrade (или alembic upgrade head)
+"""
+
+import logging
+from pathlib import Path
+from typing import Optional, Callable, Any
+
+from alembic import command, op
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlalchemy.util import await_only
+
+from ..config import settings
+from ..database import engine
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent
+ALEMBIC_INI = MIGRATIONS_DIR.parents[1] / "alembic.ini"
+
+
+def alembic_config() -> Config:
+    config = Config(str(ALEMBIC_INI)) if ALEMBIC_INI.exists() else Config()
+    config.set_main_option("script_location", str(MIGRATIONS_DIR))
+    return config
+
+
+def head_revision() -> Optional[str]:
+    """Последняя ревизия (чтение файлов versions/, без базы)"""
+    return ScriptDirectory.from_config(alembic_config()).get_current_head()
+
+
+async def current_revision() -> Optional[str]:
+    """Версия схемы базы из alembic_version (None - база без миграций)"""
+    async with engine.connect() as conn:
+        return await conn.run_sync(lambda sync_conn: MigrationContext.configure(sync_conn).get_current_revision())
+
+
+async def upgrade(revision: str = "head") -> None:
+    """Применение ревизий через соединение приложения"""
+    config = alembic_config()
+    
+    def run(sync_conn) -> None:
+        config.attributes["connection"] = sync_conn
+        command.upgrade(config, revision)
+    
+    async with engine.connect() as conn:
+        await conn.run_sync(run)
+        await conn.commit()
+
+
+async def check_schema() -> None:
+    """Проверка при запуске: одна строка alembic_version вместо DDL"""
+    current, head = await current_revision(), head_revision()
+    if current == head:
+        logger.info(f"✅ Database schema is up to date ({head})")
+        return
+    
+    if not settings.db_auto_migrate:
+        raise RuntimeError(
+            f"Схема базы ({current or 'без версии'}) отстает от {head}: выполните python -m src.migrations upgrade"
+        )
+    logger.info(f"🧬 Migrating database schema {current or '(empty)'} -> {head}")
+    await upgrade()
+
+
+def run_async(function: Callable[[AsyncConnection], Any]) -> Any:
+    """Асинхронный код приложения (например, секционирование) внутри ревизии"""
+    return await_only(function(AsyncConnection(engine, op.get_bind())))
+
+
+def _is_postgres() -> bool:
+    return op.get_bind().dialect.name == "postgresql"
+
+
+def _partitions(bind, table: str) -> list:
+    return bind.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:name) ORDER BY c.relname"
+    ), {"name": table}).scalars().all()
+
+
+def _build_concurrently(bind, name: str, table: str, columns: str, unique: str) -> None:
+    # Прерванная сборка CONCURRENTLY оставляет невалидный индекс - он собирается заново
+    valid = bind.execute(
+        text("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"), {"name": name}
+    ).scalar()
+    if valid is False:
+        bind.execute(text(f"DROP INDEX CONCURRENTLY {name}"))
+    bind.execute(text(f"CREATE {unique}INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({columns})"))
+
+
+def create_index_online(name: str, table: str, columns: str, unique: bool = False) -> None:
+    """Индекс без блокировки записи; на секционированной таблице - по одной секции"""
+    unique = "UNIQUE " if unique else ""
+    if not _is_postgres():
+        op.execute(f"CREATE {unique}INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+        return
+    
+    # CONCURRENTLY не работает внутри транзакции
+    with op.get_context().autocommit_block():
+        bind = op.get_bind()
+        kind = bind.execute(text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:name)"), {"name": table}).scalar()
+        if kind != "p":
+            _build_concurrently(bind, name, table, columns, unique)
+            return
+        
+        # Для секционированной таблицы CONCURRENTLY недоступен: индекс родителя создается
+        # только в каталоге (ON ONLY), индексы секций строятся по одному и присоединяются;
+        # новые секции получают индекс автоматически
+        bind.execute(text(f"CREATE {unique}INDEX IF NOT EXISTS {name} ON ONLY {table} ({columns})"))
+        for partition in _partitions(bind, table):
+            partition_index = f"{name}_{partition[len(table):].lstrip('_')}"[:63]
+            _build_concurrently(bind, partition_index, partition, columns, unique)
+            bind.execute(text(f"ALTER INDEX {name} ATTACH PARTITION {partition_index}"))
+
+
+def drop_index_online(name: str) -> None:
+    """Удаление индекса без блокировки записи (кроме индексов секционированных таблиц)"""
+    if not _is_postgres():
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+        return
+    
+    with op.get_context().autocommit_block():
+        bind = op.get_bind()
+        kind = bind.execute(text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:name)"), {"name": name}).scalar()
+        if kind == "I":
+            # Индекс секционированной таблицы удаляется только целиком, без CONCURRENTLY
+            bind.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        elif kind is not None:
+            bind.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
@@ -0,0 +1,27 @@
+"""
+🧬 Миграции схемы из командной строки
+
+Запуск: python -m src.migrations [upgrade|current]
+"""
+
+import asyncio
+import sys
+
+from . import upgrade, current_revision, head_revision
+from ..database import close_db
+
+
+async def main(command: str) -> None:
+    try:
+        if command == "upgrade":
+            await upgrade()
+        print(f"🧬 Database: {await current_revision() or '(empty)'}, head: {head_revision()}")
+    finally:
+        await close_db()
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "upgrade"
+    if command not in ("upgrade", "current"):
+        sys.exit("Usage: python -m src.migrations [upgrade|current]")
+    asyncio.run(main(command))
@@ -0,0 +1,63 @@
+"""
+🧬 Окружение Alembic MAXXPHARM CRM: асинхронный движок из настроек приложения
+"""
+
+import asyncio
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from src.config import settings
+from src.models.database import Base
+
+config = context.config
+if config.config_file_name is not None and config.attributes.get("connection") is None:
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+target_metadata = Base.metadata
+
+
+def include_object(obj, name, type_, reflected, compare_to) -> bool:
+    """Autogenerate не трогает индексы idx_* из ревизий и секции журналов (их нет в моделях)"""
+    if type_ == "index" and reflected and compare_to is None and name.startswith("idx_"):
+        return False
+    if type_ == "table" and reflected and compare_to is None:
+        return False
+    return True
+
+
+def do_run_migrations(connection) -> None:
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        # Каждая ревизия - своя транзакция: сбой не откатывает примененные ревизии
+        transaction_per_migration=True,
+        compare_type=True,
+        include_object=include_object
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+async def run_async_migrations() -> None:
+    engine = create_async_engine(settings.database_url, poolclass=NullPool)
+    async with engine.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+    await engine.dispose()
+
+
+def run_migrations_online() -> None:
+    # При запуске из приложения (src.migrations) соединение передается готовым
+    connection = config.attributes.get("connection")
+    if connection is None:
+        asyncio.run(run_async_migrations())
+    else:
+        do_run_migrations(connection)
+
+
+if context.is_offline_mode():
+    raise RuntimeError("Офлайн-режим (--sql) не поддерживается: ревизии читают состояние базы")
+
+run_migrations_online()
@@ -0,0 +1,201 @@
+"""baseline: схема до перехода на миграции (таблицы, созданные create_all при запуске)
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19 14:10:40.253726
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# Индексы, которые раньше создавались при каждом запуске (create_indexes)
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_users_telegram_id ON users(telegram_id)",
+    "CREATE INDEX IF NOT EXISTS idx_users_role ON users(role)",
+    "CREATE INDEX IF NOT EXISTS idx_orders_status ON orders(status)",
+    "CREATE INDEX IF NOT EXISTS idx_orders_client_id ON orders(client_id)",
+    "CREATE INDEX IF NOT EXISTS idx_orders_created_at ON orders(created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_payments_order_id ON payments(order_id)",
+    "CREATE INDEX IF NOT EXISTS idx_locations_user_id ON locations(user_id)",
+    "CREATE INDEX IF NOT EXISTS idx_activity_logs_user_id ON activity_logs(user_id)",
+    "CREATE INDEX IF NOT EXISTS idx_activity_logs_created_at ON activity_logs(created_at)",
+]
+
+
+def upgrade() -> None:
+    # Рабочие базы созданы до миграций (create_all при запуске) и уже содержат эти таблицы:
+    # базовая ревизия создает только отсутствующие, новые колонки добавляет 0002
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+    
+    if 'users' not in existing:
+        op.create_table('users',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('telegram_id', sa.Integer(), nullable=False),
+            sa.Column('username', sa.String(length=255), nullable=True),
+            sa.Column('full_name', sa.String(length=255), nullable=False),
+            sa.Column('phone', sa.String(length=20), nullable=True),
+            sa.Column('role', sa.String(length=50), nullable=False),
+            sa.Column('is_active', sa.Boolean(), nullable=False),
+            sa.Column('is_blocked', sa.Boolean(), nullable=False),
+            sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_users_id'), 'users', ['id'], unique=False)
+        op.create_index(op.f('ix_users_telegram_id'), 'users', ['telegram_id'], unique=True)
+    
+    if 'activity_logs' not in existing:
+        op.create_table('activity_logs',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('action', sa.String(length=255), nullable=False),
+            sa.Column('entity_type', sa.String(length=100), nullable=True),
+            sa.Column('entity_id', sa.Integer(), nullable=True),
+            sa.Column('details', sa.JSON(), nullable=True),
+            sa.Column('ip_address', sa.String(length=45), nullable=True),
+            sa.Column('user_agent', sa.Text(), nullable=True),
+            sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_activity_logs_id'), 'activity_logs', ['id'], unique=False)
+    
+    if 'pharmacies' not in existing:
+        op.create_table('pharmacies',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=255), nullable=False),
+            sa.Column('address', sa.Text(), nullable=False),
+            sa.Column('license_number', sa.String(length=100), nullable=True),
+            sa.Column('contact_person', sa.String(length=255), nullable=True),
+            sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('user_id')
+        )
+        op.create_index(op.f('ix_pharmacies_id'), 'pharmacies', ['id'], unique=False)
+    
+    if 'orders' not in existing:
+        op.create_table('orders',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('order_number', sa.String(length=50), nullable=False),
+            sa.Column('client_id', sa.Integer(), nullable=False),
+            sa.Column('pharmacy_id', sa.Integer(), nullable=False),
+            sa.Column('operator_id', sa.Integer(), nullable=True),
+            sa.Column('collector_id', sa.Integer(), nullable=True),
+            sa.Column('checker_id', sa.Integer(), nullable=True),
+            sa.Column('courier_id', sa.Integer(), nullable=True),
+            sa.Column('status', sa.String(length=50), nullable=False),
+            sa.Column('total_amount', sa.Numeric(precision=10, scale=2), nullable=False),
+            sa.Column('paid_amount', sa.Numeric(precision=10, scale=2), nullable=False),
+            sa.Column('debt_amount', sa.Numeric(precision=10, scale=2), nullable=False),
+            sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.Column('confirmed_at', sa.DateTime(timezone=True), nullable=True),
+            sa.Column('collected_at', sa.DateTime(timezone=True), nullable=True),
+            sa.Column('checked_at', sa.DateTime(timezone=True), nullable=True),
+            sa.Column('delivered_at', sa.DateTime(timezone=True), nullable=True),
+            sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+            sa.Column('notes', sa.Text(), nullable=True),
+            sa.Column('rejection_reason', sa.Text(), nullable=True),
+            sa.Column('delivery_address', sa.Text(), nullable=True),
+            sa.ForeignKeyConstraint(['checker_id'], ['users.id'], ),
+            sa.ForeignKeyConstraint(['client_id'], ['users.id'], ),
+            sa.ForeignKeyConstraint(['collector_id'], ['users.id'], ),
+            sa.ForeignKeyConstraint(['courier_id'], ['users.id'], ),
+            sa.ForeignKeyConstraint(['operator_id'], ['users.id'], ),
+            sa.ForeignKeyConstraint(['pharmacy_id'], ['pharmacies.id'], ),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_orders_id'), 'orders', ['id'], unique=False)
+        op.create_index(op.f('ix_orders_order_number'), 'orders', ['order_number'], unique=True)
+    
+    if 'debts' not in existing:
+        op.create_table('debts',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('order_id', sa.Integer(), nullable=False),
+            sa.Column('client_id', sa.Integer(), nullable=False),
+            sa.Column('total_amount', sa.Numeric(precision=10, scale=2), nullable=False),
+            sa.Column('paid_amount', sa.Numeric(precision=10, scale=2), nullable=False),
+            sa.Column('remaining_amount', sa.Numeric(precision=10, scale=2), nullable=False),
+            sa.Column('is_active', sa.Boolean(), nullable=False),
+            sa.Column('collected_by', sa.Integer(), nullable=True),
+            sa.Column('collected_at', sa.DateTime(timezone=True), nullable=True),
+            sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+            sa.ForeignKeyConstraint(['client_id'], ['users.id'], ),
+            sa.ForeignKeyConstraint(['collected_by'], ['users.id'], ),
+            sa.ForeignKeyConstraint(['order_id'], ['orders.id'], ),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_debts_id'), 'debts', ['id'], unique=False)
+    
+    if 'locations' not in existing:
+        op.create_table('locations',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('order_id', sa.Integer(), nullable=True),
+            sa.Column('latitude', sa.Numeric(precision=10, scale=8), nullable=False),
+            sa.Column('longitude', sa.Numeric(precision=11, scale=8), nullable=False),
+            sa.Column('address', sa.Text(), nullable=True),
+            sa.Column('accuracy', sa.Float(), nullable=True),
+            sa.Column('speed', sa.Float(), nullable=True),
+            sa.Column('heading', sa.Float(), nullable=True),
+            sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.ForeignKeyConstraint(['order_id'], ['orders.id'], ),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_locations_id'), 'locations', ['id'], unique=False)
+    
+    if 'order_items' not in existing:
+        op.create_table('order_items',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('order_id', sa.Integer(), nullable=False),
+            sa.Column('product_name', sa.String(length=255), nullable=False),
+            sa.Column('quantity', sa.Integer(), nullable=False),
+            sa.Column('unit_price', sa.Numeric(precision=10, scale=2), nullable=False),
+            sa.Column('total_price', sa.Numeric(precision=10, scale=2), nullable=False),
+            sa.ForeignKeyConstraint(['order_id'], ['orders.id'], ),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_order_items_id'), 'order_items', ['id'], unique=False)
+    
+    if 'payments' not in existing:
+        op.create_table('payments',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('order_id', sa.Integer(), nullable=False),
+            sa.Column('payment_type', sa.String(length=50), nullable=False),
+            sa.Column('amount', sa.Numeric(precision=10, scale=2), nullable=False),
+            sa.Column('bank_name', sa.String(length=255), nullable=True),
+            sa.Column('recipient_name', sa.String(length=255), nullable=True),
+            sa.Column('recipient_phone', sa.String(length=20), nullable=True),
+            sa.Column('transaction_id', sa.String(length=255), nullable=True),
+            sa.Column('check_image_url', sa.String(length=500), nullable=True),
+            sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.Column('confirmed_at', sa.DateTime(timezone=True), nullable=True),
+            sa.ForeignKeyConstraint(['order_id'], ['orders.id'], ),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_payments_id'), 'payments', ['id'], unique=False)
+    
+    for index_sql in INDEXES:
+        op.execute(index_sql)
+
+
+def downgrade() -> None:
+    # Индексы удаляются вместе с таблицами
+    op.drop_table('payments')
+    op.drop_table('order_items')
+    op.drop_table('locations')
+    op.drop_table('debts')
+    op.drop_table('orders')
+    op.drop_table('pharmacies')
+    op.drop_table('activity_logs')
+    op.drop_table('users')
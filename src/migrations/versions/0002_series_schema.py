@@ -0,0 +1,305 @@
+"""series schema: нагрузка сотрудников, зоны, каталог, баланс клиентов, архив и журналы
+
+Колонки и таблицы, добавленные в модели после базовой схемы. Рабочая
+база на 0001 получает их здесь; уже существующие (база, созданная
+create_all новой версией) пропускаются.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 14:12:05.118240
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+from src.migrations import run_async
+from src.services.partition_service import partition_manager
+
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+# Новые колонки существующих таблиц; NOT NULL - со значением по умолчанию для старых строк
+COLUMNS = {
+    'users': [
+        sa.Column('zone', sa.String(length=50), nullable=True),
+        sa.Column('is_online', sa.Boolean(), server_default=sa.true(), nullable=False),
+        sa.Column('active_orders', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('max_orders', sa.Integer(), server_default='5', nullable=False),
+        sa.Column('performance_score', sa.Numeric(precision=3, scale=2), server_default='5.0', nullable=False),
+        sa.Column('last_assigned_at', sa.DateTime(timezone=True), nullable=True),
+    ],
+    'pharmacies': [
+        sa.Column('latitude', sa.Numeric(precision=10, scale=8), nullable=True),
+        sa.Column('longitude', sa.Numeric(precision=11, scale=8), nullable=True),
+        sa.Column('zone', sa.String(length=50), nullable=True),
+    ],
+    'orders': [
+        sa.Column('charged_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('zone', sa.String(length=50), nullable=True),
+    ],
+    'order_items': [
+        sa.Column('product_id', sa.Integer(), nullable=True),
+    ],
+    'payments': [
+        sa.Column('client_id', sa.Integer(), nullable=True),
+        sa.Column('recorded_by', sa.Integer(), nullable=True),
+    ],
+}
+
+# Внешние ключи новых колонок
+FOREIGN_KEYS = [
+    ('fk_order_items_product_id', 'order_items', 'products', 'product_id'),
+    ('fk_payments_client_id', 'payments', 'users', 'client_id'),
+    ('fk_payments_recorded_by', 'payments', 'users', 'recorded_by'),
+]
+
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_pharmacies_zone ON pharmacies(zone)",
+    "CREATE INDEX IF NOT EXISTS idx_users_role_online ON users(role, is_online)",
+    "CREATE INDEX IF NOT EXISTS idx_orders_client_history ON orders(client_id, id DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_orders_zone_status ON orders(zone, status, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_payments_created_at ON payments(created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_payments_client_id ON payments(client_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_debts_order_active ON debts(order_id, is_active)",
+    "CREATE INDEX IF NOT EXISTS idx_balance_entries_client ON balance_entries(client_id, id)",
+    "CREATE INDEX IF NOT EXISTS idx_debts_client_active ON debts(client_id, is_active)",
+    "CREATE INDEX IF NOT EXISTS idx_debt_worklist_rep_priority ON debt_worklist(sales_rep_id, priority DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_debt_worklist_zone_priority ON debt_worklist(zone, priority DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_locations_user_created ON locations(user_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_activity_logs_user_created ON activity_logs(user_id, created_at)",
+]
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    existing = set(inspector.get_table_names())
+    
+    if 'products' not in existing:
+        op.create_table('products',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('sku', sa.String(length=100), nullable=True),
+            sa.Column('name', sa.String(length=255), nullable=False),
+            sa.Column('synonyms', sa.JSON(), nullable=True),
+            sa.Column('form', sa.String(length=100), nullable=True),
+            sa.Column('price', sa.Numeric(precision=10, scale=2), nullable=False),
+            sa.Column('stock', sa.Integer(), nullable=False),
+            sa.Column('is_active', sa.Boolean(), nullable=False),
+            sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('sku')
+        )
+        op.create_index(op.f('ix_products_id'), 'products', ['id'], unique=False)
+        op.create_index(op.f('ix_products_name'), 'products', ['name'], unique=False)
+    
+    if 'geocode_cache' not in existing:
+        op.create_table('geocode_cache',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('cache_key', sa.String(length=512), nullable=False),
+            sa.Column('query', sa.Text(), nullable=False),
+            sa.Column('found', sa.Boolean(), nullable=False),
+            sa.Column('latitude', sa.Numeric(precision=10, scale=8), nullable=True),
+            sa.Column('longitude', sa.Numeric(precision=11, scale=8), nullable=True),
+            sa.Column('formatted_address', sa.Text(), nullable=True),
+            sa.Column('place_id', sa.String(length=255), nullable=True),
+            sa.Column('provider', sa.String(length=50), nullable=False),
+            sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_geocode_cache_cache_key'), 'geocode_cache', ['cache_key'], unique=True)
+        op.create_index(op.f('ix_geocode_cache_id'), 'geocode_cache', ['id'], unique=False)
+    
+    if 'order_attachments' not in existing:
+        op.create_table('order_attachments',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('order_id', sa.Integer(), nullable=False),
+            sa.Column('uploaded_by', sa.Integer(), nullable=True),
+            sa.Column('kind', sa.String(length=50), nullable=False),
+            sa.Column('content_hash', sa.String(length=64), nullable=False),
+            sa.Column('storage_path', sa.String(length=255), nullable=False),
+            sa.Column('mime_type', sa.String(length=100), nullable=False),
+            sa.Column('size_bytes', sa.Integer(), nullable=False),
+            sa.Column('original_size_bytes', sa.Integer(), nullable=True),
+            sa.Column('width', sa.Integer(), nullable=True),
+            sa.Column('height', sa.Integer(), nullable=True),
+            sa.Column('telegram_file_unique_id', sa.String(length=255), nullable=True),
+            sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.ForeignKeyConstraint(['order_id'], ['orders.id'], ),
+            sa.ForeignKeyConstraint(['uploaded_by'], ['users.id'], ),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('order_id', 'content_hash', name='uq_order_attachments_content')
+        )
+        op.create_index(op.f('ix_order_attachments_content_hash'), 'order_attachments', ['content_hash'], unique=False)
+        op.create_index(op.f('ix_order_attachments_id'), 'order_attachments', ['id'], unique=False)
+        op.create_index(op.f('ix_order_attachments_order_id'), 'order_attachments', ['order_id'], unique=False)
+        op.create_index(op.f('ix_order_attachments_telegram_file_unique_id'), 'order_attachments', ['telegram_file_unique_id'], unique=False)
+    
+    if 'payment_receipts' not in existing:
+        op.create_table('payment_receipts',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('order_id', sa.Integer(), nullable=False),
+            sa.Column('payment_id', sa.Integer(), nullable=True),
+            sa.Column('client_id', sa.Integer(), nullable=True),
+            sa.Column('content_hash', sa.String(length=64), nullable=False),
+            sa.Column('storage_path', sa.String(length=255), nullable=False),
+            sa.Column('thumbnail_path', sa.String(length=255), nullable=True),
+            sa.Column('mime_type', sa.String(length=100), nullable=False),
+            sa.Column('size_bytes', sa.Integer(), nullable=False),
+            sa.Column('width', sa.Integer(), nullable=True),
+            sa.Column('height', sa.Integer(), nullable=True),
+            sa.Column('telegram_file_unique_id', sa.String(length=255), nullable=True),
+            sa.Column('duplicate_of_id', sa.Integer(), nullable=True),
+            sa.Column('status', sa.String(length=20), nullable=False),
+            sa.Column('reviewed_by', sa.Integer(), nullable=True),
+            sa.Column('reviewed_at', sa.DateTime(timezone=True), nullable=True),
+            sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.ForeignKeyConstraint(['client_id'], ['users.id'], ),
+            sa.ForeignKeyConstraint(['duplicate_of_id'], ['payment_receipts.id'], ),
+            sa.ForeignKeyConstraint(['order_id'], ['orders.id'], ),
+            sa.ForeignKeyConstraint(['payment_id'], ['payments.id'], ),
+            sa.ForeignKeyConstraint(['reviewed_by'], ['users.id'], ),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('order_id', 'content_hash', name='uq_payment_receipts_content')
+        )
+        op.create_index(op.f('ix_payment_receipts_content_hash'), 'payment_receipts', ['content_hash'], unique=False)
+        op.create_index(op.f('ix_payment_receipts_id'), 'payment_receipts', ['id'], unique=False)
+        op.create_index(op.f('ix_payment_receipts_order_id'), 'payment_receipts', ['order_id'], unique=False)
+        op.create_index(op.f('ix_payment_receipts_payment_id'), 'payment_receipts', ['payment_id'], unique=False)
+        op.create_index(op.f('ix_payment_receipts_status'), 'payment_receipts', ['status'], unique=False)
+        op.create_index(op.f('ix_payment_receipts_telegram_file_unique_id'), 'payment_receipts', ['telegram_file_unique_id'], unique=False)
+    
+    if 'client_balances' not in existing:
+        op.create_table('client_balances',
+            sa.Column('client_id', sa.Integer(), nullable=False),
+            sa.Column('charged_total', sa.Numeric(precision=12, scale=2), nullable=False),
+            sa.Column('paid_total', sa.Numeric(precision=12, scale=2), nullable=False),
+            sa.Column('outstanding', sa.Numeric(precision=12, scale=2), nullable=False),
+            sa.Column('active_debt', sa.Numeric(precision=12, scale=2), nullable=False),
+            sa.Column('last_entry_id', sa.Integer(), nullable=True),
+            sa.Column('last_payment_at', sa.DateTime(timezone=True), nullable=True),
+            sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.ForeignKeyConstraint(['client_id'], ['users.id'], ),
+            sa.PrimaryKeyConstraint('client_id')
+        )
+    
+    if 'balance_entries' not in existing:
+        op.create_table('balance_entries',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('client_id', sa.Integer(), nullable=False),
+            sa.Column('order_id', sa.Integer(), nullable=True),
+            sa.Column('payment_id', sa.Integer(), nullable=True),
+            sa.Column('kind', sa.String(length=20), nullable=False),
+            sa.Column('amount', sa.Numeric(precision=12, scale=2), nullable=False),
+            sa.Column('balance_after', sa.Numeric(precision=12, scale=2), nullable=False),
+            sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.ForeignKeyConstraint(['client_id'], ['users.id'], ),
+            sa.ForeignKeyConstraint(['order_id'], ['orders.id'], ),
+            sa.ForeignKeyConstraint(['payment_id'], ['payments.id'], ),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_balance_entries_id'), 'balance_entries', ['id'], unique=False)
+    
+    if 'debt_worklist' not in existing:
+        op.create_table('debt_worklist',
+            sa.Column('client_id', sa.Integer(), nullable=False),
+            sa.Column('sales_rep_id', sa.Integer(), nullable=True),
+            sa.Column('zone', sa.String(length=50), nullable=True),
+            sa.Column('outstanding', sa.Numeric(precision=12, scale=2), nullable=False),
+            sa.Column('debt_count', sa.Integer(), nullable=False),
+            sa.Column('oldest_debt_at', sa.DateTime(timezone=True), nullable=True),
+            sa.Column('risk', sa.Float(), nullable=False),
+            sa.Column('priority', sa.Float(), nullable=False),
+            sa.Column('client_name', sa.String(length=255), nullable=True),
+            sa.Column('phone', sa.String(length=20), nullable=True),
+            sa.Column('pharmacy_name', sa.String(length=255), nullable=True),
+            sa.Column('address', sa.Text(), nullable=True),
+            sa.Column('latitude', sa.Float(), nullable=True),
+            sa.Column('longitude', sa.Float(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.ForeignKeyConstraint(['client_id'], ['users.id'], ),
+            sa.ForeignKeyConstraint(['sales_rep_id'], ['users.id'], ),
+            sa.PrimaryKeyConstraint('client_id')
+        )
+    
+    if 'client_summaries' not in existing:
+        op.create_table('client_summaries',
+            sa.Column('client_id', sa.Integer(), nullable=False),
+            sa.Column('order_count', sa.Integer(), nullable=False),
+            sa.Column('open_order_count', sa.Integer(), nullable=False),
+            sa.Column('orders_amount', sa.Numeric(precision=12, scale=2), nullable=False),
+            sa.Column('last_order_at', sa.DateTime(timezone=True), nullable=True),
+            sa.Column('recent_orders', sa.JSON(), nullable=False),
+            sa.Column('outstanding', sa.Numeric(precision=12, scale=2), nullable=False),
+            sa.Column('last_payment_at', sa.DateTime(timezone=True), nullable=True),
+            sa.Column('last_payment_amount', sa.Numeric(precision=12, scale=2), nullable=True),
+            sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.ForeignKeyConstraint(['client_id'], ['users.id'], ),
+            sa.PrimaryKeyConstraint('client_id')
+        )
+    
+    if 'order_archive' not in existing:
+        op.create_table('order_archive',
+            sa.Column('order_id', sa.Integer(), nullable=False),
+            sa.Column('order_number', sa.String(length=50), nullable=False),
+            sa.Column('client_id', sa.Integer(), nullable=False),
+            sa.Column('status', sa.String(length=50), nullable=False),
+            sa.Column('total_amount', sa.Numeric(precision=10, scale=2), nullable=False),
+            sa.Column('charged_amount', sa.Numeric(precision=10, scale=2), nullable=False),
+            sa.Column('paid_total', sa.Numeric(precision=10, scale=2), nullable=False),
+            sa.Column('created_at', sa.DateTime(timezone=True), nullable=True),
+            sa.Column('closed_at', sa.DateTime(timezone=True), nullable=True),
+            sa.Column('archived_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.Column('archive_file', sa.String(length=500), nullable=False),
+            sa.Column('position', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['client_id'], ['users.id'], ),
+            sa.PrimaryKeyConstraint('order_id')
+        )
+        op.create_index(op.f('ix_order_archive_client_id'), 'order_archive', ['client_id'], unique=False)
+        op.create_index(op.f('ix_order_archive_order_number'), 'order_archive', ['order_number'], unique=True)
+    
+    for table, columns in COLUMNS.items():
+        present = {column['name'] for column in inspector.get_columns(table)}
+        for column in columns:
+            if column.name not in present:
+                op.add_column(table, column.copy())
+    
+    for name, table, referent, column in FOREIGN_KEYS:
+        if not any(fk['constrained_columns'] == [column] for fk in inspector.get_foreign_keys(table)):
+            # В SQLite batch-режим пересоздает таблицу, в PostgreSQL - обычный ALTER TABLE
+            with op.batch_alter_table(table) as batch:
+                batch.create_foreign_key(name, referent, [column], ['id'])
+    
+    # Журналы в PostgreSQL - секционированные таблицы (существующие переносятся в секции)
+    run_async(partition_manager.ensure)
+    
+    for index_sql in INDEXES:
+        op.execute(index_sql)
+
+
+def downgrade() -> None:
+    for index_sql in INDEXES:
+        # "CREATE INDEX IF NOT EXISTS <имя> ON ..."
+        op.execute(f"DROP INDEX IF EXISTS {index_sql.split()[5]}")
+    
+    for table, columns in COLUMNS.items():
+        with op.batch_alter_table(table) as batch:
+            for name, fk_table, _, _ in FOREIGN_KEYS:
+                if fk_table == table:
+                    batch.drop_constraint(name, type_='foreignkey')
+            for column in columns:
+                batch.drop_column(column.name)
+    
+    op.drop_table('payment_receipts')
+    op.drop_table('balance_entries')
+    op.drop_table('order_archive')
+    op.drop_table('client_summaries')
+    op.drop_table('debt_worklist')
+    op.drop_table('client_balances')
+    op.drop_table('order_attachments')
+    op.drop_table('geocode_cache')
+    op.drop_table('products')
@@ -0,0 +1,36 @@
+"""hot query indexes: заказы по статусу и курьеру, трек курьера
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 15:02:11.480913
+"""
+
+from src.migrations import create_index_online, drop_index_online
+
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Очереди по статусу с сортировкой по времени (операторы, сборщики, проверка)
+    create_index_online("idx_orders_status_created", "orders", "status, created_at")
+    # Заказы курьера в нужном статусе (маршрут, активные доставки)
+    create_index_online("idx_orders_courier_status", "orders", "courier_id, status")
+    # Последние точки пользователя (трек курьера, последняя геолокация)
+    create_index_online("idx_locations_user_created_desc", "locations", "user_id, created_at DESC")
+    
+    # Покрыты новыми индексами по префиксу
+    drop_index_online("idx_orders_status")
+    drop_index_online("idx_locations_user_created")
+
+
+def downgrade() -> None:
+    create_index_online("idx_locations_user_created", "locations", "user_id, created_at")
+    create_index_online("idx_orders_status", "orders", "status")
+    
+    drop_index_online("idx_locations_user_created_desc")
+    drop_index_online("idx_orders_courier_status")
+    drop_index_online("idx_orders_status_created")
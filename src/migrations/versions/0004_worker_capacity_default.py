@@ -0,0 +1,32 @@
+"""worker capacity default: users.max_orders без значения по умолчанию
+
+NULL в users.max_orders - лимит из настроек (MAX_ORDERS_PER_WORKER), число -
+свой лимит сотрудника. Раньше колонка была NOT NULL со значением 5, и
+настройка не действовала ни на кого; 5 из старого значения по умолчанию
+становится NULL.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 15:20:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.alter_column('max_orders', existing_type=sa.Integer(), nullable=True, server_default=None)
+    op.execute("UPDATE users SET max_orders = NULL WHERE max_orders = 5")
+
+
+def downgrade() -> None:
+    op.execute("UPDATE users SET max_orders = 5 WHERE max_orders IS NULL")
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.alter_column('max_orders', existing_type=sa.Integer(), nullable=False, server_default='5')
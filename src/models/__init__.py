@@ -9,12 +9,21 @@ from .database import (
     Pharmacy,
     Order,
     OrderStatus,
+    Product,
     OrderItem,
+    OrderAttachment,
     Payment,
     PaymentType,
+    PaymentReceipt,
     Debt,
+    ClientBalance,
+    BalanceEntry,
+    DebtWorkItem,
+    ClientSummary,
+    ArchivedOrder,
     Location,
-    ActivityLog
+    ActivityLog,
+    GeocodeCache
 )
 
 __all__ = [
@@ -24,10 +33,19 @@ __all__ = [
     "Pharmacy",
     "Order",
     "OrderStatus",
+    "Product",
     "OrderItem",
+    "OrderAttachment",
     "Payment",
     "PaymentType",
+    "PaymentReceipt",
     "Debt",
+    "ClientBalance",
+    "BalanceEntry",
+    "DebtWorkItem",
+    "ClientSummary",
+    "ArchivedOrder",
     "Location",
-    "ActivityLog"
+    "ActivityLog",
+    "GeocodeCache"
 ]
@@ -7,7 +7,7 @@ from typing import Optional, List
 from enum import Enum
 from sqlalchemy import (
     Column, Integer, String, DateTime, Float, Boolean, 
-    Text, ForeignKey, JSON, Numeric
+    Text, ForeignKey, JSON, Numeric, UniqueConstraint
 )
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
@@ -64,12 +64,21 @@ class User(Base):
     role = Column(String(50), default=UserRole.CLIENT, nullable=False)
     is_active = Column(Boolean, default=True, nullable=False)
     is_blocked = Column(Boolean, default=False, nullable=False)
+    
+    # Нагрузка сотрудника (автоназначение)
+    zone = Column(String(50), nullable=True)
+    is_online = Column(Boolean, default=True, nullable=False)
+    active_orders = Column(Integer, default=0, nullable=False)
+    max_orders = Column(Integer, nullable=True)  # None - MAX_ORDERS_PER_WORKER из настроек
+    performance_score = Column(Numeric(3, 2), default=5.0, nullable=False)
+    last_assigned_at = Column(DateTime(timezone=True), nullable=True)
+    
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
     # Отношения
     pharmacy = relationship("Pharmacy", back_populates="user", uselist=False)
-    orders = relationship("Order", back_populates="client")
+    orders = relationship("Order", back_populates="client", foreign_keys="Order.client_id")
     locations = relationship("Location", back_populates="user")
     activity_logs = relationship("ActivityLog", back_populates="user")
 
@@ -84,6 +93,12 @@ class Pharmacy(Base):
     address = Column(Text, nullable=False)
     license_number = Column(String(100), nullable=True)
     contact_person = Column(String(255), nullable=True)
+    
+    # Координаты точки доставки
+    latitude = Column(Numeric(10, 8), nullable=True)
+    longitude = Column(Numeric(11, 8), nullable=True)
+    zone = Column(String(50), nullable=True, index=True)
+    
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
@@ -118,11 +133,17 @@ class Order(Base):
     delivered_at = Column(DateTime(timezone=True), nullable=True)
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
+    # Сумма заказа отнесена на баланс клиента (один раз, см. ReconciliationService)
+    charged_at = Column(DateTime(timezone=True), nullable=True)
+    
     # Дополнительная информация
     notes = Column(Text, nullable=True)
     rejection_reason = Column(Text, nullable=True)
     delivery_address = Column(Text, nullable=True)
     
+    # Зона доставки (копия зоны аптеки на момент создания)
+    zone = Column(String(50), nullable=True)
+    
     # Отношения
     client = relationship("User", foreign_keys=[client_id], back_populates="orders")
     pharmacy = relationship("Pharmacy", back_populates="orders")
@@ -132,6 +153,25 @@ class Order(Base):
     courier = relationship("User", foreign_keys=[courier_id])
     items = relationship("OrderItem", back_populates="order", cascade="all, delete-orphan")
     payments = relationship("Payment", back_populates="order", cascade="all, delete-orphan")
+    attachments = relationship("OrderAttachment", back_populates="order", cascade="all, delete-orphan")
+    receipts = relationship("PaymentReceipt", back_populates="order", cascade="all, delete-orphan")
+
+
+class Product(Base):
+    """Товары каталога"""
+    __tablename__ = "products"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    sku = Column(String(100), unique=True, nullable=True)
+    name = Column(String(255), nullable=False, index=True)
+    synonyms = Column(JSON, nullable=True)  # торговые названия, написание латиницей
+    form = Column(String(100), nullable=True)  # таблетки, ампулы, флакон и т.д.
+    price = Column(Numeric(10, 2), nullable=False)
+    stock = Column(Integer, default=0, nullable=False)
+    is_active = Column(Boolean, default=True, nullable=False)
+    
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
 
 class OrderItem(Base):
@@ -140,6 +180,7 @@ class OrderItem(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     order_id = Column(Integer, ForeignKey("orders.id"), nullable=False)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=True)
     product_name = Column(String(255), nullable=False)
     quantity = Column(Integer, nullable=False)
     unit_price = Column(Numeric(10, 2), nullable=False)
@@ -149,12 +190,44 @@ class OrderItem(Base):
     order = relationship("Order", back_populates="items")
 
 
+class OrderAttachment(Base):
+    """Файлы заказа (фото рецептов), хранятся по хэшу содержимого"""
+    __tablename__ = "order_attachments"
+    __table_args__ = (
+        UniqueConstraint("order_id", "content_hash", name="uq_order_attachments_content"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False, index=True)
+    uploaded_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    kind = Column(String(50), default="prescription_photo", nullable=False)
+    
+    # Содержимое: sha256 сжатой копии и путь в хранилище
+    content_hash = Column(String(64), nullable=False, index=True)
+    storage_path = Column(String(255), nullable=False)
+    mime_type = Column(String(100), default="image/jpeg", nullable=False)
+    size_bytes = Column(Integer, nullable=False)
+    original_size_bytes = Column(Integer, nullable=True)
+    width = Column(Integer, nullable=True)
+    height = Column(Integer, nullable=True)
+    
+    # Повторная отправка того же файла в Telegram не скачивается заново
+    telegram_file_unique_id = Column(String(255), nullable=True, index=True)
+    
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    # Отношения
+    order = relationship("Order", back_populates="attachments")
+
+
 class Payment(Base):
     """Платежи"""
     __tablename__ = "payments"
     
     id = Column(Integer, primary_key=True, index=True)
     order_id = Column(Integer, ForeignKey("orders.id"), nullable=False)
+    client_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    recorded_by = Column(Integer, ForeignKey("users.id"), nullable=True)
     payment_type = Column(String(50), nullable=False)
     amount = Column(Numeric(10, 2), nullable=False)
     
@@ -171,6 +244,46 @@ class Payment(Base):
     
     # Отношения
     order = relationship("Order", back_populates="payments")
+    receipts = relationship("PaymentReceipt", back_populates="payment")
+
+
+class PaymentReceipt(Base):
+    """Чеки оплаты (фото и скриншоты), хранятся по sha256 исходного файла"""
+    __tablename__ = "payment_receipts"
+    __table_args__ = (
+        UniqueConstraint("order_id", "content_hash", name="uq_payment_receipts_content"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False, index=True)
+    payment_id = Column(Integer, ForeignKey("payments.id"), nullable=True, index=True)
+    client_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    
+    # Содержимое: sha256 исходного файла и миниатюра
+    content_hash = Column(String(64), nullable=False, index=True)
+    storage_path = Column(String(255), nullable=False)
+    thumbnail_path = Column(String(255), nullable=True)
+    mime_type = Column(String(100), default="image/jpeg", nullable=False)
+    size_bytes = Column(Integer, nullable=False)
+    width = Column(Integer, nullable=True)
+    height = Column(Integer, nullable=True)
+    telegram_file_unique_id = Column(String(255), nullable=True, index=True)
+    
+    # Тот же чек уже присылали к другому заказу (повторно использованный скриншот)
+    duplicate_of_id = Column(Integer, ForeignKey("payment_receipts.id"), nullable=True)
+    
+    # Проверка оператором: pending, accepted, rejected
+    status = Column(String(20), default="pending", nullable=False, index=True)
+    reviewed_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    reviewed_at = Column(DateTime(timezone=True), nullable=True)
+    
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    # Отношения
+    order = relationship("Order", back_populates="receipts")
+    payment = relationship("Payment", back_populates="receipts")
+    client = relationship("User", foreign_keys=[client_id])
+    duplicate_of = relationship("PaymentReceipt", remote_side=[id])
 
 
 class Debt(Base):
@@ -198,6 +311,113 @@ class Debt(Base):
     collector = relationship("User", foreign_keys=[collected_by])
 
 
+class ClientBalance(Base):
+    """Текущий баланс клиента: обновляется в той же транзакции, что и операция"""
+    __tablename__ = "client_balances"
+    
+    client_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    charged_total = Column(Numeric(12, 2), default=0.00, nullable=False)
+    paid_total = Column(Numeric(12, 2), default=0.00, nullable=False)
+    outstanding = Column(Numeric(12, 2), default=0.00, nullable=False)  # charged_total - paid_total
+    active_debt = Column(Numeric(12, 2), default=0.00, nullable=False)  # остаток по активным долгам
+    
+    last_entry_id = Column(Integer, nullable=True)
+    last_payment_at = Column(DateTime(timezone=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    # Отношения
+    client = relationship("User")
+
+
+class BalanceEntry(Base):
+    """Журнал операций по балансу клиента с нарастающим итогом"""
+    __tablename__ = "balance_entries"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    client_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    order_id = Column(Integer, ForeignKey("orders.id"), nullable=True)
+    payment_id = Column(Integer, ForeignKey("payments.id"), nullable=True)
+    
+    # charge (+ сумма заказа), payment (- оплата), reversal (- отмена начисления), adjustment (исправление сверки)
+    kind = Column(String(20), nullable=False)
+    amount = Column(Numeric(12, 2), nullable=False)
+    balance_after = Column(Numeric(12, 2), nullable=False)
+    
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class DebtWorkItem(Base):
+    """Должник в списке торгового представителя: приоритет пересчитывается при изменении долгов"""
+    __tablename__ = "debt_worklist"
+    
+    client_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    sales_rep_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    zone = Column(String(50), nullable=True)
+    
+    # Активные долги клиента и приоритет: сумма × возраст × риск
+    outstanding = Column(Numeric(12, 2), nullable=False)
+    debt_count = Column(Integer, default=0, nullable=False)
+    oldest_debt_at = Column(DateTime(timezone=True), nullable=True)
+    risk = Column(Float, default=1.0, nullable=False)
+    priority = Column(Float, default=0.0, nullable=False)
+    
+    # Копия данных клиента и аптеки: экран представителя читается без join
+    client_name = Column(String(255), nullable=True)
+    phone = Column(String(20), nullable=True)
+    pharmacy_name = Column(String(255), nullable=True)
+    address = Column(Text, nullable=True)
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
+    
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class ClientSummary(Base):
+    """Сводка клиента для экрана "Мои заявки": обновляется событиями заказов и оплат"""
+    __tablename__ = "client_summaries"
+    
+    client_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    
+    # Счетчики заказов (отклоненные не входят в сумму)
+    order_count = Column(Integer, default=0, nullable=False)
+    open_order_count = Column(Integer, default=0, nullable=False)
+    orders_amount = Column(Numeric(12, 2), default=0.00, nullable=False)
+    last_order_at = Column(DateTime(timezone=True), nullable=True)
+    
+    # Последние заказы: [{id, order_number, status, total_amount, paid_amount, created_at, delivered_at}]
+    recent_orders = Column(JSON, nullable=False, default=list)
+    
+    # Копия баланса и последней оплаты
+    outstanding = Column(Numeric(12, 2), default=0.00, nullable=False)
+    last_payment_at = Column(DateTime(timezone=True), nullable=True)
+    last_payment_amount = Column(Numeric(12, 2), nullable=True)
+    
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class ArchivedOrder(Base):
+    """Индекс архива закрытых заказов: сам заказ с позициями и оплатами лежит в сжатом файле"""
+    __tablename__ = "order_archive"
+    
+    order_id = Column(Integer, primary_key=True)  # id заказа в основной таблице
+    order_number = Column(String(50), unique=True, nullable=False, index=True)
+    client_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    status = Column(String(50), nullable=False)
+    
+    # Суммы для сверки балансов клиентов после удаления заказа и оплат из основных таблиц
+    total_amount = Column(Numeric(10, 2), nullable=False)
+    charged_amount = Column(Numeric(10, 2), default=0.00, nullable=False)
+    paid_total = Column(Numeric(10, 2), default=0.00, nullable=False)
+    
+    created_at = Column(DateTime(timezone=True), nullable=True)
+    closed_at = Column(DateTime(timezone=True), nullable=True)
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    # Файл архива (относительно archive_path) и номер строки в нем
+    archive_file = Column(String(500), nullable=False)
+    position = Column(Integer, nullable=False)
+
+
 class Location(Base):
     """Геолокация"""
     __tablename__ = "locations"
@@ -241,3 +461,23 @@ class ActivityLog(Base):
     
     # Отношения
     user = relationship("User", back_populates="activity_logs")
+
+
+class GeocodeCache(Base):
+    """Кэш геокодирования"""
+    __tablename__ = "geocode_cache"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    cache_key = Column(String(512), unique=True, nullable=False, index=True)
+    query = Column(Text, nullable=False)
+    
+    # Результат (пустой при отрицательном кэшировании)
+    found = Column(Boolean, default=True, nullable=False)
+    latitude = Column(Numeric(10, 8), nullable=True)
+    longitude = Column(Numeric(11, 8), nullable=True)
+    formatted_address = Column(Text, nullable=True)
+    place_id = Column(String(255), nullable=True)
+    provider = Column(String(50), nullable=False)
+    
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False)
@@ -0,0 +1,212 @@
+"""
+📚 Чтение с реплик MAXXPHARM CRM
+
+Методы отчетов помечаются @read_only и выполняются в сессии реплики из
+DATABASE_REPLICA_URLS, если ее отставание не больше REPLICA_MAX_LAG_SECONDS.
+Иначе, а также когда сессия уже что-то записала или пользователь писал
+в последние REPLICA_STICKY_SECONDS (читает свои же изменения), запрос
+идет в основную базу.
+"""
+
+import asyncio
+import copy
+import functools
+import itertools
+import logging
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from aiogram import BaseMiddleware
+from sqlalchemy import event, text, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .database import AsyncSessionLocal, engine_options
+from .metrics import metrics, instrument_engine
+
+logger = logging.getLogger(__name__)
+
+# Отставание реплики PostgreSQL; 0, если все полученное уже применено (основная база простаивает)
+LAG_QUERY = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+# Пользователь текущего обновления Telegram (для чтения своих записей)
+current_actor: ContextVar[Optional[int]] = ContextVar("current_actor", default=None)
+
+
+class Replica:
+    def __init__(self, url: str):
+        self.name = make_url(url).host or make_url(url).database
+        self.engine: AsyncEngine = create_async_engine(url, **engine_options(url))
+        instrument_engine(self.engine)
+        self.lag: Optional[float] = None  # None - еще не проверена или недоступна
+
+
+class ReplicaRouter:
+    """Выбор реплики по отставанию и липкость к основной базе после записи"""
+    
+    def __init__(self):
+        self.replicas: List[Replica] = []
+        self._next = itertools.count()
+        self._writes: Dict[int, float] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._configured = False
+    
+    def configure(self) -> None:
+        if self._configured:
+            return
+        self._configured = True
+        urls = [url.strip() for url in settings.database_replica_urls.split(",") if url.strip()]
+        self.replicas = [Replica(url) for url in urls]
+        if self.replicas:
+            metrics.gauge("db_replica_lag_seconds", self._lag_gauges, "Отставание реплики")
+            logger.info(f"📚 Read replicas: {', '.join(replica.name for replica in self.replicas)}")
+    
+    @property
+    def enabled(self) -> bool:
+        self.configure()
+        return bool(self.replicas)
+    
+    def _lag_gauges(self) -> dict:
+        return {(("replica", replica.name),): replica.lag for replica in self.replicas if replica.lag is not None}
+    
+    def mark_write(self, actor: int) -> None:
+        self._writes[actor] = time.monotonic()
+        if len(self._writes) > 10000:
+            # Старые отметки больше не влияют на выбор
+            horizon = time.monotonic() - settings.replica_sticky_seconds
+            self._writes = {key: at for key, at in self._writes.items() if at >= horizon}
+    
+    def is_sticky(self, actor: Optional[int]) -> bool:
+        written = self._writes.get(actor) if actor is not None else None
+        return written is not None and time.monotonic() - written < settings.replica_sticky_seconds
+    
+    def pick(self, session: Optional[AsyncSession] = None) -> Optional[Replica]:
+        """Реплика для чтения или None (читать из основной базы)"""
+        if not self.enabled:
+            return None
+        reason = None
+        if session is not None and session.sync_session.info.get("wrote"):
+            reason = "session_wrote"
+        elif self.is_sticky(current_actor.get()):
+            reason = "sticky"
+        else:
+            fresh = [r for r in self.replicas if r.lag is not None and r.lag <= settings.replica_max_lag_seconds]
+            if fresh:
+                metrics.inc("db_reads_total", description="Чтения @read_only по месту выполнения", target="replica")
+                return fresh[next(self._next) % len(fresh)]
+            reason = "lag"
+        metrics.inc("db_reads_total", description="Чтения @read_only по месту выполнения", target="primary", reason=reason)
+        return None
+    
+    async def check_lag(self) -> None:
+        self.configure()
+        for replica in self.replicas:
+            try:
+                async with replica.engine.connect() as conn:
+                    if conn.dialect.name == "postgresql":
+                        replica.lag = float((await conn.execute(LAG_QUERY)).scalar())
+                    else:
+                        # SQLite как замена реплики в тестах: отставания нет
+                        await conn.execute(text("SELECT 1"))
+                        replica.lag = 0.0
+            except Exception as e:
+                if replica.lag is not None:
+                    logger.warning(f"⚠️ Replica {replica.name} unavailable: {e}")
+                replica.lag = None
+    
+    def start(self) -> None:
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.check_lag()
+            except Exception as e:
+                logger.error(f"❌ Replica lag check error: {e}")
+            await asyncio.sleep(settings.replica_lag_check_seconds)
+    
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+
+# Глобальный маршрутизатор чтения
+replica_router = ReplicaRouter()
+
+
+@asynccontextmanager
+async def read_session(session: Optional[AsyncSession] = None):
+    """Сессия для чтения: реплика, если подходит, иначе переданная сессия или новая на основной базе"""
+    replica = replica_router.pick(session)
+    if replica is None and session is not None:
+        yield session
+        return
+    
+    async with (AsyncSessionLocal(bind=replica.engine) if replica else AsyncSessionLocal()) as read:
+        read.sync_session.info["replica"] = replica is not None
+        yield read
+
+
+def read_only(method: Callable[..., Awaitable[Any]]):
+    """Метод сервиса только читает: выполняется на копии сервиса с сессией реплики"""
+    
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        if not replica_router.enabled or self.session.sync_session.info.get("replica"):
+            return await method(self, *args, **kwargs)
+        
+        async with read_session(self.session) as session:
+            if session is self.session:
+                return await method(self, *args, **kwargs)
+            service = copy.copy(self)
+            service.session = session
+            return await method(service, *args, **kwargs)
+    
+    return wrapper
+
+
+@event.listens_for(Session, "after_flush")
+def _after_flush(session, flush_context) -> None:
+    session.info["wrote"] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _on_execute(orm_execute_state) -> None:
+    # UPDATE/DELETE/INSERT через session.execute() минуют flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["wrote"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session) -> None:
+    actor = current_actor.get()
+    if session.info.pop("wrote", False) and actor is not None:
+        replica_router.mark_write(actor)
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session) -> None:
+    session.info.pop("wrote", None)
+
+
+class ActorMiddleware(BaseMiddleware):
+    """Внешний middleware: запоминает пользователя обновления для липкости к основной базе"""
+    
+    async def __call__(self, handler: Callable[..., Awaitable[Any]], event: Any, data: Dict[str, Any]) -> Any:
+        user = data.get("event_from_user")
+        token = current_actor.set(user.id if user else None)
+        try:
+            return await handler(event, data)
+        finally:
+            current_actor.reset(token)
@@ -4,16 +4,40 @@
 
 from .user_service import UserService
 from .order_service import OrderService
-from .payment_service import PaymentService
 from .analytics_service import AnalyticsService
-from .notification_service import NotificationService
 from .location_service import LocationService
+from .assignment_service import AssignmentService
+from .dispatch_service import DispatchService
+from .route_service import RouteService
+from .geocoding_service import GeocodingService
+from .zone_service import ZoneService
+from .catalog_service import CatalogService
+from .order_import_service import OrderImportService
+from .media_service import MediaService
+from .voice_service import VoiceService
+from .receipt_service import ReceiptService
+from .reconciliation_service import ReconciliationService
+from .collection_service import CollectionService
+from .client_summary_service import ClientSummaryService
+from .archive_service import ArchiveService
 
 __all__ = [
     "UserService",
     "OrderService", 
-    "PaymentService",
     "AnalyticsService",
-    "NotificationService",
-    "LocationService"
+    "LocationService",
+    "AssignmentService",
+    "DispatchService",
+    "RouteService",
+    "GeocodingService",
+    "ZoneService",
+    "CatalogService",
+    "OrderImportService",
+    "MediaService",
+    "VoiceService",
+    "ReceiptService",
+    "ReconciliationService",
+    "CollectionService",
+    "ClientSummaryService",
+    "ArchiveService"
 ]
@@ -5,14 +5,15 @@
 from typing import Dict, Any, List, Optional
 from datetime import datetime, timedelta
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_, or_
+from sqlalchemy import select, func, and_, or_, case
 from sqlalchemy.orm import selectinload
 
 from ..models.database import (
     Order, OrderStatus, User, UserRole, Payment, 
-    PaymentType, Debt, ActivityLog
+    PaymentType, Debt, ActivityLog, ClientBalance
 )
 from ..config import settings
+from ..replicas import read_only
 
 
 class AnalyticsService:
@@ -21,6 +22,7 @@ class AnalyticsService:
     def __init__(self, session: AsyncSession):
         self.session = session
     
+    @read_only
     async def get_daily_report(self, date: datetime = None) -> Dict[str, Any]:
         """Генерация ежедневного отчета"""
         
@@ -94,9 +96,16 @@ class AnalyticsService:
         )
         total_debts = debts_result.scalar() or 0
         
+        # Текущая задолженность клиентов - из таблицы балансов, без агрегации по заказам и платежам
+        outstanding_result = await self.session.execute(select(func.sum(ClientBalance.outstanding)))
+        total_outstanding = outstanding_result.scalar() or 0
+        
         # Эффективность сотрудников
         employee_stats = await self._get_employee_efficiency(start_of_day, end_of_day)
         
+        # Разбивка по зонам
+        zone_stats = await self.get_zone_stats(start_of_day, end_of_day)
+        
         report = {
             'date': date.strftime('%d.%m.%Y'),
             'total_orders': total_orders,
@@ -107,6 +116,7 @@ class AnalyticsService:
             'total_revenue': float(total_revenue),
             'total_payments': float(total_payments),
             'total_debts': float(total_debts),
+            'total_outstanding': float(total_outstanding),
             'confirmation_rate': self._calculate_rate(
                 status_stats.get(OrderStatus.CONFIRMED.value, 0),
                 status_stats.get(OrderStatus.CREATED.value, 0)
@@ -115,11 +125,13 @@ class AnalyticsService:
                 status_stats.get(OrderStatus.DELIVERED.value, 0),
                 status_stats.get(OrderStatus.CONFIRMED.value, 0)
             ),
-            'employee_stats': employee_stats
+            'employee_stats': employee_stats,
+            'zone_stats': zone_stats
         }
         
         return report
     
+    @read_only
     async def get_weekly_report(self, start_date: datetime = None) -> Dict[str, Any]:
         """Генерация недельного отчета"""
         
@@ -174,6 +186,7 @@ class AnalyticsService:
             )
         }
     
+    @read_only
     async def get_monthly_report(self, year: int = None, month: int = None) -> Dict[str, Any]:
         """Генерация месячного отчета"""
         
@@ -253,7 +266,7 @@ class AnalyticsService:
             ai_report = await self._call_openai_api(prompt)
             
             return ai_report
-            
+        
         except Exception as e:
             return f"❌ Ошибка генерации AI отчета: {str(e)}"
     
@@ -372,6 +385,43 @@ class AnalyticsService:
         
         return prompt
     
+    @read_only
+    async def get_zone_stats(
+        self,
+        start_date: datetime,
+        end_date: datetime
+    ) -> List[Dict[str, Any]]:
+        """Заказы, доставки и оборот по зонам за период"""
+        
+        delivered = case((Order.status == OrderStatus.DELIVERED.value, 1), else_=0)
+        
+        result = await self.session.execute(
+            select(
+                Order.zone,
+                func.count(Order.id).label('orders'),
+                func.sum(delivered).label('delivered'),
+                func.sum(Order.total_amount).label('total_amount')
+            )
+            .where(
+                and_(
+                    Order.created_at >= start_date,
+                    Order.created_at <= end_date
+                )
+            )
+            .group_by(Order.zone)
+            .order_by(func.count(Order.id).desc())
+        )
+        
+        return [
+            {
+                'zone': row.zone or 'без зоны',
+                'orders': row.orders,
+                'delivered': int(row.delivered or 0),
+                'total_amount': float(row.total_amount or 0)
+            }
+            for row in result.all()
+        ]
+    
     async def _get_employee_efficiency(
         self,
         start_date: datetime,
@@ -539,8 +589,7 @@ class AnalyticsService:
 
 # Функция для получения сервиса
 async def get_analytics_service() -> AnalyticsService:
-    """Получение экземпляра AnalyticsService"""
-    from ..database import get_db
+    """Получение экземпляра AnalyticsService на сессии текущего обновления Telegram"""
+    from ..database import update_session
     
-    async for session in get_db():
-        return AnalyticsService(session)
+    return AnalyticsService(update_session())
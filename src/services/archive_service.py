@@ -0,0 +1,299 @@
+"""
+🗄 Архив закрытых заказов MAXXPHARM CRM: сжатые JSONL-файлы и индекс по номеру заказа
+"""
+
+import asyncio
+import gzip
+import json
+import logging
+import os
+import tempfile
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Optional, List, Dict, Any
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, delete, func, and_, exists, inspect, DateTime, Numeric
+from sqlalchemy.orm import selectinload
+
+from ..models.database import (
+    Order, OrderStatus, OrderItem, OrderAttachment, Payment, PaymentReceipt,
+    Debt, BalanceEntry, Location, ArchivedOrder
+)
+from ..database import update_session
+from ..config import settings
+from ..replicas import read_only
+
+logger = logging.getLogger(__name__)
+
+try:
+    import zstandard
+except ImportError:  # zstandard необязателен: без него архив сжимается gzip
+    zstandard = None
+
+# Заказ закрыт: доставлен без долга, оплачен или отклонен
+ARCHIVE_STATUSES = [OrderStatus.DELIVERED.value, OrderStatus.PAID.value, OrderStatus.REJECTED.value]
+
+# Связанные записи, которые уходят в архив вместе с заказом
+RELATED = {
+    "items": OrderItem,
+    "payments": Payment,
+    "debts": Debt,
+    "attachments": OrderAttachment,
+    "receipts": PaymentReceipt,
+}
+
+
+def archive_suffix() -> str:
+    compression = settings.archive_compression
+    if compression == "zstd" or (compression == "auto" and zstandard is not None):
+        return ".jsonl.zst"
+    return ".jsonl.gz"
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def row_to_dict(obj) -> Dict[str, Any]:
+    """Значения колонок модели"""
+    return {attr.key: getattr(obj, attr.key) for attr in inspect(type(obj)).column_attrs}
+
+
+def dict_to_row(model, data: Dict[str, Any]):
+    """Объект модели из записи архива (вне сессии)"""
+    values = {}
+    for attr in inspect(model).column_attrs:
+        value = data.get(attr.key)
+        column_type = attr.columns[0].type
+        if value is not None and isinstance(column_type, DateTime):
+            value = datetime.fromisoformat(value)
+        elif value is not None and isinstance(column_type, Numeric):
+            value = Decimal(value)
+        values[attr.key] = value
+    return model(**values)
+
+
+def write_chunk(root: str, relative_path: str, lines: List[str]) -> int:
+    """Сжатие и атомарная запись файла архива (в пуле потоков); возвращает размер"""
+    data = ("\n".join(lines) + "\n").encode()
+    if relative_path.endswith(".zst"):
+        data = zstandard.ZstdCompressor(level=10).compress(data)
+    else:
+        data = gzip.compress(data, compresslevel=6)
+    
+    path = os.path.join(root, relative_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    return len(data)
+
+
+def read_chunk(root: str, relative_path: str) -> List[str]:
+    """Строки файла архива (в пуле потоков)"""
+    with open(os.path.join(root, relative_path), "rb") as file:
+        data = file.read()
+    if relative_path.endswith(".zst"):
+        data = zstandard.ZstdDecompressor().decompress(data)
+    else:
+        data = gzip.decompress(data)
+    return data.decode().splitlines()
+
+
+class ChunkCache:
+    """Несколько последних распакованных файлов: поиск соседних заказов не читает файл заново"""
+    
+    def __init__(self, size: int = 4):
+        self.size = size
+        self._files: "OrderedDict[str, List[str]]" = OrderedDict()
+    
+    async def lines(self, root: str, relative_path: str) -> List[str]:
+        if relative_path in self._files:
+            self._files.move_to_end(relative_path)
+            return self._files[relative_path]
+        
+        lines = await asyncio.get_running_loop().run_in_executor(None, read_chunk, root, relative_path)
+        self._files[relative_path] = lines
+        if len(self._files) > self.size:
+            self._files.popitem(last=False)
+        return lines
+
+
+chunk_cache = ChunkCache()
+
+
+class ArchiveService:
+    """Перенос закрытых заказов в архив порциями и чтение из архива по номеру"""
+    
+    def __init__(self, session: AsyncSession, root: Optional[str] = None):
+        self.session = session
+        self.root = root or settings.archive_path
+    
+    def _eligible(self, cutoff: datetime):
+        """Закрыт дольше срока, без активных долгов и непроверенных чеков"""
+        return and_(
+            Order.status.in_(ARCHIVE_STATUSES),
+            func.coalesce(Order.delivered_at, Order.updated_at, Order.created_at) < cutoff,
+            ~exists().where(Debt.order_id == Order.id, Debt.is_active == True),
+            ~exists().where(PaymentReceipt.order_id == Order.id, PaymentReceipt.status == "pending")
+        )
+    
+    async def archive_closed(self, now: Optional[datetime] = None, days: Optional[int] = None) -> Dict[str, Any]:
+        """Архивация порциями: файл пишется до удаления строк, каждая порция - своя точка сохранения
+        
+        Фиксирует вызывающий код (SessionMiddleware или ночной планировщик).
+        """
+        now = now or datetime.utcnow()
+        cutoff = now - timedelta(days=days if days is not None else settings.archive_after_days)
+        stats = {"orders": 0, "files": 0, "bytes": 0}
+        last_id = 0
+        
+        while True:
+            result = await self.session.execute(
+                select(Order.id)
+                .where(self._eligible(cutoff), Order.id > last_id)
+                .order_by(Order.id.asc())
+                .limit(settings.archive_chunk_size)
+            )
+            order_ids = result.scalars().all()
+            if not order_ids:
+                break
+            
+            last_id = order_ids[-1]
+            stats["bytes"] += await self._archive_chunk(order_ids, now)
+            stats["orders"] += len(order_ids)
+            stats["files"] += 1
+        
+        if stats["orders"]:
+            logger.info(f"🗄 Archived {stats['orders']} orders into {stats['files']} files ({stats['bytes']} bytes)")
+        return stats
+    
+    async def _archive_chunk(self, order_ids: List[int], now: datetime) -> int:
+        orders = (await self.session.execute(
+            select(Order)
+            .options(
+                selectinload(Order.items),
+                selectinload(Order.payments),
+                selectinload(Order.attachments),
+                selectinload(Order.receipts)
+            )
+            .where(Order.id.in_(order_ids))
+            .order_by(Order.id.asc())
+        )).scalars().all()
+        debts: Dict[int, List[Debt]] = {}
+        for debt in (await self.session.execute(select(Debt).where(Debt.order_id.in_(order_ids)))).scalars().all():
+            debts.setdefault(debt.order_id, []).append(debt)
+        
+        relative_path = f"orders/{now:%Y/%m}/orders-{order_ids[0]}-{order_ids[-1]}{archive_suffix()}"
+        lines, index_rows = [], []
+        for position, order in enumerate(orders):
+            record = {
+                "order": row_to_dict(order),
+                "items": [row_to_dict(item) for item in order.items],
+                "payments": [row_to_dict(payment) for payment in order.payments],
+                "debts": [row_to_dict(debt) for debt in debts.get(order.id, [])],
+                "attachments": [row_to_dict(attachment) for attachment in order.attachments],
+                "receipts": [row_to_dict(receipt) for receipt in order.receipts],
+            }
+            lines.append(json.dumps(record, ensure_ascii=False, separators=(",", ":"), default=_json_default))
+            index_rows.append({
+                "order_id": order.id,
+                "order_number": order.order_number,
+                "client_id": order.client_id,
+                "status": order.status,
+                "total_amount": order.total_amount,
+                "charged_amount": order.total_amount if order.charged_at else 0,
+                "paid_total": sum((payment.amount for payment in order.payments), Decimal("0")),
+                "created_at": order.created_at,
+                "closed_at": order.delivered_at or order.updated_at or order.created_at,
+                "archive_file": relative_path,
+                "position": position,
+            })
+        
+        size = await asyncio.get_running_loop().run_in_executor(None, write_chunk, self.root, relative_path, lines)
+        
+        try:
+            # Ошибка откатывает только эту порцию: уже перенесенные остаются в транзакции
+            async with self.session.begin_nested():
+                await self.session.execute(ArchivedOrder.__table__.insert(), index_rows)
+                payment_ids = select(Payment.id).where(Payment.order_id.in_(order_ids)).scalar_subquery()
+                receipt_ids = select(PaymentReceipt.id).where(PaymentReceipt.order_id.in_(order_ids)).scalar_subquery()
+                # Журнал балансов и геолокации остаются, ссылки на удаляемые строки обнуляются
+                await self.session.execute(
+                    update(BalanceEntry).where(BalanceEntry.payment_id.in_(payment_ids)).values(payment_id=None)
+                )
+                await self.session.execute(
+                    update(BalanceEntry).where(BalanceEntry.order_id.in_(order_ids)).values(order_id=None)
+                )
+                await self.session.execute(
+                    update(Location).where(Location.order_id.in_(order_ids)).values(order_id=None)
+                )
+                await self.session.execute(
+                    update(PaymentReceipt)
+                    .where(PaymentReceipt.duplicate_of_id.in_(receipt_ids), PaymentReceipt.order_id.notin_(order_ids))
+                    .values(duplicate_of_id=None)
+                )
+                for model in (PaymentReceipt, OrderAttachment, Debt, Payment, OrderItem, Order):
+                    column = model.id if model is Order else model.order_id
+                    await self.session.execute(delete(model).where(column.in_(order_ids)))
+        finally:
+            self.session.expunge_all()
+        return size
+    
+    async def get_order(self, order_number: str) -> Optional[Order]:
+        """Заказ из архива со связанными записями (объекты вне сессии, только для чтения)"""
+        entry = (await self.session.execute(
+            select(ArchivedOrder).where(ArchivedOrder.order_number == order_number)
+        )).scalar_one_or_none()
+        if entry is None:
+            return None
+        
+        lines = await chunk_cache.lines(self.root, entry.archive_file)
+        record = json.loads(lines[entry.position])
+        order = dict_to_row(Order, record["order"])
+        for relation, model in RELATED.items():
+            rows = [dict_to_row(model, data) for data in record.get(relation, [])]
+            if relation != "debts":
+                setattr(order, relation, rows)
+        order.is_archived = True
+        return order
+    
+    @read_only
+    async def get_stats(self) -> Dict[str, Any]:
+        """Сводка архива для администратора"""
+        result = await self.session.execute(
+            select(
+                func.count(ArchivedOrder.order_id),
+                func.sum(ArchivedOrder.total_amount),
+                func.min(ArchivedOrder.closed_at),
+                func.max(ArchivedOrder.closed_at),
+                func.count(func.distinct(ArchivedOrder.archive_file)),
+                func.max(ArchivedOrder.archived_at)
+            )
+        )
+        count, amount, oldest, newest, files, last_run = result.one()
+        return {
+            'orders': count or 0,
+            'amount': float(amount or 0),
+            'oldest': oldest,
+            'newest': newest,
+            'files': files or 0,
+            'last_archived_at': last_run,
+        }
+
+
+# Функция для получения сервиса
+async def get_archive_service() -> ArchiveService:
+    """Получение экземпляра ArchiveService на сессии текущего обновления Telegram"""
+    return ArchiveService(update_session())
@@ -0,0 +1,464 @@
+"""
+🎯 Сервис автоматического назначения сотрудников MAXXPHARM CRM
+"""
+
+import heapq
+import itertools
+import logging
+import time
+from typing import Optional, List, Dict, Any, Iterable, Set, Tuple
+from datetime import datetime
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, case
+
+from ..models.database import User, UserRole, Order, OrderStatus
+from ..config import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+# Роль, которая назначается при переходе заказа в статус
+ROLE_FOR_STATUS = {
+    OrderStatus.CONFIRMED.value: UserRole.COLLECTOR,
+    OrderStatus.COLLECTED.value: UserRole.CHECKER,
+    OrderStatus.READY_FOR_DELIVERY.value: UserRole.COURIER,
+}
+
+# Роль, которая освобождается при переходе заказа в статус
+RELEASE_ON_STATUS = {
+    OrderStatus.COLLECTED.value: UserRole.COLLECTOR,
+    OrderStatus.READY_FOR_DELIVERY.value: UserRole.CHECKER,
+    OrderStatus.DELIVERED.value: UserRole.COURIER,
+}
+
+# Поле заказа, в котором хранится сотрудник роли
+ORDER_FIELD_FOR_ROLE = {
+    UserRole.COLLECTOR.value: "collector_id",
+    UserRole.CHECKER.value: "checker_id",
+    UserRole.COURIER.value: "courier_id",
+}
+
+ASSIGNABLE_ROLES = [UserRole.COLLECTOR, UserRole.CHECKER, UserRole.COURIER]
+
+
+class WorkerLoad:
+    """Текущая нагрузка сотрудника"""
+    
+    __slots__ = (
+        "user_id", "role", "zone", "is_online", "active_orders",
+        "max_orders", "performance_score", "last_assigned_at", "version"
+    )
+    
+    def __init__(
+        self,
+        user_id: int,
+        role: str,
+        zone: Optional[str] = None,
+        is_online: bool = True,
+        active_orders: int = 0,
+        max_orders: int = 5,
+        performance_score: float = 5.0,
+        last_assigned_at: Optional[float] = None
+    ):
+        self.user_id = user_id
+        self.role = role
+        self.zone = zone
+        self.is_online = is_online
+        self.active_orders = active_orders
+        self.max_orders = max_orders
+        self.performance_score = performance_score
+        self.last_assigned_at = last_assigned_at
+        self.version = 0
+    
+    @classmethod
+    def from_user(cls, user: User) -> "WorkerLoad":
+        """Создание из модели пользователя"""
+        return cls(
+            user_id=user.id,
+            role=user.role,
+            zone=user.zone,
+            is_online=bool(user.is_online) and bool(user.is_active) and not user.is_blocked,
+            active_orders=user.active_orders or 0,
+            max_orders=user.max_orders if user.max_orders is not None else settings.max_orders_per_worker,
+            performance_score=float(user.performance_score or 0),
+            last_assigned_at=user.last_assigned_at.timestamp() if user.last_assigned_at else None
+        )
+    
+    @property
+    def is_available(self) -> bool:
+        """Может ли сотрудник взять еще заказ"""
+        return self.is_online and self.active_orders < self.max_orders
+    
+    def priority(self) -> Tuple[float, float]:
+        """Ключ приоритета (как в get_optimal_worker из crm_database.sql)"""
+        # Меньше нагрузка и выше рейтинг - раньше; давно не назначенные - раньше,
+        # никогда не назначенные - после них (NULLS LAST)
+        score = self.active_orders * 2.0 - self.performance_score
+        last = self.last_assigned_at if self.last_assigned_at is not None else float("inf")
+        return (score, last)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Представление для отчетов"""
+        return {
+            "user_id": self.user_id,
+            "role": self.role,
+            "zone": self.zone,
+            "is_online": self.is_online,
+            "active_orders": self.active_orders,
+            "max_orders": self.max_orders,
+            "performance_score": self.performance_score,
+        }
+
+
+class WorkerLoadBalancer:
+    """In-memory куча сотрудников по нагрузке для выбора за O(log n)"""
+    
+    def __init__(self):
+        self._workers: Dict[int, WorkerLoad] = {}
+        # (роль, зона) -> куча записей (приоритет, seq, user_id, version);
+        # зона None - общая куча роли
+        self._heaps: Dict[Tuple[str, Optional[str]], List[tuple]] = {}
+        self._counter = itertools.count()
+        self.synced_at: Optional[float] = None
+    
+    def load(self, workers: Iterable[WorkerLoad]) -> None:
+        """Полная перезагрузка состояния"""
+        self._workers = {}
+        self._heaps = {}
+        for worker in workers:
+            self._workers[worker.user_id] = worker
+            self._push(worker)
+        self.synced_at = time.monotonic()
+    
+    def is_stale(self, max_age_seconds: float) -> bool:
+        """Нужна ли повторная синхронизация с БД"""
+        return self.synced_at is None or time.monotonic() - self.synced_at > max_age_seconds
+    
+    def get(self, user_id: int) -> Optional[WorkerLoad]:
+        """Получение нагрузки сотрудника"""
+        return self._workers.get(user_id)
+    
+    def upsert(self, worker: WorkerLoad) -> None:
+        """Добавление или обновление сотрудника"""
+        current = self._workers.get(worker.user_id)
+        if current is not None:
+            worker.version = current.version + 1
+        self._workers[worker.user_id] = worker
+        self._push(worker)
+    
+    def remove(self, user_id: int) -> None:
+        """Удаление сотрудника (записи в кучах становятся устаревшими)"""
+        worker = self._workers.pop(user_id, None)
+        if worker is not None:
+            worker.version += 1
+    
+    def set_online(self, user_id: int, is_online: bool) -> None:
+        """Изменение статуса онлайн"""
+        worker = self._workers.get(user_id)
+        if worker is None or worker.is_online == is_online:
+            return
+        worker.is_online = is_online
+        self._touch(worker)
+    
+    def adjust(self, user_id: int, delta: int) -> None:
+        """Изменение количества активных заказов сотрудника"""
+        worker = self._workers.get(user_id)
+        if worker is None:
+            return
+        worker.active_orders = max(worker.active_orders + delta, 0)
+        if delta > 0:
+            worker.last_assigned_at = time.time()
+        self._touch(worker)
+    
+    def best(
+        self,
+        role: str,
+        zone: Optional[str] = None,
+        exclude: Optional[Set[int]] = None
+    ) -> Optional[WorkerLoad]:
+        """Лучший доступный сотрудник роли (в зоне, иначе любой)"""
+        if zone is not None:
+            worker = self._peek((role, zone), exclude)
+            if worker is not None:
+                return worker
+        return self._peek((role, None), exclude)
+    
+    def snapshot(self, role: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Текущая нагрузка сотрудников"""
+        return [
+            worker.to_dict()
+            for worker in self._workers.values()
+            if role is None or worker.role == role
+        ]
+    
+    def _touch(self, worker: WorkerLoad) -> None:
+        """Инвалидация старых записей и повторная вставка"""
+        worker.version += 1
+        self._push(worker)
+    
+    def _push(self, worker: WorkerLoad) -> None:
+        """Вставка записи сотрудника в кучи роли и зоны"""
+        if not worker.is_available:
+            return
+        entry = (worker.priority(), next(self._counter), worker.user_id, worker.version)
+        keys = [(worker.role, None)]
+        if worker.zone is not None:
+            keys.append((worker.role, worker.zone))
+        
+        for key in keys:
+            heap = self._heaps.setdefault(key, [])
+            heapq.heappush(heap, entry)
+            
+            # Устаревшие записи удаляются лениво; не даем куче разрастаться
+            if len(heap) > 4 * len(self._workers) + 64:
+                self._compact(key)
+    
+    def _compact(self, key: Tuple[str, Optional[str]]) -> None:
+        """Перестроение кучи только из актуальных записей"""
+        heap = [
+            entry for entry in self._heaps[key]
+            if entry[2] in self._workers
+            and self._workers[entry[2]].version == entry[3]
+            and self._workers[entry[2]].is_available
+        ]
+        heapq.heapify(heap)
+        self._heaps[key] = heap
+    
+    def _peek(
+        self,
+        key: Tuple[str, Optional[str]],
+        exclude: Optional[Set[int]] = None
+    ) -> Optional[WorkerLoad]:
+        """Вершина кучи с ленивым удалением устаревших записей"""
+        heap = self._heaps.get(key)
+        if not heap:
+            return None
+        
+        skipped = []
+        found = None
+        while heap:
+            entry = heap[0]
+            worker = self._workers.get(entry[2])
+            if worker is None or worker.version != entry[3] or not worker.is_available:
+                heapq.heappop(heap)
+                continue
+            if exclude and worker.user_id in exclude:
+                skipped.append(heapq.heappop(heap))
+                continue
+            found = worker
+            break
+        
+        for entry in skipped:
+            heapq.heappush(heap, entry)
+        
+        return found
+
+
+# Глобальный балансировщик нагрузки
+worker_balancer = WorkerLoadBalancer()
+
+
+class AssignmentService:
+    """Сервис автоматического назначения сборщиков, проверщиков и курьеров"""
+    
+    # Сколько кандидатов пробуем, если строки сотрудников заблокированы
+    MAX_ATTEMPTS = 5
+    
+    def __init__(self, session: AsyncSession, balancer: Optional[WorkerLoadBalancer] = None):
+        self.session = session
+        self.balancer = balancer or worker_balancer
+    
+    async def sync_workers(self) -> int:
+        """Синхронизация нагрузки сотрудников из базы данных"""
+        result = await self.session.execute(
+            select(User).where(
+                User.role.in_([role.value for role in ASSIGNABLE_ROLES]),
+                User.is_active == True
+            )
+        )
+        workers = [WorkerLoad.from_user(user) for user in result.scalars().all()]
+        self.balancer.load(workers)
+        
+        logger.info(f"🎯 Worker load synced: {len(workers)} workers")
+        return len(workers)
+    
+    async def ensure_synced(self) -> None:
+        """Синхронизация, если данные устарели"""
+        if self.balancer.is_stale(settings.worker_sync_interval_seconds):
+            await self.sync_workers()
+    
+    async def on_status_change(self, order: Order, old_status: str, new_status: str) -> Optional[User]:
+        """Освобождение и назначение сотрудников при смене статуса заказа.
+
+        Вызывается внутри транзакции смены статуса, коммит - на вызывающей стороне.
+        """
+        if new_status == OrderStatus.REJECTED.value:
+            for role in ASSIGNABLE_ROLES:
+                await self.release(order, role)
+            return None
+        
+        release_role = RELEASE_ON_STATUS.get(new_status)
+        if release_role is not None:
+            await self.release(order, release_role)
+        
+        assign_role = ROLE_FOR_STATUS.get(new_status)
+        if assign_role is None:
+            return None
+        
+        candidates = None
+        if assign_role == UserRole.COURIER and settings.geo_dispatch_enabled:
+            # Курьеры ранжируются по расстоянию до точки доставки; без координат аптеки
+            # радиус не проверить - назначение по нагрузке зоны
+            from .dispatch_service import DispatchService
+            
+            dispatch = DispatchService(self.session, balancer=self.balancer)
+            destination = await dispatch.get_order_destination(order)
+            if destination is not None:
+                ranked = await dispatch.rank_couriers(destination[0], destination[1])
+                candidates = [candidate['courier_id'] for candidate in ranked]
+                
+                # Рейс - одному курьеру: если другие заказы рейса уже у курьера, он первый
+                # кандидат (точки рейса рядом, радиус проверен при назначении первой из них)
+                from .route_service import RouteService
+                
+                trip_courier = await RouteService(self.session).trip_courier(order)
+                if trip_courier is not None:
+                    candidates = [trip_courier] + [courier_id for courier_id in candidates if courier_id != trip_courier]
+        
+        return await self.assign(order, assign_role, candidates)
+    
+    async def assign(
+        self,
+        order: Order,
+        role: UserRole,
+        candidates: Optional[List[int]] = None
+    ) -> Optional[User]:
+        """Назначение наименее загруженного сотрудника на заказ.
+        
+        Если переданы candidates (курьеры в радиусе доставки), назначается только
+        один из них в указанном порядке; если все заняты, заказ остается без
+        назначения и ждет предложения курьеров.
+        """
+        field = ORDER_FIELD_FOR_ROLE[role.value]
+        
+        # Блокируем строку заказа, чтобы параллельная транзакция не назначила второго
+        locked = await self.session.execute(
+            select(getattr(Order, field))
+            .where(Order.id == order.id)
+            .with_for_update()
+        )
+        if locked.scalar_one_or_none() is not None:
+            return None
+        
+        await self.ensure_synced()
+        
+        zone = order.zone
+        tried: Set[int] = set()
+        preferred = list(candidates or [])
+        
+        for _ in range(self.MAX_ATTEMPTS + len(preferred)):
+            if preferred:
+                candidate_id = preferred.pop(0)
+            elif candidates is not None:
+                # Радиус доставки - жесткое ограничение: балансировщик не выбирает курьеров вне его
+                logger.warning(f"⚠️ No {role.value} within delivery radius available for order {order.id}")
+                return None
+            else:
+                candidate = self.balancer.best(role.value, zone, exclude=tried)
+                if candidate is None:
+                    logger.warning(f"⚠️ No available {role.value} for order {order.id}")
+                    return None
+                candidate_id = candidate.user_id
+            
+            if candidate_id in tried:
+                continue
+            
+            tried.add(candidate_id)
+            worker = await self._reserve(candidate_id)
+            if worker is None:
+                continue
+            
+            setattr(order, field, worker.id)
+            order.updated_at = datetime.utcnow()
+            self.balancer.adjust(worker.id, +1)
+            
+            logger.info(f"🎯 Order {order.id}: {role.value} {worker.id} assigned")
+            return worker
+        
+        return None
+    
+    async def release(self, order: Order, role: UserRole) -> None:
+        """Уменьшение нагрузки сотрудника роли после завершения этапа"""
+        user_id = getattr(order, ORDER_FIELD_FOR_ROLE[role.value])
+        if user_id is None:
+            return
+        
+        await self.session.execute(
+            update(User)
+            .where(User.id == user_id)
+            .values(
+                active_orders=case(
+                    (User.active_orders > 0, User.active_orders - 1),
+                    else_=0
+                )
+            )
+        )
+        self.balancer.adjust(user_id, -1)
+    
+    async def reassign(self, order: Order, role: UserRole, employee_id: int) -> None:
+        """Ручное переназначение с учетом нагрузки"""
+        field = ORDER_FIELD_FOR_ROLE[role.value]
+        if getattr(order, field) == employee_id:
+            return
+        
+        await self.release(order, role)
+        await self.session.execute(
+            update(User)
+            .where(User.id == employee_id)
+            .values(
+                active_orders=User.active_orders + 1,
+                last_assigned_at=datetime.utcnow()
+            )
+        )
+        setattr(order, field, employee_id)
+        self.balancer.adjust(employee_id, +1)
+    
+    async def set_online(self, user_id: int, is_online: bool) -> None:
+        """Изменение статуса онлайн сотрудника"""
+        await self.session.execute(
+            update(User).where(User.id == user_id).values(is_online=is_online)
+        )
+        self.balancer.set_online(user_id, is_online)
+    
+    async def _reserve(self, user_id: int) -> Optional[User]:
+        """Резервирование слота сотрудника под блокировкой строки"""
+        result = await self.session.execute(
+            select(User)
+            .where(User.id == user_id)
+            .with_for_update(skip_locked=True)
+        )
+        user = result.scalar_one_or_none()
+        
+        if user is None:
+            # Строку держит другая транзакция - пробуем следующего
+            return None
+        
+        worker = WorkerLoad.from_user(user)
+        if not worker.is_available:
+            # In-memory состояние устарело - исправляем его
+            self.balancer.upsert(worker)
+            return None
+        
+        user.active_orders = (user.active_orders or 0) + 1
+        user.last_assigned_at = datetime.utcnow()
+        
+        return user
+
+
+# Функция для получения сервиса
+async def get_assignment_service() -> AssignmentService:
+    """Получение экземпляра AssignmentService на сессии текущего обновления Telegram"""
+    from ..database import update_session
+    
+    return AssignmentService(update_session())
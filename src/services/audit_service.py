@@ -0,0 +1,187 @@
+"""
+📝 Журнал действий MAXXPHARM CRM: очередь событий и пакетная запись в activity_logs
+"""
+
+import asyncio
+import contextvars
+import json
+import logging
+import time
+from datetime import datetime
+from typing import Optional, List, Dict, Any
+
+from sqlalchemy import insert, bindparam, JSON
+from sqlalchemy.types import TypeDecorator
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models.database import ActivityLog
+from ..database import AsyncSessionLocal
+from ..config import settings
+from ..metrics import LatencyWindow
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:  # orjson необязателен: без него используется стандартный json
+    orjson = None
+
+
+def dumps_details(details: Optional[Dict[str, Any]]) -> str:
+    """Сериализация деталей один раз, при постановке события в очередь"""
+    if orjson is not None:
+        return orjson.dumps(details or {}, default=str).decode()
+    return json.dumps(details or {}, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+class SerializedJSON(TypeDecorator):
+    """JSON, уже сериализованный в строку: передается драйверу без повторного кодирования"""
+    
+    impl = JSON
+    cache_ok = True
+    
+    def bind_processor(self, dialect):
+        return None
+
+
+INSERT_ACTIVITY = insert(ActivityLog.__table__).values(details=bindparam("details_json", type_=SerializedJSON))
+
+
+class AuditLog:
+    """Очередь событий журнала с фоновой пакетной записью"""
+    
+    def __init__(
+        self,
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        max_size: Optional[int] = None,
+        session_factory=None
+    ):
+        self.batch_size = batch_size or settings.audit_batch_size
+        self.flush_interval = flush_interval or settings.audit_flush_interval
+        self.max_size = max_size or settings.audit_queue_size
+        self.session_factory = session_factory or AsyncSessionLocal
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"enqueued": 0, "written": 0, "batches": 0, "strict": 0, "failed": 0}
+        self.flush_latency = LatencyWindow()
+    
+    def start(self) -> None:
+        """Запуск фоновой записи (при старте приложения)"""
+        if self._task is not None and not self._task.done():
+            return
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_size)
+        # Пустой контекст: писатель не наследует пользователя, трассировку и сессию
+        # обновления, в котором его запустили бы лениво (скрипты, поллинг без lifespan)
+        self._task = contextvars.Context().run(asyncio.create_task, self._writer())
+    
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+    
+    async def record(
+        self,
+        user_id: int,
+        action: str,
+        entity_type: Optional[str] = None,
+        entity_id: Optional[int] = None,
+        details: Optional[Dict[str, Any]] = None,
+        session: Optional[AsyncSession] = None,
+        strict: bool = False
+    ) -> None:
+        """Событие журнала; strict - в транзакции вызывающего кода (денежные операции)"""
+        row = {
+            "user_id": user_id,
+            "action": action,
+            "entity_type": entity_type,
+            "entity_id": entity_id,
+            "details_json": dumps_details(details),
+            "created_at": datetime.utcnow(),
+        }
+        
+        if strict:
+            if session is None:
+                raise ValueError("Строгая запись журнала требует сессию вызывающего кода")
+            # Запись фиксируется или откатывается вместе с операцией
+            await session.execute(INSERT_ACTIVITY, [row])
+            self.stats["strict"] += 1
+            return
+        
+        self.start()
+        # При переполнении вызывающий код ждет: события журнала не отбрасываются
+        await self._queue.put(row)
+        self.stats["enqueued"] += 1
+    
+    async def _writer(self) -> None:
+        while True:
+            row = await self._queue.get()
+            batch = [row]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            try:
+                await self._write(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+    
+    async def _write(self, batch: List[Dict[str, Any]]) -> None:
+        """Многострочный INSERT; при ошибке - построчно, чтобы одна строка не теряла пакет"""
+        started = time.perf_counter()
+        try:
+            async with self.session_factory() as session:
+                await session.execute(INSERT_ACTIVITY, batch)
+                await session.commit()
+            self.stats["written"] += len(batch)
+        except Exception as e:
+            logger.warning(f"⚠️ Audit batch of {len(batch)} failed, retrying row by row: {e}")
+            for row in batch:
+                try:
+                    async with self.session_factory() as session:
+                        await session.execute(INSERT_ACTIVITY, [row])
+                        await session.commit()
+                    self.stats["written"] += 1
+                except Exception as row_error:
+                    self.stats["failed"] += 1
+                    logger.error(f"❌ Audit event lost: {row['action']} user={row['user_id']}: {row_error}")
+        self.stats["batches"] += 1
+        self.flush_latency.add(time.perf_counter() - started)
+    
+    async def flush(self) -> None:
+        """Ожидание записи всех событий, поставленных в очередь"""
+        if self._queue is not None and self._task is not None:
+            await self._queue.join()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "depth": self.depth,
+            "max_size": self.max_size,
+            "batch_size": self.batch_size,
+            "flush": self.flush_latency.summary(),
+        }
+    
+    async def stop(self) -> None:
+        """Запись остатка очереди при остановке приложения"""
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self.flush(), settings.audit_shutdown_timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"❌ Audit shutdown timeout: {self.depth} events not written")
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        self._queue = None
+
+
+# Глобальный журнал
+audit_log = AuditLog()
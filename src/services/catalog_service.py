@@ -0,0 +1,507 @@
+"""
+📚 Сервис каталога товаров MAXXPHARM CRM
+"""
+
+import asyncio
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import Optional, List, Dict, Any, Iterable, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func
+
+from ..models.database import Product
+from ..config import settings
+
+
+logger = logging.getLogger(__name__)
+
+# Числа (в т.ч. дробные) и слова отдельно: "500мг" -> "500", "мг"
+TOKEN_PATTERN = re.compile(r"\d+(?:[.,]\d+)?|[^\W\d_]+")
+
+# Транслитерация латиницы, чтобы "paracetamol" и "парацетамол" давали одни токены
+LATIN_DIGRAPHS = [
+    ("sch", "щ"), ("sh", "ш"), ("ch", "ч"), ("zh", "ж"), ("kh", "х"),
+    ("ts", "ц"), ("ya", "я"), ("yu", "ю"), ("yo", "е"), ("ph", "ф"),
+]
+LATIN_LETTERS = str.maketrans({
+    "a": "а", "b": "б", "c": "ц", "d": "д", "e": "е", "f": "ф", "g": "г",
+    "h": "х", "i": "и", "j": "й", "k": "к", "l": "л", "m": "м", "n": "н",
+    "o": "о", "p": "п", "q": "к", "r": "р", "s": "с", "t": "т", "u": "у",
+    "v": "в", "w": "в", "x": "кс", "y": "и", "z": "з",
+})
+
+# Единицы и формы выпуска: участвуют в оценке, но не используются для поиска кандидатов
+NOISE_TOKENS = {
+    "мг", "мкг", "мл", "г", "гр", "л", "ме", "шт", "уп", "упак", "н", "№",
+    "таб", "табл", "таблетки", "таблетка", "капс", "капсулы", "амп", "ампулы",
+    "р", "р-р", "раствор", "фл", "флакон", "пор", "порошок", "д", "для", "с", "и",
+}
+
+# Базовый каталог на случай пустой таблицы products
+DEFAULT_PRODUCTS: List[Dict[str, Any]] = [
+    {"name": "Парацетамол 500мг", "form": "таблетки", "price": 45.0},
+    {"name": "Ибупрофен 400мг", "form": "таблетки", "price": 80.0, "synonyms": ["Нурофен"]},
+    {"name": "Аспирин 100мг", "form": "таблетки", "price": 35.0, "synonyms": ["Ацетилсалициловая кислота"]},
+    {"name": "Анальгин 500мг", "form": "таблетки", "price": 25.0, "synonyms": ["Метамизол"]},
+    {"name": "Арбидол", "form": "капсулы", "price": 250.0, "synonyms": ["Умифеновир"]},
+    {"name": "Кагоцел", "form": "таблетки", "price": 200.0},
+    {"name": "Ремантадин", "form": "таблетки", "price": 150.0},
+    {"name": "Осельтамивир", "form": "капсулы", "price": 300.0, "synonyms": ["Тамифлю"]},
+    {"name": "Лозартан 50мг", "form": "таблетки", "price": 120.0},
+    {"name": "Эналаприл 10мг", "form": "таблетки", "price": 90.0},
+    {"name": "Амлодипин 5мг", "form": "таблетки", "price": 85.0},
+    {"name": "Витамин D3", "form": "капли", "price": 60.0},
+    {"name": "Витамин C", "form": "таблетки", "price": 40.0, "synonyms": ["Аскорбиновая кислота"]},
+    {"name": "Омега-3", "form": "капсулы", "price": 150.0},
+    {"name": "Кальций D3", "form": "таблетки", "price": 80.0},
+    {"name": "Ромашка", "form": "фильтр-пакеты", "price": 30.0},
+    {"name": "Шалфей", "form": "фильтр-пакеты", "price": 25.0},
+    {"name": "Эхинацея", "form": "таблетки", "price": 45.0},
+    {"name": "Цефтриаксон 1г", "form": "порошок", "price": 150.0},
+    {"name": "Новокаин 0.5%", "form": "ампулы", "price": 45.0, "synonyms": ["Прокаин"]},
+    {"name": "Физраствор", "form": "раствор", "price": 35.0, "synonyms": ["Натрия хлорид 0.9%"]},
+]
+
+
+def transliterate(token: str) -> str:
+    """Латиница -> кириллица"""
+    for latin, cyrillic in LATIN_DIGRAPHS:
+        token = token.replace(latin, cyrillic)
+    return token.translate(LATIN_LETTERS)
+
+
+def normalize_tokens(text: str) -> List[str]:
+    """Нормализованные токены названия"""
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower().replace("ё", "е")):
+        if token[0].isdigit():
+            tokens.append(token.replace(",", "."))
+        elif token.isascii():
+            tokens.append(transliterate(token))
+        else:
+            tokens.append(token)
+    return tokens
+
+
+def trigrams(token: str) -> List[str]:
+    """Триграммы токена с границами слова"""
+    padded = f"  {token} "
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+class TokenTrie:
+    """Префиксное дерево токенов каталога"""
+    
+    __slots__ = ("root",)
+    
+    END = ""
+    
+    def __init__(self):
+        self.root: Dict[str, Any] = {}
+    
+    def insert(self, token: str) -> None:
+        node = self.root
+        for char in token:
+            node = node.setdefault(char, {})
+        node[self.END] = token
+    
+    def with_prefix(self, prefix: str, limit: int) -> List[str]:
+        """Токены, начинающиеся с prefix (не более limit)"""
+        node = self.root
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return []
+        
+        found = []
+        stack = [node]
+        while stack and len(found) < limit:
+            node = stack.pop()
+            for char, child in node.items():
+                if char == self.END:
+                    found.append(child)
+                else:
+                    stack.append(child)
+        return found[:limit]
+
+
+class CatalogEntry:
+    """Товар в индексе каталога"""
+    
+    __slots__ = ("product_id", "name", "sku", "form", "price", "stock", "tokens", "keys")
+    
+    def __init__(
+        self,
+        product_id: Optional[int],
+        name: str,
+        price: float,
+        form: Optional[str] = None,
+        stock: Optional[int] = None,
+        synonyms: Optional[Iterable[str]] = None,
+        sku: Optional[str] = None
+    ):
+        self.product_id = product_id
+        self.name = name
+        self.sku = sku
+        self.form = form
+        self.price = float(price)
+        self.stock = stock
+        # Набор токенов для каждого варианта названия (основное + синонимы)
+        self.keys: List[Tuple[str, ...]] = []
+        for variant in [name, *(synonyms or [])]:
+            tokens = tuple(normalize_tokens(variant))
+            if tokens and tokens not in self.keys:
+                self.keys.append(tokens)
+        self.tokens = frozenset(token for key in self.keys for token in key)
+    
+    def to_dict(self, score: float) -> Dict[str, Any]:
+        return {
+            'product_id': self.product_id,
+            'name': self.name,
+            'sku': self.sku,
+            'form': self.form,
+            'price': self.price,
+            'stock': self.stock,
+            'score': round(score, 3)
+        }
+
+
+class CatalogIndex:
+    """Индекс каталога: точные названия, trie токенов и триграммы (перестраивается целиком)"""
+    
+    MAX_PREFIX_EXPANSIONS = 32
+    MAX_FUZZY_EXPANSIONS = 10
+    MIN_FUZZY_SIMILARITY = 0.45
+    MAX_CANDIDATES = 2000
+    
+    def __init__(self, entries: List[CatalogEntry], version: Any = None, cache_size: int = 4096):
+        self.entries = entries
+        self.version = version
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Optional[Tuple[int, float]]]" = OrderedDict()
+        
+        self._exact: Dict[str, int] = {}
+        self._skus: Dict[str, int] = {}
+        self._postings: Dict[str, List[int]] = {}
+        for position, entry in enumerate(entries):
+            if entry.sku:
+                self._skus.setdefault(entry.sku.strip().lower(), position)
+            for key in entry.keys:
+                self._exact.setdefault(" ".join(key), position)
+            for token in entry.tokens:
+                self._postings.setdefault(token, []).append(position)
+        
+        self._trie = TokenTrie()
+        self._grams: Dict[str, List[str]] = {}
+        self._gram_counts: Dict[str, int] = {}
+        for token in self._postings:
+            if not token[0].isalpha():
+                continue
+            self._trie.insert(token)
+            grams = set(trigrams(token))
+            self._gram_counts[token] = len(grams)
+            for gram in grams:
+                self._grams.setdefault(gram, []).append(token)
+    
+    @classmethod
+    def from_products(cls, products: Iterable[Dict[str, Any]], version: Any = None) -> "CatalogIndex":
+        entries = [
+            CatalogEntry(
+                product_id=product.get("id"),
+                name=product["name"],
+                price=product["price"],
+                form=product.get("form"),
+                stock=product.get("stock"),
+                synonyms=product.get("synonyms"),
+                sku=product.get("sku")
+            )
+            for product in products
+        ]
+        return cls(entries, version=version)
+    
+    def __len__(self) -> int:
+        return len(self.entries)
+    
+    def by_sku(self, sku: str) -> Optional[Dict[str, Any]]:
+        """Товар по артикулу (точное совпадение без учета регистра)"""
+        position = self._skus.get(sku.strip().lower())
+        if position is None:
+            return None
+        return self.entries[position].to_dict(1.0)
+    
+    def match(self, text: str) -> Optional[Dict[str, Any]]:
+        """Лучший товар для строки заказа или None"""
+        tokens = normalize_tokens(text)
+        if not tokens:
+            return None
+        
+        key = " ".join(tokens)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            hit = self._cache[key]
+        else:
+            hit = self._match_tokens(key, tokens)
+            self._cache[key] = hit
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        
+        if hit is None:
+            return None
+        return self.entries[hit[0]].to_dict(hit[1])
+    
+    def _match_tokens(self, key: str, tokens: List[str]) -> Optional[Tuple[int, float]]:
+        position = self._exact.get(key)
+        if position is not None:
+            return position, 1.0
+        
+        # Варианты каждого токена запроса: (токен каталога, вес)
+        expansions = [self._expand(token) for token in tokens]
+        
+        anchors = [
+            options for token, options in zip(tokens, expansions)
+            if options and token[0].isalpha() and token not in NOISE_TOKENS
+        ]
+        if not anchors:
+            return None
+        
+        candidates = self._candidates(anchors)
+        if not candidates:
+            return None
+        
+        # Единицы и формы не штрафуют, если их нет в названии товара
+        informative = [token not in NOISE_TOKENS for token in tokens]
+        informative_count = sum(informative)
+        
+        best: Optional[Tuple[int, float]] = None
+        best_rank = None
+        for position in candidates:
+            entry = self.entries[position]
+            product_tokens = entry.tokens
+            
+            coverage = 0.0
+            matched = 0
+            for options, is_informative in zip(expansions, informative):
+                weight = 0.0
+                for token, option_weight in options:
+                    if option_weight > weight and token in product_tokens:
+                        weight = option_weight
+                if weight:
+                    matched += 1
+                    if is_informative:
+                        coverage += weight
+            
+            # Запрос должен быть покрыт, лишние слова товара штрафуются слабо
+            score = 0.8 * coverage / informative_count + 0.2 * min(matched / len(product_tokens), 1.0)
+            rank = (score, -len(entry.name))
+            if best_rank is None or rank > best_rank:
+                best, best_rank = (position, score), rank
+        
+        if best is None or best[1] < settings.catalog_match_threshold:
+            return None
+        return best
+    
+    def _expand(self, token: str) -> List[Tuple[str, float]]:
+        """Точное совпадение, продолжения по префиксу или похожие по триграммам"""
+        if token in self._postings:
+            return [(token, 1.0)]
+        if not token[0].isalpha():
+            return []
+        
+        options = []
+        if len(token) >= 4:
+            options = [
+                (candidate, 0.9)
+                for candidate in self._trie.with_prefix(token, self.MAX_PREFIX_EXPANSIONS)
+            ]
+        if options:
+            return options
+        
+        return self._fuzzy(token)
+    
+    def _fuzzy(self, token: str) -> List[Tuple[str, float]]:
+        """Токены каталога, похожие по триграммам (коэффициент Дайса)"""
+        grams = set(trigrams(token))
+        overlaps: Dict[str, int] = {}
+        for gram in grams:
+            for candidate in self._grams.get(gram, ()):
+                overlaps[candidate] = overlaps.get(candidate, 0) + 1
+        
+        scored = []
+        for candidate, common in overlaps.items():
+            similarity = 2.0 * common / (len(grams) + self._gram_counts[candidate])
+            if similarity >= self.MIN_FUZZY_SIMILARITY:
+                scored.append((candidate, similarity))
+        
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored[:self.MAX_FUZZY_EXPANSIONS]
+    
+    def _candidates(self, anchors: List[List[Tuple[str, float]]]) -> set:
+        """Товары, содержащие хотя бы одно опорное слово запроса"""
+        per_anchor = []
+        for options in anchors:
+            positions = set()
+            for token, _ in options:
+                positions.update(self._postings[token])
+            per_anchor.append(positions)
+        
+        candidates = set().union(*per_anchor)
+        if len(candidates) > self.MAX_CANDIDATES:
+            # Слишком общие слова: берем самое редкое опорное слово
+            candidates = min(per_anchor, key=len)
+        return candidates
+
+
+class ProductCatalog:
+    """Актуальный индекс каталога процесса с горячей перезагрузкой"""
+    
+    def __init__(self):
+        self.index: CatalogIndex = CatalogIndex.from_products(DEFAULT_PRODUCTS, version="default")
+        self.checked_at: Optional[float] = None
+        self._dirty = False
+        self._lock: Optional[asyncio.Lock] = None
+    
+    def invalidate(self) -> None:
+        """Перестроение индекса при следующем обращении (каталог изменен в этом процессе)"""
+        self._dirty = True
+        self.checked_at = None
+    
+    async def refresh(self, session: AsyncSession, force: bool = False) -> CatalogIndex:
+        """Перестроение индекса, если каталог в базе изменился"""
+        force = force or self._dirty
+        if not force and self.checked_at is not None and \
+                time.monotonic() - self.checked_at < settings.catalog_reload_seconds:
+            return self.index
+        
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        
+        async with self._lock:
+            if not force and self.checked_at is not None and \
+                    time.monotonic() - self.checked_at < settings.catalog_reload_seconds:
+                return self.index
+            
+            version_result = await session.execute(
+                select(func.count(Product.id), func.max(Product.id), func.max(Product.updated_at))
+                .where(Product.is_active == True)
+            )
+            count, max_id, max_updated = version_result.one()
+            version = (count, max_id, str(max_updated))
+            
+            if force or version != self.index.version:
+                self._dirty = False
+                if count:
+                    result = await session.execute(
+                        select(
+                            Product.id, Product.name, Product.sku, Product.synonyms, Product.form,
+                            Product.price, Product.stock
+                        ).where(Product.is_active == True)
+                    )
+                    products = [dict(row._mapping) for row in result.all()]
+                else:
+                    products = DEFAULT_PRODUCTS
+                
+                started = time.perf_counter()
+                self.index = await asyncio.to_thread(CatalogIndex.from_products, products, version)
+                logger.info(
+                    f"📚 Catalog index built: {len(self.index)} products "
+                    f"in {(time.perf_counter() - started) * 1000:.0f} ms"
+                )
+            
+            self.checked_at = time.monotonic()
+            return self.index
+
+
+# Глобальный каталог процесса
+product_catalog = ProductCatalog()
+
+
+class CatalogService:
+    """Сервис каталога товаров и сопоставления строк заказа"""
+    
+    def __init__(self, session: AsyncSession, catalog: Optional[ProductCatalog] = None):
+        self.session = session
+        self.catalog = catalog if catalog is not None else product_catalog
+    
+    async def match(self, text: str) -> Optional[Dict[str, Any]]:
+        """Товар каталога для свободного текста"""
+        index = await self.catalog.refresh(self.session)
+        return index.match(text)
+    
+    async def price_items(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Сопоставление строк заказа с каталогом и расстановка цен"""
+        index = await self.catalog.refresh(self.session)
+        
+        for item in items:
+            product = index.by_sku(item['sku']) if item.get('sku') else None
+            if product is None:
+                product = index.match(item['product_name'])
+            if product is not None:
+                item['product_id'] = product['product_id']
+                item['product_name'] = product['name']
+                item['unit_price'] = product['price']
+            else:
+                item['product_id'] = None
+                item['unit_price'] = settings.default_unit_price
+        
+        return items
+    
+    async def get_product(self, product_id: int) -> Optional[Product]:
+        """Получение товара по ID"""
+        result = await self.session.execute(
+            select(Product).where(Product.id == product_id)
+        )
+        return result.scalar_one_or_none()
+    
+    async def upsert_product(
+        self,
+        name: str,
+        price: float,
+        sku: Optional[str] = None,
+        form: Optional[str] = None,
+        stock: int = 0,
+        synonyms: Optional[List[str]] = None,
+        is_active: bool = True
+    ) -> Product:
+        """Создание или обновление товара (по артикулу или названию)"""
+        condition = Product.sku == sku if sku else Product.name == name
+        result = await self.session.execute(select(Product).where(condition))
+        product = result.scalar_one_or_none()
+        
+        if product is None:
+            product = Product(name=name, sku=sku)
+            self.session.add(product)
+        
+        product.name = name
+        product.price = price
+        product.form = form
+        product.stock = stock
+        product.synonyms = synonyms or []
+        product.is_active = is_active
+        
+        await self.session.flush()
+        await self.session.refresh(product)
+        
+        self.catalog.invalidate()
+        return product
+    
+    async def set_stock(self, product_id: int, stock: int) -> Optional[Product]:
+        """Обновление остатка товара"""
+        product = await self.get_product(product_id)
+        if product is None:
+            return None
+        
+        product.stock = stock
+        await self.session.flush()
+        
+        self.catalog.invalidate()
+        return product
+
+
+# Функция для получения сервиса
+async def get_catalog_service() -> CatalogService:
+    """Получение экземпляра CatalogService на сессии текущего обновления Telegram"""
+    from ..database import update_session
+    
+    return CatalogService(update_session())
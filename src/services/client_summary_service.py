@@ -0,0 +1,244 @@
+"""
+📋 Сводка клиента MAXXPHARM CRM: последние заказы, итоги и баланс одной строкой
+"""
+
+import logging
+from datetime import datetime
+from decimal import Decimal
+from typing import Optional, List, Dict, Any, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, delete, func, case, inspect
+from sqlalchemy.exc import IntegrityError
+
+from ..models.database import Order, OrderStatus, Payment, ClientBalance, ClientSummary, ArchivedOrder
+from ..database import update_session
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+# Заказ больше не в работе: доставлен, оплачен или отклонен
+CLOSED_STATUSES = {
+    OrderStatus.DELIVERED.value,
+    OrderStatus.PAID.value,
+    OrderStatus.PARTIALLY_PAID.value,
+    OrderStatus.DEBT.value,
+    OrderStatus.REJECTED.value,
+}
+
+
+def _status(value) -> str:
+    return value.value if isinstance(value, OrderStatus) else value
+
+
+def _isoformat(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def _naive(value: datetime) -> datetime:
+    return value.replace(tzinfo=None) if value.tzinfo else value
+
+
+def order_entry(order: Order) -> Dict[str, Any]:
+    """Компактная запись заказа для сводки"""
+    return {
+        'id': order.id,
+        'order_number': order.order_number,
+        'status': _status(order.status),
+        'total_amount': float(order.total_amount or 0),
+        'paid_amount': float(order.paid_amount or 0),
+        'created_at': _isoformat(order.created_at or datetime.utcnow()),
+        'delivered_at': _isoformat(order.delivered_at),
+    }
+
+
+def archived_entry(archived: ArchivedOrder) -> Dict[str, Any]:
+    """Запись архивного заказа в том же виде, что и order_entry"""
+    return {
+        'id': archived.order_id,
+        'order_number': archived.order_number,
+        'status': archived.status,
+        'total_amount': float(archived.total_amount or 0),
+        'paid_amount': float(archived.paid_total or 0),
+        'created_at': _isoformat(archived.created_at or archived.archived_at or datetime.utcnow()),
+        'delivered_at': _isoformat(archived.closed_at) if archived.status != OrderStatus.REJECTED.value else None,
+    }
+
+
+class ClientSummaryService:
+    """Сводка клиента: события заказов и оплат меняют одну строку, экран читает ее по ключу"""
+    
+    def __init__(self, session: AsyncSession):
+        self.session = session
+    
+    async def _lock(self, client_id: int) -> Tuple[ClientSummary, bool]:
+        """Строка сводки под блокировкой; отсутствующая строится из истории (built=True)"""
+        query = (
+            select(ClientSummary)
+            .where(ClientSummary.client_id == client_id)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        )
+        await self.session.flush()
+        summary = (await self.session.execute(query)).scalar_one_or_none()
+        if summary is not None:
+            return summary, False
+        
+        try:
+            async with self.session.begin_nested():
+                # Построенная строка уже учитывает текущее событие: оно сброшено в базу выше
+                summary = await self._build(client_id)
+                self.session.add(summary)
+            return summary, True
+        except IntegrityError:
+            # Параллельная операция уже создала строку сводки
+            return (await self.session.execute(query)).scalar_one(), False
+    
+    async def _build(self, client_id: int) -> ClientSummary:
+        """Сводка из заказов, архива, баланса и оплат (первое обращение или после исправления сверки)
+        
+        Архивные заказы закрыты: они входят в количество и сумму, но не в открытые.
+        """
+        result = await self.session.execute(
+            select(
+                func.count(Order.id),
+                func.sum(case((Order.status.notin_(CLOSED_STATUSES), 1), else_=0)),
+                func.sum(case((Order.status != OrderStatus.REJECTED.value, Order.total_amount), else_=0)),
+                func.max(Order.created_at)
+            ).where(Order.client_id == client_id)
+        )
+        order_count, open_count, amount, last_order_at = result.one()
+        
+        archived = await self.session.execute(
+            select(
+                func.count(ArchivedOrder.order_id),
+                func.sum(case((ArchivedOrder.status != OrderStatus.REJECTED.value, ArchivedOrder.total_amount), else_=0)),
+                func.max(ArchivedOrder.created_at)
+            ).where(ArchivedOrder.client_id == client_id)
+        )
+        archived_count, archived_amount, archived_last_at = archived.one()
+        if archived_last_at is not None and (last_order_at is None or _naive(archived_last_at) > _naive(last_order_at)):
+            last_order_at = archived_last_at
+        
+        recent, _ = await self.get_history_page(client_id, limit=settings.client_recent_orders)
+        last_payment = (await self.session.execute(
+            select(Payment.amount, func.coalesce(Payment.confirmed_at, Payment.created_at).label("paid_at"))
+            .where(Payment.client_id == client_id)
+            .order_by(Payment.id.desc())
+            .limit(1)
+        )).first()
+        balance = await self.session.get(ClientBalance, client_id)
+        
+        return ClientSummary(
+            client_id=client_id,
+            order_count=(order_count or 0) + (archived_count or 0),
+            open_order_count=open_count or 0,
+            orders_amount=Decimal(str(amount or 0)) + Decimal(str(archived_amount or 0)),
+            last_order_at=last_order_at,
+            recent_orders=recent,
+            outstanding=balance.outstanding if balance else 0,
+            last_payment_at=last_payment.paid_at if last_payment else None,
+            last_payment_amount=last_payment.amount if last_payment else None
+        )
+    
+    def _put_recent(self, summary: ClientSummary, order: Order, add: bool = False) -> None:
+        """Обновление записи заказа в списке последних (новый заказ - в начало)"""
+        entry = order_entry(order)
+        recent = [item for item in (summary.recent_orders or []) if item['id'] != order.id]
+        if add or len(recent) < len(summary.recent_orders or []):
+            recent.insert(0, entry)
+            recent.sort(key=lambda item: item['id'], reverse=True)
+        # JSON-колонка сохраняется только при присваивании нового списка
+        summary.recent_orders = recent[:settings.client_recent_orders]
+    
+    async def _copy_balance(self, summary: ClientSummary) -> None:
+        balance = await self.session.get(ClientBalance, summary.client_id)
+        if balance is not None:
+            summary.outstanding = balance.outstanding
+    
+    async def on_order_created(self, order: Order) -> None:
+        """Новый заказ (без commit)"""
+        if "created_at" in inspect(order).unloaded:
+            # Время создания заполняет база при INSERT
+            await self.session.refresh(order, ["created_at"])
+        
+        summary, built = await self._lock(order.client_id)
+        if not built:
+            summary.order_count += 1
+            summary.open_order_count += 1
+            summary.orders_amount = Decimal(summary.orders_amount or 0) + Decimal(str(order.total_amount or 0))
+            summary.last_order_at = order.created_at or datetime.utcnow()
+            self._put_recent(summary, order, add=True)
+    
+    async def on_order_changed(self, order: Order, old_status: str) -> None:
+        """Смена статуса заказа; доставка меняет и задолженность (без commit)"""
+        summary, built = await self._lock(order.client_id)
+        await self._copy_balance(summary)
+        if built:
+            return
+        
+        old_status, new_status = _status(old_status), _status(order.status)
+        was_open, is_open = old_status not in CLOSED_STATUSES, new_status not in CLOSED_STATUSES
+        if was_open != is_open:
+            summary.open_order_count += 1 if is_open else -1
+        if (old_status == OrderStatus.REJECTED.value) != (new_status == OrderStatus.REJECTED.value):
+            sign = -1 if new_status == OrderStatus.REJECTED.value else 1
+            summary.orders_amount = Decimal(summary.orders_amount or 0) + sign * Decimal(str(order.total_amount or 0))
+        self._put_recent(summary, order)
+    
+    async def on_payment(self, order: Order, payment: Payment) -> None:
+        """Оплата по заказу (без commit)"""
+        summary, built = await self._lock(order.client_id)
+        await self._copy_balance(summary)
+        if built:
+            return
+        
+        summary.last_payment_at = payment.confirmed_at or datetime.utcnow()
+        summary.last_payment_amount = payment.amount
+        self._put_recent(summary, order)
+    
+    async def invalidate(self, client_ids: List[int]) -> None:
+        """Сброс сводок: следующее чтение построит их заново (после исправлений сверки)"""
+        if client_ids:
+            await self.session.execute(delete(ClientSummary).where(ClientSummary.client_id.in_(client_ids)))
+    
+    async def get_summary(self, client_id: int) -> ClientSummary:
+        """Сводка клиента - чтение одной строки по ключу"""
+        summary = await self.session.get(ClientSummary, client_id)
+        if summary is not None:
+            return summary
+        
+        summary, _ = await self._lock(client_id)
+        await self.session.flush()
+        return summary
+    
+    async def get_history_page(
+        self,
+        client_id: int,
+        before_id: Optional[int] = None,
+        limit: Optional[int] = None
+    ) -> Tuple[List[Dict[str, Any]], bool]:
+        """Страница истории заказов по убыванию id: рабочие и архивные заказы вместе
+        
+        Архив сохраняет id заказа, поэтому keyset общий: orders(client_id, id)
+        и order_archive(client_id) читаются до limit + 1 строк каждая.
+        """
+        limit = limit or settings.client_history_page_size
+        query = select(Order).where(Order.client_id == client_id)
+        archived_query = select(ArchivedOrder).where(ArchivedOrder.client_id == client_id)
+        if before_id:
+            query = query.where(Order.id < before_id)
+            archived_query = archived_query.where(ArchivedOrder.order_id < before_id)
+        
+        orders = await self.session.execute(query.order_by(Order.id.desc()).limit(limit + 1))
+        archived = await self.session.execute(archived_query.order_by(ArchivedOrder.order_id.desc()).limit(limit + 1))
+        entries = [order_entry(order) for order in orders.scalars().all()]
+        entries += [archived_entry(row) for row in archived.scalars().all()]
+        entries.sort(key=lambda entry: entry['id'], reverse=True)
+        return entries[:limit], len(entries) > limit
+
+
+# Функция для получения сервиса
+async def get_client_summary_service() -> ClientSummaryService:
+    """Получение экземпляра ClientSummaryService на сессии текущего обновления Telegram"""
+    return ClientSummaryService(update_session())
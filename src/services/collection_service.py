@@ -0,0 +1,310 @@
+"""
+💼 Сервис сбора долгов MAXXPHARM CRM (торговые представители)
+"""
+
+import logging
+from datetime import datetime, timezone
+from typing import Optional, List, Dict, Any, Iterable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, delete, func
+from sqlalchemy.orm import selectinload
+
+from ..models.database import (
+    User, UserRole, Debt, ClientBalance, DebtWorkItem, Location, Payment
+)
+from ..database import update_session
+from ..config import settings
+from .route_service import plan_trip
+
+logger = logging.getLogger(__name__)
+
+
+def _age_days(since: Optional[datetime], now: datetime) -> float:
+    if since is None:
+        return 0.0
+    if since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    return max((now - since).total_seconds() / 86400, 0.0)
+
+
+def client_risk(debt_count: int, age_days: float, charged_total: float, paid_total: float) -> float:
+    """Риск невозврата: 1.0 - обычный клиент, больше - выше риск"""
+    risk = 1.0
+    # Несколько открытых долгов одновременно
+    risk += 0.1 * min(max(debt_count - 1, 0), 5)
+    # Просрочка самого старого долга
+    if age_days > 60:
+        risk += 0.5
+    elif age_days > 30:
+        risk += 0.25
+    # Доля неоплаченного за всю историю клиента
+    if charged_total > 0:
+        risk += 0.5 * (1 - min(paid_total / charged_total, 1.0))
+    return round(risk, 3)
+
+
+def debt_priority(outstanding: float, age_days: float, risk: float) -> float:
+    """Приоритет визита: сумма × возраст × риск"""
+    return round(outstanding * (1 + age_days / settings.collection_age_weight_days) * risk, 2)
+
+
+class CollectionService:
+    """Список должников по представителям и зонам и план визитов на день"""
+    
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self._reps_by_zone: Optional[Dict[Optional[str], List[int]]] = None
+        # Должников у представителя: из базы один раз, дальше считается по назначениям
+        self._rep_load: Optional[Dict[int, int]] = None
+    
+    async def refresh_client(self, client_id: int, now: Optional[datetime] = None) -> Optional[DebtWorkItem]:
+        """Пересчет строки клиента после оплаты или нового долга (без commit)"""
+        await self.session.flush()
+        items = await self._refresh_clients([client_id], now or datetime.utcnow())
+        return items.get(client_id)
+    
+    async def rebuild(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """Полный пересчет списка порциями по клиентам (ночью: возраст долгов меняет приоритеты)"""
+        now = now or datetime.utcnow()
+        stats = {"clients": 0, "removed": 0}
+        last_client_id = 0
+        
+        while True:
+            result = await self.session.execute(
+                select(Debt.client_id)
+                .where(Debt.is_active == True, Debt.client_id > last_client_id)
+                .group_by(Debt.client_id)
+                .order_by(Debt.client_id.asc())
+                .limit(settings.collection_rebuild_chunk)
+            )
+            client_ids = result.scalars().all()
+            if not client_ids:
+                break
+            
+            last_client_id = client_ids[-1]
+            await self._refresh_clients(client_ids, now)
+            await self.session.flush()
+            self.session.expunge_all()
+            stats["clients"] += len(client_ids)
+        
+        # Клиенты, у которых не осталось активных долгов
+        result = await self.session.execute(
+            delete(DebtWorkItem).where(
+                ~DebtWorkItem.client_id.in_(select(Debt.client_id).where(Debt.is_active == True))
+            )
+        )
+        stats["removed"] = result.rowcount or 0
+        logger.info(f"💼 Debt worklist rebuilt: {stats['clients']} clients, {stats['removed']} removed")
+        return stats
+    
+    async def _refresh_clients(self, client_ids: Iterable[int], now: datetime) -> Dict[int, DebtWorkItem]:
+        """Строки списка для группы клиентов: по одному запросу на долги, балансы, аптеки и строки"""
+        client_ids = list(client_ids)
+        debts = {
+            row.client_id: row for row in (await self.session.execute(
+                select(
+                    Debt.client_id,
+                    func.sum(Debt.remaining_amount).label("outstanding"),
+                    func.count(Debt.id).label("debt_count"),
+                    func.min(Debt.created_at).label("oldest")
+                )
+                .where(Debt.client_id.in_(client_ids), Debt.is_active == True)
+                .group_by(Debt.client_id)
+            )).all()
+        }
+        balances = {
+            balance.client_id: balance for balance in (await self.session.execute(
+                select(ClientBalance).where(ClientBalance.client_id.in_(client_ids))
+            )).scalars().all()
+        }
+        clients = {
+            user.id: user for user in (await self.session.execute(
+                select(User).options(selectinload(User.pharmacy)).where(User.id.in_(client_ids))
+            )).scalars().all()
+        }
+        items = {
+            item.client_id: item for item in (await self.session.execute(
+                select(DebtWorkItem).where(DebtWorkItem.client_id.in_(client_ids))
+            )).scalars().all()
+        }
+        
+        refreshed = {}
+        for client_id in client_ids:
+            row = debts.get(client_id)
+            item = items.get(client_id)
+            if row is None or not row.outstanding or float(row.outstanding) <= 0:
+                if item is not None:
+                    self._release(item.sales_rep_id)
+                    await self.session.delete(item)
+                continue
+            
+            client = clients.get(client_id)
+            pharmacy = client.pharmacy if client else None
+            balance = balances.get(client_id)
+            outstanding = float(row.outstanding)
+            age = _age_days(row.oldest, now)
+            risk = client_risk(
+                row.debt_count,
+                age,
+                float(balance.charged_total) if balance else 0.0,
+                float(balance.paid_total) if balance else 0.0
+            )
+            zone = pharmacy.zone if pharmacy else None
+            
+            # Представитель выбирается до добавления строки: запросы не сбросят неполную строку
+            sales_rep_id = item.sales_rep_id if item is not None else None
+            if item is None or item.zone != zone or sales_rep_id not in await self._active_reps():
+                self._release(sales_rep_id)
+                sales_rep_id = await self._pick_rep(zone)
+            if item is None:
+                item = DebtWorkItem(client_id=client_id)
+                self.session.add(item)
+            
+            item.sales_rep_id = sales_rep_id
+            item.zone = zone
+            item.outstanding = row.outstanding
+            item.debt_count = row.debt_count
+            item.oldest_debt_at = row.oldest
+            item.risk = risk
+            item.priority = debt_priority(outstanding, age, risk)
+            item.client_name = client.full_name if client else None
+            item.phone = client.phone if client else None
+            item.pharmacy_name = pharmacy.name if pharmacy else None
+            item.address = pharmacy.address if pharmacy else None
+            item.latitude = float(pharmacy.latitude) if pharmacy and pharmacy.latitude is not None else None
+            item.longitude = float(pharmacy.longitude) if pharmacy and pharmacy.longitude is not None else None
+            refreshed[client_id] = item
+        
+        return refreshed
+    
+    async def _load_reps(self) -> Dict[Optional[str], List[int]]:
+        """Активные представители по зонам (один запрос на экземпляр сервиса)"""
+        if self._reps_by_zone is None:
+            result = await self.session.execute(
+                select(User.id, User.zone).where(User.role == UserRole.SALES_REP.value, User.is_active == True)
+            )
+            self._reps_by_zone = {}
+            for rep_id, rep_zone in result.all():
+                self._reps_by_zone.setdefault(rep_zone, []).append(rep_id)
+        return self._reps_by_zone
+    
+    async def _active_reps(self) -> set:
+        return {rep_id for reps in (await self._load_reps()).values() for rep_id in reps}
+    
+    async def _pick_rep(self, zone: Optional[str]) -> Optional[int]:
+        """Представитель зоны (при нескольких - с меньшим числом должников); иначе - без зоны"""
+        reps_by_zone = await self._load_reps()
+        candidates = reps_by_zone.get(zone) or reps_by_zone.get(None) or []
+        if not candidates:
+            return None
+        
+        if len(candidates) > 1 and self._rep_load is None:
+            # Сессия без autoflush: строки, добавленные до этого, сначала записываются
+            await self.session.flush()
+            result = await self.session.execute(
+                select(DebtWorkItem.sales_rep_id, func.count())
+                .where(DebtWorkItem.sales_rep_id.in_(await self._active_reps()))
+                .group_by(DebtWorkItem.sales_rep_id)
+            )
+            self._rep_load = dict(result.all())
+        
+        load = self._rep_load or {}
+        rep_id = min(candidates, key=lambda candidate: load.get(candidate, 0))
+        if self._rep_load is not None:
+            self._rep_load[rep_id] = self._rep_load.get(rep_id, 0) + 1
+        return rep_id
+    
+    def _release(self, rep_id: Optional[int]) -> None:
+        """Должник снят с представителя (удален или передан другому)"""
+        if self._rep_load is not None and self._rep_load.get(rep_id):
+            self._rep_load[rep_id] -= 1
+    
+    async def get_worklist(self, sales_rep_id: int, limit: Optional[int] = None) -> List[DebtWorkItem]:
+        """Должники представителя по убыванию приоритета (чтение по индексу)"""
+        result = await self.session.execute(
+            select(DebtWorkItem)
+            .where(DebtWorkItem.sales_rep_id == sales_rep_id)
+            .order_by(DebtWorkItem.priority.desc())
+            .limit(limit or settings.collection_worklist_size)
+        )
+        return result.scalars().all()
+    
+    async def get_zone_worklist(self, zone: Optional[str], limit: Optional[int] = None) -> List[DebtWorkItem]:
+        """Должники зоны по убыванию приоритета"""
+        result = await self.session.execute(
+            select(DebtWorkItem)
+            .where(DebtWorkItem.zone == zone)
+            .order_by(DebtWorkItem.priority.desc())
+            .limit(limit or settings.collection_worklist_size)
+        )
+        return result.scalars().all()
+    
+    async def plan_day(self, sales_rep_id: int) -> Dict[str, Any]:
+        """План визитов: самые приоритетные должники в порядке объезда, в пределах рабочего дня"""
+        candidates = await self.get_worklist(sales_rep_id, settings.collection_max_visits)
+        located = [item for item in candidates if item.latitude is not None and item.longitude is not None]
+        unlocated = [item for item in candidates if item not in located]
+        origin = await self._rep_origin(sales_rep_id)
+        
+        # Пока объезд не укладывается в день, убирается наименее приоритетный визит
+        trip = plan_trip(origin, [(item.latitude, item.longitude) for item in located])
+        while located and trip['total_minutes'] > settings.collection_day_minutes:
+            located.pop()
+            trip = plan_trip(origin, [(item.latitude, item.longitude) for item in located])
+        
+        visits = [
+            {**self.to_dict(located[step['stop']]), 'leg_km': step['leg_km'], 'arrival_minutes': step['arrival_minutes']}
+            for step in trip['sequence']
+        ]
+        return {
+            'visits': visits,
+            'without_location': [self.to_dict(item) for item in unlocated],
+            'distance_km': trip['distance_km'],
+            'total_minutes': trip['total_minutes'],
+            'expected_amount': round(sum(visit['outstanding'] for visit in visits), 2),
+        }
+    
+    async def _rep_origin(self, sales_rep_id: int):
+        """Последняя геолокация представителя или склад"""
+        result = await self.session.execute(
+            select(Location.latitude, Location.longitude)
+            .where(Location.user_id == sales_rep_id)
+            .order_by(Location.created_at.desc())
+            .limit(1)
+        )
+        row = result.first()
+        if row is not None:
+            return (float(row.latitude), float(row.longitude))
+        return (settings.depot_latitude, settings.depot_longitude)
+    
+    async def get_collection_history(self, sales_rep_id: int, limit: int = 20) -> List[Payment]:
+        """Последние оплаты, зафиксированные представителем"""
+        result = await self.session.execute(
+            select(Payment)
+            .options(selectinload(Payment.order))
+            .where(Payment.recorded_by == sales_rep_id)
+            .order_by(Payment.created_at.desc())
+            .limit(limit)
+        )
+        return result.scalars().all()
+    
+    def to_dict(self, item: DebtWorkItem) -> Dict[str, Any]:
+        return {
+            'client_id': item.client_id,
+            'client_name': item.client_name,
+            'pharmacy_name': item.pharmacy_name,
+            'address': item.address,
+            'phone': item.phone,
+            'outstanding': float(item.outstanding),
+            'debt_count': item.debt_count,
+            'age_days': round(_age_days(item.oldest_debt_at, datetime.utcnow())),
+            'risk': item.risk,
+            'priority': item.priority,
+        }
+
+
+# Функция для получения сервиса
+async def get_collection_service() -> CollectionService:
+    """Получение экземпляра CollectionService на сессии текущего обновления Telegram"""
+    return CollectionService(update_session())
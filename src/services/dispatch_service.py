@@ -0,0 +1,308 @@
+"""
+🚚 Сервис геодиспетчеризации курьеров MAXXPHARM CRM
+"""
+
+import heapq
+import logging
+import math
+import time
+from typing import Optional, List, Dict, Any, Callable, Iterator, Tuple
+from datetime import datetime, timedelta
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, and_, func
+
+from ..models.database import Location, User, UserRole, Order, Pharmacy
+from ..config import settings
+from .location_service import haversine_km, travel_minutes, STOP_HANDLING_MINUTES
+from .assignment_service import worker_balancer, WorkerLoadBalancer
+
+
+logger = logging.getLogger(__name__)
+
+# Километров в одном градусе широты
+KM_PER_DEGREE = 111.32
+
+# Опорная широта сетки (Душанбе)
+DEFAULT_REFERENCE_LATITUDE = 38.56
+
+
+class CourierGridIndex:
+    """Пространственная сетка последних позиций курьеров для поиска k ближайших"""
+    
+    def __init__(
+        self,
+        cell_km: float = 1.0,
+        reference_latitude: float = DEFAULT_REFERENCE_LATITUDE
+    ):
+        self.cell_km = cell_km
+        self.lat_step = cell_km / KM_PER_DEGREE
+        self.lon_step = cell_km / (KM_PER_DEGREE * math.cos(math.radians(reference_latitude)))
+        
+        # ячейка -> {courier_id: (lat, lon)}
+        self._cells: Dict[Tuple[int, int], Dict[int, Tuple[float, float]]] = {}
+        # courier_id -> (ячейка, lat, lon, время обновления)
+        self._positions: Dict[int, Tuple[Tuple[int, int], float, float, float]] = {}
+        self.loaded_at: Optional[float] = None
+    
+    def __len__(self) -> int:
+        return len(self._positions)
+    
+    def cell_of(self, latitude: float, longitude: float) -> Tuple[int, int]:
+        """Ячейка сетки для координат"""
+        return (
+            math.floor(latitude / self.lat_step),
+            math.floor(longitude / self.lon_step)
+        )
+    
+    def update(
+        self,
+        courier_id: int,
+        latitude: float,
+        longitude: float,
+        updated_at: Optional[float] = None
+    ) -> None:
+        """Обновление позиции курьера"""
+        latitude = float(latitude)
+        longitude = float(longitude)
+        cell = self.cell_of(latitude, longitude)
+        
+        previous = self._positions.get(courier_id)
+        if previous is not None and previous[0] != cell:
+            self._discard_from_cell(previous[0], courier_id)
+        
+        self._cells.setdefault(cell, {})[courier_id] = (latitude, longitude)
+        self._positions[courier_id] = (cell, latitude, longitude, updated_at or time.time())
+    
+    def remove(self, courier_id: int) -> None:
+        """Удаление курьера из индекса"""
+        previous = self._positions.pop(courier_id, None)
+        if previous is not None:
+            self._discard_from_cell(previous[0], courier_id)
+    
+    def position(self, courier_id: int) -> Optional[Dict[str, Any]]:
+        """Последняя позиция курьера"""
+        entry = self._positions.get(courier_id)
+        if entry is None:
+            return None
+        return {'latitude': entry[1], 'longitude': entry[2], 'updated_at': entry[3]}
+    
+    def nearest(
+        self,
+        latitude: float,
+        longitude: float,
+        k: int,
+        max_km: float,
+        max_age_seconds: Optional[float] = None,
+        predicate: Optional[Callable[[int], bool]] = None
+    ) -> List[Tuple[float, int]]:
+        """k ближайших курьеров в радиусе max_km: список (км, courier_id)"""
+        if k <= 0 or not self._positions:
+            return []
+        
+        latitude = float(latitude)
+        longitude = float(longitude)
+        center = self.cell_of(latitude, longitude)
+        now = time.time()
+        
+        # Нижняя граница расстояния до точек за пределами кольца r - r * min_cell_km
+        min_cell_km = min(
+            self.cell_km,
+            self.lon_step * KM_PER_DEGREE * math.cos(math.radians(latitude))
+        )
+        max_ring = int(math.ceil(max_km / min_cell_km)) + 1
+        
+        best: List[Tuple[float, int]] = []  # max-куча (-км, courier_id)
+        scanned = 0
+        
+        for ring in range(max_ring + 1):
+            for cell in self._ring_cells(center, ring):
+                bucket = self._cells.get(cell)
+                if not bucket:
+                    continue
+                
+                scanned += len(bucket)
+                for courier_id, (lat, lon) in bucket.items():
+                    if max_age_seconds is not None and now - self._positions[courier_id][3] > max_age_seconds:
+                        continue
+                    if predicate is not None and not predicate(courier_id):
+                        continue
+                    
+                    distance = haversine_km(latitude, longitude, lat, lon)
+                    if distance > max_km:
+                        continue
+                    
+                    if len(best) < k:
+                        heapq.heappush(best, (-distance, courier_id))
+                    elif distance < -best[0][0]:
+                        heapq.heapreplace(best, (-distance, courier_id))
+            
+            # Все непросмотренные курьеры дальше текущего k-го
+            if len(best) == k and -best[0][0] <= ring * min_cell_km:
+                break
+            if scanned == len(self._positions):
+                break
+        
+        return sorted((-distance, courier_id) for distance, courier_id in best)
+    
+    def _ring_cells(self, center: Tuple[int, int], ring: int) -> Iterator[Tuple[int, int]]:
+        """Ячейки на границе квадрата радиуса ring"""
+        ci, cj = center
+        if ring == 0:
+            yield center
+            return
+        
+        for dj in range(-ring, ring + 1):
+            yield (ci - ring, cj + dj)
+            yield (ci + ring, cj + dj)
+        for di in range(-ring + 1, ring):
+            yield (ci + di, cj - ring)
+            yield (ci + di, cj + ring)
+    
+    def _discard_from_cell(self, cell: Tuple[int, int], courier_id: int) -> None:
+        """Удаление курьера из ячейки"""
+        bucket = self._cells.get(cell)
+        if bucket is None:
+            return
+        bucket.pop(courier_id, None)
+        if not bucket:
+            del self._cells[cell]
+
+
+# Глобальный индекс позиций курьеров
+courier_index = CourierGridIndex(cell_km=settings.dispatch_grid_cell_km)
+
+
+class DispatchService:
+    """Сервис выбора курьера по расстоянию и нагрузке"""
+    
+    def __init__(
+        self,
+        session: AsyncSession,
+        index: Optional[CourierGridIndex] = None,
+        balancer: Optional[WorkerLoadBalancer] = None
+    ):
+        self.session = session
+        self.index = index if index is not None else courier_index
+        self.balancer = balancer if balancer is not None else worker_balancer
+    
+    async def load_positions(self) -> int:
+        """Загрузка последних позиций курьеров из базы данных"""
+        threshold = datetime.utcnow() - timedelta(minutes=settings.courier_position_ttl_minutes)
+        
+        last_seen = (
+            select(
+                Location.user_id,
+                func.max(Location.created_at).label('last_at')
+            )
+            .join(User, User.id == Location.user_id)
+            .where(
+                and_(
+                    User.role == UserRole.COURIER.value,
+                    User.is_active == True,
+                    Location.created_at >= threshold
+                )
+            )
+            .group_by(Location.user_id)
+            .subquery()
+        )
+        
+        result = await self.session.execute(
+            select(Location).join(
+                last_seen,
+                and_(
+                    Location.user_id == last_seen.c.user_id,
+                    Location.created_at == last_seen.c.last_at
+                )
+            )
+        )
+        
+        count = 0
+        for location in result.scalars().all():
+            self.index.update(
+                location.user_id,
+                location.latitude,
+                location.longitude,
+                location.created_at.timestamp() if location.created_at else None
+            )
+            count += 1
+        
+        self.index.loaded_at = time.monotonic()
+        logger.info(f"🚚 Courier positions loaded: {count}")
+        return count
+    
+    def update_position(self, courier_id: int, latitude: float, longitude: float) -> None:
+        """Обновление позиции курьера в индексе"""
+        self.index.update(courier_id, latitude, longitude)
+    
+    async def rank_couriers(
+        self,
+        latitude: float,
+        longitude: float,
+        k: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Ранжирование ближайших доступных курьеров по ETA и нагрузке"""
+        if self.index.loaded_at is None:
+            await self.load_positions()
+        
+        k = k or settings.dispatch_candidates
+        
+        def is_available(courier_id: int) -> bool:
+            worker = self.balancer.get(courier_id)
+            # Курьеры вне балансировщика (еще не синхронизирован) не отсекаются
+            return worker is None or worker.is_available
+        
+        # Берем с запасом, так как итоговый порядок учитывает и нагрузку
+        nearest = self.index.nearest(
+            latitude,
+            longitude,
+            k=k * 2,
+            max_km=settings.delivery_radius_km,
+            max_age_seconds=settings.courier_position_ttl_minutes * 60,
+            predicate=is_available
+        )
+        
+        ranked = []
+        for distance, courier_id in nearest:
+            worker = self.balancer.get(courier_id)
+            active_orders = worker.active_orders if worker else 0
+            eta = travel_minutes(distance) + STOP_HANDLING_MINUTES
+            
+            ranked.append({
+                'courier_id': courier_id,
+                'distance_km': round(distance, 2),
+                'eta_minutes': round(eta),
+                'active_orders': active_orders,
+                'score': eta + active_orders * settings.dispatch_load_penalty_minutes
+            })
+        
+        ranked.sort(key=lambda candidate: candidate['score'])
+        return ranked[:k]
+    
+    async def propose_couriers(self, order: Order, k: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Предложение курьеров для заказа, готового к доставке"""
+        destination = await self.get_order_destination(order)
+        if destination is None:
+            return []
+        
+        return await self.rank_couriers(destination[0], destination[1], k)
+    
+    async def get_order_destination(self, order: Order) -> Optional[Tuple[float, float]]:
+        """Координаты точки доставки заказа"""
+        result = await self.session.execute(
+            select(Pharmacy.latitude, Pharmacy.longitude)
+            .where(Pharmacy.id == order.pharmacy_id)
+        )
+        row = result.first()
+        
+        if row is None or row.latitude is None or row.longitude is None:
+            return None
+        
+        return float(row.latitude), float(row.longitude)
+
+
+# Функция для получения сервиса
+async def get_dispatch_service() -> DispatchService:
+    """Получение экземпляра DispatchService на сессии текущего обновления Telegram"""
+    from ..database import update_session
+    
+    return DispatchService(update_session())
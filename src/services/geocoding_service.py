@@ -0,0 +1,430 @@
+"""
+🧭 Сервис геокодирования MAXXPHARM CRM
+"""
+
+import asyncio
+import logging
+import re
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, Any, List, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from ..models.database import GeocodeCache
+from ..database import AsyncSessionLocal
+from ..config import settings
+from .location_service import haversine_km
+
+
+logger = logging.getLogger(__name__)
+
+# Сокращения, которые приводятся к одному виду в ключе кэша
+ADDRESS_ABBREVIATIONS = {
+    "ул": "улица",
+    "пр": "проспект",
+    "пр-т": "проспект",
+    "просп": "проспект",
+    "мкр": "микрорайон",
+    "мкрн": "микрорайон",
+    "д": "дом",
+    "г": "город",
+    "р-н": "район",
+}
+
+# Районы и ориентиры Душанбе для офлайн-геокодирования (координаты приблизительные)
+DUSHANBE_GAZETTEER: List[Dict[str, Any]] = [
+    # Улицы и ориентиры
+    {"names": ["рудаки", "проспект рудаки"], "lat": 38.5740, "lon": 68.7870,
+     "address": "проспект Рудаки, Душанбе"},
+    {"names": ["айни", "улица айни"], "lat": 38.5500, "lon": 68.8100,
+     "address": "улица Айни, Душанбе"},
+    {"names": ["корвон", "рынок корвон"], "lat": 38.5120, "lon": 68.7600,
+     "address": "рынок Корвон, Душанбе"},
+    {"names": ["зеленый базар", "шохмансур бозор"], "lat": 38.5770, "lon": 68.8010,
+     "address": "Зеленый базар, Душанбе"},
+    {"names": ["аэропорт"], "lat": 38.5430, "lon": 68.8250,
+     "address": "Аэропорт Душанбе"},
+    {"names": ["102 микрорайон", "микрорайон 102"], "lat": 38.5520, "lon": 68.8230,
+     "address": "102 микрорайон, Душанбе"},
+    {"names": ["82 микрорайон", "микрорайон 82"], "lat": 38.5870, "lon": 68.7140,
+     "address": "82 микрорайон, Душанбе"},
+    # Районы
+    {"names": ["исмоили сомони", "район сомони"], "lat": 38.5880, "lon": 68.7750,
+     "address": "район Исмоили Сомони, Душанбе"},
+    {"names": ["сино", "район сино"], "lat": 38.5450, "lon": 68.7350,
+     "address": "район Сино, Душанбе"},
+    {"names": ["фирдавси", "фирдавсӣ", "район фирдавси"], "lat": 38.5700, "lon": 68.7400,
+     "address": "район Фирдавси, Душанбе"},
+    {"names": ["шохмансур", "район шохмансур"], "lat": 38.5600, "lon": 68.8100,
+     "address": "район Шохмансур, Душанбе"},
+    # Город целиком
+    {"names": ["душанбе", "город душанбе"], "lat": 38.5598, "lon": 68.7870,
+     "address": "Душанбе"},
+]
+
+
+def normalize_address(address: str) -> str:
+    """Нормализация адреса для ключа кэша"""
+    text = address.lower().replace("ё", "е")
+    text = re.sub(r"[^\w\s\-]", " ", text)
+    
+    words = []
+    for word in text.split():
+        word = word.strip("-")
+        if word:
+            words.append(ADDRESS_ABBREVIATIONS.get(word, word))
+    
+    return " ".join(words)
+
+
+def forward_key(address: str) -> str:
+    """Ключ кэша прямого геокодирования"""
+    return f"f:{normalize_address(address)}"
+
+
+def reverse_key(latitude: float, longitude: float, precision: Optional[int] = None) -> str:
+    """Ключ кэша обратного геокодирования по округленным координатам"""
+    precision = settings.geocode_coordinate_precision if precision is None else precision
+    return f"r:{round(float(latitude), precision):.{precision}f},{round(float(longitude), precision):.{precision}f}"
+
+
+class GeocodingProvider:
+    """Базовый провайдер геокодирования (блокирующие вызовы)"""
+    
+    name = "base"
+    
+    def geocode(self, address: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+    
+    def reverse(self, latitude: float, longitude: float) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+
+class GoogleGeocodingProvider(GeocodingProvider):
+    """Google Maps Geocoding API с одним клиентом на процесс"""
+    
+    name = "google"
+    
+    def __init__(self, api_key: str, timeout: Optional[float] = None):
+        self.api_key = api_key
+        self.timeout = timeout if timeout is not None else settings.geocode_timeout_seconds
+        self._client = None
+    
+    @property
+    def client(self):
+        if self._client is None:
+            import googlemaps
+            
+            self._client = googlemaps.Client(key=self.api_key, timeout=self.timeout)
+        return self._client
+    
+    def geocode(self, address: str) -> Optional[Dict[str, Any]]:
+        results = self.client.geocode(address)
+        if not results:
+            return None
+        return self._to_result(results[0])
+    
+    def reverse(self, latitude: float, longitude: float) -> Optional[Dict[str, Any]]:
+        results = self.client.reverse_geocode((latitude, longitude))
+        if not results:
+            return None
+        return self._to_result(results[0])
+    
+    @staticmethod
+    def _to_result(item: Dict[str, Any]) -> Dict[str, Any]:
+        location = item['geometry']['location']
+        return {
+            'latitude': location['lat'],
+            'longitude': location['lng'],
+            'formatted_address': item['formatted_address'],
+            'place_id': item.get('place_id')
+        }
+
+
+class GazetteerProvider(GeocodingProvider):
+    """Офлайн-провайдер по локальному справочнику районов и ориентиров"""
+    
+    name = "gazetteer"
+    
+    def __init__(self, entries: Optional[List[Dict[str, Any]]] = None, max_reverse_km: float = 5.0):
+        self.entries = entries if entries is not None else DUSHANBE_GAZETTEER
+        self.max_reverse_km = max_reverse_km
+        
+        # Записи проверяются по порядку справочника: от улиц к району и городу
+        self._names: List[Tuple[List[str], Dict[str, Any]]] = [
+            ([normalize_address(name) for name in entry["names"]], entry)
+            for entry in self.entries
+        ]
+    
+    def geocode(self, address: str) -> Optional[Dict[str, Any]]:
+        normalized = f" {normalize_address(address)} "
+        for names, entry in self._names:
+            if any(f" {name} " in normalized for name in names):
+                return self._to_result(entry)
+        return None
+    
+    def reverse(self, latitude: float, longitude: float) -> Optional[Dict[str, Any]]:
+        best = None
+        best_distance = self.max_reverse_km
+        for entry in self.entries:
+            distance = haversine_km(latitude, longitude, entry["lat"], entry["lon"])
+            if distance <= best_distance:
+                best, best_distance = entry, distance
+        return self._to_result(best) if best is not None else None
+    
+    @staticmethod
+    def _to_result(entry: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'latitude': entry["lat"],
+            'longitude': entry["lon"],
+            'formatted_address': entry["address"],
+            'place_id': None
+        }
+
+
+class LRUCache:
+    """Ограниченный кэш в памяти со сроком жизни записей"""
+    
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[str, Tuple[Optional[Dict[str, Any]], datetime]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    def __len__(self) -> int:
+        return len(self._data)
+    
+    def get(self, key: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """(найдено в кэше, значение); None - закэшированный отрицательный ответ"""
+        entry = self._data.get(key)
+        if entry is None or entry[1] <= datetime.utcnow():
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return False, None
+        
+        self._data.move_to_end(key)
+        self.hits += 1
+        return True, entry[0]
+    
+    def set(self, key: str, value: Optional[Dict[str, Any]], expires_at: datetime) -> None:
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+    
+    def clear(self) -> None:
+        self._data.clear()
+
+
+class Geocoder:
+    """Процессный слой геокодирования: провайдер, LRU и ограничение параллельности"""
+    
+    def __init__(
+        self,
+        provider: Optional[GeocodingProvider] = None,
+        cache_size: Optional[int] = None,
+        concurrency: Optional[int] = None
+    ):
+        self._provider = provider
+        self.memory = LRUCache(cache_size or settings.geocode_memory_cache_size)
+        self.concurrency = concurrency or settings.geocode_concurrency
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.provider_calls = 0
+        self.provider_errors = 0
+    
+    @property
+    def provider(self) -> GeocodingProvider:
+        if self._provider is None:
+            self._provider = self._default_provider()
+        return self._provider
+    
+    @provider.setter
+    def provider(self, provider: GeocodingProvider) -> None:
+        self._provider = provider
+        self.memory.clear()
+    
+    @staticmethod
+    def _default_provider() -> GeocodingProvider:
+        choice = settings.geocoding_provider
+        if choice == "google" or (choice == "auto" and settings.google_maps_api_key):
+            return GoogleGeocodingProvider(settings.google_maps_api_key)
+        return GazetteerProvider()
+    
+    async def call(self, key: str, method: str, *args) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """Вызов провайдера в потоке: (результат, успешный ли ответ)
+
+        Одновременные запросы одного ключа ждут общий вызов.
+        """
+        pending = self._inflight.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            outcome = await self._call_provider(method, *args)
+            future.set_result(outcome)
+            return outcome
+        except BaseException as e:
+            future.set_exception(e)
+            # Исключение уже передано ожидающим, подавляем предупреждение
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+    
+    async def _call_provider(self, method: str, *args) -> Tuple[Optional[Dict[str, Any]], bool]:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        
+        provider = self.provider
+        async with self._semaphore:
+            self.provider_calls += 1
+            try:
+                result = await asyncio.wait_for(
+                    asyncio.to_thread(getattr(provider, method), *args),
+                    timeout=settings.geocode_timeout_seconds
+                )
+                return result, True
+            except Exception as e:
+                self.provider_errors += 1
+                logger.warning(f"🧭 Geocoding error ({provider.name}.{method}): {e}")
+                return None, False
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика кэша и провайдера"""
+        lookups = self.memory.hits + self.memory.misses
+        return {
+            'provider': self.provider.name,
+            'memory_entries': len(self.memory),
+            'memory_hits': self.memory.hits,
+            'memory_misses': self.memory.misses,
+            'memory_hit_rate': round(self.memory.hits / lookups, 3) if lookups else 0.0,
+            'provider_calls': self.provider_calls,
+            'provider_errors': self.provider_errors
+        }
+
+
+# Глобальный геокодер процесса
+geocoder = Geocoder()
+
+
+class GeocodingService:
+    """Сервис геокодирования с постоянным кэшем в базе данных"""
+    
+    def __init__(self, session: AsyncSession, geocoder_instance: Optional[Geocoder] = None):
+        self.session = session
+        self.geocoder = geocoder_instance if geocoder_instance is not None else geocoder
+    
+    async def geocode(self, address: str) -> Optional[Dict[str, Any]]:
+        """Адрес -> координаты"""
+        if not address or not address.strip():
+            return None
+        return await self._lookup(forward_key(address), address, "geocode", address)
+    
+    async def reverse(self, latitude: float, longitude: float) -> Optional[Dict[str, Any]]:
+        """Координаты -> адрес"""
+        key = reverse_key(latitude, longitude)
+        return await self._lookup(key, key[2:], "reverse", float(latitude), float(longitude))
+    
+    async def _lookup(self, key: str, query: str, method: str, *args) -> Optional[Dict[str, Any]]:
+        cached, value = self.geocoder.memory.get(key)
+        if cached:
+            return value
+        
+        row = await self._get_cached_row(key)
+        if row is not None:
+            # PostgreSQL возвращает время с часовым поясом, SQLite - без; сравниваем в наивном UTC
+            cached_until = row.expires_at
+            if cached_until.tzinfo is not None:
+                cached_until = cached_until.astimezone(timezone.utc).replace(tzinfo=None)
+            if cached_until > datetime.utcnow():
+                value = self._row_to_result(row)
+                self.geocoder.memory.set(key, value, cached_until)
+                return value
+        
+        value, ok = await self.geocoder.call(key, method, *args)
+        if not ok:
+            # Ошибка провайдера не кэшируется в базе, чтобы не скрыть адрес надолго
+            return None
+        
+        expires_at = datetime.utcnow() + (
+            timedelta(days=settings.geocode_cache_ttl_days) if value is not None
+            else timedelta(hours=settings.geocode_negative_ttl_hours)
+        )
+        self.geocoder.memory.set(key, value, expires_at)
+        await self._store(key, query, value, expires_at)
+        return value
+    
+    async def _get_cached_row(self, key: str) -> Optional[GeocodeCache]:
+        result = await self.session.execute(
+            select(GeocodeCache).where(GeocodeCache.cache_key == key)
+        )
+        return result.scalar_one_or_none()
+    
+    async def _store(
+        self,
+        key: str,
+        query: str,
+        value: Optional[Dict[str, Any]],
+        expires_at: datetime
+    ) -> None:
+        """Запись в кэш своей сессией: транзакцию вызывающего кода не фиксирует и не откатывает"""
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(GeocodeCache).where(GeocodeCache.cache_key == key)
+            )
+            row = result.scalar_one_or_none()
+            if row is None:
+                row = GeocodeCache(cache_key=key, query=query)
+                session.add(row)
+            
+            row.found = value is not None
+            row.latitude = value['latitude'] if value else None
+            row.longitude = value['longitude'] if value else None
+            row.formatted_address = value['formatted_address'] if value else None
+            row.place_id = value['place_id'] if value else None
+            row.provider = self.geocoder.provider.name
+            row.expires_at = expires_at
+            
+            try:
+                await session.commit()
+            except IntegrityError:
+                # Параллельный запрос уже сохранил этот ключ
+                await session.rollback()
+            except SQLAlchemyError as e:
+                # Кэш - не повод ломать запрос: результат уже есть в памяти процесса
+                await session.rollback()
+                logger.warning(f"⚠️ Geocode cache write failed for {key}: {e}")
+    
+    @staticmethod
+    def _row_to_result(row: GeocodeCache) -> Optional[Dict[str, Any]]:
+        if not row.found:
+            return None
+        return {
+            'latitude': float(row.latitude),
+            'longitude': float(row.longitude),
+            'formatted_address': row.formatted_address,
+            'place_id': row.place_id
+        }
+    
+    async def purge_expired(self) -> int:
+        """Удаление просроченных записей кэша"""
+        from sqlalchemy import delete
+        
+        result = await self.session.execute(
+            delete(GeocodeCache).where(GeocodeCache.expires_at < datetime.utcnow())
+        )
+        return result.rowcount
+
+
+# Функция для получения сервиса
+async def get_geocoding_service() -> GeocodingService:
+    """Получение экземпляра GeocodingService на сессии текущего обновления Telegram"""
+    from ..database import update_session
+    
+    return GeocodingService(update_session())
@@ -0,0 +1,115 @@
+"""
+🩺 Проверки здоровья MAXXPHARM CRM: liveness, readiness и снимок статистики
+
+Liveness не делает ввода-вывода. Readiness берет соединение из пула
+(SELECT 1 с таймаутом), а ответ Telegram getMe кешируется: пробы раз в
+30 секунд не ходят в Bot API. Статистика для /health и /stats
+собирается в фоне раз в STATS_REFRESH_SECONDS.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Optional, Dict, Any
+
+from ..database import db_manager
+from ..config import settings
+from ..replicas import replica_router
+
+logger = logging.getLogger(__name__)
+
+
+class HealthMonitor:
+    """Состояние приложения для проб и фоновый снимок статистики"""
+    
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+        self._bot_lock = asyncio.Lock()
+        self._bot_ok: Optional[bool] = None
+        self._bot_checked_at = 0.0
+        self._bot_username: Optional[str] = None
+        self.stats: Optional[Dict[str, Any]] = None
+        self.stats_refreshed_at: Optional[datetime] = None
+    
+    def liveness(self) -> Dict[str, Any]:
+        """Процесс жив и цикл событий отвечает"""
+        return {"status": "alive", "uptime_seconds": round(time.monotonic() - self.started_at)}
+    
+    async def check_bot(self, bot) -> bool:
+        """getMe не чаще раза в health_bot_cache_seconds (после ошибки - health_bot_retry_seconds)"""
+        ttl = settings.health_bot_cache_seconds if self._bot_ok else settings.health_bot_retry_seconds
+        if self._bot_ok is not None and time.monotonic() - self._bot_checked_at < ttl:
+            return self._bot_ok
+        
+        async with self._bot_lock:
+            # Пока ждали блокировку, проверку мог выполнить другой запрос
+            if self._bot_ok is not None and time.monotonic() - self._bot_checked_at < ttl:
+                return self._bot_ok
+            try:
+                me = await asyncio.wait_for(bot.get_me(), settings.health_check_timeout)
+                self._bot_ok, self._bot_username = True, me.username
+            except Exception as e:
+                if self._bot_ok is not False:
+                    logger.warning(f"⚠️ Telegram getMe failed: {e}")
+                self._bot_ok = False
+            self._bot_checked_at = time.monotonic()
+        return self._bot_ok
+    
+    async def readiness(self, bot) -> Dict[str, Any]:
+        """Готовность принимать запросы: база обязательна, Telegram - деградация"""
+        database = await db_manager.health_check(timeout=settings.health_check_timeout)
+        bot_ok = await self.check_bot(bot) if bot is not None else False
+        
+        if not database:
+            status = "unhealthy"
+        else:
+            status = "healthy" if bot_ok else "degraded"
+        return {
+            "status": status,
+            "database": database,
+            "bot": bot_ok,
+            "bot_username": self._bot_username,
+            "bot_checked_seconds_ago": round(time.monotonic() - self._bot_checked_at) if self._bot_checked_at else None,
+            "pool": db_manager.pool_status(),
+        }
+    
+    async def refresh_stats(self) -> Dict[str, Any]:
+        # Снимок не требует свежести: берется с реплики, если она есть
+        replica = replica_router.pick()
+        self.stats = await db_manager.get_stats(replica.engine if replica else None)
+        self.stats_refreshed_at = datetime.utcnow()
+        return self.stats
+    
+    async def get_stats(self) -> Dict[str, Any]:
+        """Последний снимок статистики (до первого обновления - собирается сразу)"""
+        if self.stats is None:
+            await self.refresh_stats()
+        return {
+            **self.stats,
+            "refreshed_at": self.stats_refreshed_at.isoformat(),
+            "age_seconds": round((datetime.utcnow() - self.stats_refreshed_at).total_seconds()),
+        }
+    
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh_stats()
+            except Exception as e:
+                logger.error(f"❌ Stats refresh error: {e}")
+            await asyncio.sleep(settings.stats_refresh_seconds)
+    
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+# Глобальный монитор здоровья
+health_monitor = HealthMonitor()
@@ -4,12 +4,40 @@
 
 from typing import Optional, List, Dict, Any
 from datetime import datetime, timedelta
+from math import radians, cos, sin, asin, sqrt
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_, func
 from sqlalchemy.orm import selectinload
 
 from ..models.database import Location, User, Order
-from ..config import settings
+from ..replicas import read_only
+
+
+# Радиус Земли в километрах
+EARTH_RADIUS_KM = 6371
+
+# Средняя скорость курьера в городе (км/ч)
+AVG_COURIER_SPEED_KMH = 30.0
+
+# Дополнительное время на точке (прогрузка, поиск адреса), минуты
+STOP_HANDLING_MINUTES = 15
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Расстояние между двумя точками по формуле Хаверсина в километрах"""
+    
+    lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
+    
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
+    
+    return 2 * asin(sqrt(a)) * EARTH_RADIUS_KM
+
+
+def travel_minutes(distance_km: float) -> float:
+    """Время в пути по городу в минутах"""
+    return (distance_km / AVG_COURIER_SPEED_KMH) * 60
 
 
 class LocationService:
@@ -43,7 +71,7 @@ class LocationService:
         )
         
         self.session.add(location)
-        await self.session.commit()
+        await self.session.flush()
         await self.session.refresh(location)
         
         return location
@@ -142,7 +170,7 @@ class LocationService:
         start_date: datetime,
         end_date: datetime
     ) -> List[Location]:
-        """Получение истории маршрута пользователя"""
+        """Получение истории маршрута пользователя (границы по created_at отсекают лишние секции)"""
         
         result = await self.session.execute(
             select(Location)
@@ -166,22 +194,7 @@ class LocationService:
         lon2: float
     ) -> float:
         """Расчет расстояния между двумя точками в километрах"""
-        
-        from math import radians, cos, sin, asin, sqrt
-        
-        # Переводим в радианы
-        lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
-        
-        # Формула Хаверсина
-        dlat = lat2 - lat1
-        dlon = lon2 - lon1
-        a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-        c = 2 * asin(sqrt(a))
-        
-        # Радиус Земли в километрах
-        r = 6371
-        
-        return c * r
+        return haversine_km(lat1, lon1, lat2, lon2)
     
     async def get_daily_distance(self, user_id: int, date: datetime) -> float:
         """Расчет пройденного расстояния за день"""
@@ -229,14 +242,11 @@ class LocationService:
             delivery_lat, delivery_lon
         )
         
-        # Средняя скорость курьера в городе (км/ч)
-        avg_speed = 30.0
-        
         # Время в пути (минуты)
-        travel_time = (distance / avg_speed) * 60
+        travel_time = travel_minutes(distance)
         
         # Дополнительное время (прогрузка, поиск адреса)
-        additional_time = 15
+        additional_time = STOP_HANDLING_MINUTES
         
         # Общее время
         total_time = travel_time + additional_time
@@ -249,21 +259,19 @@ class LocationService:
             'estimated_arrival': datetime.utcnow() + timedelta(minutes=total_time)
         }
     
-    async def cleanup_old_locations(self, days: int = 30) -> int:
-        """Очистка старых геолокаций"""
+    async def cleanup_old_locations(self, days: int = 30) -> Dict[str, int]:
+        """Очистка старых геолокаций: целыми секциями (PostgreSQL) или порциями (SQLite)
         
-        cutoff_date = datetime.utcnow() - timedelta(days=days)
+        Возвращает {'partitions': ..., 'rows': ...} - убранные секции и строки.
+        """
+        from .partition_service import partition_manager
         
-        from sqlalchemy import delete
+        connection = await self.session.connection()
+        removed = await partition_manager.apply_retention(connection, "locations", days)
         
-        delete_result = await self.session.execute(
-            delete(Location).where(Location.created_at < cutoff_date)
-        )
-        
-        await self.session.commit()
-        
-        return delete_result.rowcount
+        return removed
     
+    @read_only
     async def get_location_statistics(self) -> Dict[str, Any]:
         """Получение статистики геолокаций"""
         
@@ -296,33 +304,9 @@ class LocationService:
     
     async def geocode_address(self, address: str) -> Optional[Dict[str, Any]]:
         """Геокодирование адреса в координаты"""
+        from .geocoding_service import GeocodingService
         
-        if not settings.google_maps_api_key:
-            return None
-        
-        try:
-            import googlemaps
-            
-            gmaps = googlemaps.Client(key=settings.google_maps_api_key)
-            
-            # Геокодирование
-            geocode_result = gmaps.geocode(address)
-            
-            if geocode_result:
-                location = geocode_result[0]['geometry']['location']
-                
-                return {
-                    'latitude': location['lat'],
-                    'longitude': location['lng'],
-                    'formatted_address': geocode_result[0]['formatted_address'],
-                    'place_id': geocode_result[0]['place_id']
-                }
-                
-        except Exception as e:
-            # Логирование ошибки
-            print(f"Geocoding error: {e}")
-        
-        return None
+        return await GeocodingService(self.session).geocode(address)
     
     async def reverse_geocode(
         self,
@@ -330,32 +314,15 @@ class LocationService:
         longitude: float
     ) -> Optional[str]:
         """Обратное геокодирование (координаты в адрес)"""
+        from .geocoding_service import GeocodingService
         
-        if not settings.google_maps_api_key:
-            return None
-        
-        try:
-            import googlemaps
-            
-            gmaps = googlemaps.Client(key=settings.google_maps_api_key)
-            
-            # Обратное геокодирование
-            reverse_result = gmaps.reverse_geocode((latitude, longitude))
-            
-            if reverse_result:
-                return reverse_result[0]['formatted_address']
-                
-        except Exception as e:
-            # Логирование ошибки
-            print(f"Reverse geocoding error: {e}")
-        
-        return None
+        result = await GeocodingService(self.session).reverse(latitude, longitude)
+        return result['formatted_address'] if result else None
 
 
 # Функция для получения сервиса
 async def get_location_service() -> LocationService:
-    """Получение экземпляра LocationService"""
-    from ..database import get_db
+    """Получение экземпляра LocationService на сессии текущего обновления Telegram"""
+    from ..database import update_session
     
-    async for session in get_db():
-        return LocationService(session)
+    return LocationService(update_session())
@@ -0,0 +1,346 @@
+"""
+📷 Сервис медиафайлов MAXXPHARM CRM (фото рецептов)
+"""
+
+import asyncio
+import hashlib
+import io
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, List, Dict, Any
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func
+from sqlalchemy.exc import IntegrityError
+
+from ..models.database import OrderAttachment
+from ..database import update_session
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ContentStore:
+    """Файловое хранилище с адресацией по sha256: одинаковое содержимое хранится один раз"""
+    
+    def __init__(self, root: str):
+        self.root = root
+    
+    @staticmethod
+    def relative_path(digest: str, extension: str) -> str:
+        # Два уровня каталогов, чтобы не держать десятки тысяч файлов в одном
+        return os.path.join(digest[:2], digest[2:4], f"{digest}{extension}")
+    
+    def path(self, relative_path: str) -> str:
+        return os.path.join(self.root, relative_path)
+    
+    def exists(self, relative_path: str) -> bool:
+        return os.path.exists(self.path(relative_path))
+    
+    def put(self, data: bytes, extension: str) -> Dict[str, Any]:
+        """Запись (атомарно через временный файл); повторная запись того же содержимого пропускается"""
+        digest = hashlib.sha256(data).hexdigest()
+        relative = self.relative_path(digest, extension)
+        created = self.write(relative, data)
+        return {"sha256": digest, "path": relative, "size": len(data), "created": created}
+    
+    def write(self, relative_path: str, data: bytes) -> bool:
+        """Атомарная запись по заданному пути; существующий файл не перезаписывается"""
+        target = self.path(relative_path)
+        if os.path.exists(target):
+            return False
+        
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(target), suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(data)
+            os.replace(temp_path, target)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        return True
+    
+    def put_file(self, source_path: str, extension: str, chunk_size: int = 1024 * 1024) -> Dict[str, Any]:
+        """Копирование файла в хранилище по частям: хэш считается за один проход вместе с записью"""
+        os.makedirs(self.root, exist_ok=True)
+        sha256 = hashlib.sha256()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(dir=self.root, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as target, open(source_path, "rb") as source:
+                for chunk in iter(lambda: source.read(chunk_size), b""):
+                    sha256.update(chunk)
+                    target.write(chunk)
+                    size += len(chunk)
+            
+            digest = sha256.hexdigest()
+            relative = self.relative_path(digest, extension)
+            created = not self.exists(relative)
+            if created:
+                os.makedirs(os.path.dirname(self.path(relative)), exist_ok=True)
+                os.replace(temp_path, self.path(relative))
+            else:
+                os.unlink(temp_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        
+        return {"sha256": digest, "path": relative, "size": size, "created": created}
+
+
+def normalize_image(source_path: str, store_root: str, max_side: int, quality: int) -> Dict[str, Any]:
+    """Поворот по EXIF, RGB, уменьшение до max_side и JPEG в хранилище (выполняется в процессе пула)"""
+    from PIL import Image, ImageOps
+    
+    original_size = os.path.getsize(source_path)
+    with Image.open(source_path) as image:
+        # JPEG декодируется сразу в уменьшенном масштабе (1/2, 1/4, 1/8) - меньше памяти и CPU
+        image.draft("RGB", (max_side, max_side))
+        image = ImageOps.exif_transpose(image)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+        width, height = image.size
+        
+        buffer = io.BytesIO()
+        image.save(buffer, "JPEG", quality=quality, optimize=True, progressive=True)
+    
+    stored = ContentStore(store_root).put(buffer.getvalue(), ".jpg")
+    stored.update({"width": width, "height": height, "original_size": original_size})
+    return stored
+
+
+class ImageProcessor:
+    """Пул процессов для обработки изображений с ограничением числа задач в работе"""
+    
+    def __init__(self, workers: Optional[int] = None, max_in_flight: Optional[int] = None):
+        self.workers = workers or settings.image_workers
+        self.max_in_flight = max_in_flight or settings.image_max_in_flight
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        # Один и тот же файл, присланный параллельно (альбом, повтор), обрабатывается один раз
+        self.in_progress: Dict[str, asyncio.Future] = {}
+        self.stats = {"processed": 0, "failed": 0, "waiting": 0, "in_flight": 0, "total_seconds": 0.0}
+    
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+    
+    @property
+    def slots(self) -> asyncio.Semaphore:
+        """Слоты на скачивание и обработку: при всплеске фото лишние ждут, не занимая диск и память"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+        return self._slots
+    
+    async def normalize(self, source_path: str) -> Dict[str, Any]:
+        """Нормализация файла в пуле процессов (цикл событий не блокируется)"""
+        return await self.run(
+            normalize_image,
+            source_path,
+            settings.media_storage_path,
+            settings.image_max_side,
+            settings.image_jpeg_quality
+        )
+    
+    async def run(self, function, *args) -> Any:
+        """Выполнение функции обработки в пуле процессов (функция должна быть на уровне модуля)"""
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            result = await loop.run_in_executor(self.executor, function, *args)
+        except Exception:
+            self.stats["failed"] += 1
+            raise
+        
+        self.stats["processed"] += 1
+        self.stats["total_seconds"] += time.perf_counter() - started
+        return result
+    
+    def get_stats(self) -> Dict[str, Any]:
+        processed = self.stats["processed"]
+        return {
+            **self.stats,
+            "avg_ms": round(self.stats["total_seconds"] / processed * 1000, 1) if processed else 0.0,
+            "workers": self.workers,
+            "max_in_flight": self.max_in_flight,
+        }
+    
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Глобальный пул обработки изображений
+image_processor = ImageProcessor()
+
+
+class MediaService:
+    """Сервис приема фото рецептов и вложений заказов"""
+    
+    def __init__(self, session: AsyncSession, processor: Optional[ImageProcessor] = None):
+        self.session = session
+        self.processor = processor if processor is not None else image_processor
+        self.store = ContentStore(settings.media_storage_path)
+    
+    async def store_photo(self, bot, file) -> Dict[str, Any]:
+        """Сжатая копия фото в хранилище (file - PhotoSize или Document); повторный файл не скачивается"""
+        existing = await self._find_by_file(file.file_unique_id)
+        if existing is not None:
+            return {
+                "sha256": existing.content_hash,
+                "path": existing.storage_path,
+                "size": existing.size_bytes,
+                "original_size": existing.original_size_bytes,
+                "width": existing.width,
+                "height": existing.height,
+                "file_unique_id": file.file_unique_id,
+            }
+        
+        pending = self.processor.in_progress.get(file.file_unique_id)
+        if pending is not None:
+            return dict(await asyncio.shield(pending))
+        
+        future = asyncio.get_running_loop().create_future()
+        self.processor.in_progress[file.file_unique_id] = future
+        try:
+            stored = await self._download_and_normalize(bot, file)
+            stored["file_unique_id"] = file.file_unique_id
+            future.set_result(stored)
+            return dict(stored)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Исключение получают ожидающие; если их нет, оно не должно попасть в лог как забытое
+            future.exception()
+            raise
+        finally:
+            self.processor.in_progress.pop(file.file_unique_id, None)
+    
+    async def attach(
+        self,
+        order_id: int,
+        stored: Dict[str, Any],
+        uploaded_by: Optional[int] = None,
+        kind: str = "prescription_photo"
+    ) -> OrderAttachment:
+        """Привязка сохраненного файла к заказу (одно и то же содержимое - одна запись на заказ)"""
+        attachment = await self._find_in_order(order_id, stored["sha256"])
+        if attachment is not None:
+            return attachment
+        
+        attachment = OrderAttachment(
+            order_id=order_id,
+            uploaded_by=uploaded_by,
+            kind=kind,
+            content_hash=stored["sha256"],
+            storage_path=stored["path"],
+            size_bytes=stored["size"],
+            original_size_bytes=stored.get("original_size"),
+            width=stored.get("width"),
+            height=stored.get("height"),
+            telegram_file_unique_id=stored.get("file_unique_id")
+        )
+        try:
+            async with self.session.begin_nested():
+                self.session.add(attachment)
+        except IntegrityError:
+            # Параллельное сообщение уже прикрепило это фото
+            return await self._find_in_order(order_id, stored["sha256"])
+        
+        await self.session.refresh(attachment)
+        return attachment
+    
+    async def _find_in_order(self, order_id: int, content_hash: str) -> Optional[OrderAttachment]:
+        result = await self.session.execute(
+            select(OrderAttachment).where(
+                OrderAttachment.order_id == order_id,
+                OrderAttachment.content_hash == content_hash
+            )
+        )
+        return result.scalar_one_or_none()
+    
+    async def attach_photo(
+        self,
+        bot,
+        file,
+        order_id: int,
+        uploaded_by: Optional[int] = None
+    ) -> OrderAttachment:
+        """Скачивание, нормализация и привязка фото к заказу"""
+        stored = await self.store_photo(bot, file)
+        return await self.attach(order_id, stored, uploaded_by)
+    
+    async def _find_by_file(self, file_unique_id: str) -> Optional[OrderAttachment]:
+        """Ранее обработанное вложение с тем же файлом Telegram"""
+        result = await self.session.execute(
+            select(OrderAttachment)
+            .where(OrderAttachment.telegram_file_unique_id == file_unique_id)
+            .order_by(OrderAttachment.id.desc())
+            .limit(1)
+        )
+        attachment = result.scalar_one_or_none()
+        if attachment is not None and not self.store.exists(attachment.storage_path):
+            return None
+        return attachment
+    
+    async def _download_and_normalize(self, bot, file) -> Dict[str, Any]:
+        """Потоковое скачивание во временный файл и обработка в пуле процессов"""
+        if file.file_size and file.file_size > settings.image_max_download_mb * 1024 * 1024:
+            raise ValueError(f"Файл больше {settings.image_max_download_mb} МБ")
+        
+        self.processor.stats["waiting"] += 1
+        async with self.processor.slots:
+            self.processor.stats["waiting"] -= 1
+            self.processor.stats["in_flight"] += 1
+            fd, temp_path = tempfile.mkstemp(suffix=".img")
+            os.close(fd)
+            try:
+                # aiogram пишет файл на диск по частям, целиком в память он не попадает
+                await bot.download(file, destination=temp_path)
+                return await self.processor.normalize(temp_path)
+            finally:
+                self.processor.stats["in_flight"] -= 1
+                os.unlink(temp_path)
+    
+    async def get_attachments(self, order_id: int) -> List[OrderAttachment]:
+        """Вложения заказа"""
+        result = await self.session.execute(
+            select(OrderAttachment)
+            .where(OrderAttachment.order_id == order_id)
+            .order_by(OrderAttachment.created_at.asc())
+        )
+        return result.scalars().all()
+    
+    async def count_attachments(self, order_ids: List[int]) -> Dict[int, int]:
+        """Количество вложений по заказам одним запросом"""
+        if not order_ids:
+            return {}
+        
+        result = await self.session.execute(
+            select(OrderAttachment.order_id, func.count(OrderAttachment.id))
+            .where(OrderAttachment.order_id.in_(order_ids))
+            .group_by(OrderAttachment.order_id)
+        )
+        return {order_id: count for order_id, count in result.all()}
+    
+    def file_path(self, attachment: OrderAttachment) -> str:
+        """Абсолютный путь к файлу вложения"""
+        return self.store.path(attachment.storage_path)
+
+
+# Функция для получения сервиса
+async def get_media_service() -> MediaService:
+    """Получение экземпляра MediaService на сессии текущего обновления Telegram"""
+    return MediaService(update_session())
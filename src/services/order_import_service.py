@@ -0,0 +1,351 @@
+"""
+📥 Импорт заказов из CSV/XLSX документов MAXXPHARM CRM
+"""
+
+import asyncio
+import codecs
+import csv
+import io
+import logging
+import re
+import tempfile
+from itertools import islice
+from typing import Optional, List, Dict, Any, Iterator, Tuple, BinaryIO, Callable, Awaitable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .catalog_service import CatalogService, normalize_tokens
+from .order_parser import UNIT_ALIASES, parse_line
+from .order_service import OrderService
+from ..database import update_session
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+CSV_EXTENSIONS = (".csv", ".tsv", ".txt")
+XLSX_EXTENSIONS = (".xlsx", ".xlsm")
+CSV_MIME_TYPES = ("text/csv", "text/plain", "text/tab-separated-values", "application/csv")
+XLSX_MIME_TYPES = ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",)
+DELIMITERS = (";", "\t", ",")
+
+# Заголовки колонок -> поле позиции (сравнение после нормализации заголовка)
+HEADER_ALIASES = {
+    "sku": ("артикул", "код товара", "код", "sku", "article", "code"),
+    "name": ("наименование", "название", "номенклатура", "товар", "препарат", "лекарство", "name", "product"),
+    "quantity": ("количество", "кол во", "колво", "кол", "заказ", "qty", "quantity", "count"),
+    "unit": ("ед изм", "единица", "ед", "unit"),
+}
+
+# "10", "10.0" (числа из Excel), "10 шт", "5уп."
+QUANTITY_CELL = re.compile(r"^(\d+)(?:[.,]0+)?\s*([^\W\d_]*)\.?$")
+HEADER_CLEANUP = re.compile(r"[^\w]+")
+
+# Ошибок в отчете сохраняется не больше, чем показывается пользователю с запасом
+MAX_STORED_ERRORS = 50
+
+ProgressCallback = Callable[[str, int, Optional[int]], Awaitable[None]]
+
+
+def detect_format(file_name: Optional[str], mime_type: Optional[str] = None) -> Optional[str]:
+    """Формат документа по имени файла и MIME-типу: csv, xlsx или None"""
+    name = (file_name or "").lower()
+    if name.endswith(XLSX_EXTENSIONS) or mime_type in XLSX_MIME_TYPES:
+        return "xlsx"
+    if name.endswith(CSV_EXTENSIONS) or mime_type in CSV_MIME_TYPES:
+        return "csv"
+    return None
+
+
+def open_spool() -> BinaryIO:
+    """Буфер для скачивания: в памяти до import_spool_mb, дальше временный файл"""
+    return tempfile.SpooledTemporaryFile(max_size=settings.import_spool_mb * 1024 * 1024)
+
+
+def _detect_encoding(sample: bytes) -> str:
+    if sample.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    try:
+        # final=False: обрезанный на границе выборки символ не считается ошибкой
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "cp1251"
+
+
+def _detect_delimiter(sample: str) -> str:
+    """Разделитель, который встречается в каждой из первых строк (";" в приоритете: "12,5")"""
+    lines = [line for line in sample.splitlines()[:20] if line.strip()]
+    # Последняя строка выборки может быть обрезана
+    if len(lines) > 1:
+        lines = lines[:-1]
+    best, best_count = ",", 0
+    for delimiter in DELIMITERS:
+        count = min((line.count(delimiter) for line in lines), default=0)
+        if count > best_count:
+            best, best_count = delimiter, count
+    return best
+
+
+def iter_csv_rows(stream: BinaryIO) -> Iterator[List[Any]]:
+    """Построчное чтение CSV: кодировка и разделитель по первым 64 КБ"""
+    sample = stream.read(64 * 1024)
+    stream.seek(0)
+    encoding = _detect_encoding(sample)
+    
+    delimiter = _detect_delimiter(sample.decode(encoding, errors="ignore"))
+    
+    text = io.TextIOWrapper(stream, encoding=encoding, errors="replace", newline="")
+    try:
+        yield from csv.reader(text, csv.excel, delimiter=delimiter)
+    finally:
+        # Поток закрывает вызывающий код
+        text.detach()
+
+
+def iter_xlsx_rows(stream: BinaryIO) -> Iterator[List[Any]]:
+    """Построчное чтение первого листа XLSX в режиме read-only"""
+    from openpyxl import load_workbook
+    
+    workbook = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        for row in workbook.active.iter_rows(values_only=True):
+            yield ["" if value is None else value for value in row]
+    finally:
+        workbook.close()
+
+
+def _normalize_header(value: Any) -> str:
+    return HEADER_CLEANUP.sub(" ", str(value).lower()).strip()
+
+
+def _take(rows: Iterator[List[Any]], count: int) -> List[List[Any]]:
+    return list(islice(rows, count))
+
+
+class ColumnMapping:
+    """Соответствие колонок документа полям позиции заказа"""
+    
+    def __init__(self, columns: Dict[str, int]):
+        self.columns = columns
+    
+    @classmethod
+    def from_header(cls, cells: List[Any]) -> Optional["ColumnMapping"]:
+        """Разбор строки заголовка; None, если колонка с названием не найдена"""
+        columns: Dict[str, int] = {}
+        for position, cell in enumerate(cells):
+            header = _normalize_header(cell)
+            if not header:
+                continue
+            for field, aliases in HEADER_ALIASES.items():
+                if field in columns:
+                    continue
+                if any(header == alias or header.startswith(alias + " ") for alias in aliases):
+                    columns[field] = position
+                    break
+        
+        return cls(columns) if "name" in columns else None
+    
+    def get(self, row: List[Any], field: str) -> Any:
+        position = self.columns.get(field)
+        if position is None or position >= len(row):
+            return None
+        return row[position]
+
+
+def parse_quantity(value: Any) -> Tuple[Optional[int], Optional[str]]:
+    """Количество и единица из ячейки (число Excel или текст "10 шт")"""
+    if isinstance(value, bool) or value is None:
+        return None, None
+    if isinstance(value, (int, float)):
+        return (int(value), None) if float(value).is_integer() else (None, None)
+    
+    match = QUANTITY_CELL.match(str(value).strip())
+    if not match:
+        return None, None
+    unit = UNIT_ALIASES.get(match.group(2).lower()) if match.group(2) else None
+    return int(match.group(1)), unit
+
+
+def parse_row(row: List[Any], mapping: Optional[ColumnMapping]) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """Позиция из строки документа или текст ошибки"""
+    if mapping is None:
+        # Документ без заголовка: строка разбирается как выгрузка остатков
+        items = parse_line("\t".join(str(cell) for cell in row))
+        if not items:
+            return None, "не найдено наименование"
+        item = items[0]
+        if not item["explicit"]:
+            return None, "не указано количество"
+        quantity, unit, sku = item["quantity"], item["unit"], None
+        name = item["product_name"]
+    else:
+        name = str(mapping.get(row, "name") or "").strip()
+        if not name:
+            return None, "пустое наименование"
+        quantity, unit = parse_quantity(mapping.get(row, "quantity"))
+        if quantity is None:
+            return None, f"некорректное количество «{mapping.get(row, 'quantity') or ''}»"
+        unit = UNIT_ALIASES.get(str(mapping.get(row, "unit") or "").strip().lower().rstrip("."), unit)
+        sku = str(mapping.get(row, "sku") or "").strip() or None
+    
+    if quantity <= 0:
+        return None, "количество должно быть больше нуля"
+    if quantity > settings.import_max_quantity:
+        return None, f"количество больше {settings.import_max_quantity}"
+    
+    return {
+        "product_name": name,
+        "quantity": quantity,
+        "unit": unit or "шт",
+        "sku": sku,
+    }, None
+
+
+class OrderImportService:
+    """Сервис импорта заказов из CSV/XLSX"""
+    
+    def __init__(self, session: AsyncSession):
+        self.session = session
+    
+    async def read_document(
+        self,
+        stream: BinaryIO,
+        file_name: Optional[str],
+        mime_type: Optional[str] = None,
+        progress: Optional[ProgressCallback] = None
+    ) -> Dict[str, Any]:
+        """Потоковое чтение документа: строки читаются пачками в потоке, повторы суммируются"""
+        file_format = detect_format(file_name, mime_type)
+        if file_format is None:
+            raise ValueError("Поддерживаются только файлы CSV и XLSX")
+        
+        rows = iter_csv_rows(stream) if file_format == "csv" else iter_xlsx_rows(stream)
+        report: Dict[str, Any] = {
+            "format": file_format,
+            "rows": 0,
+            "items": [],
+            "errors": [],
+            "error_count": 0,
+            "truncated": False,
+        }
+        merged: Dict[str, Dict[str, Any]] = {}
+        mapping: Optional[ColumnMapping] = None
+        header_checked = False
+        row_number = 0
+        
+        try:
+            while not report["truncated"]:
+                chunk = await asyncio.to_thread(_take, rows, settings.import_chunk_rows)
+                if not chunk:
+                    break
+                
+                for row in chunk:
+                    row_number += 1
+                    if not any(str(cell).strip() for cell in row):
+                        continue
+                    if not header_checked:
+                        header_checked = True
+                        mapping = ColumnMapping.from_header(row)
+                        if mapping is not None:
+                            continue
+                    
+                    if report["rows"] >= settings.import_max_rows:
+                        report["truncated"] = True
+                        break
+                    report["rows"] += 1
+                    
+                    item, error = parse_row(row, mapping)
+                    if error:
+                        report["error_count"] += 1
+                        if len(report["errors"]) < MAX_STORED_ERRORS:
+                            report["errors"].append((row_number, error))
+                        continue
+                    
+                    key = item["sku"].lower() if item["sku"] else " ".join(normalize_tokens(item["product_name"]))
+                    if key in merged:
+                        merged[key]["quantity"] += item["quantity"]
+                    else:
+                        merged[key] = item
+                
+                if progress:
+                    await progress("read", row_number, None)
+        except ValueError:
+            raise
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to read {file_format} document {file_name}: {e}")
+            raise ValueError("Не удалось прочитать файл, проверьте формат") from e
+        finally:
+            rows.close()
+        
+        report["items"] = list(merged.values())
+        return report
+    
+    async def price_items(
+        self,
+        items: List[Dict[str, Any]],
+        progress: Optional[ProgressCallback] = None
+    ) -> List[Dict[str, Any]]:
+        """Сопоставление с каталогом пачками с передачей управления циклу событий"""
+        catalog_service = CatalogService(self.session)
+        chunk_size = settings.import_chunk_rows
+        
+        for start in range(0, len(items), chunk_size):
+            await catalog_service.price_items(items[start:start + chunk_size])
+            if progress:
+                await progress("match", min(start + chunk_size, len(items)), len(items))
+            await asyncio.sleep(0)
+        
+        # Разные написания одного товара сливаются в одну позицию
+        merged: Dict[Any, Dict[str, Any]] = {}
+        result = []
+        for item in items:
+            product_id = item.get("product_id")
+            if product_id is None:
+                result.append(item)
+            elif product_id in merged:
+                merged[product_id]["quantity"] += item["quantity"]
+            else:
+                merged[product_id] = item
+                result.append(item)
+        return result
+    
+    async def import_order(
+        self,
+        stream: BinaryIO,
+        file_name: Optional[str],
+        client_id: int,
+        pharmacy_id: int,
+        mime_type: Optional[str] = None,
+        progress: Optional[ProgressCallback] = None
+    ) -> Dict[str, Any]:
+        """Чтение, проверка, сопоставление и создание заказа одним пакетным INSERT"""
+        report = await self.read_document(stream, file_name, mime_type, progress)
+        report["order"] = None
+        if not report["items"]:
+            return report
+        
+        items = await self.price_items(report["items"], progress)
+        report["items"] = items
+        report["unmatched"] = sum(1 for item in items if item.get("product_id") is None)
+        
+        if progress:
+            await progress("save", len(items), len(items))
+        
+        report["order"] = await OrderService(self.session).create_order(
+            client_id=client_id,
+            pharmacy_id=pharmacy_id,
+            items=items,
+            notes=f"Импорт из файла {file_name}: {len(items)} позиций"
+        )
+        
+        logger.info(
+            f"📥 Imported order {report['order'].order_number}: {report['rows']} rows, "
+            f"{len(items)} items, {report['error_count']} errors"
+        )
+        return report
+
+
+# Функция для получения сервиса
+async def get_order_import_service() -> OrderImportService:
+    """Получение экземпляра OrderImportService на сессии текущего обновления Telegram"""
+    return OrderImportService(update_session())
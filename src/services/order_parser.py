@@ -0,0 +1,181 @@
+"""
+🧾 Парсер текстовых заказов MAXXPHARM CRM
+"""
+
+import io
+import re
+from typing import Optional, List, Dict, Any, Iterable, Iterator, Union
+
+
+# Единицы количества -> нормализованное название
+UNIT_ALIASES = {
+    "шт": "шт", "штук": "шт", "штука": "шт", "штуки": "шт", "pcs": "шт",
+    "амп": "ампула", "ампул": "ампула", "ампула": "ампула", "ампулы": "ампула",
+    "фл": "флакон", "флак": "флакон", "флакон": "флакон", "флакона": "флакон", "флаконов": "флакон",
+    "уп": "упаковка", "упак": "упаковка", "упаковка": "упаковка", "упаковки": "упаковка",
+    "упаковок": "упаковка", "пач": "упаковка", "пачка": "упаковка", "пачки": "упаковка",
+    "пачек": "упаковка",
+}
+
+_UNIT = "|".join(sorted(map(re.escape, UNIT_ALIASES), key=len, reverse=True))
+
+# "50шт", "50 шт.", "20 ампул", "3 уп"
+QUANTITY_WITH_UNIT = re.compile(rf"(?<![\w.,])(\d+)\s*({_UNIT})\.?(?!\w)", re.IGNORECASE)
+
+# "x50", "х 50" (кириллица), "×50", "*50", а также "50x" в конце строки
+MULTIPLIER = re.compile(r"(?:(?<!\w)[xх×*]\s*(\d+)(?!\w))|(?:(?<![\w.,\-])(\d+)\s*[xх×*](?!\w))", re.IGNORECASE)
+
+# Название и количество через разделитель: " - ", " — ", ":"
+SEPARATOR = re.compile(r"\s+[-–—]+\s*|\s*[-–—]+\s+|\s*:\s*")
+
+# Число в начале остатка после разделителя
+LEADING_NUMBER = re.compile(r"^\s*(\d+)(?![\d.,]*\s*(?:мг|мкг|г|мл|л|ме|%))", re.IGNORECASE)
+
+# Одиночное число в конце / начале строки
+TRAILING_NUMBER = re.compile(r"(?<![.,%№])\s+(\d+)\s*\.?$")
+LEADING_QUANTITY = re.compile(r"^(\d+)\s+(?=[^\W\d_])")
+
+# Маркеры списков: "•", "-", "*", "1.", "2)"
+BULLET = re.compile(r"^\s*(?:[•·●▪►✓✔\-–—*]+|\d{1,4}[.)](?!\d))\s*")
+
+# Разделители нескольких позиций в строке (запятая только перед буквой, не "0,5%")
+ITEM_SPLIT = re.compile(r";|,(?=\s*[^\W\d_])")
+
+CLEANUP = re.compile(r"[\s\-–—:,;.]+$|^[\s\-–—:,;.\"'«]+")
+SPACES = re.compile(r"\s{2,}")
+HAS_LETTER = re.compile(r"[^\W\d_]")
+
+# Артикул в первой колонке выгрузки: "АП-0012", "SKU12345"
+ARTICLE_CODE = re.compile(r"^[^\W\d_]{0,5}[-_/]?\d{3,}$")
+
+
+def parse_line(line: str) -> List[Dict[str, Any]]:
+    """Позиции заказа из одной строки (в строке может быть несколько позиций)"""
+    line = line.strip()
+    if not line or line.endswith(":") or not HAS_LETTER.search(line):
+        return []
+    
+    if "\t" in line:
+        item = _parse_cells(line.split("\t"))
+        return [item] if item else []
+    
+    segments = ITEM_SPLIT.split(line)
+    if len(segments) > 1:
+        items = [_parse_segment(segment) for segment in segments]
+        items = [item for item in items if item]
+        # Запятые внутри названия: дробим строку, только если количеств несколько
+        if sum(1 for item in items if item["explicit"]) >= 2:
+            return items
+    
+    item = _parse_segment(line)
+    return [item] if item else []
+
+
+def _parse_segment(segment: str) -> Optional[Dict[str, Any]]:
+    """Одна позиция: название, количество, единица"""
+    raw = segment.strip()
+    text = BULLET.sub("", raw, count=1)
+    if not HAS_LETTER.search(text):
+        return None
+    
+    quantity = None
+    unit = None
+    name = text
+    
+    match = QUANTITY_WITH_UNIT.search(text)
+    if match:
+        quantity = int(match.group(1))
+        unit = UNIT_ALIASES[match.group(2).lower()]
+        name = text[:match.start()] + " " + text[match.end():]
+    else:
+        match = MULTIPLIER.search(text)
+        if match:
+            quantity = int(match.group(1) or match.group(2))
+            name = text[:match.start()] + " " + text[match.end():]
+    
+    if quantity is None:
+        parts = SEPARATOR.split(text, maxsplit=1)
+        if len(parts) == 2 and HAS_LETTER.search(parts[0]):
+            number = LEADING_NUMBER.match(parts[1])
+            if number:
+                quantity = int(number.group(1))
+                name = parts[0]
+    
+    if quantity is None:
+        number = TRAILING_NUMBER.search(text)
+        if number:
+            quantity = int(number.group(1))
+            name = text[:number.start()]
+        else:
+            number = LEADING_QUANTITY.match(text)
+            if number:
+                quantity = int(number.group(1))
+                name = text[number.end():]
+    
+    name = _clean_name(SEPARATOR.split(name, maxsplit=1)[0] if quantity is not None else name)
+    if not name or not HAS_LETTER.search(name):
+        return None
+    
+    return {
+        "product_name": name,
+        "quantity": quantity if quantity else 1,
+        "unit": unit or "шт",
+        "explicit": quantity is not None,
+        "raw": raw,
+    }
+
+
+def _parse_cells(cells: List[str]) -> Optional[Dict[str, Any]]:
+    """Строка выгрузки остатков: название и количество в отдельных колонках"""
+    name = None
+    quantity = None
+    unit = None
+    
+    for cell in cells:
+        cell = cell.strip()
+        if not cell:
+            continue
+        if name is None:
+            if HAS_LETTER.search(cell) and not ARTICLE_CODE.match(cell):
+                name = BULLET.sub("", cell, count=1)
+            continue
+        
+        match = QUANTITY_WITH_UNIT.fullmatch(cell)
+        if match:
+            quantity = int(match.group(1))
+            unit = UNIT_ALIASES[match.group(2).lower()]
+            break
+        if cell.isdigit():
+            quantity = int(cell)
+            # Следующая колонка может быть единицей измерения
+            continue
+        if quantity is not None:
+            unit = UNIT_ALIASES.get(cell.lower().rstrip("."), unit)
+            break
+    
+    if name is None:
+        return None
+    
+    return {
+        "product_name": _clean_name(name),
+        "quantity": quantity if quantity else 1,
+        "unit": unit or "шт",
+        "explicit": quantity is not None,
+        "raw": "\t".join(cells).strip(),
+    }
+
+
+def _clean_name(name: str) -> str:
+    return SPACES.sub(" ", CLEANUP.sub("", name.strip()))
+
+
+def iter_order_items(source: Union[str, Iterable[str]]) -> Iterator[Dict[str, Any]]:
+    """Построчный разбор текста или потока строк без построения промежуточных списков"""
+    lines = io.StringIO(source) if isinstance(source, str) else source
+    for line in lines:
+        yield from parse_line(line)
+
+
+def parse_order_text(text: str) -> List[Dict[str, Any]]:
+    """Все позиции заказа из текста"""
+    return list(iter_order_items(text))
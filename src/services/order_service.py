@@ -5,14 +5,16 @@
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, and_, or_, func
+from sqlalchemy import select, update, insert, and_, or_, func
 from sqlalchemy.orm import selectinload
 
 from ..models.database import (
-    Order, OrderStatus, OrderItem, User, Pharmacy,
+    Order, OrderStatus, OrderItem, User, UserRole, Pharmacy,
     Payment, PaymentType, Debt
 )
-from ..database import get_db
+from ..database import update_session
+from ..config import settings
+from ..replicas import read_only
 
 
 class OrderService:
@@ -37,6 +39,12 @@ class OrderService:
         # Расчет общей суммы
         total_amount = sum(item['quantity'] * item['unit_price'] for item in items)
         
+        # Зона доставки берется из аптеки
+        zone_result = await self.session.execute(
+            select(Pharmacy.zone).where(Pharmacy.id == pharmacy_id)
+        )
+        zone = zone_result.scalar_one_or_none()
+        
         # Создание заказа
         order = Order(
             order_number=order_number,
@@ -45,24 +53,36 @@ class OrderService:
             status=OrderStatus.CREATED,
             total_amount=total_amount,
             notes=notes,
-            delivery_address=delivery_address
+            delivery_address=delivery_address,
+            zone=zone
         )
         
         self.session.add(order)
         await self.session.flush()  # Получаем ID заказа
         
-        # Создание элементов заказа
-        for item_data in items:
-            item = OrderItem(
-                order_id=order.id,
-                product_name=item_data['product_name'],
-                quantity=item_data['quantity'],
-                unit_price=item_data['unit_price'],
-                total_price=item_data['quantity'] * item_data['unit_price']
+        # Элементы заказа одним multi-row INSERT (импорт может дать тысячи строк)
+        if items:
+            await self.session.execute(
+                insert(OrderItem),
+                [
+                    {
+                        "order_id": order.id,
+                        "product_id": item_data.get('product_id'),
+                        "product_name": item_data['product_name'],
+                        "quantity": item_data['quantity'],
+                        "unit_price": item_data['unit_price'],
+                        "total_price": item_data['quantity'] * item_data['unit_price']
+                    }
+                    for item_data in items
+                ]
             )
-            self.session.add(item)
         
-        await self.session.commit()
+        # Сводка клиента обновляется в той же транзакции
+        from .client_summary_service import ClientSummaryService
+        
+        await ClientSummaryService(self.session).on_order_created(order)
+        
+        await self.session.flush()
         await self.session.refresh(order)
         
         return order
@@ -99,17 +119,35 @@ class OrderService:
             .options(selectinload(Order.payments))
             .where(Order.order_number == order_number)
         )
-        return result.scalar_one_or_none()
+        order = result.scalar_one_or_none()
+        if order is None:
+            # Закрытый заказ мог быть перенесен в архив
+            from .archive_service import ArchiveService
+            order = await ArchiveService(self.session).get_order(order_number)
+        return order
     
-    async def get_orders_by_status(self, status: OrderStatus) -> List[Order]:
-        """Получение заказов по статусу"""
-        result = await self.session.execute(
+    async def get_orders_by_status(
+        self,
+        status: OrderStatus,
+        zone: Optional[str] = None,
+        courier_id: Optional[int] = None
+    ) -> List[Order]:
+        """Получение заказов по статусу (опционально только одной зоны или одного курьера)"""
+        query = (
             select(Order)
             .options(selectinload(Order.items))
             .options(selectinload(Order.client))
+            .options(selectinload(Order.pharmacy))
             .where(Order.status == status.value)
             .order_by(Order.created_at.desc())
         )
+        if zone is not None:
+            # Заказы без зоны (старые, аптека без координат или вне контуров) видны во всех зонах
+            query = query.where(or_(Order.zone == zone, Order.zone.is_(None)))
+        if courier_id is not None:
+            query = query.where(Order.courier_id == courier_id)
+        
+        result = await self.session.execute(query)
         return result.scalars().all()
     
     async def get_orders_by_client(self, client_id: int) -> List[Order]:
@@ -146,11 +184,28 @@ class OrderService:
             order.collected_at = datetime.utcnow()
         elif new_status == OrderStatus.DELIVERED:
             order.delivered_at = datetime.utcnow()
+            
+            # Сумма заказа относится на баланс клиента вместе со сменой статуса
+            from .reconciliation_service import ReconciliationService
+            
+            await ReconciliationService(self.session).charge_order(order)
         
         if notes:
             order.notes = notes
         
-        await self.session.commit()
+        # Автоматическое назначение сотрудников на следующий этап
+        if settings.auto_assignment_enabled:
+            from .assignment_service import AssignmentService
+            
+            await AssignmentService(self.session).on_status_change(
+                order, old_status, new_status.value
+            )
+        
+        from .client_summary_service import ClientSummaryService
+        
+        await ClientSummaryService(self.session).on_order_changed(order, old_status)
+        
+        await self.session.flush()
         
         # Логирование изменения статуса
         await self._log_order_status_change(
@@ -170,15 +225,18 @@ class OrderService:
         if not order:
             return None
         
-        if employee_role == "collector":
-            order.collector_id = employee_id
-        elif employee_role == "checker":
-            order.checker_id = employee_id
-        elif employee_role == "courier":
-            order.courier_id = employee_id
+        from .assignment_service import AssignmentService, ORDER_FIELD_FOR_ROLE
+        
+        if employee_role not in ORDER_FIELD_FOR_ROLE:
+            return None
+        
+        # Ручное назначение тоже учитывается в нагрузке сотрудников
+        await AssignmentService(self.session).reassign(
+            order, UserRole(employee_role), employee_id
+        )
         
         order.updated_at = datetime.utcnow()
-        await self.session.commit()
+        await self.session.flush()
         
         return order
     
@@ -193,16 +251,34 @@ class OrderService:
         if not order:
             return None
         
+        old_status = order.status
         order.status = OrderStatus.REJECTED.value
         order.operator_id = operator_id
         order.rejection_reason = rejection_reason
         order.updated_at = datetime.utcnow()
         
-        await self.session.commit()
+        # Освобождение назначенных сотрудников
+        if settings.auto_assignment_enabled:
+            from .assignment_service import AssignmentService
+            
+            await AssignmentService(self.session).on_status_change(
+                order, old_status, OrderStatus.REJECTED.value
+            )
+        
+        # Предоплата уже отнесла сумму заказа на баланс клиента - начисление отменяется
+        from .reconciliation_service import ReconciliationService
+        
+        await ReconciliationService(self.session).reverse_charge(order, recorded_by=operator_id)
+        
+        from .client_summary_service import ClientSummaryService
+        
+        await ClientSummaryService(self.session).on_order_changed(order, old_status)
+        
+        await self.session.flush()
         
         # Логирование
         await self._log_order_status_change(
-            order_id, OrderStatus.CREATED.value, OrderStatus.REJECTED.value, operator_id
+            order_id, old_status, OrderStatus.REJECTED.value, operator_id
         )
         
         return order
@@ -213,41 +289,42 @@ class OrderService:
             select(Order)
             .options(selectinload(Order.items))
             .options(selectinload(Order.client))
+            .options(selectinload(Order.pharmacy))
             .where(Order.status == OrderStatus.CREATED.value)
             .order_by(Order.created_at.asc())
         )
         return result.scalars().all()
     
-    async def get_orders_for_collector(self) -> List[Order]:
-        """Получение заказов для сборщика"""
-        result = await self.session.execute(
-            select(Order)
-            .options(selectinload(Order.items))
-            .where(Order.status == OrderStatus.CONFIRMED.value)
-            .order_by(Order.created_at.asc())
-        )
-        return result.scalars().all()
+    async def get_orders_for_collector(self, zone: Optional[str] = None) -> List[Order]:
+        """Получение заказов для сборщика (очередь зоны, если она указана)"""
+        return await self._get_queue(OrderStatus.CONFIRMED, zone)
     
-    async def get_orders_for_checker(self) -> List[Order]:
-        """Получение заказов для проверщика"""
-        result = await self.session.execute(
-            select(Order)
-            .options(selectinload(Order.items))
-            .where(Order.status == OrderStatus.COLLECTED.value)
-            .order_by(Order.created_at.asc())
-        )
-        return result.scalars().all()
+    async def get_orders_for_checker(self, zone: Optional[str] = None) -> List[Order]:
+        """Получение заказов для проверщика (очередь зоны, если она указана)"""
+        return await self._get_queue(OrderStatus.COLLECTED, zone)
     
-    async def get_orders_for_courier(self) -> List[Order]:
-        """Получение заказов для курьера"""
-        result = await self.session.execute(
+    async def get_orders_for_courier(self, zone: Optional[str] = None) -> List[Order]:
+        """Получение заказов для курьера (очередь зоны, если она указана)"""
+        return await self._get_queue(OrderStatus.READY_FOR_DELIVERY, zone)
+    
+    async def _get_queue(self, status: OrderStatus, zone: Optional[str]) -> List[Order]:
+        """Очередь заказов этапа, старые первыми"""
+        query = (
             select(Order)
             .options(selectinload(Order.items))
-            .where(Order.status == OrderStatus.READY_FOR_DELIVERY.value)
+            .options(selectinload(Order.client))
+            .options(selectinload(Order.pharmacy))
+            .where(Order.status == status.value)
             .order_by(Order.created_at.asc())
         )
+        if zone is not None:
+            # Заказы без зоны (старые, аптека без координат или вне контуров) видны во всех зонах
+            query = query.where(or_(Order.zone == zone, Order.zone.is_(None)))
+        
+        result = await self.session.execute(query)
         return result.scalars().all()
     
+    @read_only
     async def get_order_statistics(self) -> Dict[str, Any]:
         """Получение статистики заказов"""
         # Общая статистика
@@ -328,6 +405,5 @@ class OrderService:
 
 # Функция для получения сервиса
 async def get_order_service() -> OrderService:
-    """Получение экземпляра OrderService"""
-    async for session in get_db():
-        return OrderService(session)
+    """Получение экземпляра OrderService на сессии текущего обновления Telegram"""
+    return OrderService(update_session())
@@ -0,0 +1,267 @@
+"""
+🗂️ Секционирование журналов MAXXPHARM CRM: activity_logs и locations по времени
+
+В PostgreSQL таблицы секционируются по created_at (RANGE), вставки
+распределяются по секциям самой базой, а срок хранения соблюдается
+удалением или отсоединением целых секций. В SQLite таблицы остаются
+обычными, а срок хранения соблюдается удалением порциями.
+"""
+
+import asyncio
+import logging
+import re
+from datetime import datetime, timedelta
+from typing import Optional, List, Dict, Any
+
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateTable
+
+from ..models.database import ActivityLog, Location
+from ..database import engine
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+PARTITIONED_TABLES = {
+    "locations": Location.__table__,
+    "activity_logs": ActivityLog.__table__,
+}
+
+BOUND_UPPER = re.compile(r"TO \('([^']+)'\)")
+
+
+def period_start(moment: datetime, interval: str) -> datetime:
+    """Начало дня или месяца (UTC), в который попадает момент"""
+    moment = moment.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+    return moment.replace(day=1) if interval == "month" else moment
+
+
+def next_period(start: datetime, interval: str) -> datetime:
+    if interval == "month":
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def partition_name(table: str, start: datetime, interval: str) -> str:
+    return f"{table}_p{start:%Y%m}" if interval == "month" else f"{table}_p{start:%Y%m%d}"
+
+
+def _literal(moment: datetime) -> str:
+    return f"'{moment:%Y-%m-%d %H:%M:%S}+00'"
+
+
+def _parse_bound(value) -> datetime:
+    """Граница секции из pg_get_expr ('2026-10-01 05:00:00+05') или datetime -> UTC без tzinfo"""
+    moment = value if isinstance(value, datetime) else datetime.fromisoformat(
+        re.sub(r"([+-]\d{2})$", r"\1:00", value.strip())
+    )
+    if moment.tzinfo is not None:
+        moment = (moment - moment.utcoffset()).replace(tzinfo=None)
+    return moment
+
+
+class PartitionManager:
+    """Секции по дням или месяцам: создание заранее, перенос старой таблицы, срок хранения"""
+    
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self.last_run: Optional[Dict[str, Any]] = None
+    
+    def interval(self, table: str) -> str:
+        if table == "locations":
+            return settings.partition_interval_locations
+        return settings.partition_interval_activity_logs
+    
+    def retention_days(self, table: str) -> int:
+        if table == "locations":
+            return settings.location_retention_days
+        return settings.activity_log_retention_days
+    
+    @staticmethod
+    def supported(conn) -> bool:
+        return conn.dialect.name == "postgresql"
+    
+    def parent_ddl(self, table: str) -> str:
+        """DDL секционированной таблицы из модели: ключ секции входит в первичный ключ"""
+        ddl = str(CreateTable(PARTITIONED_TABLES[table]).compile(dialect=postgresql.dialect())).rstrip()
+        ddl = ddl.replace("PRIMARY KEY (id)", "PRIMARY KEY (id, created_at)")
+        return f"{ddl} PARTITION BY RANGE (created_at)"
+    
+    async def ensure(self, conn, now: Optional[datetime] = None) -> None:
+        """Секционированные таблицы и ближайшие секции (базовая миграция схемы)"""
+        if not self.supported(conn):
+            return
+        
+        for table in PARTITIONED_TABLES:
+            kind = (await conn.execute(
+                text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:name)"), {"name": table}
+            )).scalar()
+            if kind == "r":
+                await self._migrate(conn, table)
+            elif kind is None:
+                await conn.execute(text(self.parent_ddl(table)))
+            await self.create_partitions(conn, table, now)
+    
+    async def _migrate(self, conn, table: str) -> None:
+        """Обычная таблица -> секционированная; старые строки остаются секцией {table}_legacy"""
+        has_rows = (await conn.execute(text(f"SELECT EXISTS (SELECT 1 FROM {table})"))).scalar()
+        if not has_rows:
+            await conn.execute(text(f"DROP TABLE {table}"))
+            await conn.execute(text(self.parent_ddl(table)))
+            logger.info(f"🗂️ {table}: empty table recreated as partitioned")
+            return
+        
+        legacy = f"{table}_legacy"
+        interval = self.interval(table)
+        # Ключ секции не может быть NULL: такие строки датируются моментом переноса и остаются
+        # в legacy до срока хранения, считая от него, а не уходят с первой же очисткой
+        undated = (await conn.execute(
+            text(f"UPDATE {table} SET created_at = now() WHERE created_at IS NULL")
+        )).rowcount
+        if undated:
+            logger.warning(f"⚠️ {table}: {undated} rows without created_at dated to the migration time")
+        newest = (await conn.execute(text(f"SELECT max(created_at) FROM {table}"))).scalar()
+        upper = next_period(period_start(_parse_bound(newest), interval), interval)
+        
+        await conn.execute(text(f"ALTER TABLE {table} RENAME TO {legacy}"))
+        # Имена индексов уникальны в схеме: индексы старой таблицы переименовываются
+        indexes = (await conn.execute(
+            text("SELECT indexname FROM pg_indexes WHERE tablename = :name"), {"name": legacy}
+        )).scalars().all()
+        for index in indexes:
+            await conn.execute(text(f'ALTER INDEX "{index}" RENAME TO "{(index + "_legacy")[:63]}"'))
+        
+        await conn.execute(text(self.parent_ddl(table)))
+        await conn.execute(text(f"ALTER TABLE {legacy} ALTER COLUMN created_at SET NOT NULL"))
+        await conn.execute(text(
+            f"ALTER TABLE {table} ATTACH PARTITION {legacy} FOR VALUES FROM (MINVALUE) TO ({_literal(upper)})"
+        ))
+        await conn.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT max(id) FROM {legacy}))"
+        ))
+        logger.info(f"🗂️ {table}: migrated to partitions, existing rows kept in {legacy} (until {upper:%Y-%m-%d})")
+    
+    async def _partitions(self, conn, table: str) -> Dict[str, Optional[str]]:
+        """Секции таблицы: имя -> выражение границ"""
+        result = await conn.execute(text(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = to_regclass(:name)"
+        ), {"name": table})
+        return dict(result.all())
+    
+    def _upper_bound(self, table: str, name: str, bound: Optional[str]) -> Optional[datetime]:
+        """Верхняя граница секции: из имени {table}_pYYYYMM[DD] или из выражения границ"""
+        suffix = name[len(table) + 2:] if name.startswith(f"{table}_p") else ""
+        if suffix.isdigit():
+            start = datetime.strptime(suffix, "%Y%m" if len(suffix) == 6 else "%Y%m%d")
+            return next_period(start, "month" if len(suffix) == 6 else "day")
+        match = BOUND_UPPER.search(bound or "")
+        return _parse_bound(match.group(1)) if match else None
+    
+    async def create_partitions(self, conn, table: str, now: Optional[datetime] = None) -> List[str]:
+        """Секции на текущий и следующие периоды плюс секция DEFAULT для всего остального"""
+        interval = self.interval(table)
+        existing = await self._partitions(conn, table)
+        legacy = f"{table}_legacy"
+        # Периоды, еще покрытые секцией со старыми строками, не создаются
+        covered = self._upper_bound(table, legacy, existing[legacy]) if legacy in existing else None
+        
+        created = []
+        start = period_start(now or datetime.utcnow(), interval)
+        for _ in range(settings.partition_premake + 1):
+            end = next_period(start, interval)
+            name = partition_name(table, start, interval)
+            if name not in existing and (covered is None or start >= covered):
+                try:
+                    async with conn.begin_nested():
+                        await conn.execute(text(
+                            f"CREATE TABLE {name} PARTITION OF {table} "
+                            f"FOR VALUES FROM ({_literal(start)}) TO ({_literal(end)})"
+                        ))
+                    created.append(name)
+                except Exception as e:
+                    # Например, в DEFAULT уже есть строки этого периода
+                    logger.error(f"❌ Partition {name} not created: {e}")
+            start = end
+        
+        await conn.execute(text(f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT"))
+        if created:
+            logger.info(f"🗂️ {table}: created partitions {', '.join(created)}")
+        return created
+    
+    async def apply_retention(
+        self,
+        conn,
+        table: str,
+        days: Optional[int] = None,
+        now: Optional[datetime] = None
+    ) -> Dict[str, int]:
+        """Срок хранения: целые секции старше срока удаляются или отсоединяются (архив)
+        
+        Возвращает {'partitions': ..., 'rows': ...} - число убранных секций
+        (в SQLite всегда 0) и строк в них.
+        """
+        cutoff = (now or datetime.utcnow()) - timedelta(days=days or self.retention_days(table))
+        if not self.supported(conn):
+            return {"partitions": 0, "rows": await self._delete_older(conn, table, cutoff)}
+        
+        removed = {"partitions": 0, "rows": 0}
+        for name, bound in (await self._partitions(conn, table)).items():
+            upper = self._upper_bound(table, name, bound)
+            if upper is None or upper > cutoff:
+                continue
+            removed["rows"] += (await conn.execute(text(f"SELECT count(*) FROM {name}"))).scalar()
+            if settings.partition_retention_action == "detach":
+                await conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+                logger.info(f"🗄️ {table}: partition {name} detached to archive")
+            else:
+                await conn.execute(text(f"DROP TABLE {name}"))
+                logger.info(f"🗑️ {table}: partition {name} dropped")
+            removed["partitions"] += 1
+        return removed
+    
+    async def _delete_older(self, conn, table: str, cutoff: datetime) -> int:
+        """Без секций (SQLite): удаление порциями, без одной долгой блокировки таблицы"""
+        deleted = 0
+        while True:
+            result = await conn.execute(text(
+                f"DELETE FROM {table} WHERE id IN "
+                f"(SELECT id FROM {table} WHERE created_at < :cutoff LIMIT :chunk)"
+            ), {"cutoff": cutoff, "chunk": settings.retention_delete_chunk})
+            deleted += result.rowcount or 0
+            if not result.rowcount or result.rowcount < settings.retention_delete_chunk:
+                return deleted
+    
+    async def maintain(self, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """Создание секций наперед и соблюдение срока хранения для всех таблиц"""
+        report = {"at": (now or datetime.utcnow()).isoformat(), "tables": {}}
+        for table in PARTITIONED_TABLES:
+            async with engine.begin() as conn:
+                created = await self.create_partitions(conn, table, now) if self.supported(conn) else []
+                removed = await self.apply_retention(conn, table, now=now)
+            report["tables"][table] = {"created": created, "removed": removed}
+        self.last_run = report
+        return report
+    
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.maintain()
+            except Exception as e:
+                logger.error(f"❌ Partition maintenance error: {e}")
+            await asyncio.sleep(settings.partition_maintenance_hours * 3600)
+    
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+# Глобальный менеджер секций
+partition_manager = PartitionManager()
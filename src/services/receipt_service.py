@@ -0,0 +1,453 @@
+"""
+🧾 Сервис чеков оплаты MAXXPHARM CRM
+"""
+
+import asyncio
+import hashlib
+import hmac
+import io
+import logging
+import mimetypes
+import os
+import re
+import tempfile
+import time
+from datetime import datetime
+from typing import Optional, List, Dict, Any, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
+
+from ..models.database import PaymentReceipt, Payment, PaymentType, Order, OrderStatus
+from .media_service import ContentStore, ImageProcessor, image_processor
+from .audit_service import audit_log
+from ..database import update_session
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+# Форматы чеков: фото с телефона и скриншоты банковских приложений
+RECEIPT_FORMATS = {
+    "JPEG": (".jpg", "image/jpeg"),
+    "PNG": (".png", "image/png"),
+    "WEBP": (".webp", "image/webp"),
+}
+THUMBNAIL_SUFFIX = ".thumb.jpg"
+
+# Имя файла в ссылке: sha256 и расширение, без каталогов
+RECEIPT_NAME = re.compile(r"^[0-9a-f]{64}(?:\.thumb)?\.(?:jpg|png|webp)$")
+
+# Заказы, к которым клиент может прислать чек
+PAYABLE_STATUSES = [
+    OrderStatus.CONFIRMED.value,
+    OrderStatus.COLLECTING.value,
+    OrderStatus.COLLECTED.value,
+    OrderStatus.CHECKING.value,
+    OrderStatus.READY_FOR_DELIVERY.value,
+    OrderStatus.IN_DELIVERY.value,
+    OrderStatus.DELIVERED.value,
+    OrderStatus.PARTIALLY_PAID.value,
+    OrderStatus.DEBT.value,
+]
+
+
+def process_receipt(source_path: str, store_root: str, thumbnail_side: int, quality: int) -> Dict[str, Any]:
+    """Проверка изображения, копия оригинала по sha256 и миниатюра JPEG (выполняется в процессе пула)"""
+    from PIL import Image, ImageOps
+    
+    with Image.open(source_path) as image:
+        if image.format not in RECEIPT_FORMATS:
+            raise ValueError(f"Неподдерживаемый формат: {image.format}")
+        extension, mime_type = RECEIPT_FORMATS[image.format]
+        width, height = image.size
+        
+        image.draft("RGB", (thumbnail_side, thumbnail_side))
+        image = ImageOps.exif_transpose(image)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        image.thumbnail((thumbnail_side, thumbnail_side), Image.Resampling.LANCZOS)
+        
+        buffer = io.BytesIO()
+        image.save(buffer, "JPEG", quality=quality, optimize=True)
+    
+    # Оригинал не пережимается: оператор сверяет реквизиты и сумму по исходному файлу
+    store = ContentStore(store_root)
+    stored = store.put_file(source_path, extension)
+    thumbnail_path = store.relative_path(stored["sha256"], THUMBNAIL_SUFFIX)
+    store.write(thumbnail_path, buffer.getvalue())
+    
+    stored.update({
+        "thumbnail_path": thumbnail_path,
+        "mime_type": mime_type,
+        "width": width,
+        "height": height,
+    })
+    return stored
+
+
+def receipt_relative_path(name: str) -> Optional[str]:
+    """Путь в хранилище по имени файла из ссылки (None для недопустимого имени)"""
+    if not RECEIPT_NAME.match(name):
+        return None
+    return ContentStore.relative_path(name[:64], name[64:])
+
+
+def sign_receipt_link(name: str, expires: int) -> str:
+    message = f"{name}:{expires}".encode()
+    return hmac.new(settings.secret_key.encode(), message, hashlib.sha256).hexdigest()[:32]
+
+
+def verify_receipt_link(name: str, expires: int, signature: str) -> bool:
+    """Подпись ссылки на чек и срок ее действия"""
+    if expires < time.time():
+        return False
+    return hmac.compare_digest(sign_receipt_link(name, expires), signature)
+
+
+def receipt_link(relative_path: str) -> Optional[str]:
+    """Подписанная ссылка на файл чека в API (None, если PUBLIC_BASE_URL не задан)"""
+    if not settings.public_base_url:
+        return None
+    
+    # Срок округляется до окна: в пределах окна ссылка одна и та же и кэшируется браузером
+    window = settings.receipt_link_ttl_minutes * 60
+    expires = (int(time.time()) // window + 2) * window
+    name = os.path.basename(relative_path)
+    return (
+        f"{settings.public_base_url.rstrip('/')}/receipts/{name}"
+        f"?expires={expires}&signature={sign_receipt_link(name, expires)}"
+    )
+
+
+class LocalReceiptStorage:
+    """Чеки на локальном диске (по умолчанию)"""
+    
+    name = "local"
+    
+    def __init__(self, root: str):
+        self.store = ContentStore(root)
+        self.staging_root = root
+    
+    async def publish(self, stored: Dict[str, Any]) -> None:
+        # Файлы уже записаны в хранилище при обработке
+        return None
+    
+    async def exists(self, relative_path: str) -> bool:
+        return self.store.exists(relative_path)
+    
+    def local_path(self, relative_path: str) -> Optional[str]:
+        return self.store.path(relative_path)
+    
+    def remote_url(self, relative_path: str) -> Optional[str]:
+        return None
+
+
+class S3ReceiptStorage:
+    """Чеки в S3-совместимом хранилище; локальный каталог нужен только до загрузки"""
+    
+    name = "s3"
+    
+    def __init__(self, bucket: str, endpoint_url: Optional[str], staging_root: str):
+        import boto3
+        
+        self.client = boto3.client("s3", endpoint_url=endpoint_url)
+        self.bucket = bucket
+        self.store = ContentStore(staging_root)
+        self.staging_root = staging_root
+    
+    async def publish(self, stored: Dict[str, Any]) -> None:
+        """Загрузка оригинала и миниатюры; содержимое по хэшу не меняется - кэш навсегда"""
+        for relative_path in (stored["path"], stored["thumbnail_path"]):
+            source = self.store.path(relative_path)
+            if not os.path.exists(source):
+                continue
+            await asyncio.to_thread(
+                self.client.upload_file,
+                source,
+                self.bucket,
+                relative_path,
+                ExtraArgs={
+                    "ContentType": mimetypes.guess_type(relative_path)[0] or "application/octet-stream",
+                    "CacheControl": "private, max-age=31536000, immutable",
+                }
+            )
+            os.unlink(source)
+    
+    async def exists(self, relative_path: str) -> bool:
+        from botocore.exceptions import ClientError
+        
+        try:
+            await asyncio.to_thread(self.client.head_object, Bucket=self.bucket, Key=relative_path)
+            return True
+        except ClientError:
+            return False
+    
+    def local_path(self, relative_path: str) -> Optional[str]:
+        return None
+    
+    def remote_url(self, relative_path: str) -> Optional[str]:
+        """Временная ссылка S3: диапазоны и ETag обрабатывает само хранилище"""
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": relative_path},
+            ExpiresIn=settings.receipt_link_ttl_minutes * 60
+        )
+
+
+# Хранилище чеков создается при первом обращении (boto3 нужен только для s3)
+_receipt_storage = None
+
+
+def get_receipt_storage():
+    """Хранилище чеков по настройке RECEIPT_STORAGE_BACKEND"""
+    global _receipt_storage
+    if _receipt_storage is None:
+        if settings.receipt_storage_backend == "s3":
+            _receipt_storage = S3ReceiptStorage(
+                settings.receipt_s3_bucket,
+                settings.receipt_s3_endpoint_url,
+                settings.receipt_storage_path
+            )
+        else:
+            _receipt_storage = LocalReceiptStorage(settings.receipt_storage_path)
+        logger.info(f"🧾 Receipt storage: {_receipt_storage.name}")
+    return _receipt_storage
+
+
+class ReceiptService:
+    """Сервис приема, хранения и проверки чеков оплаты"""
+    
+    def __init__(self, session: AsyncSession, processor: Optional[ImageProcessor] = None, storage=None):
+        self.session = session
+        self.processor = processor if processor is not None else image_processor
+        self.storage = storage if storage is not None else get_receipt_storage()
+    
+    async def store_receipt(self, bot, file) -> Dict[str, Any]:
+        """Оригинал и миниатюра чека в хранилище (file - PhotoSize или Document); повторный файл не скачивается"""
+        existing = await self._find_by_file(file.file_unique_id)
+        if existing is not None:
+            return {
+                "sha256": existing.content_hash,
+                "path": existing.storage_path,
+                "thumbnail_path": existing.thumbnail_path,
+                "size": existing.size_bytes,
+                "mime_type": existing.mime_type,
+                "width": existing.width,
+                "height": existing.height,
+                "file_unique_id": file.file_unique_id,
+            }
+        
+        key = f"receipt:{file.file_unique_id}"
+        pending = self.processor.in_progress.get(key)
+        if pending is not None:
+            return dict(await asyncio.shield(pending))
+        
+        future = asyncio.get_running_loop().create_future()
+        self.processor.in_progress[key] = future
+        try:
+            stored = await self._download_and_process(bot, file)
+            await self.storage.publish(stored)
+            stored["file_unique_id"] = file.file_unique_id
+            future.set_result(stored)
+            return dict(stored)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            self.processor.in_progress.pop(key, None)
+    
+    async def _find_by_file(self, file_unique_id: str) -> Optional[PaymentReceipt]:
+        """Ранее сохраненный чек с тем же файлом Telegram"""
+        result = await self.session.execute(
+            select(PaymentReceipt)
+            .where(PaymentReceipt.telegram_file_unique_id == file_unique_id)
+            .order_by(PaymentReceipt.id.desc())
+            .limit(1)
+        )
+        receipt = result.scalar_one_or_none()
+        if receipt is not None and not await self.storage.exists(receipt.storage_path):
+            return None
+        return receipt
+    
+    async def _download_and_process(self, bot, file) -> Dict[str, Any]:
+        """Потоковое скачивание во временный файл, хэш и миниатюра в пуле процессов"""
+        if file.file_size and file.file_size > settings.receipt_max_download_mb * 1024 * 1024:
+            raise ValueError(f"Файл больше {settings.receipt_max_download_mb} МБ")
+        
+        async with self.processor.slots:
+            fd, temp_path = tempfile.mkstemp(suffix=".img")
+            os.close(fd)
+            try:
+                await bot.download(file, destination=temp_path)
+                return await self.processor.run(
+                    process_receipt,
+                    temp_path,
+                    self.storage.staging_root,
+                    settings.receipt_thumbnail_side,
+                    settings.image_jpeg_quality
+                )
+            finally:
+                os.unlink(temp_path)
+    
+    async def register(
+        self,
+        order_id: int,
+        stored: Dict[str, Any],
+        client_id: Optional[int] = None
+    ) -> Tuple[PaymentReceipt, bool, List[PaymentReceipt]]:
+        """Чек к заказу: (запись, новая ли, тот же чек в других заказах)"""
+        receipt = await self._find_in_order(order_id, stored["sha256"])
+        if receipt is not None:
+            return receipt, False, await self.find_duplicates(receipt)
+        
+        duplicates = await self._find_by_hash(stored["sha256"], exclude_order_id=order_id)
+        receipt = PaymentReceipt(
+            order_id=order_id,
+            client_id=client_id,
+            content_hash=stored["sha256"],
+            storage_path=stored["path"],
+            thumbnail_path=stored.get("thumbnail_path"),
+            mime_type=stored.get("mime_type") or "image/jpeg",
+            size_bytes=stored["size"],
+            width=stored.get("width"),
+            height=stored.get("height"),
+            telegram_file_unique_id=stored.get("file_unique_id"),
+            duplicate_of_id=duplicates[0].id if duplicates else None
+        )
+        try:
+            async with self.session.begin_nested():
+                self.session.add(receipt)
+        except IntegrityError:
+            # Параллельное сообщение уже прикрепило этот чек
+            return await self._find_in_order(order_id, stored["sha256"]), False, duplicates
+        
+        await self.session.refresh(receipt)
+        if duplicates:
+            logger.warning(
+                f"⚠️ Receipt {stored['sha256'][:12]} for order {order_id} "
+                f"was already sent for order {duplicates[0].order_id}"
+            )
+        return receipt, True, duplicates
+    
+    async def _find_in_order(self, order_id: int, content_hash: str) -> Optional[PaymentReceipt]:
+        result = await self.session.execute(
+            select(PaymentReceipt).where(
+                PaymentReceipt.order_id == order_id,
+                PaymentReceipt.content_hash == content_hash
+            )
+        )
+        return result.scalar_one_or_none()
+    
+    async def _find_by_hash(self, content_hash: str, exclude_order_id: int) -> List[PaymentReceipt]:
+        result = await self.session.execute(
+            select(PaymentReceipt)
+            .options(selectinload(PaymentReceipt.order))
+            .where(
+                PaymentReceipt.content_hash == content_hash,
+                PaymentReceipt.order_id != exclude_order_id
+            )
+            .order_by(PaymentReceipt.id.asc())
+        )
+        return result.scalars().all()
+    
+    async def find_duplicates(self, receipt: PaymentReceipt) -> List[PaymentReceipt]:
+        """Тот же файл чека, присланный к другим заказам"""
+        return await self._find_by_hash(receipt.content_hash, exclude_order_id=receipt.order_id)
+    
+    async def get_payable_orders(self, client_id: int, limit: int = 10) -> List[Order]:
+        """Заказы клиента, к которым можно прислать чек"""
+        result = await self.session.execute(
+            select(Order)
+            .where(Order.client_id == client_id, Order.status.in_(PAYABLE_STATUSES))
+            .order_by(Order.created_at.desc())
+            .limit(limit)
+        )
+        return result.scalars().all()
+    
+    async def get_pending_receipts(self, limit: int = 10) -> List[PaymentReceipt]:
+        """Чеки, ожидающие проверки оператором"""
+        result = await self.session.execute(
+            select(PaymentReceipt)
+            .options(
+                selectinload(PaymentReceipt.order),
+                selectinload(PaymentReceipt.client),
+                selectinload(PaymentReceipt.duplicate_of).selectinload(PaymentReceipt.order)
+            )
+            .where(PaymentReceipt.status == "pending")
+            .order_by(PaymentReceipt.created_at.asc())
+            .limit(limit)
+        )
+        return result.scalars().all()
+    
+    async def get_receipt(self, receipt_id: int) -> Optional[PaymentReceipt]:
+        result = await self.session.execute(
+            select(PaymentReceipt)
+            .options(selectinload(PaymentReceipt.order))
+            .where(PaymentReceipt.id == receipt_id)
+        )
+        return result.scalar_one_or_none()
+    
+    async def review(self, receipt_id: int, reviewer_id: int, accepted: bool) -> Tuple[Optional[PaymentReceipt], Optional[Payment]]:
+        """Решение оператора по чеку: (чек, платеж)
+        
+        Строка чека блокируется, решение принимается только по чеку в статусе
+        pending (иначе ValueError). Подтвержденный чек оплачивает остаток заказа.
+        """
+        from .reconciliation_service import ReconciliationService
+        
+        result = await self.session.execute(
+            select(PaymentReceipt)
+            .options(selectinload(PaymentReceipt.order))
+            .where(PaymentReceipt.id == receipt_id)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        )
+        receipt = result.scalar_one_or_none()
+        if not receipt:
+            return None, None
+        if receipt.status != "pending":
+            raise ValueError("Чек уже проверен")
+        
+        receipt.status = "accepted" if accepted else "rejected"
+        receipt.reviewed_by = reviewer_id
+        receipt.reviewed_at = datetime.utcnow()
+        await audit_log.record(
+            user_id=reviewer_id,
+            action="receipt_accepted" if accepted else "receipt_rejected",
+            entity_type="payment_receipt",
+            entity_id=receipt.id,
+            details={"order_id": receipt.order_id, "content_hash": receipt.content_hash},
+            session=self.session,
+            strict=True
+        )
+        
+        payment = None
+        if accepted and receipt.payment_id is None:
+            # Чек подтверждает оплату остатка заказа; остаток считается под блокировкой заказа
+            payment = await ReconciliationService(self.session).apply_payment(
+                receipt.order_id,
+                None,
+                PaymentType.ONLINE,
+                recorded_by=reviewer_id,
+                check_image_url=receipt_link(receipt.storage_path),
+                receipt=receipt
+            )
+        
+        await self.session.flush()
+        return receipt, payment
+    
+    def media_source(self, relative_path: str) -> Optional[str]:
+        """Локальный путь или временная ссылка на файл (для отправки в Telegram)"""
+        return self.storage.local_path(relative_path) or self.storage.remote_url(relative_path)
+
+
+# Функция для получения сервиса
+async def get_receipt_service() -> ReceiptService:
+    """Получение экземпляра ReceiptService на сессии текущего обновления Telegram"""
+    return ReceiptService(update_session())
@@ -0,0 +1,651 @@
+"""
+💰 Сервис сверки оплат MAXXPHARM CRM
+"""
+
+import asyncio
+import logging
+from datetime import datetime, date, time, timedelta
+from decimal import Decimal
+from typing import Optional, List, Dict, Any, Iterable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, func
+from sqlalchemy.exc import IntegrityError
+
+from ..models.database import (
+    Order, OrderStatus, Payment, PaymentType, PaymentReceipt,
+    Debt, ClientBalance, BalanceEntry, ArchivedOrder
+)
+from ..database import update_session, AsyncSessionLocal
+from ..config import settings
+from .collection_service import CollectionService
+from .client_summary_service import ClientSummaryService
+from .audit_service import audit_log
+from .archive_service import ArchiveService
+
+logger = logging.getLogger(__name__)
+
+ZERO = Decimal("0.00")
+CENT = Decimal("0.01")
+
+# Статусы после доставки: по факту оплаты заказ становится оплаченным или частично оплаченным
+SETTLEMENT_STATUSES = {
+    OrderStatus.DELIVERED.value,
+    OrderStatus.PARTIALLY_PAID.value,
+    OrderStatus.DEBT.value,
+    OrderStatus.PAID.value,
+}
+
+# В отчете сверки хранится не больше этого числа расхождений (счетчик - полный)
+MAX_REPORTED_MISMATCHES = 100
+
+
+def to_money(value) -> Decimal:
+    return Decimal(str(value or 0)).quantize(CENT)
+
+
+class ReconciliationService:
+    """Проведение оплат по заказам, долгам и балансам клиентов и ночная сверка"""
+    
+    def __init__(self, session: AsyncSession):
+        self.session = session
+    
+    async def _lock_order(self, order_id: int) -> Optional[Order]:
+        # populate_existing перечитывает строку: несохраненные изменения сначала записываются
+        await self.session.flush()
+        result = await self.session.execute(
+            select(Order)
+            .where(Order.id == order_id)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        )
+        return result.scalar_one_or_none()
+    
+    async def _lock_balance(self, client_id: int) -> ClientBalance:
+        """Строка баланса клиента под блокировкой (создается при первой операции)"""
+        query = (
+            select(ClientBalance)
+            .where(ClientBalance.client_id == client_id)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        )
+        await self.session.flush()
+        balance = (await self.session.execute(query)).scalar_one_or_none()
+        if balance is not None:
+            return balance
+        
+        try:
+            async with self.session.begin_nested():
+                balance = ClientBalance(
+                    client_id=client_id,
+                    charged_total=ZERO,
+                    paid_total=ZERO,
+                    outstanding=ZERO,
+                    active_debt=ZERO
+                )
+                self.session.add(balance)
+            return balance
+        except IntegrityError:
+            # Параллельная операция уже создала строку баланса
+            return (await self.session.execute(query)).scalar_one()
+    
+    async def _append_entry(
+        self,
+        balance: ClientBalance,
+        kind: str,
+        amount: Decimal,
+        order_id: Optional[int] = None,
+        payment_id: Optional[int] = None
+    ) -> BalanceEntry:
+        """Запись в журнал с нарастающим итогом (баланс уже заблокирован)"""
+        balance.outstanding = to_money(balance.outstanding) + amount
+        entry = BalanceEntry(
+            client_id=balance.client_id,
+            order_id=order_id,
+            payment_id=payment_id,
+            kind=kind,
+            amount=amount,
+            balance_after=balance.outstanding
+        )
+        self.session.add(entry)
+        await self.session.flush()
+        balance.last_entry_id = entry.id
+        return entry
+    
+    async def charge_order(self, order: Order) -> bool:
+        """Сумма заказа на баланс клиента и долг на неоплаченный остаток (один раз на заказ, без commit)"""
+        # Отклоненный заказ не начисляется: оплата по нему остается переплатой клиента
+        if order.charged_at is not None or order.status == OrderStatus.REJECTED.value:
+            return False
+        
+        balance = await self._lock_balance(order.client_id)
+        total = to_money(order.total_amount)
+        remaining = max(total - to_money(order.paid_amount), ZERO)
+        
+        order.charged_at = datetime.utcnow()
+        order.debt_amount = remaining
+        balance.charged_total = to_money(balance.charged_total) + total
+        await self._append_entry(balance, "charge", total, order_id=order.id)
+        
+        if remaining > ZERO:
+            self.session.add(Debt(
+                order_id=order.id,
+                client_id=order.client_id,
+                total_amount=remaining,
+                paid_amount=ZERO,
+                remaining_amount=remaining
+            ))
+            balance.active_debt = to_money(balance.active_debt) + remaining
+            await CollectionService(self.session).refresh_client(order.client_id)
+        
+        await self.session.flush()
+        return True
+    
+    async def reverse_charge(self, order: Order, recorded_by: Optional[int] = None) -> bool:
+        """Отмена начисления (отклонение после предоплаты): сумма заказа снимается с баланса,
+        долги заказа закрываются, внесенные оплаты остаются переплатой клиента (без commit)"""
+        order = await self._lock_order(order.id)
+        if order is None or order.charged_at is None:
+            return False
+        
+        balance = await self._lock_balance(order.client_id)
+        total = to_money(order.total_amount)
+        result = await self.session.execute(
+            select(Debt)
+            .where(Debt.order_id == order.id, Debt.is_active == True)
+            .with_for_update()
+        )
+        for debt in result.scalars().all():
+            balance.active_debt = to_money(balance.active_debt) - to_money(debt.remaining_amount)
+            debt.remaining_amount = ZERO
+            debt.is_active = False
+        
+        order.charged_at = None
+        order.debt_amount = ZERO
+        balance.charged_total = to_money(balance.charged_total) - total
+        entry = await self._append_entry(balance, "reversal", -total, order_id=order.id)
+        await CollectionService(self.session).refresh_client(order.client_id)
+        
+        await audit_log.record(
+            user_id=recorded_by or order.client_id,
+            action="charge_reversed",
+            entity_type="order",
+            entity_id=order.id,
+            details={"amount": str(total), "balance_entry_id": entry.id},
+            session=self.session,
+            strict=True
+        )
+        return True
+    
+    async def apply_payment(
+        self,
+        order_id: int,
+        amount,
+        payment_type: PaymentType = PaymentType.ONLINE,
+        recorded_by: Optional[int] = None,
+        transaction_id: Optional[str] = None,
+        check_image_url: Optional[str] = None,
+        receipt: Optional[PaymentReceipt] = None
+    ) -> Optional[Payment]:
+        """Оплата заказа: платеж, заказ, долги и баланс клиента в одной транзакции
+        
+        amount=None - оплата остатка заказа, посчитанного под блокировкой строки
+        (None, если заказ уже оплачен полностью).
+        """
+        if amount is not None:
+            amount = to_money(amount)
+            if amount <= ZERO:
+                raise ValueError("Сумма оплаты должна быть больше нуля")
+        
+        order = await self._lock_order(order_id)
+        if not order:
+            raise ValueError("Заказ не найден")
+        
+        if amount is None:
+            amount = to_money(order.total_amount) - to_money(order.paid_amount)
+            if amount <= ZERO:
+                return None
+        
+        # Ошибка откатывает только эту оплату, фиксирует обновление SessionMiddleware
+        async with self.session.begin_nested():
+            payment = await self._post_payment(
+                order, amount, payment_type, recorded_by, transaction_id, check_image_url
+            )
+            if receipt is not None:
+                receipt.payment_id = payment.id
+            
+            await CollectionService(self.session).refresh_client(order.client_id)
+        
+        return payment
+    
+    async def apply_client_payment(
+        self,
+        client_id: int,
+        amount,
+        payment_type: PaymentType = PaymentType.CASH,
+        recorded_by: Optional[int] = None
+    ) -> List[Payment]:
+        """Оплата долгов клиента (например, собранная представителем): от старых долгов к новым"""
+        amount = to_money(amount)
+        if amount <= ZERO:
+            raise ValueError("Сумма оплаты должна быть больше нуля")
+        
+        result = await self.session.execute(
+            select(Debt.order_id, func.sum(Debt.remaining_amount), func.min(Debt.created_at))
+            .where(Debt.client_id == client_id, Debt.is_active == True)
+            .group_by(Debt.order_id)
+            .order_by(func.min(Debt.created_at).asc(), Debt.order_id.asc())
+        )
+        debts = result.all()
+        if not debts:
+            raise ValueError("У клиента нет активных долгов")
+        
+        # Оплаты по всем долгам проводятся вместе или не проводятся совсем
+        async with self.session.begin_nested():
+            payments = []
+            left = amount
+            for index, (order_id, remaining, _) in enumerate(debts):
+                # Переплата остается на последнем заказе и уходит в баланс клиента
+                take = left if index == len(debts) - 1 else min(to_money(remaining), left)
+                order = await self._lock_order(order_id)
+                payments.append(await self._post_payment(order, take, payment_type, recorded_by))
+                left -= take
+                if left <= ZERO:
+                    break
+            
+            await CollectionService(self.session).refresh_client(client_id)
+        
+        return payments
+    
+    async def _post_payment(
+        self,
+        order: Order,
+        amount: Decimal,
+        payment_type: PaymentType,
+        recorded_by: Optional[int] = None,
+        transaction_id: Optional[str] = None,
+        check_image_url: Optional[str] = None
+    ) -> Payment:
+        """Платеж по заблокированному заказу: заказ, долги, баланс и журнал (без commit)"""
+        # Предоплата до доставки тоже сначала относит сумму заказа на баланс
+        await self.charge_order(order)
+        balance = await self._lock_balance(order.client_id)
+        now = datetime.utcnow()
+        
+        payment = Payment(
+            order_id=order.id,
+            client_id=order.client_id,
+            recorded_by=recorded_by,
+            payment_type=payment_type.value,
+            amount=amount,
+            transaction_id=transaction_id,
+            check_image_url=check_image_url,
+            confirmed_at=now
+        )
+        self.session.add(payment)
+        await self.session.flush()
+        
+        order.paid_amount = to_money(order.paid_amount) + amount
+        order.debt_amount = max(to_money(order.total_amount) - order.paid_amount, ZERO)
+        if order.status in SETTLEMENT_STATUSES:
+            order.status = (
+                OrderStatus.PAID.value if order.debt_amount == ZERO
+                else OrderStatus.PARTIALLY_PAID.value
+            )
+        
+        await self._apply_to_debts(order.id, amount, balance, recorded_by, now)
+        
+        balance.paid_total = to_money(balance.paid_total) + amount
+        balance.last_payment_at = now
+        await self._append_entry(balance, "payment", -amount, order_id=order.id, payment_id=payment.id)
+        await ClientSummaryService(self.session).on_payment(order, payment)
+        
+        # Денежное событие пишется в журнал в той же транзакции
+        await audit_log.record(
+            user_id=recorded_by or order.client_id,
+            action="payment_recorded",
+            entity_type="payment",
+            entity_id=payment.id,
+            details={
+                "order_id": order.id,
+                "amount": str(amount),
+                "payment_type": payment_type.value,
+                "transaction_id": transaction_id
+            },
+            session=self.session,
+            strict=True
+        )
+        return payment
+    
+    async def _apply_to_debts(
+        self,
+        order_id: int,
+        amount: Decimal,
+        balance: ClientBalance,
+        recorded_by: Optional[int],
+        now: datetime
+    ) -> None:
+        """Погашение активных долгов заказа, от старых к новым"""
+        result = await self.session.execute(
+            select(Debt)
+            .where(Debt.order_id == order_id, Debt.is_active == True)
+            .order_by(Debt.created_at.asc(), Debt.id.asc())
+            .with_for_update()
+        )
+        left = amount
+        for debt in result.scalars().all():
+            if left <= ZERO:
+                break
+            
+            take = min(to_money(debt.remaining_amount), left)
+            debt.paid_amount = to_money(debt.paid_amount) + take
+            debt.remaining_amount = to_money(debt.remaining_amount) - take
+            balance.active_debt = to_money(balance.active_debt) - take
+            left -= take
+            
+            if debt.remaining_amount == ZERO:
+                debt.is_active = False
+                debt.collected_at = now
+                if recorded_by is not None:
+                    debt.collected_by = recorded_by
+    
+    async def get_balance(self, client_id: int) -> Optional[ClientBalance]:
+        """Баланс клиента - чтение одной строки по ключу"""
+        return await self.session.get(ClientBalance, client_id)
+    
+    async def get_outstanding(self, client_id: int) -> Decimal:
+        """Задолженность клиента (отрицательная - переплата)"""
+        balance = await self.get_balance(client_id)
+        return to_money(balance.outstanding) if balance else ZERO
+    
+    async def get_statement(self, client_id: int, limit: int = 20) -> List[BalanceEntry]:
+        """Последние операции по балансу клиента"""
+        result = await self.session.execute(
+            select(BalanceEntry)
+            .where(BalanceEntry.client_id == client_id)
+            .order_by(BalanceEntry.id.desc())
+            .limit(limit)
+        )
+        return result.scalars().all()
+    
+    async def get_total_outstanding(self) -> Decimal:
+        """Общая задолженность клиентов по таблице балансов"""
+        result = await self.session.execute(select(func.sum(ClientBalance.outstanding)))
+        return to_money(result.scalar())
+    
+    async def reconcile_day(
+        self,
+        day: date,
+        chunk_size: Optional[int] = None,
+        fix: Optional[bool] = None
+    ) -> Dict[str, Any]:
+        """Сверка за день: платежи читаются порциями по ключу, проверяются затронутые заказы и клиенты"""
+        chunk_size = chunk_size or settings.reconcile_chunk_size
+        fix = settings.reconcile_auto_fix if fix is None else fix
+        start = datetime.combine(day, time.min)
+        end = start + timedelta(days=1)
+        
+        report = {
+            "date": day.isoformat(),
+            "payments": 0,
+            "amount": ZERO,
+            "orders_checked": 0,
+            "clients_checked": 0,
+            "mismatch_count": 0,
+            "mismatches": [],
+            "fixed": 0,
+        }
+        seen_orders = set()
+        seen_clients = set()
+        last_id = 0
+        
+        while True:
+            result = await self.session.execute(
+                select(Payment.id, Payment.order_id, Payment.client_id, Payment.amount)
+                .where(Payment.created_at >= start, Payment.created_at < end, Payment.id > last_id)
+                .order_by(Payment.id.asc())
+                .limit(chunk_size)
+            )
+            rows = result.all()
+            if not rows:
+                break
+            
+            last_id = rows[-1].id
+            report["payments"] += len(rows)
+            report["amount"] += sum((to_money(row.amount) for row in rows), ZERO)
+            
+            order_ids = {row.order_id for row in rows} - seen_orders
+            client_ids = {row.client_id for row in rows if row.client_id is not None} - seen_clients
+            seen_orders.update(order_ids)
+            seen_clients.update(client_ids)
+            
+            await self._check_orders(order_ids, report, fix)
+            await self._check_clients(client_ids, report, fix)
+            if fix:
+                await self.session.flush()
+            # Загруженные строки не копятся в сессии (фиксирует вызывающий код)
+            self.session.expunge_all()
+        
+        report["orders_checked"] = len(seen_orders)
+        report["clients_checked"] = len(seen_clients)
+        report["amount"] = float(report["amount"])
+        return report
+    
+    async def reconcile_range(self, start_day: date, end_day: date, fix: Optional[bool] = None) -> Dict[str, Any]:
+        """Сверка за период по дням (память ограничена одним днем и одной порцией)"""
+        summary = {"days": 0, "payments": 0, "mismatch_count": 0, "fixed": 0, "days_with_mismatches": []}
+        day = start_day
+        while day <= end_day:
+            report = await self.reconcile_day(day, fix=fix)
+            summary["days"] += 1
+            summary["payments"] += report["payments"]
+            summary["mismatch_count"] += report["mismatch_count"]
+            summary["fixed"] += report["fixed"]
+            if report["mismatch_count"]:
+                summary["days_with_mismatches"].append(report["date"])
+            day += timedelta(days=1)
+        return summary
+    
+    def _report_mismatch(self, report: Dict[str, Any], kind: str, key: int, expected, actual) -> None:
+        report["mismatch_count"] += 1
+        if len(report["mismatches"]) < MAX_REPORTED_MISMATCHES:
+            report["mismatches"].append({
+                "kind": kind,
+                "id": key,
+                "expected": float(expected),
+                "actual": float(actual),
+            })
+    
+    async def _check_orders(self, order_ids: Iterable[int], report: Dict[str, Any], fix: bool) -> None:
+        """Оплачено по заказу = сумма платежей; долг заказа и остаток активных долгов = неоплаченная часть"""
+        order_ids = list(order_ids)
+        if not order_ids:
+            return
+        
+        paid = dict((await self.session.execute(
+            select(Payment.order_id, func.sum(Payment.amount))
+            .where(Payment.order_id.in_(order_ids))
+            .group_by(Payment.order_id)
+        )).all())
+        debts = dict((await self.session.execute(
+            select(Debt.order_id, func.sum(Debt.remaining_amount))
+            .where(Debt.order_id.in_(order_ids), Debt.is_active == True)
+            .group_by(Debt.order_id)
+        )).all())
+        orders = (await self.session.execute(
+            select(Order.id, Order.total_amount, Order.paid_amount, Order.debt_amount, Order.charged_at)
+            .where(Order.id.in_(order_ids))
+        )).all()
+        
+        for order in orders:
+            expected_paid = to_money(paid.get(order.id))
+            expected_debt = max(to_money(order.total_amount) - expected_paid, ZERO)
+            values = {}
+            
+            if to_money(order.paid_amount) != expected_paid:
+                self._report_mismatch(report, "order_paid", order.id, expected_paid, order.paid_amount)
+                values["paid_amount"] = expected_paid
+            
+            if order.charged_at is not None:
+                if to_money(order.debt_amount) != expected_debt:
+                    self._report_mismatch(report, "order_debt", order.id, expected_debt, order.debt_amount)
+                    values["debt_amount"] = expected_debt
+                if order.id in debts and to_money(debts[order.id]) != expected_debt:
+                    # Остатки долгов исправляются вручную: неясно, какой из долгов неверен
+                    self._report_mismatch(report, "debt_remaining", order.id, expected_debt, debts[order.id])
+            
+            if fix and values:
+                await self.session.execute(update(Order).where(Order.id == order.id).values(**values))
+                report["fixed"] += 1
+    
+    async def _check_clients(self, client_ids: Iterable[int], report: Dict[str, Any], fix: bool) -> None:
+        """Баланс клиента = начислено - оплачено = сумма журнала; долг = остаток активных долгов"""
+        client_ids = list(client_ids)
+        if not client_ids:
+            return
+        
+        paid = dict((await self.session.execute(
+            select(Payment.client_id, func.sum(Payment.amount))
+            .where(Payment.client_id.in_(client_ids))
+            .group_by(Payment.client_id)
+        )).all())
+        charged = dict((await self.session.execute(
+            select(Order.client_id, func.sum(Order.total_amount))
+            .where(Order.client_id.in_(client_ids), Order.charged_at.isnot(None))
+            .group_by(Order.client_id)
+        )).all())
+        # Заказы, перенесенные в архив, входят в итоги клиента
+        archived = {row.client_id: row for row in (await self.session.execute(
+            select(
+                ArchivedOrder.client_id,
+                func.sum(ArchivedOrder.paid_total).label("paid"),
+                func.sum(ArchivedOrder.charged_amount).label("charged")
+            )
+            .where(ArchivedOrder.client_id.in_(client_ids))
+            .group_by(ArchivedOrder.client_id)
+        )).all()}
+        ledger = dict((await self.session.execute(
+            select(BalanceEntry.client_id, func.sum(BalanceEntry.amount))
+            .where(BalanceEntry.client_id.in_(client_ids))
+            .group_by(BalanceEntry.client_id)
+        )).all())
+        debts = dict((await self.session.execute(
+            select(Debt.client_id, func.sum(Debt.remaining_amount))
+            .where(Debt.client_id.in_(client_ids), Debt.is_active == True)
+            .group_by(Debt.client_id)
+        )).all())
+        balances = (await self.session.execute(
+            select(ClientBalance).where(ClientBalance.client_id.in_(client_ids))
+        )).scalars().all()
+        
+        fixed = []
+        for balance in balances:
+            expected_paid = to_money(paid.get(balance.client_id))
+            expected_charged = to_money(charged.get(balance.client_id))
+            if balance.client_id in archived:
+                expected_paid += to_money(archived[balance.client_id].paid)
+                expected_charged += to_money(archived[balance.client_id].charged)
+            expected_outstanding = expected_charged - expected_paid
+            expected_debt = to_money(debts.get(balance.client_id))
+            ledger_total = to_money(ledger.get(balance.client_id))
+            mismatch = False
+            
+            if to_money(balance.paid_total) != expected_paid:
+                self._report_mismatch(report, "client_paid", balance.client_id, expected_paid, balance.paid_total)
+                mismatch = True
+            if to_money(balance.charged_total) != expected_charged:
+                self._report_mismatch(
+                    report, "client_charged", balance.client_id, expected_charged, balance.charged_total
+                )
+                mismatch = True
+            if to_money(balance.outstanding) != expected_outstanding or ledger_total != expected_outstanding:
+                self._report_mismatch(
+                    report, "client_outstanding", balance.client_id, expected_outstanding, balance.outstanding
+                )
+                mismatch = True
+            
+            if to_money(balance.active_debt) != expected_debt:
+                self._report_mismatch(report, "client_debt", balance.client_id, expected_debt, balance.active_debt)
+                mismatch = True
+            
+            if fix and mismatch:
+                balance.paid_total = expected_paid
+                balance.charged_total = expected_charged
+                balance.active_debt = expected_debt
+                balance.outstanding = ledger_total
+                if ledger_total != expected_outstanding:
+                    # Журнал не переписывается: расхождение закрывается корректирующей записью
+                    await self._append_entry(balance, "adjustment", expected_outstanding - ledger_total)
+                fixed.append(balance.client_id)
+                report["fixed"] += 1
+        
+        # Исправленные балансы: сводки клиентов строятся заново при следующем чтении
+        await ClientSummaryService(self.session).invalidate(fixed)
+
+
+class NightlyReconciler:
+    """Фоновая сверка прошедшего дня раз в сутки"""
+    
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self.last_report: Optional[Dict[str, Any]] = None
+    
+    def start(self) -> None:
+        if settings.reconcile_enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    def _seconds_until_run(self) -> float:
+        now = datetime.utcnow()
+        run_at = now.replace(hour=settings.reconcile_hour_utc, minute=0, second=0, microsecond=0)
+        if run_at <= now:
+            run_at += timedelta(days=1)
+        return (run_at - now).total_seconds()
+    
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self._seconds_until_run())
+            # Время сверки задается в UTC; проверяется завершившийся день UTC
+            day = datetime.utcnow().date() - timedelta(days=1)
+            try:
+                async with AsyncSessionLocal() as session:
+                    self.last_report = await ReconciliationService(session).reconcile_day(day)
+                    await session.commit()
+                logger.info(
+                    f"💰 Reconciliation {day}: {self.last_report['payments']} payments, "
+                    f"{self.last_report['mismatch_count']} mismatches, {self.last_report['fixed']} fixed"
+                )
+            except Exception as e:
+                logger.error(f"❌ Reconciliation error: {e}")
+            
+            # Возраст долгов вырос на день - приоритеты списка должников пересчитываются
+            try:
+                async with AsyncSessionLocal() as session:
+                    await CollectionService(session).rebuild()
+                    await session.commit()
+            except Exception as e:
+                logger.error(f"❌ Debt worklist rebuild error: {e}")
+            
+            # Закрытые заказы старше срока уходят в архив после сверки
+            if settings.archive_enabled:
+                try:
+                    async with AsyncSessionLocal() as session:
+                        await ArchiveService(session).archive_closed()
+                        await session.commit()
+                except Exception as e:
+                    logger.error(f"❌ Order archive error: {e}")
+    
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+# Глобальный планировщик ночной сверки
+nightly_reconciler = NightlyReconciler()
+
+
+# Функция для получения сервиса
+async def get_reconciliation_service() -> ReconciliationService:
+    """Получение экземпляра ReconciliationService на сессии текущего обновления Telegram"""
+    return ReconciliationService(update_session())
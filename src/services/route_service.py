@@ -0,0 +1,331 @@
+"""
+🗺 Сервис планирования маршрутов курьеров MAXXPHARM CRM
+"""
+
+import math
+from collections import Counter
+from typing import Optional, List, Dict, Any, Sequence, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, and_, or_
+from sqlalchemy.orm import selectinload
+
+from ..models.database import Order, OrderStatus, Location
+from ..config import settings
+from .location_service import (
+    haversine_km, travel_minutes, EARTH_RADIUS_KM, STOP_HANDLING_MINUTES
+)
+
+
+Point = Tuple[float, float]
+
+
+def distance_matrix(points: Sequence[Point]) -> List[List[float]]:
+    """Матрица расстояний (км) между всеми точками.
+
+    Считается векторно через numpy, если он установлен. Результат - списки,
+    так как поэлементный доступ к ним в эвристиках быстрее, чем к ndarray.
+    """
+    if not points:
+        return []
+    
+    try:
+        import numpy as np
+    except ImportError:
+        return [[haversine_km(a[0], a[1], b[0], b[1]) for b in points] for a in points]
+    
+    coords = np.radians(np.asarray(points, dtype=float))
+    lat = coords[:, 0][:, None]
+    lon = coords[:, 1][:, None]
+    
+    a = (
+        np.sin((lat.T - lat) / 2) ** 2
+        + np.cos(lat) * np.cos(lat.T) * np.sin((lon.T - lon) / 2) ** 2
+    )
+    matrix = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+    
+    return matrix.tolist()
+
+
+def nearest_neighbour_tour(matrix: List[List[float]], stops: Sequence[int], start: int = 0) -> List[int]:
+    """Жадный маршрут: из текущей точки в ближайшую непосещенную"""
+    remaining = set(stops)
+    remaining.discard(start)
+    tour = [start]
+    current = start
+    
+    while remaining:
+        row = matrix[current]
+        current = min(remaining, key=row.__getitem__)
+        remaining.remove(current)
+        tour.append(current)
+    
+    return tour
+
+
+def two_opt(tour: List[int], matrix: List[List[float]], max_passes: int = 50) -> List[int]:
+    """Улучшение открытого маршрута 2-opt (первая точка фиксирована)"""
+    tour = list(tour)
+    n = len(tour)
+    if n < 4:
+        return tour
+    
+    for _ in range(max_passes):
+        improved = False
+        for i in range(1, n - 1):
+            a, b = tour[i - 1], tour[i]
+            d_ab = matrix[a][b]
+            for j in range(i + 1, n):
+                c = tour[j]
+                # Маршрут открытый: после последней точки ребра нет
+                if j + 1 < n:
+                    d = tour[j + 1]
+                    delta = matrix[a][c] + matrix[b][d] - d_ab - matrix[c][d]
+                else:
+                    delta = matrix[a][c] - d_ab
+                
+                if delta < -1e-9:
+                    tour[i:j + 1] = reversed(tour[i:j + 1])
+                    improved = True
+                    b = tour[i]
+                    d_ab = matrix[a][b]
+        if not improved:
+            break
+    
+    return tour
+
+
+def tour_length(tour: Sequence[int], matrix: List[List[float]]) -> float:
+    """Длина открытого маршрута в км"""
+    return sum(matrix[tour[i]][tour[i + 1]] for i in range(len(tour) - 1))
+
+
+def sweep_batches(
+    depot: Point,
+    points: Sequence[Point],
+    max_stops: int
+) -> List[List[int]]:
+    """Группировка точек в рейсы по углу вокруг склада (sweep-алгоритм)"""
+    order = sorted(
+        range(len(points)),
+        key=lambda i: math.atan2(points[i][0] - depot[0], points[i][1] - depot[1])
+    )
+    if not order:
+        return []
+    
+    # Начинаем разрез с самого большого углового промежутка между соседними точками
+    angles = [math.atan2(points[i][0] - depot[0], points[i][1] - depot[1]) for i in order]
+    gaps = [
+        (angles[(k + 1) % len(angles)] - angles[k]) % (2 * math.pi)
+        for k in range(len(angles))
+    ]
+    start = (max(range(len(gaps)), key=gaps.__getitem__) + 1) % len(order)
+    order = order[start:] + order[:start]
+    
+    return [order[k:k + max_stops] for k in range(0, len(order), max_stops)]
+
+
+def plan_trip(origin: Point, stops: Sequence[Point]) -> Dict[str, Any]:
+    """Порядок объезда точек из начальной позиции и оценка времени"""
+    points = [origin] + list(stops)
+    matrix = distance_matrix(points)
+    
+    tour = nearest_neighbour_tour(matrix, range(len(points)))
+    tour = two_opt(tour, matrix)
+    
+    sequence = []
+    elapsed = 0.0
+    distance = 0.0
+    for previous, current in zip(tour, tour[1:]):
+        leg = matrix[previous][current]
+        distance += leg
+        elapsed += travel_minutes(leg) + STOP_HANDLING_MINUTES
+        sequence.append({
+            'stop': current - 1,
+            'leg_km': round(leg, 2),
+            'arrival_minutes': round(elapsed - STOP_HANDLING_MINUTES)
+        })
+    
+    return {
+        'sequence': sequence,
+        'distance_km': round(distance, 2),
+        'total_minutes': round(elapsed)
+    }
+
+
+class RouteService:
+    """Сервис группировки доставок в рейсы и порядка объезда точек"""
+    
+    def __init__(self, session: AsyncSession):
+        self.session = session
+    
+    @property
+    def depot(self) -> Point:
+        """Координаты склада"""
+        return (settings.depot_latitude, settings.depot_longitude)
+    
+    async def plan_ready_orders(self, zone: Optional[str] = None, include_order_id: Optional[int] = None) -> Dict[str, Any]:
+        """Разбиение заказов, готовых к доставке, на рейсы курьеров
+        
+        zone - только заказы зоны (и заказы без зоны, как в очередях);
+        include_order_id - заказ, статус которого меняется в текущей транзакции.
+        """
+        condition = Order.status == OrderStatus.READY_FOR_DELIVERY.value
+        if include_order_id is not None:
+            condition = or_(condition, Order.id == include_order_id)
+        if zone is not None:
+            condition = and_(condition, or_(Order.zone == zone, Order.zone.is_(None)))
+        orders = await self._load_orders(condition)
+        stops, unrouted = self._group_stops(orders)
+        
+        points = [stop['point'] for stop in stops]
+        trips = []
+        for batch in sweep_batches(self.depot, points, settings.route_max_stops):
+            trips.extend(self._split_by_duration([stops[i] for i in batch]))
+        
+        return {
+            'trips': trips,
+            'orders': len(orders),
+            'unrouted': unrouted
+        }
+    
+    async def trip_courier(self, order: Order) -> Optional[int]:
+        """Курьер, уже назначенный на другие заказы рейса, в который попал заказ"""
+        plan = await self.plan_ready_orders(order.zone, include_order_id=order.id)
+        for trip in plan['trips']:
+            if any(order.id in stop['order_ids'] for stop in trip['stops']):
+                couriers = Counter(
+                    courier_id
+                    for stop in trip['stops']
+                    for order_id, courier_id in zip(stop['order_ids'], stop['courier_ids'])
+                    if order_id != order.id and courier_id is not None
+                )
+                return couriers.most_common(1)[0][0] if couriers else None
+        return None
+    
+    async def plan_courier_route(self, courier_id: int) -> Dict[str, Any]:
+        """Маршрут курьера по его заказам из текущей позиции"""
+        orders = await self._load_orders(
+            and_(
+                Order.courier_id == courier_id,
+                Order.status.in_([
+                    OrderStatus.READY_FOR_DELIVERY.value,
+                    OrderStatus.IN_DELIVERY.value
+                ])
+            )
+        )
+        stops, unrouted = self._group_stops(orders)
+        origin = await self._courier_origin(courier_id)
+        
+        trip = self._build_trip(origin, stops)
+        trip['unrouted'] = unrouted
+        trip['orders'] = len(orders)
+        return trip
+    
+    def _split_by_duration(self, stops: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Деление рейса, если он длиннее допустимого"""
+        trip = self._build_trip(self.depot, stops)
+        if trip['total_minutes'] <= settings.route_max_trip_minutes or len(stops) == 1:
+            return [trip]
+        
+        # Режем по порядку объезда, чтобы половины оставались компактными
+        ordered = trip['stops']
+        middle = len(ordered) // 2
+        return (
+            self._split_by_duration([stop['source'] for stop in ordered[:middle]])
+            + self._split_by_duration([stop['source'] for stop in ordered[middle:]])
+        )
+    
+    def _build_trip(self, origin: Point, stops: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Рейс с упорядоченными точками"""
+        if not stops:
+            return {'stops': [], 'distance_km': 0.0, 'total_minutes': 0}
+        
+        plan = plan_trip(origin, [stop['point'] for stop in stops])
+        
+        ordered = []
+        for step in plan['sequence']:
+            stop = stops[step['stop']]
+            ordered.append({
+                'order_ids': stop['order_ids'],
+                'order_numbers': stop['order_numbers'],
+                'courier_ids': stop['courier_ids'],
+                'address': stop['address'],
+                'latitude': stop['point'][0],
+                'longitude': stop['point'][1],
+                'total_amount': stop['total_amount'],
+                'leg_km': step['leg_km'],
+                'arrival_minutes': step['arrival_minutes'],
+                'source': stop
+            })
+        
+        return {
+            'stops': ordered,
+            'distance_km': plan['distance_km'],
+            'total_minutes': plan['total_minutes']
+        }
+    
+    def _group_stops(self, orders: List[Order]) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """Объединение заказов одной аптеки в одну точку"""
+        stops: Dict[int, Dict[str, Any]] = {}
+        unrouted = []
+        
+        for order in orders:
+            pharmacy = order.pharmacy
+            if pharmacy is None or pharmacy.latitude is None or pharmacy.longitude is None:
+                unrouted.append(order.order_number)
+                continue
+            
+            stop = stops.get(pharmacy.id)
+            if stop is None:
+                stop = stops[pharmacy.id] = {
+                    'point': (float(pharmacy.latitude), float(pharmacy.longitude)),
+                    'address': order.delivery_address or pharmacy.address,
+                    'order_ids': [],
+                    'order_numbers': [],
+                    'courier_ids': [],
+                    'total_amount': 0.0
+                }
+            stop['order_ids'].append(order.id)
+            stop['order_numbers'].append(order.order_number)
+            stop['courier_ids'].append(order.courier_id)
+            stop['total_amount'] += float(order.total_amount or 0)
+        
+        return list(stops.values()), unrouted
+    
+    async def _load_orders(self, condition) -> List[Order]:
+        """Загрузка заказов с аптеками"""
+        result = await self.session.execute(
+            select(Order)
+            .options(selectinload(Order.pharmacy))
+            .where(condition)
+            .order_by(Order.created_at.asc())
+        )
+        return result.scalars().all()
+    
+    async def _courier_origin(self, courier_id: int) -> Point:
+        """Текущая позиция курьера (индекс, последняя геолокация или склад)"""
+        from .dispatch_service import courier_index
+        
+        position = courier_index.position(courier_id)
+        if position is not None:
+            return (position['latitude'], position['longitude'])
+        
+        result = await self.session.execute(
+            select(Location.latitude, Location.longitude)
+            .where(Location.user_id == courier_id)
+            .order_by(Location.created_at.desc())
+            .limit(1)
+        )
+        row = result.first()
+        if row is not None:
+            return (float(row.latitude), float(row.longitude))
+        
+        return self.depot
+
+
+# Функция для получения сервиса
+async def get_route_service() -> RouteService:
+    """Получение экземпляра RouteService на сессии текущего обновления Telegram"""
+    from ..database import update_session
+    
+    return RouteService(update_session())
@@ -3,13 +3,15 @@
 """
 
 from typing import Optional, List, Dict, Any
-from datetime import datetime
+from datetime import datetime, timedelta
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, update, and_, or_
 from sqlalchemy.orm import selectinload
 
 from ..models.database import User, UserRole, Pharmacy, ActivityLog
-from ..database import get_db
+from ..database import update_session
+from ..config import settings
+from ..replicas import read_only
 
 
 class UserService:
@@ -18,11 +20,12 @@ class UserService:
     def __init__(self, session: AsyncSession):
         self.session = session
     
-    async def get_user_by_telegram_id(self, telegram_id: int) -> Optional[User]:
-        """Получение пользователя по Telegram ID"""
-        result = await self.session.execute(
-            select(User).where(User.telegram_id == telegram_id)
-        )
+    async def get_user_by_telegram_id(self, telegram_id: int, with_pharmacy: bool = False) -> Optional[User]:
+        """Получение пользователя по Telegram ID (with_pharmacy - сразу с аптекой клиента)"""
+        query = select(User).where(User.telegram_id == telegram_id)
+        if with_pharmacy:
+            query = query.options(selectinload(User.pharmacy))
+        result = await self.session.execute(query)
         return result.scalar_one_or_none()
     
     async def get_user_by_id(self, user_id: int) -> Optional[User]:
@@ -56,7 +59,7 @@ class UserService:
         )
         
         self.session.add(user)
-        await self.session.commit()
+        await self.session.flush()
         await self.session.refresh(user)
         
         # Логирование действия
@@ -81,7 +84,7 @@ class UserService:
         user.role = new_role.value
         user.updated_at = datetime.utcnow()
         
-        await self.session.commit()
+        await self.session.flush()
         
         # Логирование изменения роли
         await self.log_activity(
@@ -105,7 +108,7 @@ class UserService:
         user.is_active = False
         user.updated_at = datetime.utcnow()
         
-        await self.session.commit()
+        await self.session.flush()
         
         # Логирование блокировки
         await self.log_activity(
@@ -123,6 +126,7 @@ class UserService:
         )
         return result.scalars().all()
     
+    @read_only
     async def get_active_users(self) -> List[User]:
         """Получение всех активных пользователей"""
         result = await self.session.execute(
@@ -145,6 +149,7 @@ class UserService:
         )
         return result.scalars().all()
     
+    @read_only
     async def get_user_stats(self) -> Dict[str, Any]:
         """Получение статистики пользователей"""
         # Общее количество пользователей
@@ -202,9 +207,14 @@ class UserService:
         )
         
         self.session.add(pharmacy)
-        await self.session.commit()
+        await self.session.flush()
         await self.session.refresh(pharmacy)
         
+        # Зона доставки по адресу аптеки
+        from .zone_service import ZoneService
+        
+        await ZoneService(self.session).assign_pharmacy_zone(pharmacy)
+        
         # Логирование
         await self.log_activity(
             user_id=user_id,
@@ -223,31 +233,40 @@ class UserService:
         action: str,
         entity_type: Optional[str] = None,
         entity_id: Optional[int] = None,
-        details: Optional[Dict[str, Any]] = None
-    ) -> ActivityLog:
-        """Логирование действия пользователя"""
-        log = ActivityLog(
+        details: Optional[Dict[str, Any]] = None,
+        strict: bool = False
+    ) -> None:
+        """Логирование действия пользователя (пакетная запись; strict - в текущей транзакции)"""
+        from .audit_service import audit_log
+        
+        await audit_log.record(
             user_id=user_id,
             action=action,
             entity_type=entity_type,
             entity_id=entity_id,
-            details=details or {}
+            details=details,
+            session=self.session,
+            strict=strict
         )
-        
-        self.session.add(log)
-        await self.session.commit()
-        
-        return log
     
+    @read_only
     async def get_user_activity_history(
         self,
         user_id: int,
         limit: int = 50
     ) -> List[ActivityLog]:
-        """Получение истории действий пользователя"""
+        """Получение истории действий пользователя
+        
+        Запрос ограничен сроком хранения журнала по created_at, поэтому
+        затрагивает только секции за этот срок.
+        """
+        oldest = datetime.utcnow() - timedelta(days=settings.activity_log_retention_days)
         result = await self.session.execute(
             select(ActivityLog)
-            .where(ActivityLog.user_id == user_id)
+            .where(
+                ActivityLog.user_id == user_id,
+                ActivityLog.created_at >= oldest
+            )
             .order_by(ActivityLog.created_at.desc())
             .limit(limit)
         )
@@ -256,6 +275,5 @@ class UserService:
 
 # Функция для получения сервиса
 async def get_user_service() -> UserService:
-    """Получение экземпляра UserService"""
-    async for session in get_db():
-        return UserService(session)
+    """Получение экземпляра UserService на сессии текущего обновления Telegram"""
+    return UserService(update_session())
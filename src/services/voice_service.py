@@ -0,0 +1,343 @@
+"""
+🎤 Сервис голосовых заказов MAXXPHARM CRM
+"""
+
+import asyncio
+import contextlib
+import importlib
+import logging
+import os
+import re
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, List, Dict, Any, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .catalog_service import CatalogService
+from .order_parser import parse_order_text
+from ..database import update_session
+from ..config import settings
+from ..metrics import LatencyWindow
+
+logger = logging.getLogger(__name__)
+
+# Связки между позициями в устной речи: "парацетамол 50 штук и аспирин 20 упаковок"
+SPOKEN_SEPARATORS = re.compile(r"\s+(?:и|а также|а еще|а ещё|еще|ещё|плюс)\s+|[.:;!?]\s+|,\s+", re.IGNORECASE)
+LEADING_FILLER = re.compile(r"^(?:и|а|еще|ещё|плюс|также)\s+", re.IGNORECASE)
+
+# Числительные, если распознавание вернуло их словами
+NUMBER_WORDS = {
+    "ноль": 0, "один": 1, "одна": 1, "одну": 1, "одно": 1, "два": 2, "две": 2, "три": 3, "четыре": 4,
+    "пять": 5, "шесть": 6, "семь": 7, "восемь": 8, "девять": 9, "десять": 10, "одиннадцать": 11,
+    "двенадцать": 12, "тринадцать": 13, "четырнадцать": 14, "пятнадцать": 15, "шестнадцать": 16,
+    "семнадцать": 17, "восемнадцать": 18, "девятнадцать": 19, "двадцать": 20, "тридцать": 30,
+    "сорок": 40, "пятьдесят": 50, "шестьдесят": 60, "семьдесят": 70, "восемьдесят": 80,
+    "девяносто": 90, "сто": 100, "двести": 200, "триста": 300, "четыреста": 400, "пятьсот": 500,
+    "шестьсот": 600, "семьсот": 700, "восемьсот": 800, "девятьсот": 900,
+}
+# 10-19 занимают и десятки, и единицы: после них число закончено
+TEEN_NUMBERS = range(10, 20)
+NUMBER_SEQUENCE = re.compile(
+    r"\b(?:%s)(?:\s+(?:%s))*\b" % ("|".join(NUMBER_WORDS), "|".join(NUMBER_WORDS)),
+    re.IGNORECASE
+)
+
+
+class TranscriptionBackend:
+    """Базовый класс бэкенда распознавания речи (работает в процессе воркера)"""
+    
+    name = "base"
+    
+    def transcribe(self, path: str) -> str:
+        raise NotImplementedError
+
+
+class OpenAITranscriptionBackend(TranscriptionBackend):
+    """Распознавание через OpenAI API (Whisper)"""
+    
+    name = "openai"
+    
+    def __init__(self, options: Dict[str, Any]):
+        import openai
+        
+        self.client = openai.OpenAI(api_key=options["openai_api_key"])
+        self.model = options["transcription_model"]
+    
+    def transcribe(self, path: str) -> str:
+        with open(path, "rb") as audio:
+            result = self.client.audio.transcriptions.create(model=self.model, file=audio, language="ru")
+        return result.text
+
+
+class LocalWhisperBackend(TranscriptionBackend):
+    """Локальная модель faster-whisper (загружается один раз на процесс)"""
+    
+    name = "local"
+    
+    def __init__(self, options: Dict[str, Any]):
+        from faster_whisper import WhisperModel
+        
+        self.model = WhisperModel(options["local_whisper_model"], device="cpu", compute_type="int8")
+    
+    def transcribe(self, path: str) -> str:
+        segments, _ = self.model.transcribe(path, language="ru", vad_filter=True)
+        return " ".join(segment.text.strip() for segment in segments)
+
+
+TRANSCRIPTION_BACKENDS = {
+    "openai": OpenAITranscriptionBackend,
+    "local": LocalWhisperBackend,
+}
+
+
+def resolve_backend(name: str) -> str:
+    """auto: локальная модель, если установлен faster-whisper, иначе OpenAI"""
+    if name != "auto":
+        return name
+    try:
+        importlib.import_module("faster_whisper")
+        return "local"
+    except ImportError:
+        return "openai"
+
+
+def load_backend(name: str, options: Dict[str, Any]) -> TranscriptionBackend:
+    """Бэкенд по имени из реестра или по пути "package.module:ClassName" """
+    if name in TRANSCRIPTION_BACKENDS:
+        return TRANSCRIPTION_BACKENDS[name](options)
+    module_name, _, class_name = name.partition(":")
+    backend_class = getattr(importlib.import_module(module_name), class_name)
+    return backend_class(options)
+
+
+# Бэкенд процесса воркера (модель не загружается заново для каждого сообщения)
+_worker_backend: Optional[TranscriptionBackend] = None
+
+
+def _init_worker(name: str, options: Dict[str, Any]) -> None:
+    global _worker_backend
+    _worker_backend = load_backend(name, options)
+
+
+def transcribe_in_worker(path: str) -> Tuple[str, float]:
+    """Распознавание файла в процессе пула; возвращает текст и длительность"""
+    started = time.perf_counter()
+    text = _worker_backend.transcribe(path)
+    return text.strip(), time.perf_counter() - started
+
+
+def _places(value: int) -> Tuple[int, int]:
+    """Старший и младший разряды числительного: сотни - 3, десятки - 2, единицы - 1"""
+    if value >= 100:
+        return 3, 3
+    if value >= 20:
+        return 2, 2
+    if value in TEEN_NUMBERS:
+        return 2, 1
+    if value > 0:
+        return 1, 1
+    # Ноль ни с чем не складывается
+    return 4, 0
+
+
+def words_to_numbers(text: str) -> str:
+    """"двадцать пять штук" -> "25 штук"; складываются только убывающие разряды
+    (сотни, десятки, единицы), поэтому "пять десять" -> "5 10", а не 15"""
+    def replace(match: re.Match) -> str:
+        numbers: List[int] = []
+        lowest = None
+        for word in match.group(0).split():
+            value = NUMBER_WORDS[word.lower()]
+            high, low = _places(value)
+            if lowest is not None and high < lowest:
+                numbers[-1] += value
+            else:
+                numbers.append(value)
+            lowest = low
+        return " ".join(str(number) for number in numbers)
+    
+    return NUMBER_SEQUENCE.sub(replace, text)
+
+
+def _remove_file(path: str) -> None:
+    with contextlib.suppress(FileNotFoundError):
+        os.unlink(path)
+
+
+def transcript_to_text(transcript: str) -> str:
+    """Устная речь -> текст заказа с позицией на строку"""
+    transcript = words_to_numbers(transcript)
+    parts = (LEADING_FILLER.sub("", part.strip()) for part in SPOKEN_SEPARATORS.split(transcript))
+    return "\n".join(part for part in parts if part)
+
+
+class VoiceQueue:
+    """Ограниченная очередь распознавания с пулом процессов-воркеров"""
+    
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        max_size: Optional[int] = None,
+        backend: Optional[str] = None
+    ):
+        self.workers = workers or settings.voice_workers
+        self.max_size = max_size or settings.voice_queue_size
+        self.backend = backend
+        self._queue: Optional[asyncio.Queue] = None
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._tasks: List[asyncio.Task] = []
+        self.in_flight = 0
+        self.stats = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0, "expired": 0}
+        self.wait_time = LatencyWindow()
+        self.latency = LatencyWindow()
+    
+    def _ensure_started(self) -> None:
+        if self._queue is not None:
+            return
+        
+        backend = resolve_backend(self.backend or settings.transcription_backend)
+        options = {
+            "openai_api_key": settings.openai_api_key,
+            "transcription_model": settings.transcription_model,
+            "local_whisper_model": settings.local_whisper_model,
+        }
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(backend, options)
+        )
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info(f"🎤 Voice queue started: backend={backend}, workers={self.workers}, size={self.max_size}")
+    
+    def is_full(self) -> bool:
+        return self._queue is not None and self._queue.full()
+    
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+    
+    async def submit(self, path: str, timeout: Optional[float] = None) -> str:
+        """Постановка файла в очередь и ожидание текста (asyncio.QueueFull при переполнении)
+        
+        Файл переходит очереди: его удаляет воркер после распознавания (или пропуска),
+        поэтому таймаут ожидания не удаляет файл, который еще читает процесс пула.
+        """
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((path, future, time.monotonic()))
+        except asyncio.QueueFull:
+            self.stats["rejected"] += 1
+            _remove_file(path)
+            raise
+        self.stats["submitted"] += 1
+        
+        # По таймауту future отменяется, и воркер пропускает задачу, если еще не начал ее
+        return await asyncio.wait_for(future, timeout or settings.voice_timeout_seconds)
+    
+    async def _worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            path, future, enqueued_at = await self._queue.get()
+            try:
+                if future.done():
+                    self.stats["expired"] += 1
+                    continue
+                
+                self.wait_time.add(time.monotonic() - enqueued_at)
+                self.in_flight += 1
+                try:
+                    text, seconds = await loop.run_in_executor(self._executor, transcribe_in_worker, path)
+                finally:
+                    self.in_flight -= 1
+                
+                self.latency.add(seconds)
+                self.stats["completed"] += 1
+                if not future.done():
+                    future.set_result(text)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["failed"] += 1
+                logger.warning(f"⚠️ Transcription failed: {e}")
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                _remove_file(path)
+                self._queue.task_done()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "depth": self.depth,
+            "in_flight": self.in_flight,
+            "max_size": self.max_size,
+            "workers": self.workers,
+            "wait": self.wait_time.summary(),
+            "transcription": self.latency.summary(),
+        }
+    
+    async def shutdown(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        # Файлы задач, до которых воркеры не дошли
+        while self._queue is not None and not self._queue.empty():
+            path, future, _ = self._queue.get_nowait()
+            future.cancel()
+            _remove_file(path)
+        self._queue = None
+
+
+# Глобальная очередь распознавания
+voice_queue = VoiceQueue()
+
+
+class VoiceService:
+    """Сервис голосовых заказов: распознавание и черновик заказа"""
+    
+    def __init__(self, session: AsyncSession, queue: Optional[VoiceQueue] = None):
+        self.session = session
+        self.queue = queue if queue is not None else voice_queue
+    
+    async def transcribe(self, bot, voice) -> str:
+        """Потоковое скачивание OGG во временный файл и распознавание в очереди"""
+        if voice.duration and voice.duration > settings.voice_max_duration_seconds:
+            raise ValueError(f"Сообщение длиннее {settings.voice_max_duration_seconds} секунд")
+        # Переполненная очередь отклоняет запрос до скачивания файла
+        if self.queue.is_full():
+            self.queue.stats["rejected"] += 1
+            raise asyncio.QueueFull()
+        
+        fd, path = tempfile.mkstemp(suffix=".ogg")
+        os.close(fd)
+        try:
+            await bot.download(voice, destination=path)
+        except BaseException:
+            _remove_file(path)
+            raise
+        # Дальше файл удаляет очередь
+        return await self.queue.submit(path)
+    
+    async def draft_order(self, transcript: str) -> List[Dict[str, Any]]:
+        """Позиции черновика заказа с ценами каталога"""
+        items = parse_order_text(transcript_to_text(transcript))
+        # Фразы без количества ("добрый день", "мне нужно") - не позиции, если позиции с количеством есть
+        if any(item["explicit"] for item in items):
+            items = [item for item in items if item["explicit"]]
+        if not items:
+            return []
+        return await CatalogService(self.session).price_items(items)
+
+
+# Функция для получения сервиса
+async def get_voice_service() -> VoiceService:
+    """Получение экземпляра VoiceService на сессии текущего обновления Telegram"""
+    return VoiceService(update_session())
@@ -0,0 +1,236 @@
+"""
+🗺 Сервис зон доставки MAXXPHARM CRM
+"""
+
+import json
+import logging
+from typing import Optional, List, Dict, Sequence, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, and_, func
+
+from ..models.database import Order, OrderStatus, Pharmacy, User, UserRole
+from ..config import settings
+
+
+logger = logging.getLogger(__name__)
+
+# Зоны как в crm_database.sql
+ZONES = ["центр", "север", "юг", "восток", "запад"]
+
+# Контуры зон Душанбе: список вершин (широта, долгота).
+# Центр проверяется первым, остальные зоны - трапеции вокруг него.
+DEFAULT_ZONE_POLYGONS: Dict[str, List[Tuple[float, float]]] = {
+    "центр": [(38.54, 68.76), (38.58, 68.76), (38.58, 68.81), (38.54, 68.81)],
+    "север": [(38.58, 68.76), (38.66, 68.66), (38.66, 68.92), (38.58, 68.81)],
+    "юг": [(38.54, 68.76), (38.46, 68.66), (38.46, 68.92), (38.54, 68.81)],
+    "восток": [(38.58, 68.81), (38.66, 68.92), (38.46, 68.92), (38.54, 68.81)],
+    "запад": [(38.58, 68.76), (38.66, 68.66), (38.46, 68.66), (38.54, 68.76)],
+}
+
+# Статусы, в которых заказ еще находится в очередях сотрудников
+OPEN_STATUSES = [
+    OrderStatus.CREATED.value,
+    OrderStatus.PENDING_OPERATOR.value,
+    OrderStatus.CONFIRMED.value,
+    OrderStatus.COLLECTING.value,
+    OrderStatus.COLLECTED.value,
+    OrderStatus.CHECKING.value,
+    OrderStatus.READY_FOR_DELIVERY.value,
+    OrderStatus.IN_DELIVERY.value,
+]
+
+# Роли, которые работают с очередью своей зоны
+ZONED_ROLES = [
+    UserRole.OPERATOR.value,
+    UserRole.COLLECTOR.value,
+    UserRole.CHECKER.value,
+    UserRole.COURIER.value,
+]
+
+
+def point_in_polygon(latitude: float, longitude: float, polygon: Sequence[Tuple[float, float]]) -> bool:
+    """Проверка попадания точки в многоугольник (метод лучей)"""
+    inside = False
+    j = len(polygon) - 1
+    for i in range(len(polygon)):
+        lat_i, lon_i = polygon[i]
+        lat_j, lon_j = polygon[j]
+        if (lon_i > longitude) != (lon_j > longitude):
+            crossing = lat_i + (longitude - lon_i) * (lat_j - lat_i) / (lon_j - lon_i)
+            if latitude < crossing:
+                inside = not inside
+        j = i
+    return inside
+
+
+class ZoneIndex:
+    """Контуры зон с ограничивающими прямоугольниками для быстрого отсева"""
+    
+    def __init__(self, polygons: Optional[Dict[str, List[Tuple[float, float]]]] = None):
+        self._zones: List[Tuple[str, Tuple[float, float, float, float], List[Tuple[float, float]]]] = []
+        for zone, polygon in (polygons or DEFAULT_ZONE_POLYGONS).items():
+            points = [(float(lat), float(lon)) for lat, lon in polygon]
+            lats = [lat for lat, _ in points]
+            lons = [lon for _, lon in points]
+            self._zones.append((zone, (min(lats), max(lats), min(lons), max(lons)), points))
+    
+    @classmethod
+    def from_file(cls, path: str) -> "ZoneIndex":
+        """Загрузка контуров из JSON: {"зона": [[широта, долгота], ...]}"""
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+    
+    @property
+    def zones(self) -> List[str]:
+        return [zone for zone, _, _ in self._zones]
+    
+    def locate(self, latitude: Optional[float], longitude: Optional[float]) -> Optional[str]:
+        """Зона для координат или None, если точка вне всех зон"""
+        if latitude is None or longitude is None:
+            return None
+        
+        latitude = float(latitude)
+        longitude = float(longitude)
+        for zone, (min_lat, max_lat, min_lon, max_lon), polygon in self._zones:
+            if not (min_lat <= latitude <= max_lat and min_lon <= longitude <= max_lon):
+                continue
+            if point_in_polygon(latitude, longitude, polygon):
+                return zone
+        return None
+
+
+def _load_zone_index() -> ZoneIndex:
+    if settings.zone_polygons_path:
+        try:
+            return ZoneIndex.from_file(settings.zone_polygons_path)
+        except Exception as e:
+            logger.error(f"❌ Zone polygons load error: {e}")
+    return ZoneIndex()
+
+
+# Глобальный индекс зон
+zone_index = _load_zone_index()
+
+
+class ZoneService:
+    """Сервис определения зон и очередей заказов по зонам"""
+    
+    def __init__(self, session: AsyncSession, index: Optional[ZoneIndex] = None):
+        self.session = session
+        self.index = index if index is not None else zone_index
+    
+    def zone_for_point(self, latitude: Optional[float], longitude: Optional[float]) -> Optional[str]:
+        """Зона для координат"""
+        return self.index.locate(latitude, longitude)
+    
+    async def assign_pharmacy_zone(self, pharmacy: Pharmacy, geocode: bool = True) -> Optional[str]:
+        """Определение зоны аптеки и перенос ее на открытые заказы"""
+        if geocode and (pharmacy.latitude is None or pharmacy.longitude is None):
+            from .geocoding_service import GeocodingService
+            
+            location = await GeocodingService(self.session).geocode(pharmacy.address)
+            if location is not None:
+                pharmacy.latitude = location['latitude']
+                pharmacy.longitude = location['longitude']
+        
+        zone = self.zone_for_point(pharmacy.latitude, pharmacy.longitude)
+        pharmacy.zone = zone
+        
+        await self.session.execute(
+            update(Order)
+            .where(
+                and_(
+                    Order.pharmacy_id == pharmacy.id,
+                    Order.status.in_(OPEN_STATUSES)
+                )
+            )
+            .values(zone=zone)
+        )
+        await self.session.flush()
+        
+        return zone
+    
+    async def backfill_zones(self, batch_size: int = 500, geocode: bool = True) -> Dict[str, int]:
+        """Заполнение зон аптек без зоны (с геокодированием адреса) и заказов без зоны"""
+        pharmacies = 0
+        last_id = 0
+        
+        while True:
+            result = await self.session.execute(
+                select(Pharmacy)
+                .where(and_(Pharmacy.id > last_id, Pharmacy.zone.is_(None)))
+                .order_by(Pharmacy.id)
+                .limit(batch_size)
+            )
+            batch = result.scalars().all()
+            if not batch:
+                break
+            
+            for pharmacy in batch:
+                if geocode and (pharmacy.latitude is None or pharmacy.longitude is None) and pharmacy.address:
+                    from .geocoding_service import GeocodingService
+                    
+                    location = await GeocodingService(self.session).geocode(pharmacy.address)
+                    if location is not None:
+                        pharmacy.latitude = location['latitude']
+                        pharmacy.longitude = location['longitude']
+                pharmacy.zone = self.zone_for_point(pharmacy.latitude, pharmacy.longitude)
+                pharmacies += pharmacy.zone is not None
+            last_id = batch[-1].id
+            await self.session.flush()
+        
+        pharmacy_zone = (
+            select(Pharmacy.zone)
+            .where(Pharmacy.id == Order.pharmacy_id)
+            .scalar_subquery()
+        )
+        result = await self.session.execute(
+            update(Order)
+            .where(and_(Order.zone.is_(None), Order.status.in_(OPEN_STATUSES)))
+            .values(zone=pharmacy_zone)
+            .execution_options(synchronize_session=False)
+        )
+        
+        return {'pharmacies': pharmacies, 'orders': result.rowcount}
+    
+    async def get_coverage(self) -> Dict[str, int]:
+        """Сколько аптек и открытых заказов еще без зоны"""
+        pharmacies = await self.session.execute(
+            select(func.count(Pharmacy.id)).where(Pharmacy.zone.is_(None))
+        )
+        orders = await self.session.execute(
+            select(func.count(Order.id))
+            .where(and_(Order.zone.is_(None), Order.status.in_(OPEN_STATUSES)))
+        )
+        return {'pharmacies': pharmacies.scalar(), 'orders': orders.scalar()}
+    
+    async def get_staff(self) -> List[User]:
+        """Активные сотрудники с очередями по зонам"""
+        result = await self.session.execute(
+            select(User)
+            .where(and_(User.role.in_(ZONED_ROLES), User.is_active == True))
+            .order_by(User.role, User.full_name)
+        )
+        return result.scalars().all()
+    
+    async def set_staff_zone(self, telegram_id: int, zone: Optional[str]) -> Optional[User]:
+        """Зона сотрудника (None - все зоны); только сотрудникам с очередями и известным зонам"""
+        if zone is not None and zone not in self.index.zones:
+            raise ValueError(f"Неизвестная зона: {zone}")
+        
+        result = await self.session.execute(select(User).where(User.telegram_id == telegram_id))
+        user = result.scalar_one_or_none()
+        if user is None or user.role not in ZONED_ROLES:
+            return None
+        
+        user.zone = zone
+        await self.session.flush()
+        return user
+
+
+# Функция для получения сервиса
+async def get_zone_service() -> ZoneService:
+    """Получение экземпляра ZoneService на сессии текущего обновления Telegram"""
+    from ..database import update_session
+    
+    return ZoneService(update_session())
@@ -0,0 +1,131 @@
+"""
+🔌 Сессии базы на обновление Telegram MAXXPHARM CRM
+
+SessionMiddleware дает обновлению одну сессию (get_db() и get_*_service()
+берут ее же), соединение берется из пула только при первом запросе.
+В конце обновления - одна фиксация или откат при ошибке и возврат
+соединения в пул. Транзакции, которые держат соединение дольше
+DB_SESSION_WARN_SECONDS, и сессии, потерянные без закрытия, попадают
+в журнал и метрики.
+"""
+
+import asyncio
+import logging
+import time
+import weakref
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .database import UpdateSession, current_update_session
+from .metrics import metrics, current_trace, UpdateTrace
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class OpenSession:
+    started: float
+    session: weakref.ref
+    trace: Optional[UpdateTrace]
+    warned: bool = False
+    
+    @property
+    def owner(self) -> str:
+        return f"{self.trace.router}.{self.trace.handler}" if self.trace else "background"
+
+
+class SessionTracker:
+    """Сессии с открытой транзакцией (то есть с соединением из пула)"""
+    
+    def __init__(self):
+        self._open: Dict[int, OpenSession] = {}
+        self._task: Optional[asyncio.Task] = None
+    
+    def begin(self, session: Session) -> None:
+        self._open[id(session)] = OpenSession(time.monotonic(), weakref.ref(session), current_trace.get())
+    
+    def end(self, session: Session) -> None:
+        entry = self._open.pop(id(session), None)
+        if entry is None:
+            return
+        seconds = time.monotonic() - entry.started
+        metrics.observe("db_session_held_seconds", seconds, "Время удержания соединения сессией")
+        if seconds >= settings.db_session_warn_seconds and not entry.warned:
+            logger.warning(f"🐢 Session held a connection for {seconds:.1f} s ({entry.owner})")
+    
+    def check(self) -> None:
+        """Потерянные сессии и транзакции, которые все еще держат соединение"""
+        now = time.monotonic()
+        for key, entry in list(self._open.items()):
+            if entry.session() is None:
+                # Сборщик мусора удалил сессию без close(): соединение сброшено, а не возвращено в пул
+                del self._open[key]
+                metrics.inc("db_sessions_leaked_total", description="Сессии, не закрытые кодом", owner=entry.owner)
+                logger.error(f"❌ Session leaked without close ({entry.owner}), opened {now - entry.started:.0f} s ago")
+            elif now - entry.started >= settings.db_session_warn_seconds and not entry.warned:
+                entry.warned = True
+                logger.warning(f"⚠️ Session holds a connection for {now - entry.started:.0f} s ({entry.owner})")
+    
+    def _gauges(self) -> dict:
+        now = time.monotonic()
+        ages = [now - entry.started for entry in self._open.values()]
+        return {
+            (("state", "open"),): len(ages),
+            (("state", "long_held"),): sum(age >= settings.db_session_warn_seconds for age in ages),
+        }
+    
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(settings.db_session_check_seconds)
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"❌ Session check error: {e}")
+    
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+# Глобальный учет открытых сессий
+session_tracker = SessionTracker()
+metrics.gauge("db_sessions", session_tracker._gauges, "Сессии с открытой транзакцией")
+
+
+@event.listens_for(Session, "after_begin")
+def _after_begin(session, transaction, connection) -> None:
+    session_tracker.begin(session)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _after_transaction_end(session, transaction) -> None:
+    # Вложенные транзакции (SAVEPOINT) соединение не отдают
+    if transaction.parent is None:
+        session_tracker.end(session)
+
+
+class SessionMiddleware(BaseMiddleware):
+    """Внешний middleware: общая сессия на обновление, фиксация или откат в конце"""
+    
+    async def __call__(self, handler: Callable[..., Awaitable[Any]], event: Any, data: Dict[str, Any]) -> Any:
+        update = UpdateSession()
+        token = current_update_session.set(update)
+        succeeded = False
+        try:
+            result = await handler(event, data)
+            succeeded = True
+            return result
+        finally:
+            current_update_session.reset(token)
+            await update.close(commit=succeeded)
@@ -0,0 +1,70 @@
+"""
+🧪 Общие фикстуры тестов MAXXPHARM CRM: временная база SQLite на каждый тест
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest_asyncio
+from sqlalchemy import select
+
+ROOT = Path(__file__).resolve().parents[1]
+DB_PATH = Path(tempfile.mkdtemp(prefix="maxxpharm-tests-")) / "test.db"
+
+os.environ.update({
+    "DATABASE_URL": f"sqlite+aiosqlite:///{DB_PATH}",
+    "BOT_TOKEN": "1:test",
+    "ADMIN_TELEGRAM_ID": "1",
+    "OPENAI_API_KEY": "test",
+})
+# Корневой .env - настройки развертывания на Render; тесты читают только переменные выше
+os.chdir(DB_PATH.parent)
+sys.path.insert(0, str(ROOT))
+
+from src.database import engine, AsyncSessionLocal  # noqa: E402
+from src.models.database import Base, User, UserRole, Pharmacy, Order, OrderStatus  # noqa: E402
+from src.services.audit_service import audit_log  # noqa: E402
+
+
+@pytest_asyncio.fixture
+async def session():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    
+    async with AsyncSessionLocal() as session:
+        yield session
+    
+    await audit_log.stop()
+    await engine.dispose()
+
+
+@pytest_asyncio.fixture
+async def client(session):
+    user = User(telegram_id=1001, full_name="Клиент", role=UserRole.CLIENT.value)
+    session.add(user)
+    await session.flush()
+    session.add(Pharmacy(user_id=user.id, name="Аптека", address="Ташкент"))
+    await session.commit()
+    return user
+
+
+@pytest_asyncio.fixture
+async def make_order(session, client):
+    pharmacy_id = (await session.execute(select(Pharmacy.id).where(Pharmacy.user_id == client.id))).scalar_one()
+    
+    async def make(total, status=OrderStatus.DELIVERED):
+        order = Order(
+            order_number=f"ORD-{os.urandom(4).hex()}",
+            client_id=client.id,
+            pharmacy_id=pharmacy_id,
+            status=status.value,
+            total_amount=total,
+        )
+        session.add(order)
+        await session.commit()
+        return order
+    
+    return make
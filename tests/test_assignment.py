@@ -0,0 +1,99 @@
+"""
+🧪 Автоназначение курьеров: радиус доставки - жесткое ограничение
+"""
+
+import time
+
+import pytest
+
+from src.config import settings
+from src.models.database import Order, OrderStatus, Pharmacy, User, UserRole
+from src.services import dispatch_service
+from src.services.assignment_service import AssignmentService, WorkerLoad, WorkerLoadBalancer
+from src.services.dispatch_service import CourierGridIndex
+
+TASHKENT = (41.3111, 69.2797)
+SAMARKAND = (39.6542, 66.9597)
+
+
+@pytest.fixture
+def courier_index(monkeypatch):
+    index = CourierGridIndex(cell_km=2.0)
+    index.loaded_at = time.monotonic()
+    monkeypatch.setattr(dispatch_service, "courier_index", index)
+    return index
+
+
+async def ready_order(session, client, coordinates=TASHKENT):
+    pharmacy = (await session.execute(
+        Pharmacy.__table__.select().where(Pharmacy.user_id == client.id)
+    )).first()
+    await session.execute(
+        Pharmacy.__table__.update().where(Pharmacy.id == pharmacy.id)
+        .values(latitude=coordinates[0] if coordinates else None, longitude=coordinates[1] if coordinates else None)
+    )
+    order = Order(order_number="ORD-R1", client_id=client.id, pharmacy_id=pharmacy.id,
+                  status=OrderStatus.READY_FOR_DELIVERY.value, total_amount=100)
+    session.add(order)
+    await session.commit()
+    return order
+
+
+async def add_courier(session, telegram_id):
+    courier = User(telegram_id=telegram_id, full_name=f"Курьер {telegram_id}", role=UserRole.COURIER.value)
+    session.add(courier)
+    await session.commit()
+    return courier
+
+
+@pytest.mark.asyncio
+async def test_courier_outside_radius_is_not_assigned(session, client, courier_index):
+    far = await add_courier(session, 5001)
+    courier_index.update(far.id, *SAMARKAND)
+    order = await ready_order(session, client)
+    
+    worker = await AssignmentService(session, WorkerLoadBalancer()).on_status_change(
+        order, OrderStatus.CHECKING.value, OrderStatus.READY_FOR_DELIVERY.value
+    )
+    
+    assert worker is None
+    assert order.courier_id is None
+
+
+@pytest.mark.asyncio
+async def test_nearby_courier_is_assigned(session, client, courier_index):
+    far, near = await add_courier(session, 5001), await add_courier(session, 5002)
+    courier_index.update(far.id, *SAMARKAND)
+    courier_index.update(near.id, TASHKENT[0] + 0.01, TASHKENT[1])
+    order = await ready_order(session, client)
+    
+    worker = await AssignmentService(session, WorkerLoadBalancer()).on_status_change(
+        order, OrderStatus.CHECKING.value, OrderStatus.READY_FOR_DELIVERY.value
+    )
+    
+    assert worker.id == near.id
+
+
+@pytest.mark.asyncio
+async def test_order_without_coordinates_falls_back_to_load(session, client, courier_index):
+    courier = await add_courier(session, 5001)
+    order = await ready_order(session, client, coordinates=None)
+    
+    worker = await AssignmentService(session, WorkerLoadBalancer()).on_status_change(
+        order, OrderStatus.CHECKING.value, OrderStatus.READY_FOR_DELIVERY.value
+    )
+    
+    assert worker.id == courier.id
+
+
+@pytest.mark.asyncio
+async def test_worker_capacity_defaults_to_setting(session, monkeypatch):
+    monkeypatch.setattr(settings, "max_orders_per_worker", 8)
+    default = await add_courier(session, 5101)
+    capped = await add_courier(session, 5102)
+    capped.max_orders = 2
+    await session.commit()
+    
+    assert default.max_orders is None
+    assert WorkerLoad.from_user(default).max_orders == 8
+    assert WorkerLoad.from_user(capped).max_orders == 2
@@ -0,0 +1,27 @@
+"""
+🧪 Журнал действий: фоновая пакетная запись
+"""
+
+import pytest
+from sqlalchemy import select
+
+from src.models.database import ActivityLog
+from src.replicas import current_actor
+from src.services.audit_service import AuditLog
+
+
+@pytest.mark.asyncio
+async def test_lazily_started_writer_does_not_inherit_update_context(session, client):
+    audit = AuditLog(flush_interval=0.01)
+    token = current_actor.set(client.id)
+    try:
+        await audit.record(client.id, "viewed_catalog")
+    finally:
+        current_actor.reset(token)
+    
+    inherited = current_actor in audit._task.get_context()
+    await audit.stop()
+    
+    assert not inherited
+    actions = (await session.execute(select(ActivityLog.action))).scalars().all()
+    assert actions == ["viewed_catalog"]
@@ -0,0 +1,62 @@
+"""
+🧪 Сводка клиента: архивные заказы остаются в итогах и истории
+"""
+
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import delete
+
+from src.models.database import ArchivedOrder, Order, OrderStatus
+from src.services.client_summary_service import ClientSummaryService
+
+
+async def archive(session, order):
+    session.add(ArchivedOrder(
+        order_id=order.id,
+        order_number=order.order_number,
+        client_id=order.client_id,
+        status=order.status,
+        total_amount=order.total_amount,
+        paid_total=order.total_amount,
+        created_at=order.created_at or datetime.utcnow(),
+        closed_at=datetime.utcnow(),
+        archive_file="2026/01.jsonl.gz",
+        position=0,
+    ))
+    await session.execute(delete(Order).where(Order.id == order.id))
+    await session.commit()
+
+
+@pytest.mark.asyncio
+async def test_summary_counts_archived_orders_after_invalidate(session, client, make_order):
+    old = await make_order(100, OrderStatus.PAID)
+    await make_order(50, OrderStatus.PENDING_OPERATOR)
+    await archive(session, old)
+    
+    service = ClientSummaryService(session)
+    await service.invalidate([client.id])
+    summary = await service.get_summary(client.id)
+    
+    assert summary.order_count == 2
+    assert summary.open_order_count == 1
+    assert Decimal(summary.orders_amount) == Decimal("150")
+    assert [entry['id'] for entry in summary.recent_orders][-1] == old.id
+
+
+@pytest.mark.asyncio
+async def test_history_pages_through_archive(session, client, make_order):
+    orders = [await make_order(10 * (i + 1)) for i in range(4)]
+    for order in orders[:2]:
+        await archive(session, order)
+    
+    service = ClientSummaryService(session)
+    page, has_more = await service.get_history_page(client.id, limit=3)
+    assert [entry['id'] for entry in page] == [orders[3].id, orders[2].id, orders[1].id]
+    assert has_more
+    
+    page, has_more = await service.get_history_page(client.id, before_id=page[-1]['id'], limit=3)
+    assert [entry['id'] for entry in page] == [orders[0].id]
+    assert page[0]['order_number'] == orders[0].order_number
+    assert not has_more
@@ -0,0 +1,74 @@
+"""
+🧪 Список должников: распределение клиентов между представителями
+"""
+
+from collections import Counter
+
+import pytest
+from sqlalchemy import select
+
+from src.models.database import Debt, DebtWorkItem, Order, OrderStatus, Pharmacy, User, UserRole
+from src.services.collection_service import CollectionService
+
+
+async def add_debtors(session, count, zone=None):
+    for index in range(count):
+        client = User(telegram_id=3000 + index, full_name=f"Клиент {index}", role=UserRole.CLIENT.value)
+        session.add(client)
+        await session.flush()
+        pharmacy = Pharmacy(user_id=client.id, name=f"Аптека {index}", address="Ташкент", zone=zone)
+        session.add(pharmacy)
+        await session.flush()
+        order = Order(
+            order_number=f"ORD-D{index}",
+            client_id=client.id,
+            pharmacy_id=pharmacy.id,
+            status=OrderStatus.DELIVERED.value,
+            total_amount=100 + index,
+        )
+        session.add(order)
+        await session.flush()
+        session.add(Debt(order_id=order.id, client_id=client.id, total_amount=order.total_amount,
+                         paid_amount=0, remaining_amount=order.total_amount))
+    await session.commit()
+
+
+async def add_reps(session, count, zone=None, first=4000):
+    reps = [User(telegram_id=first + index, full_name=f"Представитель {index}", role=UserRole.SALES_REP.value, zone=zone)
+            for index in range(count)]
+    session.add_all(reps)
+    await session.commit()
+    return [rep.id for rep in reps]
+
+
+async def load_by_rep(session):
+    result = await session.execute(select(DebtWorkItem.sales_rep_id))
+    return Counter(result.scalars().all())
+
+
+@pytest.mark.asyncio
+async def test_rebuild_spreads_new_debtors_across_reps(session):
+    reps = await add_reps(session, 2)
+    await add_debtors(session, 10)
+    
+    await CollectionService(session).rebuild()
+    
+    assert await load_by_rep(session) == {reps[0]: 5, reps[1]: 5}
+
+
+@pytest.mark.asyncio
+async def test_rebuild_counts_existing_assignments(session):
+    reps = await add_reps(session, 1)
+    await add_debtors(session, 4)
+    await CollectionService(session).rebuild()
+    
+    # Новый представитель получает новых должников, пока нагрузка не сравняется
+    reps += await add_reps(session, 1, first=4100)
+    session.expunge_all()
+    await session.execute(DebtWorkItem.__table__.delete().where(DebtWorkItem.client_id.in_(
+        select(DebtWorkItem.client_id).order_by(DebtWorkItem.client_id.desc()).limit(2).scalar_subquery()
+    )))
+    await session.commit()
+    await CollectionService(session).rebuild()
+    
+    assert await load_by_rep(session) == {reps[0]: 2, reps[1]: 2}
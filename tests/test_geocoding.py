@@ -0,0 +1,33 @@
+"""
+🧪 Кэш геокодирования в базе и транзакция вызывающего кода
+"""
+
+import pytest
+from sqlalchemy import select
+
+from src.models.database import GeocodeCache, User, UserRole
+from src.services.geocoding_service import Geocoder, GazetteerProvider, GeocodingService
+
+
+@pytest.mark.asyncio
+async def test_cache_write_leaves_caller_transaction_alone(session):
+    session.add(User(telegram_id=7001, full_name="Не сохранять", role=UserRole.CLIENT.value))
+    service = GeocodingService(session, Geocoder(GazetteerProvider()))
+    
+    assert await service.geocode("Душанбе, проспект Рудаки") is not None
+    await session.rollback()
+    
+    assert (await session.execute(select(User).where(User.telegram_id == 7001))).first() is None
+    assert len((await session.execute(select(GeocodeCache))).scalars().all()) == 1
+
+
+@pytest.mark.asyncio
+async def test_cached_row_is_served_without_provider(session):
+    await GeocodingService(session, Geocoder(GazetteerProvider())).geocode("Душанбе, проспект Рудаки")
+    
+    geocoder = Geocoder(GazetteerProvider())
+    service = GeocodingService(session, geocoder)
+    
+    assert await service.geocode("Душанбе, проспект Рудаки") is not None
+    assert geocoder.provider_calls == 0
+    assert not session.dirty
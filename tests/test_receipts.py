@@ -0,0 +1,112 @@
+"""
+🧪 Отдача файлов чеков: ETag, Range и If-Range
+"""
+
+import hashlib
+import os
+import time
+
+import httpx
+import pytest
+from sqlalchemy import select
+
+from src.main import app
+from src.models.database import OrderStatus, Payment, PaymentReceipt, PaymentType
+from src.services import receipt_service
+from src.services.receipt_service import ContentStore, LocalReceiptStorage, ReceiptService, sign_receipt_link
+from src.services.reconciliation_service import ReconciliationService
+
+CONTENT = b"0123456789" * 10
+
+
+@pytest.fixture
+def receipt_url(tmp_path, monkeypatch):
+    monkeypatch.setattr(receipt_service, "_receipt_storage", LocalReceiptStorage(str(tmp_path)))
+    name = hashlib.sha256(CONTENT).hexdigest() + ".jpg"
+    path = tmp_path / ContentStore.relative_path(name[:64], ".jpg")
+    os.makedirs(path.parent, exist_ok=True)
+    path.write_bytes(CONTENT)
+    
+    expires = int(time.time()) + 600
+    return f"/receipts/{name}?expires={expires}&signature={sign_receipt_link(name, expires)}", f'"{name}"'
+
+
+async def fetch(url, **headers):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        return await client.get(url, headers=headers)
+
+
+@pytest.mark.asyncio
+async def test_if_range_matching_etag_returns_partial(receipt_url):
+    url, etag = receipt_url
+    
+    response = await fetch(url, range="bytes=0-9", **{"if-range": etag})
+    
+    assert response.status_code == 206
+    assert response.content == CONTENT[:10]
+
+
+@pytest.mark.asyncio
+async def test_if_range_other_validator_returns_whole_file(receipt_url):
+    url, _ = receipt_url
+    
+    response = await fetch(url, range="bytes=0-9", **{"if-range": '"stale"'})
+    
+    assert response.status_code == 200
+    assert response.content == CONTENT
+
+
+@pytest.mark.asyncio
+async def test_if_none_match_returns_not_modified(receipt_url):
+    url, etag = receipt_url
+    
+    response = await fetch(url, **{"if-none-match": etag})
+    
+    assert response.status_code == 304
+
+
+async def pending_receipt(session, order):
+    receipt = PaymentReceipt(
+        order_id=order.id,
+        client_id=order.client_id,
+        content_hash=hashlib.sha256(order.order_number.encode()).hexdigest(),
+        storage_path="ab/cd/receipt.jpg",
+        size_bytes=100,
+        status="pending"
+    )
+    session.add(receipt)
+    await session.commit()
+    return receipt
+
+
+@pytest.mark.asyncio
+async def test_accepted_receipt_pays_remainder_once(session, client, make_order):
+    order = await make_order(300, status=OrderStatus.DELIVERED)
+    await ReconciliationService(session).apply_payment(order.id, 100, PaymentType.CASH)
+    receipt = await pending_receipt(session, order)
+    service = ReceiptService(session)
+    
+    reviewed, payment = await service.review(receipt.id, client.id, accepted=True)
+    
+    assert reviewed.status == "accepted"
+    assert payment.amount == 200
+    with pytest.raises(ValueError):
+        await service.review(receipt.id, client.id, accepted=True)
+    with pytest.raises(ValueError):
+        await service.review(receipt.id, client.id, accepted=False)
+    
+    payments = (await session.execute(select(Payment.amount).where(Payment.order_id == order.id))).scalars().all()
+    assert sorted(payments) == [100, 200]
+    assert (await service.get_receipt(receipt.id)).status == "accepted"
+
+
+@pytest.mark.asyncio
+async def test_receipt_for_paid_order_posts_no_payment(session, client, make_order):
+    order = await make_order(300, status=OrderStatus.DELIVERED)
+    await ReconciliationService(session).apply_payment(order.id, 300, PaymentType.CASH)
+    receipt = await pending_receipt(session, order)
+    
+    reviewed, payment = await ReceiptService(session).review(receipt.id, client.id, accepted=True)
+    
+    assert reviewed.status == "accepted"
+    assert payment is None
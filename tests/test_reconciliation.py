@@ -0,0 +1,169 @@
+"""
+🧪 Проведение оплат: начисление, оплата, переплата, отклонение и сверка
+"""
+
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import select, update
+
+from src.models.database import BalanceEntry, ClientBalance, ClientSummary, Debt, DebtWorkItem, Order, OrderStatus, Pharmacy, User, UserRole
+from src.services.order_service import OrderService
+from src.services.reconciliation_service import ReconciliationService
+
+
+async def balance_of(session, client_id):
+    return await session.get(ClientBalance, client_id, populate_existing=True)
+
+
+async def active_debts(session, order_id):
+    result = await session.execute(select(Debt).where(Debt.order_id == order_id, Debt.is_active == True))
+    return result.scalars().all()
+
+
+async def ledger_kinds(session, client_id):
+    result = await session.execute(
+        select(BalanceEntry.kind, BalanceEntry.amount).where(BalanceEntry.client_id == client_id).order_by(BalanceEntry.id)
+    )
+    return [(kind, Decimal(amount)) for kind, amount in result.all()]
+
+
+async def reconcile_today(session, fix=False):
+    return await ReconciliationService(session).reconcile_day(datetime.utcnow().date(), fix=fix)
+
+
+@pytest.mark.asyncio
+async def test_charge_opens_debt_once(session, client, make_order):
+    order = await make_order(100)
+    service = ReconciliationService(session)
+    
+    assert await service.charge_order(order) is True
+    assert await service.charge_order(order) is False
+    
+    balance = await balance_of(session, client.id)
+    assert (balance.charged_total, balance.outstanding, balance.active_debt) == (100, 100, 100)
+    assert [debt.remaining_amount for debt in await active_debts(session, order.id)] == [100]
+    assert await session.get(DebtWorkItem, client.id) is not None
+
+
+@pytest.mark.asyncio
+async def test_partial_payment_reduces_debt(session, client, make_order):
+    order = await make_order(100)
+    service = ReconciliationService(session)
+    await service.charge_order(order)
+    
+    await service.apply_payment(order.id, 40)
+    
+    await session.refresh(order)
+    balance = await balance_of(session, client.id)
+    assert order.status == OrderStatus.PARTIALLY_PAID.value
+    assert (order.paid_amount, order.debt_amount) == (40, 60)
+    assert (balance.paid_total, balance.outstanding, balance.active_debt) == (40, 60, 60)
+    assert [debt.remaining_amount for debt in await active_debts(session, order.id)] == [60]
+    assert (await reconcile_today(session))["mismatch_count"] == 0
+
+
+@pytest.mark.asyncio
+async def test_overpayment_becomes_credit(session, client, make_order):
+    order = await make_order(100)
+    service = ReconciliationService(session)
+    await service.charge_order(order)
+    
+    await service.apply_payment(order.id, 130)
+    
+    await session.refresh(order)
+    balance = await balance_of(session, client.id)
+    assert order.status == OrderStatus.PAID.value
+    assert order.debt_amount == 0
+    assert (balance.outstanding, balance.active_debt) == (-30, 0)
+    assert await active_debts(session, order.id) == []
+    assert await session.get(DebtWorkItem, client.id) is None
+    assert (await reconcile_today(session))["mismatch_count"] == 0
+
+
+@pytest.mark.asyncio
+async def test_client_payment_settles_oldest_debt_first(session, client, make_order):
+    service = ReconciliationService(session)
+    first, second = await make_order(100), await make_order(50)
+    await service.charge_order(first)
+    await service.charge_order(second)
+    
+    payments = await service.apply_client_payment(client.id, 120)
+    
+    assert [(payment.order_id, payment.amount) for payment in payments] == [(first.id, 100), (second.id, 20)]
+    assert await active_debts(session, first.id) == []
+    assert [debt.remaining_amount for debt in await active_debts(session, second.id)] == [30]
+    assert (await balance_of(session, client.id)).active_debt == 30
+
+
+@pytest.mark.asyncio
+async def test_reject_after_prepayment_reverses_charge(session, client, make_order):
+    operator = User(telegram_id=2001, full_name="Оператор", role=UserRole.OPERATOR.value)
+    session.add(operator)
+    order = await make_order(100, status=OrderStatus.CONFIRMED)
+    
+    # Предоплата до доставки начисляет заказ и открывает долг на остаток
+    await ReconciliationService(session).apply_payment(order.id, 40)
+    assert (await balance_of(session, client.id)).active_debt == 60
+    
+    await OrderService(session).reject_order(order.id, operator.id, "Нет в наличии")
+    
+    await session.refresh(order)
+    balance = await balance_of(session, client.id)
+    assert order.status == OrderStatus.REJECTED.value
+    assert order.charged_at is None
+    assert await active_debts(session, order.id) == []
+    assert (balance.charged_total, balance.paid_total) == (0, 40)
+    assert (balance.outstanding, balance.active_debt) == (-40, 0)
+    assert await ledger_kinds(session, client.id) == [("charge", 100), ("payment", -40), ("reversal", -100)]
+    assert await session.get(DebtWorkItem, client.id) is None
+    assert (await reconcile_today(session))["mismatch_count"] == 0
+
+
+@pytest.mark.asyncio
+async def test_payment_on_rejected_order_is_not_charged(session, client, make_order):
+    order = await make_order(100, status=OrderStatus.REJECTED)
+    
+    await ReconciliationService(session).apply_payment(order.id, 25)
+    
+    balance = await balance_of(session, client.id)
+    assert (balance.charged_total, balance.outstanding, balance.active_debt) == (0, -25, 0)
+    assert await active_debts(session, order.id) == []
+
+
+@pytest.mark.asyncio
+async def test_new_order_is_left_for_the_caller_to_commit(session, client):
+    client_id = client.id
+    pharmacy_id = (await session.execute(select(Pharmacy.id).where(Pharmacy.user_id == client_id))).scalar_one()
+    await OrderService(session).create_order(
+        client_id=client_id,
+        pharmacy_id=pharmacy_id,
+        items=[{"product_name": "Парацетамол", "quantity": 2, "unit_price": 10}]
+    )
+    
+    # Фиксирует SessionMiddleware в конце обновления; откат обновления убирает и заказ, и сводку
+    await session.rollback()
+    
+    assert (await session.execute(select(Order).where(Order.client_id == client_id))).first() is None
+    assert await session.get(ClientSummary, client_id) is None
+
+
+@pytest.mark.asyncio
+async def test_reconcile_reports_and_fixes_drift(session, client, make_order):
+    order = await make_order(100)
+    service = ReconciliationService(session)
+    await service.charge_order(order)
+    await service.apply_payment(order.id, 30)
+    
+    await session.execute(update(ClientBalance).where(ClientBalance.client_id == client.id).values(paid_total=10))
+    await session.execute(update(Order).where(Order.id == order.id).values(paid_amount=0))
+    await session.commit()
+    
+    report = await reconcile_today(session)
+    assert {mismatch["kind"] for mismatch in report["mismatches"]} == {"order_paid", "client_paid"}
+    
+    assert (await reconcile_today(session, fix=True))["fixed"] == 2
+    assert (await reconcile_today(session))["mismatch_count"] == 0
+    balance = await balance_of(session, client.id)
+    assert (balance.paid_total, balance.outstanding) == (30, 70)
@@ -0,0 +1,37 @@
+"""
+🧪 Срок хранения журналов: история действий и очистка геолокаций
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.config import settings
+from src.models.database import ActivityLog, Location
+from src.services.location_service import LocationService
+from src.services.user_service import UserService
+
+
+@pytest.mark.asyncio
+async def test_activity_history_newest_first_within_retention(session, client):
+    now = datetime.utcnow()
+    for days_ago in (1, 40, 100, settings.activity_log_retention_days + 1):
+        session.add(ActivityLog(user_id=client.id, action=f"ago_{days_ago}", created_at=now - timedelta(days=days_ago)))
+    await session.commit()
+    
+    history = await UserService(session).get_user_activity_history(client.id, limit=2)
+    
+    assert [entry.action for entry in history] == ["ago_1", "ago_40"]
+    assert len(await UserService(session).get_user_activity_history(client.id)) == 3
+
+
+@pytest.mark.asyncio
+async def test_cleanup_old_locations_reports_partitions_and_rows(session, client):
+    now = datetime.utcnow()
+    for days_ago in (1, 31, 60):
+        session.add(Location(user_id=client.id, latitude=38.56, longitude=68.77, created_at=now - timedelta(days=days_ago)))
+    await session.commit()
+    
+    removed = await LocationService(session).cleanup_old_locations(days=30)
+    
+    assert removed == {"partitions": 0, "rows": 2}
@@ -0,0 +1,76 @@
+"""
+🧪 Рейсы курьеров: группировка готовых заказов и назначение рейса одному курьеру
+"""
+
+import time
+
+import pytest
+
+from src.config import settings
+from src.models.database import Order, OrderStatus, Pharmacy, User, UserRole
+from src.services import dispatch_service
+from src.services.assignment_service import AssignmentService, WorkerLoadBalancer
+from src.services.dispatch_service import CourierGridIndex
+from src.services.route_service import RouteService
+
+NORTH = [(38.620, 68.780), (38.625, 68.785)]
+SOUTH = [(38.500, 68.790), (38.505, 68.795)]
+
+
+async def ready_orders(session, points, first=2000):
+    orders = []
+    for number, (latitude, longitude) in enumerate(points):
+        client = User(telegram_id=first + number, full_name=f"Клиент {number}", role=UserRole.CLIENT.value)
+        session.add(client)
+        await session.flush()
+        pharmacy = Pharmacy(user_id=client.id, name=f"Аптека {number}", address=f"Адрес {number}",
+                            latitude=latitude, longitude=longitude)
+        session.add(pharmacy)
+        await session.flush()
+        order = Order(order_number=f"ORD-T{first + number}", client_id=client.id, pharmacy_id=pharmacy.id,
+                      status=OrderStatus.READY_FOR_DELIVERY.value, total_amount=100)
+        session.add(order)
+        orders.append(order)
+    await session.commit()
+    return orders
+
+
+@pytest.mark.asyncio
+async def test_ready_orders_are_split_into_compact_trips(session, monkeypatch):
+    monkeypatch.setattr(settings, "route_max_stops", 2)
+    north = await ready_orders(session, NORTH)
+    south = await ready_orders(session, SOUTH, first=3000)
+    
+    plan = await RouteService(session).plan_ready_orders()
+    trips = sorted(
+        sorted(order_id for stop in trip['stops'] for order_id in stop['order_ids'])
+        for trip in plan['trips']
+    )
+    
+    assert plan['orders'] == 4
+    assert trips == sorted([sorted(order.id for order in north), sorted(order.id for order in south)])
+
+
+@pytest.mark.asyncio
+async def test_trip_goes_to_the_courier_who_has_its_other_orders(session, monkeypatch):
+    index = CourierGridIndex(cell_km=2.0)
+    index.loaded_at = time.monotonic()
+    monkeypatch.setattr(dispatch_service, "courier_index", index)
+    
+    first, second = await ready_orders(session, NORTH)
+    trip_courier = User(telegram_id=5001, full_name="Курьер рейса", role=UserRole.COURIER.value)
+    nearest = User(telegram_id=5002, full_name="Ближайший курьер", role=UserRole.COURIER.value)
+    session.add_all([trip_courier, nearest])
+    await session.flush()
+    first.courier_id = trip_courier.id
+    second.status = OrderStatus.CHECKING.value
+    await session.commit()
+    index.update(trip_courier.id, 38.590, 68.780)
+    index.update(nearest.id, *NORTH[1])
+    
+    second.status = OrderStatus.READY_FOR_DELIVERY.value
+    worker = await AssignmentService(session, WorkerLoadBalancer()).on_status_change(
+        second, OrderStatus.CHECKING.value, OrderStatus.READY_FOR_DELIVERY.value
+    )
+    
+    assert worker.id == trip_courier.id
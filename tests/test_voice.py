@@ -0,0 +1,56 @@
+"""
+🧪 Голосовые заказы: числительные словами и временные файлы очереди распознавания
+"""
+
+import asyncio
+import os
+import tempfile
+import time
+
+import pytest
+
+from src.services.voice_service import TranscriptionBackend, VoiceQueue, words_to_numbers
+
+
+class SlowBackend(TranscriptionBackend):
+    """Читает файл дольше, чем ждет обработчик"""
+    
+    name = "slow"
+    
+    def __init__(self, options):
+        pass
+    
+    def transcribe(self, path: str) -> str:
+        time.sleep(0.5)
+        with open(path) as audio:
+            return audio.read()
+
+
+def test_number_words_combine_only_descending_places():
+    assert words_to_numbers("двадцать пять штук") == "25 штук"
+    assert words_to_numbers("сто пятнадцать") == "115"
+    assert words_to_numbers("триста сорок два") == "342"
+    assert words_to_numbers("пять десять") == "5 10"
+    assert words_to_numbers("двадцать пятнадцать") == "20 15"
+    assert words_to_numbers("пятнадцать пять") == "15 5"
+
+
+@pytest.mark.asyncio
+async def test_timed_out_voice_file_is_removed_by_worker():
+    fd, path = tempfile.mkstemp(suffix=".ogg")
+    with os.fdopen(fd, "w") as audio:
+        audio.write("парацетамол")
+    
+    queue = VoiceQueue(workers=1, max_size=2, backend=f"{__name__}:SlowBackend")
+    try:
+        with pytest.raises(asyncio.TimeoutError):
+            await queue.submit(path, timeout=0.1)
+        # Процесс пула еще читает файл
+        assert os.path.exists(path)
+        
+        await asyncio.wait_for(queue._queue.join(), 30)
+    finally:
+        await queue.shutdown()
+    
+    assert queue.stats["completed"] == 1
+    assert not os.path.exists(path)
@@ -0,0 +1,94 @@
+"""
+🧪 Очереди персонала по зонам
+"""
+
+import pytest
+from sqlalchemy import select
+
+from src.models.database import OrderStatus, Pharmacy, User, UserRole
+from src.services.order_service import OrderService
+from src.services.zone_service import ZoneService
+
+
+async def zoned_orders(session, make_order, status):
+    orders = {}
+    for zone in ("Центр", "Сино"):
+        order = await make_order(100, status=status)
+        order.zone = zone
+        orders[zone] = order
+    await session.commit()
+    return orders
+
+
+@pytest.mark.asyncio
+async def test_stage_queues_scan_only_own_zone(session, make_order):
+    service = OrderService(session)
+    for status, queue in (
+        (OrderStatus.CONFIRMED, service.get_orders_for_collector),
+        (OrderStatus.COLLECTED, service.get_orders_for_checker),
+        (OrderStatus.READY_FOR_DELIVERY, service.get_orders_for_courier),
+    ):
+        orders = await zoned_orders(session, make_order, status)
+        
+        assert [order.id for order in await queue("Центр")] == [orders["Центр"].id]
+        assert len(await queue(None)) == 2
+
+
+@pytest.mark.asyncio
+async def test_orders_by_status_filters_courier(session, make_order):
+    courier = User(telegram_id=5001, full_name="Курьер", role=UserRole.COURIER.value)
+    session.add(courier)
+    await session.commit()
+    orders = await zoned_orders(session, make_order, OrderStatus.IN_DELIVERY)
+    orders["Сино"].courier_id = courier.id
+    await session.commit()
+    
+    service = OrderService(session)
+    mine = await service.get_orders_by_status(OrderStatus.IN_DELIVERY, courier_id=courier.id)
+    
+    assert [order.id for order in mine] == [orders["Сино"].id]
+    assert mine[0].pharmacy.name == "Аптека"
+    assert len(await service.get_orders_by_status(OrderStatus.IN_DELIVERY, zone="Центр")) == 1
+
+
+@pytest.mark.asyncio
+async def test_order_without_zone_stays_in_zoned_queues(session, make_order):
+    legacy = await make_order(100, status=OrderStatus.CONFIRMED)
+    other = await make_order(100, status=OrderStatus.CONFIRMED)
+    other.zone = "север"
+    await session.commit()
+    
+    service = OrderService(session)
+    
+    assert [order.id for order in await service.get_orders_for_collector("центр")] == [legacy.id]
+    assert [order.id for order in await service.get_orders_by_status(OrderStatus.CONFIRMED, zone="центр")] == [legacy.id]
+
+
+@pytest.mark.asyncio
+async def test_backfill_fills_pharmacies_and_open_orders(session, client, make_order):
+    pharmacy = (await session.execute(select(Pharmacy).where(Pharmacy.user_id == client.id))).scalar_one()
+    pharmacy.latitude, pharmacy.longitude = 38.56, 68.78
+    open_order = await make_order(100, status=OrderStatus.CONFIRMED)
+    closed_order = await make_order(100, status=OrderStatus.DELIVERED)
+    
+    result = await ZoneService(session).backfill_zones(geocode=False)
+    await session.refresh(open_order)
+    await session.refresh(closed_order)
+    
+    assert result == {"pharmacies": 1, "orders": 1}
+    assert (pharmacy.zone, open_order.zone, closed_order.zone) == ("центр", "центр", None)
+    assert await ZoneService(session).get_coverage() == {"pharmacies": 0, "orders": 0}
+
+
+@pytest.mark.asyncio
+async def test_set_staff_zone(session, client):
+    courier = User(telegram_id=5001, full_name="Курьер", role=UserRole.COURIER.value)
+    session.add(courier)
+    await session.commit()
+    service = ZoneService(session)
+    
+    assert (await service.set_staff_zone(5001, "юг")).zone == "юг"
+    assert (await service.set_staff_zone(5001, None)).zone is None
+    assert await service.set_staff_zone(client.telegram_id, "юг") is None
+    with pytest.raises(ValueError):
+        await service.set_staff_zone(5001, "луна")